@@ -0,0 +1,341 @@
+from typing import Dict
+import re
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+###
+## ABBREVIATION TABLES
+###
+
+# USPS Publication 28, appendix C1: street suffixes and their common spellings
+STREET_SUFFIXES: Dict[str, str] = {
+    "ALLEY": "ALY", "ALLEE": "ALY", "ALLY": "ALY",
+    "ANEX": "ANX", "ANNEX": "ANX", "ANNX": "ANX",
+    "ARCADE": "ARC",
+    "AVENUE": "AVE", "AV": "AVE", "AVEN": "AVE", "AVENU": "AVE", "AVN": "AVE", "AVNUE": "AVE",
+    "BAYOU": "BYU", "BAYOO": "BYU",
+    "BEACH": "BCH",
+    "BEND": "BND",
+    "BLUFF": "BLF", "BLUF": "BLF",
+    "BLUFFS": "BLFS",
+    "BOTTOM": "BTM", "BOT": "BTM", "BOTTM": "BTM",
+    "BOULEVARD": "BLVD", "BOUL": "BLVD", "BOULV": "BLVD",
+    "BRANCH": "BR", "BRNCH": "BR",
+    "BRIDGE": "BRG", "BRDGE": "BRG",
+    "BROOK": "BRK",
+    "BROOKS": "BRKS",
+    "BURG": "BG",
+    "BURGS": "BGS",
+    "BYPASS": "BYP", "BYPA": "BYP", "BYPAS": "BYP", "BYPS": "BYP",
+    "CAMP": "CP", "CMP": "CP",
+    "CANYON": "CYN", "CANYN": "CYN", "CNYN": "CYN",
+    "CAPE": "CPE",
+    "CAUSEWAY": "CSWY", "CAUSWA": "CSWY",
+    "CENTER": "CTR", "CEN": "CTR", "CENT": "CTR", "CENTR": "CTR", "CENTRE": "CTR", "CNTER": "CTR", "CNTR": "CTR",
+    "CENTERS": "CTRS",
+    "CIRCLE": "CIR", "CIRC": "CIR", "CIRCL": "CIR", "CRCL": "CIR", "CRCLE": "CIR",
+    "CIRCLES": "CIRS",
+    "CLIFF": "CLF",
+    "CLIFFS": "CLFS",
+    "CLUB": "CLB",
+    "COMMON": "CMN",
+    "COMMONS": "CMNS",
+    "CORNER": "COR",
+    "CORNERS": "CORS",
+    "COURSE": "CRSE",
+    "COURT": "CT", "CRT": "CT",
+    "COURTS": "CTS",
+    "COVE": "CV",
+    "COVES": "CVS",
+    "CREEK": "CRK",
+    "CRESCENT": "CRES", "CRSENT": "CRES", "CRSNT": "CRES",
+    "CREST": "CRST",
+    "CROSSING": "XING", "CRSSNG": "XING",
+    "CROSSROAD": "XRD",
+    "CROSSROADS": "XRDS",
+    "CURVE": "CURV",
+    "DALE": "DL",
+    "DAM": "DM",
+    "DIVIDE": "DV", "DIV": "DV", "DVD": "DV",
+    "DRIVE": "DR", "DRIV": "DR", "DRV": "DR",
+    "DRIVES": "DRS",
+    "ESTATE": "EST",
+    "ESTATES": "ESTS",
+    "EXPRESSWAY": "EXPY", "EXP": "EXPY", "EXPR": "EXPY", "EXPRESS": "EXPY", "EXPW": "EXPY",
+    "EXTENSION": "EXT", "EXTN": "EXT", "EXTNSN": "EXT",
+    "EXTENSIONS": "EXTS",
+    "FALLS": "FLS",
+    "FERRY": "FRY", "FRRY": "FRY",
+    "FIELD": "FLD",
+    "FIELDS": "FLDS",
+    "FLAT": "FLT",
+    "FLATS": "FLTS",
+    "FORD": "FRD",
+    "FORDS": "FRDS",
+    "FOREST": "FRST", "FORESTS": "FRST",
+    "FORGE": "FRG", "FORG": "FRG",
+    "FORGES": "FRGS",
+    "FORK": "FRK",
+    "FORKS": "FRKS",
+    "FORT": "FT", "FRT": "FT",
+    "FREEWAY": "FWY", "FREEWY": "FWY", "FRWAY": "FWY", "FRWY": "FWY",
+    "GARDEN": "GDN", "GARDN": "GDN", "GRDEN": "GDN", "GRDN": "GDN",
+    "GARDENS": "GDNS", "GRDNS": "GDNS",
+    "GATEWAY": "GTWY", "GATEWY": "GTWY", "GATWAY": "GTWY", "GTWAY": "GTWY",
+    "GLEN": "GLN",
+    "GLENS": "GLNS",
+    "GREEN": "GRN",
+    "GREENS": "GRNS",
+    "GROVE": "GRV", "GROV": "GRV",
+    "GROVES": "GRVS",
+    "HARBOR": "HBR", "HARB": "HBR", "HARBR": "HBR", "HRBOR": "HBR",
+    "HARBORS": "HBRS",
+    "HAVEN": "HVN",
+    "HEIGHTS": "HTS", "HT": "HTS",
+    "HIGHWAY": "HWY", "HIGHWY": "HWY", "HIWAY": "HWY", "HIWY": "HWY", "HWAY": "HWY",
+    "HILL": "HL",
+    "HILLS": "HLS",
+    "HOLLOW": "HOLW", "HLLW": "HOLW", "HOLLOWS": "HOLW", "HOLWS": "HOLW",
+    "INLET": "INLT",
+    "ISLAND": "IS", "ISLND": "IS",
+    "ISLANDS": "ISS", "ISLNDS": "ISS",
+    "ISLES": "ISLE",
+    "JUNCTION": "JCT", "JCTION": "JCT", "JCTN": "JCT", "JUNCTN": "JCT", "JUNCTON": "JCT",
+    "JUNCTIONS": "JCTS", "JCTNS": "JCTS",
+    "KEY": "KY",
+    "KEYS": "KYS",
+    "KNOLL": "KNL", "KNOL": "KNL",
+    "KNOLLS": "KNLS",
+    "LAKE": "LK",
+    "LAKES": "LKS",
+    "LANDING": "LNDG", "LNDNG": "LNDG",
+    "LANE": "LN",
+    "LIGHT": "LGT",
+    "LIGHTS": "LGTS",
+    "LOAF": "LF",
+    "LOCK": "LCK",
+    "LOCKS": "LCKS",
+    "LODGE": "LDG", "LDGE": "LDG", "LODG": "LDG",
+    "LOOPS": "LOOP",
+    "MANOR": "MNR",
+    "MANORS": "MNRS",
+    "MEADOW": "MDW",
+    "MEADOWS": "MDWS", "MEDOWS": "MDWS",
+    "MILL": "ML",
+    "MILLS": "MLS",
+    "MISSION": "MSN", "MISSN": "MSN", "MSSN": "MSN",
+    "MOTORWAY": "MTWY",
+    "MOUNT": "MT", "MNT": "MT",
+    "MOUNTAIN": "MTN", "MNTAIN": "MTN", "MNTN": "MTN", "MOUNTIN": "MTN", "MTIN": "MTN",
+    "MOUNTAINS": "MTNS", "MNTNS": "MTNS",
+    "NECK": "NCK",
+    "ORCHARD": "ORCH", "ORCHRD": "ORCH",
+    "OVL": "OVAL",
+    "OVERPASS": "OPAS",
+    "PARKS": "PARK", "PRK": "PARK",
+    "PARKWAY": "PKWY", "PARKWY": "PKWY", "PKWAY": "PKWY", "PKY": "PKWY", "PARKWAYS": "PKWY", "PKWYS": "PKWY",
+    "PASSAGE": "PSGE",
+    "PATHS": "PATH",
+    "PIKES": "PIKE",
+    "PINE": "PNE",
+    "PINES": "PNES",
+    "PLACE": "PL",
+    "PLAIN": "PLN",
+    "PLAINS": "PLNS",
+    "PLAZA": "PLZ", "PLZA": "PLZ",
+    "POINT": "PT",
+    "POINTS": "PTS",
+    "PORT": "PRT",
+    "PORTS": "PRTS",
+    "PRAIRIE": "PR", "PRR": "PR",
+    "RADIAL": "RADL", "RAD": "RADL", "RADIEL": "RADL",
+    "RANCH": "RNCH", "RANCHES": "RNCH", "RNCHS": "RNCH",
+    "RAPID": "RPD",
+    "RAPIDS": "RPDS",
+    "REST": "RST",
+    "RIDGE": "RDG", "RDGE": "RDG",
+    "RIDGES": "RDGS",
+    "RIVER": "RIV", "RVR": "RIV", "RIVR": "RIV",
+    "ROAD": "RD",
+    "ROADS": "RDS",
+    "ROUTE": "RTE",
+    "SHOAL": "SHL",
+    "SHOALS": "SHLS",
+    "SHORE": "SHR", "SHOAR": "SHR",
+    "SHORES": "SHRS", "SHOARS": "SHRS",
+    "SKYWAY": "SKWY",
+    "SPRING": "SPG", "SPNG": "SPG", "SPRNG": "SPG",
+    "SPRINGS": "SPGS", "SPNGS": "SPGS", "SPRNGS": "SPGS",
+    "SPURS": "SPUR",
+    "SQUARE": "SQ", "SQR": "SQ", "SQRE": "SQ", "SQU": "SQ",
+    "SQUARES": "SQS", "SQRS": "SQS",
+    "STATION": "STA", "STATN": "STA", "STN": "STA",
+    "STRAVENUE": "STRA", "STRAV": "STRA", "STRAVEN": "STRA", "STRAVN": "STRA", "STRVN": "STRA", "STRVNUE": "STRA",
+    "STREAM": "STRM", "STREME": "STRM",
+    "STREET": "ST", "STRT": "ST", "STR": "ST",
+    "STREETS": "STS",
+    "SUMMIT": "SMT", "SUMIT": "SMT", "SUMITT": "SMT",
+    "TERRACE": "TER", "TERR": "TER",
+    "THROUGHWAY": "TRWY",
+    "TRACE": "TRCE", "TRACES": "TRCE",
+    "TRACK": "TRAK", "TRACKS": "TRAK", "TRK": "TRAK", "TRKS": "TRAK",
+    "TRAFFICWAY": "TRFY",
+    "TRAIL": "TRL", "TRAILS": "TRL", "TRLS": "TRL",
+    "TRAILER": "TRLR", "TRLRS": "TRLR",
+    "TUNNEL": "TUNL", "TUNEL": "TUNL", "TUNLS": "TUNL", "TUNNELS": "TUNL", "TUNNL": "TUNL",
+    "TURNPIKE": "TPKE", "TRNPK": "TPKE", "TURNPK": "TPKE",
+    "UNDERPASS": "UPAS",
+    "UNION": "UN",
+    "UNIONS": "UNS",
+    "VALLEY": "VLY", "VALLY": "VLY", "VLLY": "VLY",
+    "VALLEYS": "VLYS",
+    "VIADUCT": "VIA", "VDCT": "VIA", "VIADCT": "VIA",
+    "VIEW": "VW",
+    "VIEWS": "VWS",
+    "VILLAGE": "VLG", "VILL": "VLG", "VILLAG": "VLG", "VILLG": "VLG", "VILLIAGE": "VLG",
+    "VILLAGES": "VLGS",
+    "VILLE": "VL",
+    "VISTA": "VIS", "VIST": "VIS", "VST": "VIS", "VSTA": "VIS",
+    "WALKS": "WALK",
+    "WY": "WAY",
+    "WELL": "WL",
+    "WELLS": "WLS",
+}
+
+# USPS Publication 28, appendix B: directionals
+DIRECTIONALS: Dict[str, str] = {
+    "NORTH": "N", "SOUTH": "S", "EAST": "E", "WEST": "W",
+    "NORTHEAST": "NE", "NORTHWEST": "NW", "SOUTHEAST": "SE", "SOUTHWEST": "SW",
+}
+
+# USPS Publication 28, appendix C2: secondary unit designators
+UNIT_DESIGNATORS: Dict[str, str] = {
+    "APARTMENT": "APT", "APPT": "APT",
+    "BASEMENT": "BSMT",
+    "BUILDING": "BLDG", "BLD": "BLDG",
+    "DEPARTMENT": "DEPT",
+    "FLOOR": "FL", "FLR": "FL",
+    "FRONT": "FRNT",
+    "HANGAR": "HNGR",
+    "LOBBY": "LBBY",
+    "LOWER": "LOWR",
+    "OFFICE": "OFC",
+    "PENTHOUSE": "PH",
+    "ROOM": "RM",
+    "SPACE": "SPC",
+    "SUITE": "STE",
+    "UPPER": "UPPR",
+}
+
+# every word with a standard abbreviation, looked up one word at a time
+ADDRESS_ABBREVIATIONS: Dict[str, str] = {**STREET_SUFFIXES, **DIRECTIONALS, **UNIT_DESIGNATORS}
+
+# the canonical words of each part, with the standard abbreviations spelled
+# like their word, which have no entry above
+STREET_TYPES = frozenset(STREET_SUFFIXES.values()) | {
+    "FALL", "LAND", "MALL", "MEWS", "PASS", "RAMP", "ROW", "RUE", "RUN", "WALL", "WAYS",
+}
+DIRECTIONS = frozenset(DIRECTIONALS.values())
+UNIT_TYPES = frozenset(UNIT_DESIGNATORS.values()) | {"LOT", "SLIP", "TRLR", "UNIT"}
+
+# "#" marks a unit number, "#5" and "# 5" read the same
+_SEPARATORS = re.compile(r"[,#]")
+
+# a canonical address: number, street name, then the optional street type,
+# direction and unit, e.g. "1600 PENNSYLVANIA AVE NW" or "12 MAIN ST APT 5"
+_ADDRESS_PARTS = (
+    r"^(?:(?P<number>\d+[A-Z]?)(?: |$))?(?P<street>.*?)"
+    rf"(?: (?P<type>{'|'.join(sorted(STREET_TYPES))}))?"
+    rf"(?: (?P<direction>{'|'.join(sorted(DIRECTIONS))}))?"
+    rf"(?: (?P<unit>(?:{'|'.join(sorted(UNIT_TYPES))})(?: .*)?))?$"
+)
+_ADDRESS_PARTS_RE = re.compile(_ADDRESS_PARTS)
+
+
+###
+## CANONICALIZATION
+###
+
+def canonicalize_address(address: str) -> str:
+    """
+    Gives the canonical form of one address, see `canonicalize_addresses`.
+
+    Args:
+        address (str): The address, as written or read by OCR.
+
+    Returns:
+        str: The canonical address.
+    """
+    if not isinstance(address, str):
+        return ""
+    words = _SEPARATORS.sub(" ", address.upper().replace(".", "")).split()
+    return " ".join(ADDRESS_ABBREVIATIONS.get(word, word) for word in words)
+
+
+def canonicalize_addresses(addresses: pd.Series) -> pd.Series:
+    """
+    Gives the canonical form of every address, so formatting differences
+    such as "Street" and "St", or "N.W." and "Northwest", compare equal.
+
+    Addresses are upper-cased, stripped of periods and commas, and every
+    word with a USPS abbreviation is replaced by it. Words are replaced
+    wherever they appear, not only in the suffix position, which keeps the
+    rule identical for registry records and OCR text. Whitespace is
+    collapsed and missing addresses become empty strings.
+
+    Runs on Arrow compute kernels: each distinct word is looked up once,
+    however many addresses contain it.
+
+    Args:
+        addresses (pd.Series): The addresses.
+
+    Returns:
+        pd.Series: The canonical addresses, with the index of `addresses`.
+    """
+    text = pa.array(addresses.fillna("").astype(str), type=pa.large_string())
+    text = pc.replace_substring_regex(pc.replace_substring(pc.utf8_upper(text), ".", ""), _SEPARATORS.pattern, " ")
+    words = pc.utf8_split_whitespace(pc.utf8_trim_whitespace(text))
+
+    # each distinct word is looked up in the tables once
+    encoded = pc.dictionary_encode(words.flatten())
+    canonical_words = pa.array(
+        [ADDRESS_ABBREVIATIONS.get(word, word) for word in encoded.dictionary.to_pylist()],
+        type=encoded.dictionary.type,
+    )
+    words = type(words).from_arrays(words.offsets, canonical_words.take(encoded.indices))
+    canonical = pc.binary_join(words, pa.scalar(" ", type=pa.large_string()))
+    return pd.Series(canonical.to_numpy(zero_copy_only=False), index=addresses.index, dtype=str)
+
+
+def parse_address(canonical_address: str) -> Dict[str, str]:
+    """
+    Splits one canonical address into its parts, see `parse_addresses`.
+
+    Args:
+        canonical_address (str): An address from `canonicalize_address`.
+
+    Returns:
+        Dict[str, str]: The "number", "street", "type", "direction" and
+            "unit" of the address.
+    """
+    return {part: value or "" for part, value in _ADDRESS_PARTS_RE.match(canonical_address).groupdict().items()}
+
+
+def parse_addresses(canonical_addresses: pd.Series) -> pd.DataFrame:
+    """
+    Splits canonical addresses into their parts.
+
+    The house number is the leading number, and the street type, direction
+    and unit are the trailing words in that order, when they are standard
+    abbreviations. The rest is the street name. Missing parts are empty.
+
+    Args:
+        canonical_addresses (pd.Series): Addresses from `canonicalize_addresses`.
+
+    Returns:
+        pd.DataFrame: The "number", "street", "type", "direction" and "unit"
+            of every address, with the index of `canonical_addresses`.
+    """
+    return canonical_addresses.str.extract(_ADDRESS_PARTS).fillna("").astype(str)
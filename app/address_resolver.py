@@ -0,0 +1,234 @@
+from typing import List, NamedTuple, Tuple
+import re
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+from rapidfuzz.distance import OSA
+
+from address_canonicalizer import canonicalize_address, parse_address, parse_addresses
+from match_candidates import RowCandidates, combine_scores
+
+
+# letters OCR engines commonly read for digits, undone in house numbers
+_DIGIT_CONFUSIONS = str.maketrans("OQDILTSZBG", "0001175286")
+
+# a house number run into the street, "6228WILLIAM"
+_GLUED_NUMBER = re.compile(r"^(\d{2,})([A-Z]{3,}) ")
+
+
+def _read_house_number(canonical_address: str) -> str:
+    # a leading word mostly of digits is a house number, "52L1" reads "5211"
+    first, _, rest = _GLUED_NUMBER.sub(r"\1 \2 ", canonical_address).partition(" ")
+    if sum(c.isdigit() for c in first) * 2 > len(first):
+        # a trailing letter is a house number suffix, as in "12A"
+        first = first[:-1].translate(_DIGIT_CONFUSIONS) + first[-1:]
+    return f"{first} {rest}" if rest else first
+
+
+def _ranges(starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+    # the concatenated aranges of start, stop pairs
+    lengths = stops - starts
+    return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+
+class ResolvedAddress(NamedTuple):
+    """The registry records living at an OCR address"""
+
+    # positions in the registry, by street then house number
+    positions: np.ndarray
+    # the "STREET TYPE" the address resolved to, best first
+    streets: List[str]
+    # whether the house number matched exactly, not only nearly
+    exact_number: bool
+
+
+class AddressResolver:
+    """
+    Resolves OCR addresses to the registry records living there, street
+    first and house number second.
+
+    A registry holds a few thousand streets but many more residents, so the
+    OCR street is fuzzy matched against the distinct street names only, then
+    narrowed to the street types of the matched names. Within each street,
+    records are sorted by house number, so the number is looked up by binary
+    search and, when misread, among the few numbers of that street. Names
+    are then scored against a handful of residents instead of the registry.
+
+    Example:
+        resolver = AddressResolver(select_voter_records)
+        matches = resolver.get_matched_name_address("Adam Welch", "5211 Shaw Wall")
+    """
+
+    def __init__(self, select_voter_records: pd.DataFrame, street_limit: int = 3, street_cutoff: float = 75,
+                 max_number_distance: int = 1):
+        """
+        Args:
+            select_voter_records (pd.DataFrame): The registry, from
+                `fuzzy_match_helper.create_select_voter_records`.
+            street_limit (int): The number of street names an OCR street may
+                resolve to.
+            street_cutoff (float): The lowest score, 0 to 100, a street name
+                resolves at.
+            max_number_distance (int): The most misread digits of a house
+                number that still resolves, when no number matches exactly.
+        """
+        self.select_voter_records = select_voter_records
+        self.street_limit = street_limit
+        self.street_cutoff = street_cutoff
+        self.max_number_distance = max_number_distance
+        self._names = select_voter_records["Full Name"].to_numpy(dtype=object)
+        self._addresses = select_voter_records["Full Address"].to_numpy(dtype=object)
+        self._canonical_addresses = select_voter_records["Canonical Address"].to_numpy(dtype=object)
+        self._registry_ids = select_voter_records.index.to_numpy().astype(np.int64)
+
+        parts = parse_addresses(select_voter_records["Canonical Address"])
+        numbers = pd.to_numeric(parts["number"].str.extract(r"^(\d+)", expand=False), errors="coerce")
+        # records without a house number cannot be resolved by address
+        has_number = numbers.notna().to_numpy()
+        streets = pd.MultiIndex.from_arrays([parts["street"], parts["type"]])[has_number]
+
+        # the dictionary of distinct streets, sorted by name then type, so the
+        # streets of one name are contiguous
+        street_codes, self.streets = pd.factorize(streets, sort=True)
+        self.street_names, first_street = np.unique(self.streets.get_level_values(0), return_index=True)
+        self._street_name_list = list(self.street_names)
+        self._name_streets = np.append(first_street, len(self.streets))
+        self._street_types = self.streets.get_level_values(1).to_numpy()
+        self._street_labels = (
+            (self.streets.get_level_values(0) + " " + self.streets.get_level_values(1)).str.strip().to_numpy(dtype=object)
+        )
+
+        # the integer index: records sorted by street code then house number,
+        # searched on street code * number span + house number
+        numbers = numbers.to_numpy()[has_number].astype(np.int64)
+        self._number_span = int(numbers.max(initial=0)) + 1
+        keys = street_codes.astype(np.int64) * self._number_span + numbers
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._positions = np.flatnonzero(has_number)[order]
+        self._number_strings = numbers[order].astype(str).astype(object)
+        self._street_starts = np.searchsorted(self._keys, np.arange(len(self.streets) + 1) * self._number_span)
+
+    def __len__(self) -> int:
+        return len(self.streets)
+
+    def _street_codes_of(self, street: str, street_type: str) -> np.ndarray:
+        """The codes of the streets an OCR street and type resolve to, best first."""
+        matches = process.extract(street, self._street_name_list, scorer=fuzz.ratio,
+                                  limit=self.street_limit, score_cutoff=self.street_cutoff)
+        # a misread street type or unit stays in the street, "SHAW WAL" or
+        # "SHAW WALL APPT 5", the street name is then a leading part of it
+        words = street.split()
+        n = len(words)
+        while not matches and n > 1:
+            n -= 1
+            matches = process.extract(" ".join(words[:n]), self._street_name_list, scorer=fuzz.ratio,
+                                      limit=self.street_limit, score_cutoff=self.street_cutoff)
+        if n < len(words) and not street_type:
+            street_type = words[n]
+        codes = []
+        for _, _, name in matches:
+            named = np.arange(self._name_streets[name], self._name_streets[name + 1])
+            # a misread or missing street type keeps every type of the name
+            typed = named[self._street_types[named] == street_type]
+            codes.append(typed if len(typed) else named)
+        return np.concatenate(codes) if codes else np.empty(0, dtype=np.int64)
+
+    def resolve(self, ocr_address: str, canonical_address: str = None) -> ResolvedAddress:
+        """
+        Gives the registry records at an OCR address.
+
+        Records at the exact house number are preferred; only when no street
+        has one, records whose number is within `max_number_distance` edits
+        are given.
+
+        Args:
+            ocr_address (str): The OCR result for the address.
+            canonical_address (str): The canonical form of `ocr_address`, when
+                the batch of the row was canonicalized already.
+
+        Returns:
+            ResolvedAddress: The records, none when the street or the house
+                number did not resolve.
+        """
+        if canonical_address is None:
+            canonical_address = canonicalize_address(ocr_address)
+        parts = parse_address(_read_house_number(canonical_address))
+        number = parts["number"].lstrip("0")
+        codes = self._street_codes_of(parts["street"], parts["type"]) if number else np.empty(0, dtype=np.int64)
+        labels = list(self._street_labels[codes])
+
+        digits = int("".join(filter(str.isdigit, number)) or 0)
+        if digits < self._number_span:
+            keys = codes * self._number_span + digits
+            exact = _ranges(np.searchsorted(self._keys, keys), np.searchsorted(self._keys, keys + 1))
+            if len(exact):
+                return ResolvedAddress(self._positions[exact], labels, True)
+        if not self.max_number_distance or not len(codes):
+            return ResolvedAddress(np.empty(0, dtype=np.int64), labels, False)
+
+        # the numbers of the resolved streets within a few edits
+        on_streets = _ranges(self._street_starts[codes], self._street_starts[codes + 1])
+        distances = process.cdist([number], self._number_strings[on_streets], scorer=OSA.distance,
+                                  score_cutoff=self.max_number_distance, dtype=np.int32)[0]
+        return ResolvedAddress(self._positions[on_streets[distances <= self.max_number_distance]], labels, False)
+
+    def score_candidates(self, ocr_name: str, ocr_address: str, canonical_address: str = None,
+                         limit_: int = 10) -> RowCandidates:
+        """
+        Scores the residents of the resolved address as
+        `fuzzy_match_helper.score_candidates` scores the registry.
+
+        Args:
+            ocr_name (str): The OCR result for the name.
+            ocr_address (str): The OCR result for the address.
+            canonical_address (str): The canonical form of `ocr_address`.
+            limit_ (int): The number of candidates to keep.
+
+        Returns:
+            RowCandidates: The residents with the best name scores, none
+                when the address did not resolve.
+        """
+        return self._score(ocr_name, ocr_address, canonical_address, limit_)[1]
+
+    def _score(self, ocr_name: str, ocr_address: str, canonical_address: str = None,
+               limit_: int = 10) -> Tuple[np.ndarray, RowCandidates]:
+        """Gives the candidates with their positions in the registry."""
+        if canonical_address is None:
+            canonical_address = canonicalize_address(ocr_address)
+        positions = self.resolve(ocr_address, canonical_address).positions
+        name_scores = np.array([fuzz.ratio(ocr_name, name) for name in self._names[positions]], dtype=np.float32)
+        keep = np.argsort(-name_scores, kind="stable")[:limit_]
+        positions = positions[keep]
+        return positions, RowCandidates(
+            registry_ids=self._registry_ids[positions],
+            names=list(self._names[positions]),
+            addresses=list(self._addresses[positions]),
+            name_scores=name_scores[keep],
+            address_scores=np.array([fuzz.ratio(canonical_address, address)
+                                     for address in self._canonical_addresses[positions]], dtype=np.float32),
+        )
+
+    def get_matched_name_address(self, ocr_name: str, ocr_address: str,
+                                 canonical_address: str = None) -> List[Tuple[str, str, float, int]]:
+        """
+        Address-first matching: scores the name against the residents of the
+        resolved address only, as `fuzzy_match_helper.get_matched_name_address`
+        scores it against the registry.
+
+        Args:
+            ocr_name (str): The OCR result for the name.
+            ocr_address (str): The OCR result for the address.
+            canonical_address (str): The canonical form of `ocr_address`.
+
+        Returns:
+            List[Tuple[str, str, float, int]]: The residents with their
+                harmonic match scores and positions, best first. Empty when
+                the address did not resolve, for the caller to fall back to
+                a full registry search.
+        """
+        positions, candidates = self._score(ocr_name, ocr_address, canonical_address, limit_=len(self._names))
+        scores = combine_scores(candidates.name_scores, candidates.address_scores, "harmonic")
+        results = list(zip(candidates.names, candidates.addresses, scores, positions))
+        return sorted(results, key=lambda x: x[2], reverse=True)
@@ -0,0 +1,490 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Dict, List, Optional, Tuple, Union
+import argparse
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+
+from fuzzy_match_helper import (
+    MATCHED_COLUMNS,
+    create_select_voter_records,
+    create_ocr_matched_df,
+    matched_df_from_candidates,
+)
+from match_cascade import MatchCascade
+from match_service import MatchServiceClient
+from ocr_helper import ocr_data_to_df
+from ocr_queue import FileJob, OcrJobQueue
+from settings import load_config, load_settings
+from sharding import ShardCoordinator, shard_authkey
+from store import OcrCheckpoint, ResultsStore, file_digest
+from utils import get_pipeline_logger, trace_run, tracer
+
+logger = get_pipeline_logger("batch_runner")
+
+COMBINED_RESULTS_FILENAME = "all_results.csv"
+
+
+def _format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+
+class ProgressReporter:
+    """Prints page throughput and an ETA as files are read"""
+
+    def __init__(self, filenames: List[str], interval: float = 1.0):
+        self.filenames = filenames
+        self.interval = interval
+        self.started = time.perf_counter()
+        self._last_print = 0.0
+        self._jobs: Dict[str, FileJob] = {}
+        self.files_matched = 0
+        self.files_failed = 0
+
+    def update(self, job: FileJob) -> None:
+        self._jobs[job.filename] = job
+        now = time.perf_counter()
+        if job.status in ("running", "queued") and now - self._last_print < self.interval:
+            return
+        self._last_print = now
+        print(self.status_line(now), flush=True)
+
+    def status_line(self, now: float) -> str:
+        pages_done = sum(job.pages_done for job in self._jobs.values())
+        opened = [job for job in self._jobs.values() if job.total_pages]
+        pages_known = sum(job.total_pages for job in opened)
+
+        # files not opened yet are assumed as long as the average opened file
+        unopened = len(self.filenames) - len(opened)
+        pages_expected = pages_known + (
+            unopened * pages_known / len(opened) if opened else 0
+        )
+
+        elapsed = now - self.started
+        rate = pages_done / elapsed if elapsed > 0 else 0.0
+        eta = (pages_expected - pages_done) / rate if rate > 0 else float("nan")
+        files_read = sum(job.status == "done" for job in self._jobs.values())
+
+        return (
+            f"[ocr] {pages_done}/{pages_expected:.0f} pages | {rate:.2f} pages/s | "
+            f"ETA {_format_duration(eta) if eta == eta else '?'} | "
+            f"files read {files_read}/{len(self.filenames)}, "
+            f"matched {self.files_matched}, failed {self.files_failed}"
+        )
+
+
+class ResultsWriter:
+    """Writes the results of each file as soon as it is matched"""
+
+    def __init__(self, output_dir: str, append: bool = False):
+        """
+        Args:
+            output_dir (str): The directory results are written to.
+            append (bool): Keep the combined results of an earlier run, whose
+                files are not matched again. Otherwise they are started over,
+                so a rerun does not repeat every row.
+        """
+        self.output_dir = output_dir
+        self.combined_path = os.path.join(output_dir, COMBINED_RESULTS_FILENAME)
+        self._lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+        if not append and os.path.exists(self.combined_path):
+            os.remove(self.combined_path)
+
+    def file_results_path(self, filename: str) -> str:
+        return os.path.join(
+            self.output_dir, os.path.splitext(filename)[0] + "_results.csv"
+        )
+
+    def write(self, filename: str, results_df: pd.DataFrame) -> None:
+        # written under a temporary name so a partial file is never mistaken for results
+        path = self.file_results_path(filename)
+        results_df.to_csv(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+
+        with self._lock:
+            write_header = not os.path.exists(self.combined_path)
+            results_df.to_csv(self.combined_path, mode="a", header=write_header, index=False)
+
+
+def _match_rows(
+    ocr_df: pd.DataFrame,
+    registry: Union[pd.DataFrame, ShardCoordinator, MatchServiceClient, MatchCascade],
+    threshold: float,
+    max_workers: int,
+) -> Tuple[pd.DataFrame, Optional[str]]:
+    """Matches OCR rows, giving the digest of a remote registry matched against, `None` for local ones."""
+    if isinstance(registry, MatchCascade):
+        return registry.create_ocr_matched_df(ocr_df, threshold=threshold, max_workers=max_workers)[0], None
+    if isinstance(registry, MatchServiceClient):
+        digest, candidates = registry.score_ocr_df(ocr_df, k=10)
+        return matched_df_from_candidates(ocr_df, candidates, threshold, k=10)[0], digest
+    if isinstance(registry, ShardCoordinator):
+        return registry.create_ocr_matched_df(ocr_df, threshold=threshold)[0], registry.registry_digest
+    return create_ocr_matched_df(ocr_df, registry, threshold=threshold, max_workers=max_workers), None
+
+
+def _check_registry(digest: Optional[str], registry_key: str) -> None:
+    # the match service can be given another registry while the batch runs
+    if digest is not None and digest != registry_key:
+        raise RuntimeError(f"The rows were matched against another registry ({digest[:12]})")
+
+
+def match_with_checkpoint(
+    ocr_df: pd.DataFrame,
+    select_voter_records: Union[pd.DataFrame, ShardCoordinator, MatchServiceClient, MatchCascade],
+    checkpoint: OcrCheckpoint,
+    run_key: str,
+    registry_key: str,
+    threshold: float = None,
+    max_workers: int = None,
+) -> pd.DataFrame:
+    """
+    Matches the OCR rows of a file, keeping the pages matched by an earlier run.
+
+    Args:
+        ocr_df (pd.DataFrame): The OCR rows of a single file.
+        select_voter_records (Union[pd.DataFrame, ShardCoordinator, MatchServiceClient, MatchCascade]):
+            The voter records, the coordinator of their shard workers, a
+            client of the match service serving them, or a cascade over them.
+        checkpoint (OcrCheckpoint): Stores the matched rows of every page.
+        run_key (str): The run key of the file.
+        registry_key (str): The digest of the voter records file.
+        threshold (float): The threshold for matching. Defaults to BASE_THRESHOLD
+            of config.json.
+        max_workers (int): The number of threads matching rows.
+
+    Returns:
+        pd.DataFrame: The matched rows in page and row order.
+
+    Raises:
+        RuntimeError: If a remote registry other than `registry_key` was matched against.
+    """
+    if threshold is None:
+        threshold = load_config()["BASE_THRESHOLD"]
+    match_columns = ["Matched Name", "Matched Address", "Match Score", "Matched Registry ID"]
+    row_key = ["Page Number", "Row Number", "OCR Name", "OCR Address"]
+
+    # rows read the same way as when they were matched keep their match
+    kept_df = checkpoint.load_matches(run_key, registry_key)
+    if len(kept_df):
+        ocr_df = ocr_df.merge(
+            kept_df[row_key + match_columns].drop_duplicates(row_key), on=row_key, how="left"
+        )
+    else:
+        ocr_df = ocr_df.assign(**{column: None for column in match_columns})
+
+    is_kept = ocr_df["Match Score"].notna()
+    logger.info(f"Keeping {is_kept.sum()} of {len(ocr_df)} rows matched by an earlier run")
+
+    parts = [ocr_df[is_kept]]
+    if not is_kept.all():
+        new_df, digest = _match_rows(
+            ocr_df.loc[~is_kept].drop(columns=match_columns),
+            select_voter_records,
+            threshold=threshold,
+            max_workers=max_workers,
+        )
+        _check_registry(digest, registry_key)
+        checkpoint.save_matches(run_key, registry_key, new_df)
+        parts.append(new_df)
+
+    matched_df = pd.concat(parts, ignore_index=True)
+    matched_df["Match Score"] = matched_df["Match Score"].astype(float)
+    matched_df["Valid"] = matched_df["Match Score"] >= threshold
+    return matched_df.sort_values(["Page Number", "Row Number"], ignore_index=True)[MATCHED_COLUMNS]
+
+
+def run_batch(
+    pdf_dir: str,
+    registry_path: str,
+    output_dir: str,
+    max_concurrent_requests: int = None,
+    max_concurrent_files: int = None,
+    matching_workers: int = None,
+    max_page_num: int = None,
+    threshold: float = None,
+    skip_existing: bool = False,
+    checkpoint_path: str = None,
+    resume: bool = False,
+    results_db: str = None,
+    campaign: str = None,
+    shard_workers: List[str] = None,
+    match_server: str = None,
+    cascade: bool = False,
+) -> int:
+    """
+    Reads and matches every PDF in a directory against a voter registry.
+
+    Files are read through the OCR job queue. Each file is matched and its
+    results written to `output_dir` as soon as its OCR completes, while the
+    other files are still being read.
+
+    Args:
+        pdf_dir (str): The directory of the PDF files.
+        registry_path (str): The voter records CSV file. With `shard_workers`
+            or `match_server` it is only hashed, to check they serve it.
+        output_dir (str): The directory results are written to.
+        max_concurrent_requests (int): Global bound on OCR requests in flight.
+            Defaults to MAX_CONCURRENT_OCR_REQUESTS of config.json.
+        max_concurrent_files (int): The number of files read at once.
+            Defaults to MAX_CONCURRENT_FILES of config.json.
+        matching_workers (int): The number of threads matching rows.
+        max_page_num (int): The maximum number of pages to process per file.
+        threshold (float): The threshold for matching. Defaults to BASE_THRESHOLD
+            of config.json.
+        skip_existing (bool): Skip files whose results are already in `output_dir`.
+        checkpoint_path (str): SQLite file storing every page as it completes.
+        resume (bool): Only read the pages missing or failed in the checkpoint
+            and keep the rows it has already matched.
+        results_db (str): SQLite results database the rows of every file are
+            appended to as it is matched, as one run.
+        campaign (str): The petition campaign the run belongs to.
+        shard_workers (List[str]): The "host:port" addresses of shard workers
+            to match against instead of loading the registry on this host.
+        match_server (str): The URL of a match service to match against
+            instead of loading the registry, see `main.py match-server`.
+        cascade (bool): Match through a `MatchCascade`, scanning the registry
+            only for rows their address does not settle and rescoring only
+            the rows close to the threshold.
+
+    Returns:
+        int: The exit code, 0 if every file succeeded and 1 otherwise.
+    """
+    if threshold is None:
+        threshold = load_config()["BASE_THRESHOLD"]
+    if cascade and (shard_workers or match_server):
+        raise ValueError("The cascade matches against a registry loaded on this host")
+    tracing = load_settings().tracing
+    # the trace, profile and snapshot of a batch are written next to its results
+    with trace_run("batch", output_dir, profile=tracing.profile, snapshot=tracing.snapshot) as traced, \
+            ExitStack() as resources:
+        writer = ResultsWriter(output_dir, append=skip_existing)
+
+        filenames = sorted(f for f in os.listdir(pdf_dir) if f.lower().endswith(".pdf"))
+        if skip_existing:
+            filenames = [f for f in filenames if not os.path.exists(writer.file_results_path(f))]
+        if not filenames:
+            print(f"No PDF files to process in {pdf_dir}")
+            return 0
+
+        # remote registries are checked against it at the start and for every file
+        registry_key = file_digest(registry_path)
+        if shard_workers:
+            print(f"Matching against {len(shard_workers)} shard workers")
+            select_voter_records = ShardCoordinator(shard_workers, shard_authkey())
+            resources.callback(select_voter_records.close)
+            if select_voter_records.registry_digest != registry_key:
+                raise ValueError(f"The shard workers do not serve {registry_path}")
+        elif match_server:
+            print(f"Matching against the match service at {match_server}")
+            select_voter_records = MatchServiceClient(match_server)
+            resources.callback(select_voter_records.close)
+            if select_voter_records.registry_digest != registry_key:
+                raise ValueError(f"The match service does not serve {registry_path}")
+        else:
+            print(f"Loading voter records from {registry_path}")
+            select_voter_records = create_select_voter_records(pd.read_csv(registry_path, dtype=str))
+            if cascade:
+                select_voter_records = MatchCascade(select_voter_records)
+
+        checkpoint = None
+        if checkpoint_path or resume:
+            checkpoint = OcrCheckpoint(
+                checkpoint_path or os.path.join(output_dir, "checkpoint.sqlite"), resume=resume
+            )
+            resources.callback(checkpoint.close)
+
+        results_store = run_id = None
+        if results_db:
+            results_store = ResultsStore(results_db)
+            resources.callback(results_store.close)
+            run_id = results_store.start_run(campaign=campaign, source="batch", threshold=threshold)
+
+            def fail_unfinished_run():
+                # a run stopped by an error is not left running
+                if results_store.run_status(run_id) == "running":
+                    results_store.finish_run(run_id, "failed")
+
+            resources.callback(fail_unfinished_run)
+            print(f"Appending results to {results_db} as run {run_id}")
+
+        reporter = ProgressReporter(filenames)
+        failures: Dict[str, str] = {}
+        matching: Dict[str, Future] = {}
+
+        def match_and_write(job: FileJob) -> None:
+            ocr_df = ocr_data_to_df(job.ocr_data)
+            if checkpoint is None or not len(ocr_df):
+                results_df, digest = _match_rows(ocr_df, select_voter_records, threshold, matching_workers)
+                _check_registry(digest, registry_key)
+            else:
+                results_df = match_with_checkpoint(
+                    ocr_df,
+                    select_voter_records,
+                    checkpoint,
+                    checkpoint.run_key(os.path.join(pdf_dir, job.filename)),
+                    registry_key,
+                    threshold=threshold,
+                    max_workers=matching_workers,
+                )
+            writer.write(job.filename, results_df)
+            if results_store is not None:
+                results_store.append(run_id, results_df)
+            reporter.files_matched += 1
+
+        # files are matched one at a time, each over `matching_workers` threads
+        with ThreadPoolExecutor(max_workers=1) as match_executor:
+
+            def on_progress(job: FileJob) -> None:
+                reporter.update(job)
+                if job.status == "done":
+                    # matched within the trace of the batch
+                    matching[job.filename] = match_executor.submit(
+                        contextvars.copy_context().run, match_and_write, job
+                    )
+                elif job.status == "failed":
+                    reporter.files_failed += 1
+                    failures[job.filename] = f"OCR failed: {job.error}"
+
+            queue = OcrJobQueue(
+                pdf_dir,
+                max_concurrent_requests=max_concurrent_requests,
+                max_concurrent_files=max_concurrent_files,
+                max_page_num=max_page_num,
+                on_progress=on_progress,
+                checkpoint=checkpoint,
+            )
+            for filename in filenames:
+                queue.add(filename)
+            queue.run()
+
+            for filename, future in matching.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Matching {filename} failed: {str(e)}")
+                    reporter.files_failed += 1
+                    failures[filename] = f"Matching failed: {str(e)}"
+
+        print(reporter.status_line(time.perf_counter()))
+        if results_store is not None:
+            results_store.finish_run(run_id, "failed" if failures else "done")
+        queue.metrics.export(output_dir)
+
+        summary = {
+            "files": len(filenames),
+            "succeeded": len(filenames) - len(failures),
+            "failed": failures,
+            "elapsed_s": time.perf_counter() - reporter.started,
+            "ocr": queue.metrics.summary(),
+            "results_run_id": run_id,
+            "cascade": select_voter_records.stats.summary() if cascade else None,
+            "trace": traced.summary() if tracer.enabled else None,
+        }
+        with open(os.path.join(output_dir, "run_summary.json"), "w") as f:
+            json.dump(summary, f, indent=2, default=float)
+
+        print(
+            f"Done in {_format_duration(summary['elapsed_s'])}: "
+            f"{summary['succeeded']} of {len(filenames)} files succeeded, results in {output_dir}"
+        )
+        if cascade:
+            print(f"Cascade: {select_voter_records.stats}")
+        for filename, error in failures.items():
+            print(f"  FAILED {filename}: {error}")
+
+        return 1 if failures else 0
+
+
+def cli(argv: List[str] = None) -> int:
+    """Command line entry point of the batch runner."""
+    config = load_config()
+    parser = argparse.ArgumentParser(
+        prog="main.py batch",
+        description="Validate every petition PDF in a directory against a voter registry.",
+    )
+    parser.add_argument("pdf_dir", help="directory of petition PDF files")
+    parser.add_argument("registry", help="voter records CSV file")
+    parser.add_argument("-o", "--output-dir", default="results", help="directory for the results")
+    parser.add_argument(
+        "--ocr-concurrency",
+        type=int,
+        default=config["MAX_CONCURRENT_OCR_REQUESTS"],
+        help="OCR requests in flight across all files",
+    )
+    parser.add_argument(
+        "--files-concurrency",
+        type=int,
+        default=config["MAX_CONCURRENT_FILES"],
+        help="files read at once",
+    )
+    parser.add_argument("--matching-workers", type=int, default=None, help="threads matching rows")
+    parser.add_argument("--max-pages", type=int, default=None, help="pages read per file")
+    parser.add_argument("--threshold", type=float, default=config["BASE_THRESHOLD"])
+    parser.add_argument(
+        "--skip-existing", action="store_true", help="skip files that already have results"
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default=None,
+        help="SQLite file storing every page as it completes (default: OUTPUT_DIR/checkpoint.sqlite with --resume)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="only read pages missing or failed in the checkpoint, keep already matched rows",
+    )
+    parser.add_argument(
+        "--results-db",
+        default=None,
+        help=f"SQLite database the results are appended to, e.g. {config['RESULTS_DB']}",
+    )
+    parser.add_argument("--campaign", default=None, help="campaign name stored with the results")
+    parser.add_argument(
+        "--shard-workers",
+        default=None,
+        help="comma separated host:port of shard workers to match against, see main.py shard-worker",
+    )
+    parser.add_argument(
+        "--match-server",
+        default=None,
+        help="URL of a match service to match against, e.g. http://127.0.0.1:8765, see main.py match-server",
+    )
+    parser.add_argument(
+        "--cascade",
+        action="store_true",
+        help="accept rows by their address first and rescore only the rows near the threshold",
+    )
+    args = parser.parse_args(argv)
+
+    return run_batch(
+        args.pdf_dir,
+        args.registry,
+        args.output_dir,
+        max_concurrent_requests=args.ocr_concurrency,
+        max_concurrent_files=args.files_concurrency,
+        matching_workers=args.matching_workers,
+        max_page_num=args.max_pages,
+        threshold=args.threshold,
+        skip_existing=args.skip_existing,
+        checkpoint_path=args.checkpoint,
+        resume=args.resume,
+        results_db=args.results_db,
+        campaign=args.campaign,
+        shard_workers=args.shard_workers.split(",") if args.shard_workers else None,
+        match_server=args.match_server,
+        cascade=args.cascade,
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -0,0 +1,5 @@
+from .page_hash import IndexedPage
+from .page_hash import PageHashIndex
+from .page_hash import perceptual_hash
+
+__all__ = ["IndexedPage", "PageHashIndex", "perceptual_hash"]
@@ -0,0 +1,147 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import numpy as np
+from PIL import Image
+
+
+###
+## PERCEPTUAL HASHING
+###
+
+# size of the downscaled image the DCT is taken over
+_HASH_IMAGE_SIZE = 64
+# size of the low frequency block kept for the hash (16 x 16 = 256 bits).
+# Petition pages share a printed template, so the usual 64 bit hash is too
+# coarse to tell two different sheets apart.
+_HASH_BLOCK_SIZE = 16
+HASH_BITS = _HASH_BLOCK_SIZE * _HASH_BLOCK_SIZE
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    """Orthonormal DCT-II basis so that ``M @ X @ M.T`` is the 2D DCT of ``X``."""
+    n = np.arange(size)
+    matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size))
+    matrix[0, :] *= 1 / np.sqrt(2)
+    return matrix * np.sqrt(2 / size)
+
+
+_DCT = _dct_matrix(_HASH_IMAGE_SIZE)
+
+
+def perceptual_hash(gray_pixels: np.ndarray) -> int:
+    """
+    Computes a 256 bit DCT perceptual hash (pHash) of a grayscale image.
+
+    Rescans of the same sheet differ in noise, compression and slight
+    shifts, but keep the same low frequency structure, so their hashes
+    differ by only a few bits.
+
+    Args:
+        gray_pixels (np.ndarray): 2D uint8 array of grayscale pixel values.
+
+    Returns:
+        int: The 256 bit perceptual hash.
+    """
+    image = Image.fromarray(gray_pixels).resize(
+        (_HASH_IMAGE_SIZE, _HASH_IMAGE_SIZE), Image.Resampling.LANCZOS
+    )
+    pixels = np.asarray(image, dtype=np.float64)
+    dct = _DCT @ pixels @ _DCT.T
+    block = dct[:_HASH_BLOCK_SIZE, :_HASH_BLOCK_SIZE].flatten()
+
+    # the DC term only reflects overall brightness, so it is left out of the median
+    bits = block > np.median(block[1:])
+    return int(sum(1 << i for i, bit in enumerate(bits) if bit))
+
+
+###
+## HASH INDEX
+###
+
+
+@dataclass
+class IndexedPage:
+    """A page registered in the hash index and, once read, its OCR rows"""
+
+    filename: str
+    page_number: int
+    ocr_rows: Optional[List[dict]] = None
+
+    def label(self) -> str:
+        return f"{self.filename}, page {self.page_number}"
+
+
+class PageHashIndex:
+    """
+    Index of page hashes supporting near-duplicate lookups.
+
+    Uses multi-index hashing: the hash is split into
+    ``max_distance + 1`` bands and each band is indexed exactly. By the
+    pigeonhole principle any hash within ``max_distance`` bits of a stored
+    hash shares at least one band with it, so a lookup only verifies the
+    few hashes sharing a band instead of scanning every stored page.
+    """
+
+    def __init__(self, max_distance: int = 16):
+        if max_distance < 0 or max_distance >= HASH_BITS:
+            raise ValueError(
+                f"max_distance must be between 0 and {HASH_BITS - 1}, got {max_distance}"
+            )
+
+        self.max_distance = max_distance
+
+        # band boundaries, spreading the remainder bits over the first bands
+        n_bands = max_distance + 1
+        widths = [
+            HASH_BITS // n_bands + (1 if i < HASH_BITS % n_bands else 0)
+            for i in range(n_bands)
+        ]
+        self._bands = []
+        offset = 0
+        for width in widths:
+            self._bands.append((offset, (1 << width) - 1))
+            offset += width
+
+        self._tables: List[Dict[int, List[int]]] = [dict() for _ in self._bands]
+        self._hashes: List[int] = []
+        self._pages: List[IndexedPage] = []
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def _band_keys(self, page_hash: int) -> List[int]:
+        return [(page_hash >> offset) & mask for offset, mask in self._bands]
+
+    def find(self, page_hash: int) -> Optional[IndexedPage]:
+        """
+        Finds the earliest indexed page within ``max_distance`` bits of the hash.
+
+        Args:
+            page_hash (int): The perceptual hash to look up.
+
+        Returns:
+            Optional[IndexedPage]: The first matching page, or None if there is none.
+        """
+        best_id = None
+        for table, key in zip(self._tables, self._band_keys(page_hash)):
+            for page_id in table.get(key, ()):
+                if best_id is not None and page_id >= best_id:
+                    continue
+                if (self._hashes[page_id] ^ page_hash).bit_count() <= self.max_distance:
+                    best_id = page_id
+
+        return None if best_id is None else self._pages[best_id]
+
+    def add(self, page_hash: int, page: IndexedPage) -> None:
+        """
+        Adds a page to the index.
+
+        Args:
+            page_hash (int): The perceptual hash of the page.
+            page (IndexedPage): The page the hash belongs to.
+        """
+        page_id = len(self._hashes)
+        self._hashes.append(page_hash)
+        self._pages.append(page)
+        for table, key in zip(self._tables, self._band_keys(page_hash)):
+            table.setdefault(key, []).append(page_id)
@@ -1,48 +1,27 @@
 # needed libraries
 ### structured outputs; replacements
 import os
-import json
-from typing import List, Tuple
-from tqdm.notebook import tqdm
+from typing import AsyncIterator, List, Tuple
+import asyncio
+from tqdm.auto import tqdm
 from rapidfuzz import fuzz
 from dotenv import load_dotenv
 import pandas as pd
 import numpy as np
 from concurrent.futures import ThreadPoolExecutor
-import logging
-from datetime import datetime
+
+from address_canonicalizer import canonicalize_address, canonicalize_addresses
+from match_candidates import MatchCandidates, RowCandidates, combine_scores
+from settings import load_config
+from utils import get_pipeline_logger, tracer
 
 # local environment storage
 repo_name = 'Ballot-Initiative'
 REPODIR = os.getcwd()
 load_dotenv(os.path.join(REPODIR, '.env'), override=True)
 
-# load config
-with open('config.json', 'r') as f:
-    config = json.load(f)
-
 # Set up logging after imports
-log_directory = "logs"
-if not os.path.exists(log_directory):
-    os.makedirs(log_directory)
-
-# Create a logger
-logger = logging.getLogger('fuzzy_matching')
-logger.setLevel(logging.INFO)
-
-# Create handlers
-log_filename = f"fuzzy_matching_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-file_handler = logging.FileHandler(os.path.join(log_directory, log_filename))
-console_handler = logging.StreamHandler()
-
-# Create formatters and add it to handlers
-log_format = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(log_format)
-console_handler.setFormatter(log_format)
-
-# Add handlers to the logger
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
+logger = get_pipeline_logger('fuzzy_matching')
 
 ###
 ## MATCHING FUNCTIONS
@@ -57,20 +36,30 @@ def create_select_voter_records(voter_records : pd.DataFrame) -> pd.DataFrame:
             first name, last name, and address components.
             
     Returns:
-        pd.DataFrame: DataFrame with 'Full Name' and 'Full Address' columns
+        pd.DataFrame: DataFrame with 'Full Name', 'Full Address' and
+            'Canonical Address' columns. Addresses are scored on their
+            canonical form, see `address_canonicalizer`.
     """
-    # Create full name by combining first and last names
-    name_components = ["First_Name", "Last_Name"]
-    voter_records[name_components] = voter_records[name_components].fillna('')
-    voter_records["Full Name"] = voter_records[name_components].astype(str).agg(" ".join, axis=1)
+    with tracer.span("registry_build"):
+        # Create full name by combining first and last names
+        name_components = ["First_Name", "Last_Name"]
+        voter_records[name_components] = voter_records[name_components].fillna('')
+        voter_records["Full Name"] = _join_columns(voter_records, name_components)
 
-    # Create full address by combining address components
-    address_components = ["Street_Number", "Street_Name", "Street_Type", "Street_Dir_Suffix"]
-    voter_records[address_components] = voter_records[address_components].fillna('')
-    voter_records["Full Address"] = voter_records[address_components].astype(str).agg(" ".join, axis=1)
+        # Create full address by combining address components
+        address_components = ["Street_Number", "Street_Name", "Street_Type", "Street_Dir_Suffix"]
+        voter_records[address_components] = voter_records[address_components].fillna('')
+        voter_records["Full Address"] = _join_columns(voter_records, address_components)
+        voter_records["Canonical Address"] = canonicalize_addresses(voter_records["Full Address"])
 
     # Return only the columns we need
-    return voter_records[["Full Name", "Full Address"]]
+    return voter_records[["Full Name", "Full Address", "Canonical Address"]]
+
+
+def _join_columns(df : pd.DataFrame, columns : List[str]) -> pd.Series:
+    # joins whole columns at once, a row-wise " ".join takes minutes on large registries
+    parts = df[columns].astype(str)
+    return parts[columns[0]].str.cat([parts[column] for column in columns[1:]], sep=" ")
 
 
 def score_fuzzy_match_slim(ocr_result : str, 
@@ -89,7 +78,8 @@ def score_fuzzy_match_slim(ocr_result : str,
     Returns:
         List[Tuple[str, int, int]]: The list of top matches with their scores and indices.
     """
-    logger.debug(f"Starting fuzzy matching for: {ocr_result[:30]}...")
+    # lazy arguments, the message is only built when debug logging is on
+    logger.debug("Starting fuzzy matching for: %.30s...", ocr_result)
     
     # Convert to numpy array for faster operations
     comparison_array = np.array(comparison_list)
@@ -100,17 +90,76 @@ def score_fuzzy_match_slim(ocr_result : str,
     # Calculate all scores at once
     scores = vectorized_scorer(comparison_array)
     
-    # Get top N indices
-    top_indices = np.argpartition(scores, -limit_)[-limit_:]
-    top_indices = top_indices[np.argsort(scores[top_indices])[::-1]]
+    # Get top N indices, ties broken by position so a registry split into
+    # shards gives the same matches
+    limit_ = min(limit_, len(scores))
+    kth_score = np.partition(scores, -limit_)[-limit_]
+    above = np.flatnonzero(scores > kth_score)
+    tied = np.flatnonzero(scores == kth_score)[:limit_ - len(above)]
+    top_indices = np.concatenate([above, tied])
+    top_indices = top_indices[np.lexsort((top_indices, -scores[top_indices]))]
     
     results = [(comparison_array[i], scores[i], i) for i in top_indices]
-    logger.debug(f"Top match score: {results[0][1]}, Match: {results[0][0][:30]}...")
+    logger.debug("Top match score: %s, Match: %.30s...", results[0][1], results[0][0])
     return results
 
+def score_candidates(ocr_name : str,
+                     ocr_address : str,
+                     select_voter_records : pd.DataFrame,
+                     limit_ : int = 10,
+                     canonical_address : str = None) -> RowCandidates:
+    """
+    Scores the registry records closest to an OCR row by name.
+
+    The records with the best name scores are kept and their addresses are
+    scored against the OCR address, so each candidate carries the name and
+    address score of the same record. Addresses are compared in canonical
+    form, so "N.W." and "Northwest" score alike.
+
+    Args:
+        ocr_name (str): The OCR result for the name.
+        ocr_address (str): The OCR result for the address.
+        select_voter_records (pd.DataFrame): The DataFrame containing voter records.
+        limit_ (int): The number of candidates to keep.
+        canonical_address (str): The canonical form of `ocr_address`, when
+            the batch of the row was canonicalized already.
+
+    Returns:
+        RowCandidates: The candidates, best name score first, with their registry IDs.
+    """
+    with tracer.span("match"):
+        return _score_candidates(ocr_name, ocr_address, select_voter_records, limit_, canonical_address)[1]
+
+def _score_candidates(ocr_name : str,
+                      ocr_address : str,
+                      select_voter_records : pd.DataFrame,
+                      limit_ : int = 10,
+                      canonical_address : str = None) -> Tuple[np.ndarray, RowCandidates]:
+    """Gives the candidates with their positions in `select_voter_records`."""
+    name_matches = score_fuzzy_match_slim(ocr_name, select_voter_records["Full Name"].values, limit_=limit_)
+    positions = np.array([x[2] for x in name_matches])
+    addresses = select_voter_records["Full Address"].values[positions]
+    if "Canonical Address" in select_voter_records:
+        canonical_addresses = select_voter_records["Canonical Address"].values[positions]
+    else:
+        # records indexed before addresses were canonicalized
+        canonical_addresses = [canonicalize_address(address) for address in addresses]
+    if canonical_address is None:
+        canonical_address = canonicalize_address(ocr_address)
+
+    return positions, RowCandidates(
+        registry_ids=select_voter_records.index.values[positions].astype(np.int64),
+        names=[x[0] for x in name_matches],
+        addresses=list(addresses),
+        name_scores=np.array([x[1] for x in name_matches], dtype=np.float32),
+        address_scores=np.array([fuzz.ratio(canonical_address, address) for address in canonical_addresses],
+                                dtype=np.float32),
+    )
+
 def get_matched_name_address(ocr_name : str, 
                               ocr_address : str, 
-                              select_voter_records : pd.DataFrame) -> List[Tuple[str, str, float, int]]:
+                              select_voter_records : pd.DataFrame,
+                              canonical_address : str = None) -> List[Tuple[str, str, float, int]]:
     """
     Optimized name and address matching
 
@@ -118,79 +167,109 @@ def get_matched_name_address(ocr_name : str,
         ocr_name (str): The OCR result for the name.
         ocr_address (str): The OCR result for the address.
         select_voter_records (pd.DataFrame): The DataFrame containing voter records.
+        canonical_address (str): The canonical form of `ocr_address`, when
+            the batch of the row was canonicalized already.
         
     Returns:
         List[Tuple[str, str, float, int]]: The list of top matches with their scores and indices.
     """
-    logger.debug(f"Matching - Name: {ocr_name[:30]}... Address: {ocr_address[:30]}...")
-    
-    # Get name matches
-    name_matches = score_fuzzy_match_slim(ocr_name, select_voter_records["Full Name"].values)
-    logger.debug(f"Best name match score: {name_matches[0][1]}")
-    
-    # Get address matches
-    matched_indices = [x[2] for x in name_matches]
-    relevant_addresses = select_voter_records["Full Address"].values[matched_indices]
-    address_matches = score_fuzzy_match_slim(ocr_address, relevant_addresses)
-    logger.debug(f"Best address match score: {address_matches[0][1]}")
-    
+    with tracer.span("match"):
+        positions, candidates = _score_candidates(ocr_name, ocr_address, select_voter_records,
+                                                  canonical_address=canonical_address)
+
     # Calculate harmonic means
-    name_scores = np.array([x[1] for x in name_matches])
-    addr_scores = np.array([x[1] for x in address_matches])
-    harmonic_means = 2 * name_scores * addr_scores / (name_scores + addr_scores)
+    harmonic_means = combine_scores(candidates.name_scores, candidates.address_scores, "harmonic")
     
     # Create and sort results
-    results = list(zip(
-        [x[0] for x in name_matches],
-        [x[0] for x in address_matches],
-        harmonic_means,
-        matched_indices
-    ))
-    results = sorted(results, key=lambda x: x[2], reverse=True)
-    
-    logger.debug(f"Best combined match score: {results[0][2]}")
-    return results
+    results = list(zip(candidates.names, candidates.addresses, harmonic_means, positions))
+    return sorted(results, key=lambda x: x[2], reverse=True)
+
+# columns of the matched results, in display order
+MATCHED_COLUMNS = [
+    "OCR Name", "OCR Address", "Matched Name", "Matched Address",
+    "Date", "OCR Ward", "Match Score", "Valid", "Page Number", "Row Number", "Filename",
+    "Duplicate Of", "Matched Registry ID"
+]
 
 def create_ocr_matched_df(ocr_df : pd.DataFrame, 
                            select_voter_records : pd.DataFrame, 
-                           threshold : float = config['BASE_THRESHOLD'], 
-                           st_bar = None) -> pd.DataFrame:
+                           threshold : float = None, 
+                           st_bar = None,
+                           max_workers : int = None) -> pd.DataFrame:
     """
     Creates a DataFrame with matched name and address.
 
     Args:
         ocr_df (pd.DataFrame): The DataFrame containing OCR results.
         select_voter_records (pd.DataFrame): The DataFrame containing voter records.
-        threshold (float): The threshold for matching.
+        threshold (float): The threshold for matching. Defaults to BASE_THRESHOLD of config.json.
         st_bar (st.progress): The progress bar to display.
+        max_workers (int): The number of threads matching rows. Defaults to
+            the ThreadPoolExecutor default.
         
     Returns:
         pd.DataFrame: The DataFrame with matched name and address.
     """
+    return create_ocr_matched_df_with_candidates(
+        ocr_df, select_voter_records, threshold=threshold, st_bar=st_bar, max_workers=max_workers
+    )[0]
+
+
+def create_ocr_matched_df_with_candidates(ocr_df : pd.DataFrame,
+                                          select_voter_records : pd.DataFrame,
+                                          threshold : float = None,
+                                          st_bar = None,
+                                          max_workers : int = None,
+                                          k : int = 10) -> Tuple[pd.DataFrame, MatchCandidates]:
+    """
+    Creates a DataFrame with matched name and address, and keeps the top-k
+    candidates of every row so validity can be re-evaluated without rescoring.
+
+    Args:
+        ocr_df (pd.DataFrame): The DataFrame containing OCR results.
+        select_voter_records (pd.DataFrame): The DataFrame containing voter records.
+        threshold (float): The threshold for matching. Defaults to BASE_THRESHOLD of config.json.
+        st_bar (st.progress): The progress bar to display.
+        max_workers (int): The number of threads matching rows. Defaults to
+            the ThreadPoolExecutor default.
+        k (int): The number of candidates kept per row.
+
+    Returns:
+        Tuple[pd.DataFrame, MatchCandidates]: The DataFrame with matched name and
+            address, and the candidates of its rows.
+    """
+    if threshold is None:
+        threshold = load_config()['BASE_THRESHOLD']
     logger.info(f"Starting matching process for {len(ocr_df)} records with threshold {threshold}")
     
     # Process in batches for better memory management
     batch_size = 1000
     results = []
+    candidates = []
     
     for batch_start in tqdm(range(0, len(ocr_df), batch_size)):
         batch = ocr_df.iloc[batch_start:batch_start + batch_size]
         logger.info(f"Processing batch {batch_start//batch_size + 1}, rows {batch_start} to {min(batch_start + batch_size, len(ocr_df))}")
+        canonical_addresses = canonicalize_addresses(batch["OCR Address"]).tolist()
         
         # Process batch in parallel
-        with ThreadPoolExecutor() as executor:
-            batch_results = list(executor.map(
-                lambda row: get_matched_name_address(
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            batch_candidates = list(executor.map(
+                lambda row, canonical_address: score_candidates(
                     row["OCR Name"],
                     row["OCR Address"],
-                    select_voter_records
+                    select_voter_records,
+                    limit_=k,
+                    canonical_address=canonical_address
                 ),
-                [row for _, row in batch.iterrows()]
+                [row for _, row in batch.iterrows()],
+                canonical_addresses
             ))
         
         # Extract best matches
-        batch_matches = [(res[0][0], res[0][1], res[0][2]) for res in batch_results]
+        batch_matches = [_best_candidate(row_candidates) for row_candidates in batch_candidates]
         results.extend(batch_matches)
+        candidates.extend(batch_candidates)
         
         # Log batch statistics
         batch_scores = [match[2] for match in batch_matches]
@@ -202,20 +281,169 @@ def create_ocr_matched_df(ocr_df : pd.DataFrame,
         if st_bar:
             st_bar.progress(batch_start / len(ocr_df), text=f"Processing batch {batch_start} out of {len(ocr_df)//batch_size+1} batches")
     
+    return _build_matched_df(ocr_df, results, threshold), MatchCandidates.from_rows(candidates, k)
+
+
+def _best_candidate(candidates : RowCandidates) -> Tuple[str, str, float, int]:
+    """Gives the candidate with the best harmonic mean and its registry ID."""
+    scores = combine_scores(candidates.name_scores, candidates.address_scores, "harmonic")
+    best = int(np.argmax(scores))
+    return (candidates.names[best], candidates.addresses[best], float(scores[best]),
+            int(candidates.registry_ids[best]))
+
+
+def _build_matched_df(ocr_df : pd.DataFrame,
+                      results : List[Tuple[str, str, float, int]],
+                      threshold : float) -> pd.DataFrame:
+    """
+    Joins the best match of every OCR row to the OCR results.
+
+    Args:
+        ocr_df (pd.DataFrame): The DataFrame containing OCR results.
+        results (List[Tuple[str, str, float, int]]): The best match of every row and
+            the registry ID of the matched record, in row order.
+        threshold (float): The threshold for matching.
+
+    Returns:
+        pd.DataFrame: The DataFrame with matched name and address.
+    """
     logger.info("Creating final DataFrame")
-    match_df = pd.DataFrame(results, columns=["Matched Name", "Matched Address", "Match Score"])
-    result_df = pd.concat([ocr_df, match_df], axis=1)
+    match_df = pd.DataFrame(results, columns=["Matched Name", "Matched Address", "Match Score", "Matched Registry ID"])
+    result_df = pd.concat([ocr_df.reset_index(drop=True), match_df], axis=1)
     result_df["Valid"] = result_df["Match Score"] >= threshold
-    
-    # Reorder columns
-    column_order = [
-        "OCR Name", "OCR Address", "Matched Name", "Matched Address",
-        "Date", "Match Score", "Valid", "Page Number", "Row Number", "Filename"
-    ]
+    if "OCR Ward" not in result_df:
+        result_df["OCR Ward"] = None
     
     # Log final statistics
     total_valid = result_df["Valid"].sum()
     logger.info(f"Matching complete - Total records: {len(result_df)}, "
                 f"Valid matches: {total_valid} ({total_valid/len(result_df)*100:.1f}%)")
         
-    return result_df[column_order]
\ No newline at end of file
+    return result_df[MATCHED_COLUMNS]
+
+
+async def iter_matches_async(ocr_df : pd.DataFrame,
+                             select_voter_records : pd.DataFrame,
+                             chunk_size : int = 50,
+                             k : int = 10) -> AsyncIterator[Tuple[int, RowCandidates]]:
+    """
+    Matches OCR rows to voter records, yielding the candidates of each row.
+
+    Rows are scored in chunks of `chunk_size` on a worker thread, so a
+    registry scan never blocks the event loop: other tasks of an async
+    service keep running, and the matching can be cancelled between chunks.
+
+    Args:
+        ocr_df (pd.DataFrame): The DataFrame containing OCR results.
+        select_voter_records (pd.DataFrame): The DataFrame containing voter records.
+        chunk_size (int): The number of rows scored per hand-off to the worker thread.
+        k (int): The number of candidates kept per row.
+
+    Yields:
+        Tuple[int, RowCandidates]: The position of the row in `ocr_df` and its
+            top-k candidates.
+    """
+    names = ocr_df["OCR Name"].tolist()
+    addresses = ocr_df["OCR Address"].tolist()
+
+    def score_chunk(chunk: range) -> List[RowCandidates]:
+        canonical_addresses = canonicalize_addresses(ocr_df["OCR Address"].iloc[chunk.start:chunk.stop]).tolist()
+        return [
+            score_candidates(names[position], addresses[position], select_voter_records,
+                             limit_=k, canonical_address=canonical_address)
+            for position, canonical_address in zip(chunk, canonical_addresses)
+        ]
+
+    for chunk_start in range(0, len(names), chunk_size):
+        chunk = range(chunk_start, min(chunk_start + chunk_size, len(names)))
+        for position, row_candidates in zip(chunk, await asyncio.to_thread(score_chunk, chunk)):
+            yield position, row_candidates
+
+
+async def iter_matched_chunks_async(ocr_df : pd.DataFrame,
+                                    select_voter_records : pd.DataFrame,
+                                    threshold : float = None,
+                                    chunk_size : int = 1000,
+                                    st_bar = None,
+                                    k : int = 10) -> AsyncIterator[Tuple[pd.DataFrame, MatchCandidates]]:
+    """
+    Matches OCR rows to voter records, yielding the matched rows in chunks,
+    so they can be written while the rest is still being matched.
+
+    Args:
+        ocr_df (pd.DataFrame): The DataFrame containing OCR results.
+        select_voter_records (pd.DataFrame): The DataFrame containing voter records.
+        threshold (float): The threshold for matching. Defaults to BASE_THRESHOLD of config.json.
+        chunk_size (int): The number of matched rows per chunk.
+        st_bar (st.progress): The progress bar to display.
+        k (int): The number of candidates kept per row.
+
+    Yields:
+        Tuple[pd.DataFrame, MatchCandidates]: The next matched rows, in row order,
+            and their candidates.
+    """
+    if threshold is None:
+        threshold = load_config()['BASE_THRESHOLD']
+    logger.info(f"Starting matching process for {len(ocr_df)} records with threshold {threshold}")
+
+    candidates = []
+    chunk_start = 0
+    async for position, row_candidates in iter_matches_async(ocr_df, select_voter_records, k=k):
+        candidates.append(row_candidates)
+        if st_bar and position % 100 == 0:
+            st_bar.progress(position / len(ocr_df), text=f"Matched {position} of {len(ocr_df)} records")
+        if len(candidates) == chunk_size:
+            yield matched_df_from_candidates(ocr_df.iloc[chunk_start:position + 1], candidates, threshold, k)
+            chunk_start, candidates = position + 1, []
+
+    if candidates:
+        yield matched_df_from_candidates(ocr_df.iloc[chunk_start:], candidates, threshold, k)
+
+
+def matched_df_from_candidates(ocr_df : pd.DataFrame,
+                               candidates : List[RowCandidates],
+                               threshold : float,
+                               k : int) -> Tuple[pd.DataFrame, MatchCandidates]:
+    """
+    Builds the matched rows of OCR rows from their scored candidates, e.g.
+    the candidates merged from registry shards.
+
+    Args:
+        ocr_df (pd.DataFrame): The DataFrame containing OCR results.
+        candidates (List[RowCandidates]): The candidates of every row, in row order.
+        threshold (float): The threshold for matching.
+        k (int): The number of candidates kept per row.
+
+    Returns:
+        Tuple[pd.DataFrame, MatchCandidates]: The matched rows and their candidates.
+    """
+    results = [_best_candidate(row_candidates) for row_candidates in candidates]
+    return _build_matched_df(ocr_df, results, threshold), MatchCandidates.from_rows(candidates, k)
+
+
+async def create_ocr_matched_df_async(ocr_df : pd.DataFrame,
+                                      select_voter_records : pd.DataFrame,
+                                      threshold : float = None,
+                                      st_bar = None) -> pd.DataFrame:
+    """
+    Creates a DataFrame with matched name and address, without blocking the event loop
+    for more than a chunk of rows at a time.
+
+    Args:
+        ocr_df (pd.DataFrame): The DataFrame containing OCR results.
+        select_voter_records (pd.DataFrame): The DataFrame containing voter records.
+        threshold (float): The threshold for matching. Defaults to BASE_THRESHOLD of config.json.
+        st_bar (st.progress): The progress bar to display.
+
+    Returns:
+        pd.DataFrame: The DataFrame with matched name and address.
+    """
+    if threshold is None:
+        threshold = load_config()['BASE_THRESHOLD']
+    chunks = [
+        chunk
+        async for chunk, _ in iter_matched_chunks_async(
+            ocr_df, select_voter_records, threshold=threshold, chunk_size=len(ocr_df), st_bar=st_bar
+        )
+    ]
+    return chunks[0] if chunks else _build_matched_df(ocr_df, [], threshold)
@@ -0,0 +1,284 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+import asyncio
+import os
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+from fuzzy_match_helper import MATCHED_COLUMNS, create_select_voter_records, iter_matched_chunks_async
+from match_candidates import MatchCandidates
+from ocr_queue import FileJob, OcrJobQueue
+from settings import load_config, load_settings
+from store import ResultsStore
+from utils import get_pipeline_logger, trace_run
+
+logger = get_pipeline_logger("job_manager")
+
+
+@dataclass
+class ValidationJob:
+    """State of a petition validation run executing in the background"""
+
+    job_id: str
+    owner: str
+    status: str = "queued"  # one of queued, running, done, failed, cancelled
+    progress: float = 0.0
+    progress_text: str = "Waiting for a free worker..."
+    file_progress: Dict[str, str] = field(default_factory=dict)
+    result: Optional[pd.DataFrame] = None
+    error: Optional[str] = None
+    failed_files: Dict[str, str] = field(default_factory=dict)
+    ocr_metrics: Optional[dict] = None
+    candidates: Optional[MatchCandidates] = None
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    # event loop and task of the running job, used to cancel it
+    _loop: Optional[asyncio.AbstractEventLoop] = field(default=None, repr=False)
+    _task: Optional[asyncio.Task] = field(default=None, repr=False)
+    _cancel_requested: bool = field(default=False, repr=False)
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.time()) - self.submitted_at
+
+
+class JobManager:
+    """
+    Runs validation jobs on worker threads, outside the Streamlit script run.
+
+    Each job runs its own event loop on a worker thread, so cancelling a
+    job cancels its in-flight OCR requests. Jobs are kept by ID after they
+    finish, so a page reload can pick its job back up.
+    """
+
+    def __init__(self, max_workers: int = None, keep_finished_s: float = 6 * 3600):
+        """
+        Args:
+            max_workers (int): The number of jobs run at once, further jobs queue.
+                Defaults to MAX_CONCURRENT_JOBS of config.json.
+            keep_finished_s (float): How long finished jobs are kept for.
+        """
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or load_config()["MAX_CONCURRENT_JOBS"], thread_name_prefix="validation-job"
+        )
+        self._jobs: Dict[str, ValidationJob] = {}
+        self._lock = threading.Lock()
+        self.keep_finished_s = keep_finished_s
+
+    def submit(self, owner: str, run: Callable[[ValidationJob], Awaitable[pd.DataFrame]]) -> ValidationJob:
+        """
+        Queues a job.
+
+        Args:
+            owner (str): The session that submitted the job.
+            run (Callable[[ValidationJob], Awaitable[pd.DataFrame]]): Coroutine
+                function doing the work. It may update the progress fields of
+                the job and returns the results.
+
+        Returns:
+            ValidationJob: The queued job.
+        """
+        self._prune()
+        job = ValidationJob(job_id=uuid.uuid4().hex, owner=owner)
+        with self._lock:
+            self._jobs[job.job_id] = job
+        self._executor.submit(self._execute, job, run)
+        logger.info(f"Queued job {job.job_id} for session {owner}")
+        return job
+
+    def _execute(self, job: ValidationJob, run: Callable[[ValidationJob], Awaitable[pd.DataFrame]]) -> None:
+        if job._cancel_requested:
+            job.status = "cancelled"
+            job.finished_at = time.time()
+            return
+
+        async def main() -> pd.DataFrame:
+            job._loop = asyncio.get_running_loop()
+            job._task = asyncio.current_task()
+            if job._cancel_requested:
+                raise asyncio.CancelledError()
+            return await run(job)
+
+        job.status = "running"
+        try:
+            job.result = asyncio.run(main())
+            job.status = "done"
+            job.progress, job.progress_text = 1.0, "Complete!"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            job.progress_text = "Processing cancelled by user"
+        except Exception as e:
+            logger.exception(f"Job {job.job_id} failed")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            job._loop = job._task = None
+        logger.info(f"Job {job.job_id} finished with status {job.status} after {job.elapsed:.1f}s")
+
+    def get(self, job_id: str) -> Optional[ValidationJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs_for(self, owner: str) -> List[ValidationJob]:
+        with self._lock:
+            return [job for job in self._jobs.values() if job.owner == owner]
+
+    def active_owners(self) -> List[str]:
+        """Lists the sessions with queued or running jobs."""
+        with self._lock:
+            return sorted({job.owner for job in self._jobs.values() if job.is_active})
+
+    def cancel(self, job_id: str) -> None:
+        """Cancels a job, stopping its in-flight OCR requests."""
+        job = self.get(job_id)
+        if job is None or not job.is_active:
+            return
+        job._cancel_requested = True
+        loop, task = job._loop, job._task
+        if loop is not None and task is not None:
+            loop.call_soon_threadsafe(task.cancel)
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.keep_finished_s
+        with self._lock:
+            for job_id in [
+                job_id
+                for job_id, job in self._jobs.items()
+                if job.finished_at is not None and job.finished_at < cutoff
+            ]:
+                del self._jobs[job_id]
+
+
+async def validate_petitions_async(
+    job: ValidationJob,
+    filedir: str,
+    filenames: List[str],
+    voter_records_df: pd.DataFrame,
+    threshold: float = None,
+    results_store: ResultsStore = None,
+    campaign: str = None,
+    select_voter_records: pd.DataFrame = None,
+) -> pd.DataFrame:
+    """
+    Reads the petition files with OCR and matches them to the voter records,
+    reporting progress on `job`.
+
+    Args:
+        job (ValidationJob): The job to report progress on.
+        filedir (str): The directory of the PDF files.
+        filenames (List[str]): The names of the PDF files.
+        voter_records_df (pd.DataFrame): The voter records.
+        threshold (float): The threshold for matching. Defaults to BASE_THRESHOLD
+            of config.json.
+        results_store (ResultsStore): Keeps the results as a run with the ID
+            of the job, so they outlive the session.
+        campaign (str): The petition campaign the results belong to.
+        select_voter_records (pd.DataFrame): The matching index of the voter
+            records, e.g. shared by the registry cache. Built from
+            `voter_records_df` when missing.
+
+    Returns:
+        pd.DataFrame: The matched results.
+    """
+    if threshold is None:
+        threshold = load_config()["BASE_THRESHOLD"]
+    tracing = load_settings().tracing
+    with trace_run(job.job_id, tracing.output_dir, profile=tracing.profile, snapshot=tracing.snapshot):
+        if results_store is None:
+            return await _read_and_match(
+                job, filedir, filenames, voter_records_df, threshold, select_voter_records=select_voter_records
+            )
+
+        results_store.start_run(job.job_id, campaign=campaign, source="app", threshold=threshold)
+        status = "failed"
+        try:
+            # rows are stored as they are matched, so they can be exported while the job runs
+            results_df = await _read_and_match(
+                job,
+                filedir,
+                filenames,
+                voter_records_df,
+                threshold,
+                on_chunk=lambda chunk: asyncio.to_thread(results_store.append, job.job_id, chunk),
+                select_voter_records=select_voter_records,
+            )
+            if job.candidates is not None:
+                # kept so the run can be re-evaluated with another threshold later
+                path = results_store.candidates_path(job.job_id)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                await asyncio.to_thread(job.candidates.save, path)
+            status = "done"
+            return results_df
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        finally:
+            results_store.finish_run(job.job_id, status)
+
+
+async def _read_and_match(
+    job: ValidationJob,
+    filedir: str,
+    filenames: List[str],
+    voter_records_df: pd.DataFrame,
+    threshold: float,
+    on_chunk: Callable[[pd.DataFrame], Awaitable[None]] = None,
+    select_voter_records: pd.DataFrame = None,
+) -> pd.DataFrame:
+
+    def show_file_progress(file_job: FileJob) -> None:
+        job.file_progress[file_job.filename] = (
+            f"{file_job.status} ({file_job.pages_done} of {file_job.total_pages or '?'} pages)"
+        )
+        pages_done = sum(j.pages_done for j in ocr_queue.jobs.values())
+        pages_total = sum(j.total_pages for j in ocr_queue.jobs.values())
+        job.progress = 0.9 * pages_done / pages_total if pages_total else 0.0
+        job.progress_text = f"Reading signatures: {pages_done} of {pages_total} pages"
+
+    ocr_queue = OcrJobQueue(filedir=filedir, on_progress=show_file_progress)
+    for filename in filenames:
+        ocr_queue.add(filename)
+    file_jobs = await ocr_queue.run_async()
+
+    failed_jobs = [file_job for file_job in file_jobs.values() if file_job.status == "failed"]
+    if len(failed_jobs) == len(file_jobs):
+        raise RuntimeError(f"OCR failed for every file: {failed_jobs[0].error}")
+    job.failed_files = {file_job.filename: file_job.error for file_job in failed_jobs}
+
+    # keep the OCR timings, token usage and cost of the run
+    ocr_queue.metrics.export("logs")
+    job.ocr_metrics = ocr_queue.metrics.summary()
+
+    if select_voter_records is None:
+        job.progress, job.progress_text = 0.9, "Compiling Voter Record Data"
+        select_voter_records = await asyncio.to_thread(create_select_voter_records, voter_records_df.copy())
+    job.progress = 0.9
+
+    job.progress_text = "Matching petition signatures to voter records..."
+
+    class _JobBar:
+        """Adapts the job to the progress bar interface of the matcher"""
+
+        def progress(self, value: float, text: str = "") -> None:
+            job.progress, job.progress_text = 0.9 + 0.1 * value, text
+
+    chunks, candidates = [], []
+    async for chunk, chunk_candidates in iter_matched_chunks_async(
+        ocr_queue.results_df(), select_voter_records, threshold=threshold, st_bar=_JobBar()
+    ):
+        if on_chunk is not None:
+            await on_chunk(chunk)
+        chunks.append(chunk)
+        candidates.append(chunk_candidates)
+    job.candidates = MatchCandidates.concat(candidates)
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=MATCHED_COLUMNS)
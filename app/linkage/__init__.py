@@ -0,0 +1,19 @@
+from .comparisons import Comparison
+from .comparisons import DEFAULT_COMPARISONS
+from .fields import LINKAGE_FIELDS
+from .fields import parse_names
+from .fields import record_fields
+from .linker import DEFAULT_BLOCKING_RULES
+from .linker import RecordLinker
+from .model import FellegiSunterModel
+
+__all__ = [
+    "Comparison",
+    "DEFAULT_COMPARISONS",
+    "LINKAGE_FIELDS",
+    "parse_names",
+    "record_fields",
+    "DEFAULT_BLOCKING_RULES",
+    "RecordLinker",
+    "FellegiSunterModel",
+]
@@ -0,0 +1,64 @@
+from dataclasses import dataclass
+from typing import Callable, List, Sequence
+
+import numpy as np
+from rapidfuzz.distance import Indel, JaroWinkler, Levenshtein
+from rapidfuzz.process import cpdist
+
+
+@dataclass(frozen=True)
+class Comparison:
+    """
+    Compares one field of record pairs in levels of agreement.
+
+    Level 0 is the least similar and the highest level an exact match.
+    Each threshold adds a level in between: pairs whose similarity reaches
+    the i-th lowest threshold are at level i. Pairs where either side is
+    missing are at level -1 and carry no evidence either way.
+    """
+
+    field: str
+    # rapidfuzz similarity of two strings, None compares exactly only
+    scorer: Callable = None
+    thresholds: Sequence[float] = ()
+
+    @property
+    def n_levels(self) -> int:
+        return len(self.thresholds) + 2
+
+    @property
+    def level_names(self) -> List[str]:
+        return ["different", *(f">= {t:g}" for t in self.thresholds), "exact"]
+
+    def levels(self, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+        """
+        Gives the level of every pair, all pairs at once.
+
+        Args:
+            left (np.ndarray): The field of the first record of every pair.
+            right (np.ndarray): The field of the second record of every pair.
+
+        Returns:
+            np.ndarray: The int8 level of every pair.
+        """
+        levels = np.zeros(len(left), dtype=np.int8)
+        if self.thresholds and len(left):
+            similarity = cpdist(left, right, scorer=self.scorer, dtype=np.float32, workers=-1)
+            for level, threshold in enumerate(sorted(self.thresholds), start=1):
+                levels[similarity >= threshold] = level
+        levels[left == right] = self.n_levels - 1
+        levels[(left == "") | (right == "")] = -1
+        return levels
+
+
+# names are scored on Jaro-Winkler, which forgives misread endings more than
+# beginnings, street names on their edit ratio, house numbers of three
+# digits or more allow one misread digit
+DEFAULT_COMPARISONS = (
+    Comparison("first_name", JaroWinkler.normalized_similarity, (0.7, 0.88)),
+    Comparison("last_name", JaroWinkler.normalized_similarity, (0.7, 0.88)),
+    Comparison("street_number", Levenshtein.normalized_similarity, (0.66,)),
+    Comparison("street_name", Indel.normalized_similarity, (0.75, 0.9)),
+    Comparison("street_type"),
+    Comparison("street_direction"),
+)
@@ -0,0 +1,50 @@
+import pandas as pd
+
+from address_canonicalizer import parse_addresses
+
+# the fields records are compared on, in comparison order
+LINKAGE_FIELDS = ["first_name", "last_name", "street_number", "street_name", "street_type", "street_direction"]
+
+# the first and last word, leaving out middle names and generational suffixes
+_NAME_PARTS = r"^\s*(?:(?P<first_name>\S+)\s+(?:.*?\s)??)?(?P<last_name>\S+?)(?:\s+(?:JR|SR|II|III|IV))*\s*$"
+
+
+def parse_names(full_names: pd.Series) -> pd.DataFrame:
+    """
+    Splits full names into first and last name.
+
+    Names are upper-cased and stripped of punctuation and generational
+    suffixes. The first word is the first name and the last word the last
+    name, middle names are left out. A single word is a last name.
+
+    Args:
+        full_names (pd.Series): Names as written, e.g. "Jane A. Doe Jr.".
+
+    Returns:
+        pd.DataFrame: The "first_name" and "last_name" of every name, with
+            the index of `full_names`.
+    """
+    names = full_names.fillna("").astype(str).str.upper().str.replace(r"[^\w\s'-]", "", regex=True)
+    return names.str.extract(_NAME_PARTS).fillna("")
+
+
+def record_fields(full_names: pd.Series, canonical_addresses: pd.Series) -> pd.DataFrame:
+    """
+    Gives the `LINKAGE_FIELDS` of records, registry and OCR rows alike.
+
+    Args:
+        full_names (pd.Series): The full names.
+        canonical_addresses (pd.Series): The addresses, canonicalized by
+            `address_canonicalizer.canonicalize_addresses`.
+
+    Returns:
+        pd.DataFrame: The fields of every record, missing ones empty.
+    """
+    addresses = parse_addresses(canonical_addresses)
+    fields = parse_names(full_names).assign(
+        street_number=addresses["number"].str.lstrip("0"),
+        street_name=addresses["street"],
+        street_type=addresses["type"],
+        street_direction=addresses["direction"],
+    )
+    return fields[LINKAGE_FIELDS].fillna("").astype(str)
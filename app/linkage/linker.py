@@ -0,0 +1,224 @@
+from typing import Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from address_canonicalizer import canonicalize_addresses
+from utils.app_logger import logger
+
+from .comparisons import DEFAULT_COMPARISONS, Comparison
+from .fields import record_fields
+from .model import FellegiSunterModel
+
+# a blocking rule pairs records agreeing on every (field, leading characters)
+# of the rule, None comparing the whole field; pairs of any rule are kept
+BlockingRule = Sequence[Tuple[str, int]]
+
+# one misread field still leaves a rule the pair agrees on
+DEFAULT_BLOCKING_RULES = (
+    (("street_number", None), ("street_name", 2)),
+    (("last_name", None), ("first_name", 1)),
+    (("first_name", None), ("last_name", 2)),
+    (("street_name", None), ("last_name", 1)),
+    (("street_number", None), ("last_name", 1)),
+    (("last_name", 3), ("street_name", 3)),
+)
+
+
+def _block_keys(fields: pd.DataFrame, rule: BlockingRule) -> pd.Series:
+    # the key of every record, without records missing a field of the rule
+    parts = [fields[field].str[:n] if n else fields[field] for field, n in rule]
+    present = np.logical_and.reduce([part != "" for part in parts])
+    keys = parts[0].str.cat(parts[1:], sep="|") if len(parts) > 1 else parts[0]
+    return keys[present]
+
+
+class RecordLinker:
+    """
+    Links OCR rows to registry records with a Fellegi-Sunter model.
+
+    Only pairs sharing a block, e.g. house number and street initials, are
+    compared, so the work grows with the number of candidate pairs rather
+    than with OCR rows times registry records. Each field of a pair is
+    compared separately and the model weighs every field by how much its
+    agreement tells matches from non-matches.
+
+    Example:
+        linker = RecordLinker(select_voter_records)
+        links = linker.fit(ocr_df).link(ocr_df)
+    """
+
+    def __init__(self, select_voter_records: pd.DataFrame,
+                 comparisons: Sequence[Comparison] = DEFAULT_COMPARISONS,
+                 blocking_rules: Sequence[BlockingRule] = DEFAULT_BLOCKING_RULES,
+                 max_block_size: int = 1000):
+        """
+        Args:
+            select_voter_records (pd.DataFrame): The registry, from
+                `fuzzy_match_helper.create_select_voter_records`.
+            comparisons (Sequence[Comparison]): The field comparisons.
+            blocking_rules (Sequence[BlockingRule]): The rules pairing records.
+            max_block_size (int): Registry blocks larger than this, e.g. a
+                common last name, are too unspecific and left out.
+        """
+        self.comparisons = list(comparisons)
+        self.blocking_rules = list(blocking_rules)
+        self.max_block_size = max_block_size
+        # pairs and blocks refer to registry records by position, whatever the index of the registry
+        self.registry_ids = select_voter_records.index
+        self.registry = record_fields(
+            select_voter_records["Full Name"].reset_index(drop=True),
+            select_voter_records["Canonical Address"].reset_index(drop=True),
+        )
+        self.model = FellegiSunterModel(self.comparisons)
+        self._registry_keys = [self._registry_blocks(rule) for rule in self.blocking_rules]
+
+    def _registry_blocks(self, rule: BlockingRule) -> pd.DataFrame:
+        keys = _block_keys(self.registry, rule)
+        sizes = keys.map(keys.value_counts())
+        keys = keys[sizes <= self.max_block_size]
+        return pd.DataFrame({"key": keys.to_numpy(), "registry": keys.index.to_numpy()})
+
+    def ocr_fields(self, ocr_df: pd.DataFrame) -> pd.DataFrame:
+        """Gives the fields of OCR rows, with positional index."""
+        return record_fields(
+            ocr_df["OCR Name"].reset_index(drop=True),
+            canonicalize_addresses(ocr_df["OCR Address"].reset_index(drop=True)),
+        )
+
+    def _rule_pairs(self, ocr_fields: pd.DataFrame, rule: int) -> np.ndarray:
+        # the ids, ocr * registry size + registry, of the pairs of one rule
+        keys = _block_keys(ocr_fields, self.blocking_rules[rule])
+        ocr_keys = pd.DataFrame({"key": keys.to_numpy(), "ocr": keys.index.to_numpy()})
+        pairs = ocr_keys.merge(self._registry_keys[rule], on="key")
+        return pairs["ocr"].to_numpy(np.int64) * len(self.registry) + pairs["registry"].to_numpy()
+
+    def _positions(self, pair_ids: np.ndarray) -> np.ndarray:
+        return np.column_stack(np.divmod(pair_ids, len(self.registry)))
+
+    def candidate_pairs(self, ocr_fields: pd.DataFrame) -> np.ndarray:
+        """
+        Gives the pairs sharing a block under any blocking rule.
+
+        Args:
+            ocr_fields (pd.DataFrame): The fields of the OCR rows.
+
+        Returns:
+            np.ndarray: The (pairs, 2) OCR and registry positions, every
+                pair once, sorted.
+        """
+        pair_ids = [self._rule_pairs(ocr_fields, rule) for rule in range(len(self.blocking_rules))]
+        pair_ids = np.unique(np.concatenate(pair_ids)) if pair_ids else np.empty(0, dtype=np.int64)
+        return self._positions(pair_ids)
+
+    def compare(self, ocr_fields: pd.DataFrame, pairs: np.ndarray) -> np.ndarray:
+        """
+        Gives the comparison levels of pairs.
+
+        Args:
+            ocr_fields (pd.DataFrame): The fields of the OCR rows.
+            pairs (np.ndarray): The (pairs, 2) OCR and registry positions.
+
+        Returns:
+            np.ndarray: The (pairs, comparisons) int8 levels.
+        """
+        levels = np.empty((len(pairs), len(self.comparisons)), dtype=np.int8)
+        for f, comparison in enumerate(self.comparisons):
+            left = ocr_fields[comparison.field].to_numpy(dtype=object)[pairs[:, 0]]
+            right = self.registry[comparison.field].to_numpy(dtype=object)[pairs[:, 1]]
+            levels[:, f] = comparison.levels(left, right)
+        return levels
+
+    def fit(self, ocr_df: pd.DataFrame, max_iter: int = 100, random_pairs: int = 100_000,
+            seed: int = 0) -> "RecordLinker":
+        """
+        Estimates the model weights from the OCR rows, unlabeled.
+
+        The u probabilities come from pairs drawn at random, which are
+        nearly all non-matches. The m probabilities are fit by expectation
+        maximization on the pairs of each blocking rule in turn, leaving out
+        the fields of the rule: its pairs agree on those by construction,
+        matches or not. Every field gets the mean of its estimates, weighted
+        by the matches each rule found, and the prior is fit last on the
+        pairs of all rules.
+
+        Args:
+            ocr_df (pd.DataFrame): The OCR rows, with "OCR Name" and "OCR Address".
+            max_iter (int): The maximum number of iterations of each fit.
+            random_pairs (int): The number of random pairs u is estimated on.
+            seed (int): Seeds the random pairs.
+
+        Returns:
+            RecordLinker: The linker.
+        """
+        ocr_fields = self.ocr_fields(ocr_df)
+        rng = np.random.default_rng(seed)
+        random = np.column_stack([
+            rng.integers(len(ocr_fields), size=random_pairs),
+            rng.integers(len(self.registry), size=random_pairs),
+        ])
+        self.model.estimate_u(self.compare(ocr_fields, random))
+
+        estimates = [[] for _ in self.comparisons]
+        matches = [[] for _ in self.comparisons]
+        for rule, blocking_rule in enumerate(self.blocking_rules):
+            pairs = self._positions(self._rule_pairs(ocr_fields, rule))
+            if not len(pairs):
+                continue
+            blocked = [f for f, c in enumerate(self.comparisons) if c.field in {field for field, _ in blocking_rule}]
+            levels = self.compare(ocr_fields, pairs)
+            levels[:, blocked] = -1
+            session = FellegiSunterModel(self.comparisons, prior=min(len(ocr_fields) / len(pairs), 0.5))
+            session.u = list(self.model.u)
+            session.fit(levels, max_iter=max_iter, fix_u=True)
+            for f, m in enumerate(session.m):
+                if f not in blocked:
+                    estimates[f].append(m)
+                    matches[f].append(session.prior * len(pairs))
+        self.model.m = [
+            np.average(m, axis=0, weights=w) if m else self.model.m[f]
+            for f, (m, w) in enumerate(zip(estimates, matches))
+        ]
+
+        pairs = self.candidate_pairs(ocr_fields)
+        if not len(pairs):
+            logger.warning("No candidate pairs to fit the linkage model on")
+            return self
+        self.model.prior = min(len(ocr_fields) / len(pairs), 0.5)
+        self.model.fit(self.compare(ocr_fields, pairs), max_iter=max_iter, fix_u=True, fix_m=True)
+        return self
+
+    def link(self, ocr_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Links every OCR row to its most likely registry record.
+
+        Args:
+            ocr_df (pd.DataFrame): The OCR rows, with "OCR Name" and "OCR Address".
+
+        Returns:
+            pd.DataFrame: The "registry" position and "registry_id" index
+                label, "match_weight" and "match_probability" of the best
+                pair of every OCR row, with the index of `ocr_df`. Rows
+                without candidates link to position -1 and ID None with
+                probability 0.
+        """
+        ocr_fields = self.ocr_fields(ocr_df)
+        pairs = self.candidate_pairs(ocr_fields)
+        weights = self.model.match_weights(self.compare(ocr_fields, pairs))
+
+        # the best pair of every row: sort by row, then by descending weight
+        order = np.lexsort((-weights, pairs[:, 0]))
+        first = order[np.r_[True, pairs[order[1:], 0] != pairs[order[:-1], 0]]] if len(order) else order
+        links = pd.DataFrame({
+            "registry": np.full(len(ocr_fields), -1, dtype=np.int64),
+            "match_weight": np.full(len(ocr_fields), -np.inf),
+        })
+        links.loc[pairs[first, 0], "registry"] = pairs[first, 1]
+        links.loc[pairs[first, 0], "match_weight"] = weights[first]
+        linked = links["registry"].to_numpy() >= 0
+        links.insert(1, "registry_id", None)
+        links.loc[linked, "registry_id"] = self.registry_ids[links["registry"].to_numpy()[linked]]
+        links["match_probability"] = 1 / (1 + np.exp2(-links["match_weight"]))
+        links.index = ocr_df.index
+        logger.info(f"Linked {len(ocr_fields)} rows over {len(pairs)} candidate pairs")
+        return links
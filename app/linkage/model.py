@@ -0,0 +1,145 @@
+from typing import List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from utils.app_logger import logger
+
+from .comparisons import DEFAULT_COMPARISONS, Comparison
+
+# keeps every level possible, so no single field can veto or prove a match
+_MIN_PROBABILITY = 1e-6
+
+
+def _normalize(probabilities: np.ndarray) -> np.ndarray:
+    probabilities = np.maximum(probabilities, _MIN_PROBABILITY)
+    return probabilities / probabilities.sum()
+
+
+class FellegiSunterModel:
+    """
+    Fellegi-Sunter model of record pairs compared field by field.
+
+    Every comparison level has an m probability, of a matching pair being
+    at that level, and a u probability, of a non-matching pair being at it.
+    The match weight of a pair sums log2(m/u) over its fields with the
+    prior log-odds of a match, so a misread house number counts against a
+    match more than a misread street type does, as the data shows.
+
+    Example:
+        model = FellegiSunterModel().fit(levels)
+        probabilities = model.match_probability(levels)
+    """
+
+    def __init__(self, comparisons: Sequence[Comparison] = DEFAULT_COMPARISONS, prior: float = 1e-3):
+        """
+        Starts from m probabilities rising with agreement and uniform u
+        probabilities, until the model is fit.
+
+        Args:
+            comparisons (Sequence[Comparison]): The field comparisons, in the
+                column order of the levels.
+            prior (float): The share of pairs that match.
+        """
+        self.comparisons = list(comparisons)
+        self.prior = prior
+        self.m: List[np.ndarray] = [_normalize(4.0 ** np.arange(c.n_levels)) for c in self.comparisons]
+        self.u: List[np.ndarray] = [np.full(c.n_levels, 1 / c.n_levels) for c in self.comparisons]
+        self.iterations = 0
+
+    def _field_weights(self, levels: np.ndarray) -> np.ndarray:
+        """The log2 Bayes factor of every field of every pair, 0 for missing fields."""
+        weights = np.zeros(levels.shape, dtype=np.float64)
+        for f, (m, u) in enumerate(zip(self.m, self.u)):
+            present = levels[:, f] >= 0
+            weights[present, f] = np.log2(m / u)[levels[present, f]]
+        return weights
+
+    def match_weights(self, levels: np.ndarray) -> np.ndarray:
+        """
+        Gives the match weight of every pair.
+
+        Args:
+            levels (np.ndarray): The (pairs, fields) comparison levels.
+
+        Returns:
+            np.ndarray: The log2 odds of every pair being a match.
+        """
+        return np.log2(self.prior / (1 - self.prior)) + self._field_weights(levels).sum(axis=1)
+
+    def match_probability(self, levels: np.ndarray) -> np.ndarray:
+        """Gives the probability of every pair being a match."""
+        return 1 / (1 + np.exp2(-self.match_weights(levels)))
+
+    def estimate_u(self, levels: np.ndarray) -> "FellegiSunterModel":
+        """
+        Estimates the u probabilities from pairs of random records, nearly
+        all of which do not match.
+
+        Args:
+            levels (np.ndarray): The (pairs, fields) levels of random pairs.
+
+        Returns:
+            FellegiSunterModel: The model.
+        """
+        for f, comparison in enumerate(self.comparisons):
+            present = levels[:, f] >= 0
+            self.u[f] = _normalize(np.bincount(levels[present, f], minlength=comparison.n_levels).astype(np.float64))
+        return self
+
+    def fit(self, levels: np.ndarray, max_iter: int = 100, tol: float = 1e-5,
+            fix_u: bool = False, fix_m: bool = False) -> "FellegiSunterModel":
+        """
+        Estimates the m and u probabilities and the prior by expectation
+        maximization over blocked pairs.
+
+        Pairs sharing a pattern of levels are fit once, weighted by their
+        count, so the cost of an iteration depends on the number of
+        distinct patterns rather than of pairs.
+
+        Args:
+            levels (np.ndarray): The (pairs, fields) levels of candidate pairs.
+            max_iter (int): The maximum number of iterations.
+            tol (float): Stops once no probability moves by more than this.
+            fix_u (bool): Keep the u probabilities, e.g. from `estimate_u`.
+            fix_m (bool): Keep the m probabilities, fitting the prior only.
+
+        Returns:
+            FellegiSunterModel: The fitted model.
+        """
+        patterns, counts = np.unique(levels, axis=0, return_counts=True)
+        counts = counts.astype(np.float64)
+        for self.iterations in range(1, max_iter + 1):
+            # expectation: the probability of each pattern being a match
+            p = counts / (1 + np.exp2(-self.match_weights(patterns)))
+            q = counts - p
+
+            # maximization: the level frequencies among matches and non-matches
+            change = abs(p.sum() / counts.sum() - self.prior)
+            self.prior = min(max(p.sum() / counts.sum(), _MIN_PROBABILITY), 1 - _MIN_PROBABILITY)
+            for f, comparison in enumerate(self.comparisons):
+                present = patterns[:, f] >= 0
+                if not present.any():
+                    continue
+                if not fix_m:
+                    m = _normalize(np.bincount(patterns[present, f], p[present], minlength=comparison.n_levels))
+                    change = max(change, np.abs(m - self.m[f]).max())
+                    self.m[f] = m
+                if not fix_u:
+                    u = _normalize(np.bincount(patterns[present, f], q[present], minlength=comparison.n_levels))
+                    change = max(change, np.abs(u - self.u[f]).max())
+                    self.u[f] = u
+            if change < tol:
+                break
+        logger.info(f"Fit linkage model on {int(counts.sum())} pairs, {len(patterns)} patterns, "
+                    f"in {self.iterations} iterations, prior {self.prior:.2e}")
+        return self
+
+    def summary(self) -> pd.DataFrame:
+        """Gives the m and u probabilities and the match weight of every level."""
+        return pd.DataFrame([
+            {"field": c.field, "level": level, "agreement": name, "m": m[level], "u": u[level],
+             "weight": np.log2(m[level] / u[level])}
+            for c, m, u in zip(self.comparisons, self.m, self.u)
+            for level, name in enumerate(c.level_names)
+        ])
@@ -0,0 +1,250 @@
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def _harmonic(name_scores: np.ndarray, address_scores: np.ndarray) -> np.ndarray:
+    total = name_scores + address_scores
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(total > 0, 2 * name_scores * address_scores / total, 0.0)
+
+
+# rules combining the name and address score of a candidate into its match score
+COMBINATION_RULES: Dict[str, Callable[[np.ndarray, np.ndarray], np.ndarray]] = {
+    "harmonic": _harmonic,
+    "mean": lambda name_scores, address_scores: (name_scores + address_scores) / 2,
+    "geometric": lambda name_scores, address_scores: np.sqrt(name_scores * address_scores),
+    "min": np.minimum,
+}
+
+
+def combine_scores(name_scores: np.ndarray, address_scores: np.ndarray, rule: str = "harmonic") -> np.ndarray:
+    """
+    Combines name and address scores into match scores.
+
+    Args:
+        name_scores (np.ndarray): The name scores, 0 to 100.
+        address_scores (np.ndarray): The address scores, 0 to 100.
+        rule (str): One of `COMBINATION_RULES`.
+
+    Returns:
+        np.ndarray: The match scores, shaped like the inputs.
+    """
+    if rule not in COMBINATION_RULES:
+        raise ValueError(f"Unknown combination rule: {rule}")
+    return COMBINATION_RULES[rule](name_scores, address_scores)
+
+
+class RowCandidates(NamedTuple):
+    """The registry records closest to one OCR row, best name score first"""
+
+    registry_ids: np.ndarray
+    names: List[str]
+    addresses: List[str]
+    name_scores: np.ndarray
+    address_scores: np.ndarray
+
+
+@dataclass
+class MatchCandidates:
+    """
+    Top-k registry candidates of every OCR row in compact arrays.
+
+    Rows and candidates form (rows, k) arrays of registry IDs, name scores
+    and address scores. Candidate names and addresses are kept once each in
+    a string table and referenced by code. Rows with fewer than k candidates
+    are padded with ID -1 and scores of -1.
+
+    Validity under another threshold or combination rule is recomputed from
+    the arrays, without rescoring.
+
+    Example:
+        results_df, candidates = create_ocr_matched_df_with_candidates(ocr_df, select_voter_records)
+        matches = candidates.evaluate(threshold=80, rule="mean")
+    """
+
+    registry_ids: np.ndarray
+    name_scores: np.ndarray
+    address_scores: np.ndarray
+    name_codes: np.ndarray
+    address_codes: np.ndarray
+    names: np.ndarray
+    addresses: np.ndarray
+
+    # best candidates per combination rule, so moving the threshold only compares scores
+    _best: Dict[str, pd.DataFrame] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    @classmethod
+    def from_rows(cls, rows: List[RowCandidates], k: int = 10) -> "MatchCandidates":
+        """
+        Packs the candidates of each row into arrays.
+
+        Args:
+            rows (List[RowCandidates]): The candidates of each row, in row order.
+            k (int): The number of candidates kept per row.
+
+        Returns:
+            MatchCandidates: The packed candidates.
+        """
+        n = len(rows)
+        registry_ids = np.full((n, k), -1, dtype=np.int64)
+        name_scores = np.full((n, k), -1, dtype=np.float32)
+        address_scores = np.full((n, k), -1, dtype=np.float32)
+        name_slots, address_slots = [], []
+        for i, row in enumerate(rows):
+            m = min(len(row.registry_ids), k)
+            registry_ids[i, :m] = row.registry_ids[:m]
+            name_scores[i, :m] = row.name_scores[:m]
+            address_scores[i, :m] = row.address_scores[:m]
+            name_slots.append(list(row.names[:m]) + [""] * (k - m))
+            address_slots.append(list(row.addresses[:m]) + [""] * (k - m))
+
+        name_codes, names = pd.factorize(np.array(name_slots, dtype=object).reshape(-1))
+        address_codes, addresses = pd.factorize(np.array(address_slots, dtype=object).reshape(-1))
+        return cls(
+            registry_ids=registry_ids,
+            name_scores=name_scores,
+            address_scores=address_scores,
+            name_codes=name_codes.astype(np.int32).reshape(n, k),
+            address_codes=address_codes.astype(np.int32).reshape(n, k),
+            names=np.asarray(names, dtype=object),
+            addresses=np.asarray(addresses, dtype=object),
+        )
+
+    @classmethod
+    def concat(cls, parts: List["MatchCandidates"]) -> "MatchCandidates":
+        """Joins the candidates of consecutive chunks of rows."""
+        if not parts:
+            return cls.from_rows([])
+        names, name_codes = _merge_tables([(part.names, part.name_codes) for part in parts])
+        addresses, address_codes = _merge_tables([(part.addresses, part.address_codes) for part in parts])
+        return cls(
+            registry_ids=np.concatenate([part.registry_ids for part in parts]),
+            name_scores=np.concatenate([part.name_scores for part in parts]),
+            address_scores=np.concatenate([part.address_scores for part in parts]),
+            name_codes=name_codes,
+            address_codes=address_codes,
+            names=names,
+            addresses=addresses,
+        )
+
+    def __len__(self) -> int:
+        return len(self.registry_ids)
+
+    @property
+    def k(self) -> int:
+        return self.registry_ids.shape[1]
+
+    def scores(self, rule: str = "harmonic") -> np.ndarray:
+        """Gives the (rows, k) match scores of the candidates, -1 for padding."""
+        combined = combine_scores(self.name_scores, self.address_scores, rule)
+        return np.where(self.registry_ids >= 0, combined, -1).astype(np.float32)
+
+    def best(self, rule: str = "harmonic") -> pd.DataFrame:
+        """
+        Picks the best candidate of every row.
+
+        Args:
+            rule (str): One of `COMBINATION_RULES`.
+
+        Returns:
+            pd.DataFrame: The "Matched Name", "Matched Address", "Match Score"
+                and "Matched Registry ID" of every row.
+        """
+        if rule not in self._best:
+            scores = self.scores(rule)
+            best = scores.argmax(axis=1)
+            rows = np.arange(len(self))
+            self._best[rule] = pd.DataFrame(
+                {
+                    "Matched Name": self.names[self.name_codes[rows, best]] if len(self) else [],
+                    "Matched Address": self.addresses[self.address_codes[rows, best]] if len(self) else [],
+                    "Match Score": scores[rows, best].astype(np.float64),
+                    "Matched Registry ID": self.registry_ids[rows, best],
+                }
+            )
+        return self._best[rule]
+
+    def evaluate(self, threshold: float, rule: str = "harmonic") -> pd.DataFrame:
+        """
+        Picks the best candidate of every row and validates it.
+
+        Args:
+            threshold (float): The match score threshold.
+            rule (str): One of `COMBINATION_RULES`.
+
+        Returns:
+            pd.DataFrame: The "Matched Name", "Matched Address", "Match Score",
+                "Valid" and "Matched Registry ID" of every row.
+        """
+        best = self.best(rule)
+        return best.assign(Valid=best["Match Score"].to_numpy() >= threshold)[
+            ["Matched Name", "Matched Address", "Match Score", "Valid", "Matched Registry ID"]
+        ]
+
+    def reevaluate(self, results_df: pd.DataFrame, threshold: float, rule: str = "harmonic") -> pd.DataFrame:
+        """
+        Re-validates matched results with another threshold or combination rule.
+
+        Args:
+            results_df (pd.DataFrame): The matched results the candidates were kept for, in row order.
+            threshold (float): The match score threshold.
+            rule (str): One of `COMBINATION_RULES`.
+
+        Returns:
+            pd.DataFrame: A copy of `results_df` with the best match of every row re-evaluated.
+        """
+        if len(results_df) != len(self):
+            raise ValueError(f"{len(results_df)} results for {len(self)} rows of candidates")
+        evaluated = self.evaluate(threshold, rule)
+        evaluated.index = results_df.index
+        return results_df.assign(**{column: evaluated[column] for column in evaluated.columns})
+
+    def row(self, position: int, rule: str = "harmonic") -> pd.DataFrame:
+        """Lists the candidates of one row, best match score first, for review."""
+        keep = self.registry_ids[position] >= 0
+        candidates = pd.DataFrame(
+            {
+                "Name": self.names[self.name_codes[position]],
+                "Address": self.addresses[self.address_codes[position]],
+                "Name Score": self.name_scores[position],
+                "Address Score": self.address_scores[position],
+                "Match Score": self.scores(rule)[position],
+                "Registry ID": self.registry_ids[position],
+            }
+        )[keep]
+        return candidates.sort_values("Match Score", ascending=False, kind="mergesort", ignore_index=True)
+
+    def save(self, path: str) -> None:
+        """Saves the candidates to a compressed .npz file."""
+        np.savez_compressed(
+            path,
+            registry_ids=self.registry_ids,
+            name_scores=self.name_scores,
+            address_scores=self.address_scores,
+            name_codes=self.name_codes,
+            address_codes=self.address_codes,
+            names=self.names.astype(str),
+            addresses=self.addresses.astype(str),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "MatchCandidates":
+        """Loads candidates saved with `save`."""
+        with np.load(path) as arrays:
+            fields = {name: arrays[name] for name in arrays.files}
+        fields["names"] = fields["names"].astype(object)
+        fields["addresses"] = fields["addresses"].astype(object)
+        return cls(**fields)
+
+
+def _merge_tables(parts: List[Tuple[np.ndarray, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray]:
+    # recode every part against one string table
+    codes, table = pd.factorize(np.concatenate([strings for strings, _ in parts]))
+    merged, offset = [], 0
+    for strings, part_codes in parts:
+        merged.append(codes[offset:offset + len(strings)][part_codes])
+        offset += len(strings)
+    return np.asarray(table, dtype=object), np.concatenate(merged).astype(np.int32)
@@ -0,0 +1,244 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Tuple
+import time
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process, utils
+from rapidfuzz.distance import OSA
+
+from address_canonicalizer import canonicalize_addresses, parse_address
+from address_resolver import AddressResolver
+from fuzzy_match_helper import matched_df_from_candidates, score_candidates
+from match_candidates import MatchCandidates, RowCandidates, combine_scores
+from settings import load_config
+from utils.app_logger import get_pipeline_logger
+
+logger = get_pipeline_logger("match_cascade")
+
+
+@dataclass
+class CascadeStats:
+    """How many rows each stage of a `MatchCascade` handled, and its time"""
+
+    rows: int = 0
+    # accepted on the residents of their address alone
+    resolved: int = 0
+    # scored against the whole registry, and accepted, rejected or found
+    # within the band of the threshold there
+    scanned: int = 0
+    accepted: int = 0
+    rejected: int = 0
+    scan_uncertain: int = 0
+    # with residents at their address or within the band of the threshold
+    # on the scan, scored again thoroughly
+    uncertain: int = 0
+    # uncertain rows valid after the thorough pass
+    uncertain_valid: int = 0
+    seconds: Dict[str, float] = field(default_factory=lambda: {"resolve": 0.0, "scan": 0.0, "rescore": 0.0})
+
+    def add(self, other: "CascadeStats") -> None:
+        """Adds the counts and times of another run."""
+        for name, value in asdict(other).items():
+            if name == "seconds":
+                for stage, seconds in value.items():
+                    self.seconds[stage] += seconds
+            else:
+                setattr(self, name, getattr(self, name) + value)
+
+    def summary(self) -> dict:
+        """The counts and the milliseconds per row of every stage."""
+        return {
+            **{name: value for name, value in asdict(self).items() if name != "seconds"},
+            "ms_per_row": {
+                stage: 1000 * seconds / rows if rows else 0.0
+                for (stage, seconds), rows in zip(
+                    self.seconds.items(), [self.rows, self.scanned, self.uncertain]
+                )
+            },
+        }
+
+    def __str__(self) -> str:
+        return (
+            f"{self.rows} rows: {self.resolved} accepted by address, "
+            f"{self.scanned} scanned ({self.accepted} accepted, {self.rejected} rejected, "
+            f"{self.scan_uncertain} uncertain), "
+            f"{self.uncertain} uncertain rescored ({self.uncertain_valid} valid)"
+        )
+
+
+class MatchCascade:
+    """
+    Matches OCR rows in stages, spending more only on rows still in doubt.
+
+    1. Address first: the name is scored against the residents of the OCR
+       address, see `AddressResolver`. Rows scoring at least `band` above
+       the threshold are accepted.
+    2. Registry scan: rows nobody lives at the address of are scored as
+       `create_ocr_matched_df` scores them. Rows at least `band` above the
+       threshold are accepted, rows more than `band` below it rejected.
+    3. Rescore: the rows left, within the band on the scan or with
+       residents that did not match well enough, get a wider candidate
+       search and more forgiving scorers, and their house numbers are
+       compared on their own. A name read in capitals or last name first
+       scores low on the first stages, however well it reads.
+
+    Scores stay on the 0 to 100 scale of the scan, so candidates can be
+    re-evaluated at another threshold as usual.
+
+    Example:
+        cascade = MatchCascade(select_voter_records)
+        results_df, candidates = cascade.create_ocr_matched_df(ocr_df)
+        print(cascade.stats)
+    """
+
+    def __init__(self, select_voter_records: pd.DataFrame, band: float = None, wide_k: int = 50, k: int = 10,
+                 resolver: AddressResolver = None):
+        """
+        Args:
+            select_voter_records (pd.DataFrame): The registry, from
+                `fuzzy_match_helper.create_select_voter_records`.
+            band (float): How far from the threshold a score is uncertain.
+                Defaults to CASCADE_BAND of config.json.
+            wide_k (int): The number of candidates the rescore searches by name.
+            k (int): The number of candidates kept per row.
+            resolver (AddressResolver): The address lookup of the registry,
+                built here when not given.
+        """
+        self.select_voter_records = select_voter_records
+        self.band = band if band is not None else load_config()["CASCADE_BAND"]
+        self.wide_k = wide_k
+        self.k = k
+        self.resolver = resolver or AddressResolver(select_voter_records)
+        self.stats = CascadeStats()
+        self._processed_names: List[str] = None
+
+    @property
+    def processed_names(self) -> List[str]:
+        """The registry names lower-cased and stripped of punctuation, for the rescore."""
+        if self._processed_names is None:
+            self._processed_names = [utils.default_process(name) for name in self.select_voter_records["Full Name"]]
+        return self._processed_names
+
+    def rescore(self, ocr_name: str, canonical_address: str, threshold: float) -> RowCandidates:
+        """
+        Scores a row thoroughly: its candidates are the `wide_k` best names
+        regardless of case and punctuation, and the residents of its address.
+        Names score the better of their edit ratio and token sort ratio, so
+        "WELCH, ADAM" reads as "Adam Welch". A house number as long as the
+        OCR one but more than one edit from it cannot reach the threshold,
+        however close the rest of the address.
+
+        Args:
+            ocr_name (str): The OCR result for the name.
+            canonical_address (str): The canonical OCR address.
+            threshold (float): The threshold for matching.
+
+        Returns:
+            RowCandidates: The `k` candidates with the best match scores.
+        """
+        query = utils.default_process(ocr_name)
+        by_name = [position for _, _, position in process.extract(
+            query, self.processed_names, scorer=fuzz.ratio, processor=None, limit=self.wide_k
+        )]
+        positions = np.unique(np.concatenate([
+            np.array(by_name, dtype=np.int64), self.resolver.resolve(None, canonical_address).positions,
+        ]))
+
+        names = self.processed_names
+        name_scores = np.array([max(fuzz.ratio(query, names[p]), fuzz.token_sort_ratio(query, names[p]))
+                                for p in positions], dtype=np.float32)
+        canonical_addresses = self.select_voter_records["Canonical Address"].values[positions]
+        address_scores = np.array([fuzz.ratio(canonical_address, address) for address in canonical_addresses],
+                                  dtype=np.float32)
+
+        # field level: a house number read to the registry's length has to
+        # agree but for one misread digit, else the address scores below what
+        # a perfect name needs; numbers of other lengths were split or run
+        # into the street and are left to the address score
+        number = parse_address(canonical_address)["number"]
+        if number:
+            cap = np.nextafter(np.float32(100 * threshold / (200 - threshold)), np.float32(0))
+            for i, address in enumerate(canonical_addresses):
+                other = parse_address(address)["number"]
+                if len(other) == len(number) and OSA.distance(number, other) > 1:
+                    address_scores[i] = min(address_scores[i], cap)
+
+        keep = np.argsort(-combine_scores(name_scores, address_scores, "harmonic"), kind="stable")[:self.k]
+        positions = positions[keep]
+        return RowCandidates(
+            registry_ids=self.select_voter_records.index.values[positions].astype(np.int64),
+            names=list(self.select_voter_records["Full Name"].values[positions]),
+            addresses=list(self.select_voter_records["Full Address"].values[positions]),
+            name_scores=name_scores[keep],
+            address_scores=address_scores[keep],
+        )
+
+    def create_ocr_matched_df(self, ocr_df: pd.DataFrame, threshold: float = None,
+                              max_workers: int = None) -> Tuple[pd.DataFrame, MatchCandidates]:
+        """
+        Matches OCR rows through the stages of the cascade, see
+        `fuzzy_match_helper.create_ocr_matched_df_with_candidates`. The
+        counts of the run are added to `stats`.
+
+        Args:
+            ocr_df (pd.DataFrame): The DataFrame containing OCR results.
+            threshold (float): The threshold for matching. Defaults to
+                BASE_THRESHOLD of config.json.
+            max_workers (int): The number of threads scanning the registry.
+
+        Returns:
+            Tuple[pd.DataFrame, MatchCandidates]: The matched rows and their candidates.
+        """
+        if threshold is None:
+            threshold = load_config()["BASE_THRESHOLD"]
+        stats = CascadeStats(rows=len(ocr_df))
+        names = ocr_df["OCR Name"].tolist()
+        addresses = ocr_df["OCR Address"].tolist()
+        canonical_addresses = canonicalize_addresses(ocr_df["OCR Address"]).tolist()
+
+        def best_score(candidates: RowCandidates) -> float:
+            scores = combine_scores(candidates.name_scores, candidates.address_scores, "harmonic")
+            return float(scores.max()) if len(scores) else -1.0
+
+        started = time.perf_counter()
+        candidates = [self.resolver.score_candidates(name, address, canonical, limit_=self.k)
+                      for name, address, canonical in zip(names, addresses, canonical_addresses)]
+        unresolved = [i for i, row in enumerate(candidates) if best_score(row) < threshold + self.band]
+        # rows with residents at their address skip the scan for the rescore
+        uncertain = [i for i in unresolved if len(candidates[i].names)]
+        scan = [i for i in unresolved if not len(candidates[i].names)]
+        stats.resolved = len(ocr_df) - len(unresolved)
+        stats.seconds["resolve"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            scanned = list(executor.map(
+                lambda i: score_candidates(names[i], addresses[i], self.select_voter_records,
+                                           limit_=self.k, canonical_address=canonical_addresses[i]),
+                scan,
+            ))
+        for i, row in zip(scan, scanned):
+            candidates[i] = row
+            score = best_score(row)
+            if score >= threshold + self.band:
+                stats.accepted += 1
+            elif score < threshold - self.band:
+                stats.rejected += 1
+            else:
+                uncertain.append(i)
+                stats.scan_uncertain += 1
+        stats.scanned = len(scan)
+        stats.seconds["scan"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for i in sorted(uncertain):
+            candidates[i] = self.rescore(names[i], canonical_addresses[i], threshold)
+            stats.uncertain_valid += best_score(candidates[i]) >= threshold
+        stats.uncertain = len(uncertain)
+        stats.seconds["rescore"] = time.perf_counter() - started
+
+        logger.info(f"Cascade matched {stats}")
+        self.stats.add(stats)
+        return matched_df_from_candidates(ocr_df, candidates, threshold, self.k)
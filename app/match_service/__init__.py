@@ -0,0 +1,17 @@
+from .client import MatchServiceClient
+from .service import MatchRequestHandler
+from .service import MatchService
+from .service import ServiceStats
+from .service import load_registry_file
+from .service import match_service_token
+from .service import serve
+
+__all__ = [
+    "MatchServiceClient",
+    "MatchRequestHandler",
+    "MatchService",
+    "ServiceStats",
+    "load_registry_file",
+    "match_service_token",
+    "serve",
+]
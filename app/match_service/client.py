@@ -0,0 +1,169 @@
+from typing import List, Sequence, Tuple
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+import json
+
+import numpy as np
+import pandas as pd
+
+from fuzzy_match_helper import matched_df_from_candidates
+from match_candidates import MatchCandidates, RowCandidates
+from settings import load_config
+
+from .service import match_service_token
+
+
+class MatchServiceClient:
+    """
+    Matches OCR rows against the registry of a running match service.
+
+    Example:
+        with MatchServiceClient("http://127.0.0.1:8765") as client:
+            results_df, candidates = client.create_ocr_matched_df(ocr_df)
+    """
+
+    def __init__(self, url: str = "http://127.0.0.1:8765", timeout_s: float = 300, token: str = None):
+        """
+        Args:
+            url (str): The address of the service, see `main.py match-server`.
+            timeout_s (float): How long to wait for a reply.
+            token (str): The token of the service. Defaults to MATCH_SERVICE_TOKEN.
+        """
+        self.url = url.rstrip("/")
+        self.timeout_s = timeout_s
+        self.token = token or match_service_token()
+
+    def _request(self, path: str, body: dict = None) -> dict:
+        data = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"}
+        if self.token is not None:
+            headers["Authorization"] = f"Bearer {self.token}"
+        request = Request(self.url + path, data=data, headers=headers)
+        try:
+            with urlopen(request, timeout=self.timeout_s) as reply:
+                return json.loads(reply.read())
+        except HTTPError as e:
+            raise RuntimeError(f"The match service failed: {json.loads(e.read()).get('error', e.reason)}") from e
+
+    def stats(self) -> dict:
+        """Gives the served registry, request counts, queue depth, latency and throughput."""
+        return self._request("/stats")
+
+    @property
+    def registry_digest(self) -> str:
+        return self.stats()["registry_digest"]
+
+    def swap_registry(self, registry_path: str) -> str:
+        """
+        Has the service load another registry, see `MatchService.swap_registry`.
+
+        Args:
+            registry_path (str): The voter records CSV file, on the host of the service.
+
+        Returns:
+            str: The digest of the registry now served.
+        """
+        return self._request("/registry", {"path": registry_path})["registry_digest"]
+
+    def match_rows(self, rows: Sequence[Tuple[str, str]]) -> List[List[Tuple[str, str, float, int]]]:
+        """
+        Gives the top matches of a batch of OCR rows, as
+        `fuzzy_match_helper.get_matched_name_address` does for one.
+
+        Args:
+            rows (Sequence[Tuple[str, str]]): The OCR name and address of every row.
+
+        Returns:
+            List[List[Tuple[str, str, float, int]]]: The top matches of every
+                row with their harmonic mean score and registry position, best first.
+        """
+        reply = self._request("/match", {"rows": [list(row) for row in rows]})
+        return [[tuple(match) for match in matches] for matches in reply["matches"]]
+
+    def get_matched_name_address(self, ocr_name: str, ocr_address: str) -> List[Tuple[str, str, float, int]]:
+        """`fuzzy_match_helper.get_matched_name_address` served by the service."""
+        return self.match_rows([(ocr_name, ocr_address)])[0]
+
+    def score_rows(self, rows: Sequence[Tuple[str, str]], k: int = 10) -> Tuple[str, List[RowCandidates]]:
+        """
+        Gives the top-k candidates of a batch of OCR rows.
+
+        Returns:
+            Tuple[str, List[RowCandidates]]: The digest of the registry
+                matched against, and the candidates of every row.
+        """
+        reply = self._request("/candidates", {"rows": [list(row) for row in rows], "k": k})
+        return reply["registry_digest"], [
+            RowCandidates(
+                registry_ids=np.asarray(c["registry_ids"], dtype=np.int64),
+                names=c["names"],
+                addresses=c["addresses"],
+                name_scores=np.asarray(c["name_scores"], dtype=np.float32),
+                address_scores=np.asarray(c["address_scores"], dtype=np.float32),
+            )
+            for c in reply["candidates"]
+        ]
+
+    def score_ocr_df(
+        self, ocr_df: pd.DataFrame, k: int = 10, batch_size: int = 500
+    ) -> Tuple[str, List[RowCandidates]]:
+        """
+        Gives the top-k candidates of every OCR row, in batches.
+
+        Args:
+            ocr_df (pd.DataFrame): The DataFrame containing OCR results.
+            k (int): The number of candidates kept per row.
+            batch_size (int): The number of rows sent at once.
+
+        Returns:
+            Tuple[str, List[RowCandidates]]: The digest of the registry
+                matched against, and the candidates of every row.
+
+        Raises:
+            RuntimeError: If the registry of the service is swapped while the
+                rows are matched.
+        """
+        rows = list(zip(ocr_df["OCR Name"], ocr_df["OCR Address"]))
+        digests, candidates = set(), []
+        for start in range(0, len(rows), batch_size):
+            digest, batch_candidates = self.score_rows(rows[start:start + batch_size], k=k)
+            digests.add(digest)
+            candidates.extend(batch_candidates)
+        if len(digests) > 1:
+            raise RuntimeError("The registry of the match service was swapped while the rows were matched")
+        return (digests.pop() if digests else self.registry_digest), candidates
+
+    def create_ocr_matched_df(
+        self, ocr_df: pd.DataFrame, threshold: float = None, k: int = 10, batch_size: int = 500
+    ) -> Tuple[pd.DataFrame, MatchCandidates]:
+        """
+        `fuzzy_match_helper.create_ocr_matched_df_with_candidates` served by the service.
+
+        Args:
+            ocr_df (pd.DataFrame): The DataFrame containing OCR results.
+            threshold (float): The threshold for matching. Defaults to
+                BASE_THRESHOLD of config.json.
+            k (int): The number of candidates kept per row.
+            batch_size (int): The number of rows sent at once.
+
+        Returns:
+            Tuple[pd.DataFrame, MatchCandidates]: The DataFrame with matched
+                name and address, and the candidates of its rows.
+
+        Raises:
+            RuntimeError: If the registry of the service is swapped while the
+                rows are matched.
+        """
+        if threshold is None:
+            threshold = load_config()["BASE_THRESHOLD"]
+        _, candidates = self.score_ocr_df(ocr_df, k=k, batch_size=batch_size)
+        return matched_df_from_candidates(ocr_df, candidates, threshold, k)
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "MatchServiceClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,406 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional, Sequence, Tuple
+import argparse
+import hmac
+import ipaddress
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from address_canonicalizer import canonicalize_addresses
+from fuzzy_match_helper import get_matched_name_address, score_candidates
+from match_candidates import RowCandidates
+from sessions import RegistryEntry, load_registry, registry_digest
+from utils.app_logger import logger
+
+
+# the most candidates a /candidates request may ask for per row
+MAX_CANDIDATES = 100
+
+
+def match_service_token() -> Optional[str]:
+    """
+    Gives the token clients of the match service authenticate with, from
+    the MATCH_SERVICE_TOKEN environment variable or .env, `None` if unset.
+    """
+    return os.getenv("MATCH_SERVICE_TOKEN") or None
+
+
+def load_registry_file(path: str) -> RegistryEntry:
+    """Loads a voter records CSV and builds its matching index, keyed by its digest."""
+    with open(path, "rb") as f:
+        return load_registry(registry_digest(f), f)
+
+
+class ServiceStats:
+    """
+    Counts the requests of a match service and their latency.
+
+    Latency percentiles are taken over the last `window` requests and
+    throughput over the last `throughput_window_s` seconds.
+    """
+
+    def __init__(self, window: int = 1000, throughput_window_s: float = 60):
+        self.throughput_window_s = throughput_window_s
+        self.started = time.time()
+        self.requests = 0
+        self.rows = 0
+        self.errors = 0
+        self.queued = 0
+        self.active = 0
+        self._latencies_ms = deque(maxlen=window)
+        # (finish time, rows) of recent requests
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def enqueued(self) -> None:
+        with self._lock:
+            self.queued += 1
+
+    def dequeued(self) -> None:
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+
+    def finished(self, rows: int, latency_s: float, failed: bool = False) -> None:
+        now = time.time()
+        with self._lock:
+            self.active -= 1
+            self.requests += 1
+            self.errors += failed
+            if not failed:
+                self.rows += rows
+                self._recent.append((now, rows))
+            self._latencies_ms.append(1000 * latency_s)
+            self._expire(now)
+
+    def _expire(self, now: float) -> None:
+        while self._recent and self._recent[0][0] < now - self.throughput_window_s:
+            self._recent.popleft()
+
+    def snapshot(self) -> dict:
+        """Gives the counters, the latency percentiles in ms and the recent rows per second."""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            latencies = np.array(self._latencies_ms)
+            window_s = min(self.throughput_window_s, now - self.started)
+            return {
+                "uptime_s": now - self.started,
+                "requests": self.requests,
+                "rows": self.rows,
+                "errors": self.errors,
+                "queue_depth": self.queued,
+                "active": self.active,
+                "latency_ms": {
+                    f"p{q}": float(np.percentile(latencies, q)) if len(latencies) else None
+                    for q in (50, 95, 99)
+                },
+                "rows_per_s": sum(rows for _, rows in self._recent) / window_s if window_s > 0 else 0.0,
+            }
+
+
+class MatchService:
+    """
+    Keeps a voter registry and its matching index warm in memory and
+    matches batches of OCR rows against it on a pool of threads.
+
+    The registry can be swapped while requests are served: the new one is
+    loaded next to the old, and requests already queued finish on the
+    registry they started with.
+
+    Example:
+        service = MatchService("voter_records.csv")
+        digest, matches = service.match([("Adam Welch", "5211 Shaw Wall")])
+        service.swap_registry("voter_records_june.csv")
+    """
+
+    def __init__(self, registry_path: str, max_workers: int = 4):
+        """
+        Args:
+            registry_path (str): The voter records CSV file.
+            max_workers (int): The number of requests matched at once, the
+                others wait in the queue.
+        """
+        self.stats = ServiceStats()
+        self.swaps = 0
+        self._entry = load_registry_file(registry_path)
+        self._swap_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="match")
+        logger.info(f"Match service loaded registry {self._entry.key[:12]} ({self.rows} records)")
+
+    @property
+    def registry_digest(self) -> str:
+        return self._entry.key
+
+    @property
+    def rows(self) -> int:
+        return len(self._entry.select_voter_records)
+
+    def swap_registry(self, registry_path: str) -> RegistryEntry:
+        """
+        Loads another registry and serves it to every later request.
+
+        Args:
+            registry_path (str): The voter records CSV file.
+
+        Returns:
+            RegistryEntry: The registry now served.
+        """
+        with self._swap_lock:
+            started = time.perf_counter()
+            entry = load_registry_file(registry_path)
+            previous, self._entry = self._entry, entry
+            self.swaps += 1
+        logger.info(
+            f"Match service swapped registry {previous.key[:12]} for {entry.key[:12]} "
+            f"({len(entry.select_voter_records)} records) in {time.perf_counter() - started:.1f}s"
+        )
+        return entry
+
+    def _run(self, rows: Sequence[Tuple[str, str]], match: Callable) -> Tuple[str, list]:
+        entry = self._entry
+        submitted = time.perf_counter()
+        self.stats.enqueued()
+
+        def run():
+            self.stats.dequeued()
+            # a registry swapped in meanwhile is used by the next requests only
+            canonical_addresses = canonicalize_addresses(pd.Series([address for _, address in rows], dtype=object))
+            return [
+                match(name, address, entry.select_voter_records, canonical_address)
+                for (name, address), canonical_address in zip(rows, canonical_addresses)
+            ]
+
+        try:
+            future = self._executor.submit(run)
+        except RuntimeError:
+            self.stats.dequeued()
+            self.stats.finished(len(rows), 0.0, failed=True)
+            raise
+        try:
+            results = future.result()
+        except BaseException:
+            self.stats.finished(len(rows), time.perf_counter() - submitted, failed=True)
+            raise
+        self.stats.finished(len(rows), time.perf_counter() - submitted)
+        return entry.key, results
+
+    def match(self, rows: Sequence[Tuple[str, str]]) -> Tuple[str, List[List[Tuple[str, str, float, int]]]]:
+        """
+        Matches a batch of OCR rows, like `fuzzy_match_helper.get_matched_name_address`.
+
+        Args:
+            rows (Sequence[Tuple[str, str]]): The OCR name and address of every row.
+
+        Returns:
+            Tuple[str, List[List[Tuple[str, str, float, int]]]]: The digest of
+                the registry matched against, and the top matches of every
+                row with their harmonic mean score and registry position.
+        """
+        return self._run(rows, lambda name, address, records, canonical_address: get_matched_name_address(
+            name, address, records, canonical_address=canonical_address
+        ))
+
+    def score(self, rows: Sequence[Tuple[str, str]], k: int = 10) -> Tuple[str, List[RowCandidates]]:
+        """
+        Scores the top-k candidates of a batch of OCR rows, like
+        `fuzzy_match_helper.score_candidates`.
+
+        Returns:
+            Tuple[str, List[RowCandidates]]: The digest of the registry
+                matched against, and the candidates of every row.
+        """
+        return self._run(rows, lambda name, address, records, canonical_address: score_candidates(
+            name, address, records, limit_=k, canonical_address=canonical_address
+        ))
+
+    def info(self) -> dict:
+        """Gives the served registry and the request statistics."""
+        return {"registry_digest": self.registry_digest, "registry_rows": self.rows, "swaps": self.swaps,
+                **self.stats.snapshot()}
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+###
+## HTTP API
+###
+
+def _read_rows(request: dict) -> List[Tuple[str, str]]:
+    rows = request.get("rows")
+    if not isinstance(rows, list) or not all(isinstance(row, list) and len(row) == 2 for row in rows):
+        raise ValueError('Requests need "rows": [[name, address], ...]')
+    return [(str(name or ""), str(address or "")) for name, address in rows]
+
+
+def _read_k(request: dict) -> int:
+    k = request.get("k", 10)
+    if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= MAX_CANDIDATES:
+        raise ValueError(f'"k" must be a whole number from 1 to {MAX_CANDIDATES}')
+    return k
+
+
+def _candidates_json(candidates: RowCandidates) -> dict:
+    return {
+        "registry_ids": candidates.registry_ids.tolist(),
+        "names": list(candidates.names),
+        "addresses": list(candidates.addresses),
+        "name_scores": candidates.name_scores.tolist(),
+        "address_scores": candidates.address_scores.tolist(),
+    }
+
+
+class MatchRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API of a `MatchService`.
+
+    Requests:
+        GET /stats: the served registry, request counts, queue depth,
+            latency percentiles and rows per second.
+        POST /match {"rows": [[name, address], ...]}: the top matches of every
+            row as [name, address, score, position] lists, best first.
+        POST /candidates {"rows": [...], "k": 10}: the top-k candidates of
+            every row with their name and address scores.
+        POST /registry {"path": "voter_records.csv"}: swaps the registry
+            for the file at `path` on the server.
+
+    Replies carry the digest of the registry used and the latency of the
+    request; errors are {"error": message}. When the service has a token,
+    requests without an "Authorization: Bearer <token>" header are refused.
+    """
+
+    service: MatchService
+    token: Optional[str] = None
+
+    def _authorized(self) -> bool:
+        if self.token is None:
+            return True
+        given = self.headers.get("Authorization", "")
+        if hmac.compare_digest(given.encode(), f"Bearer {self.token}".encode()):
+            return True
+        self._reply(401, {"error": "Missing or wrong match service token"})
+        return False
+
+    def do_GET(self) -> None:
+        if not self._authorized():
+            return
+        if self.path == "/stats":
+            self._reply(200, self.service.info())
+        else:
+            self._reply(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self) -> None:
+        started = time.perf_counter()
+        if not self._authorized():
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path == "/match":
+                digest, matches = self.service.match(_read_rows(request))
+                reply = {"registry_digest": digest, "matches": matches}
+            elif self.path == "/candidates":
+                digest, candidates = self.service.score(_read_rows(request), k=_read_k(request))
+                reply = {"registry_digest": digest, "candidates": [_candidates_json(c) for c in candidates]}
+            elif self.path == "/registry":
+                entry = self.service.swap_registry(str(request["path"]))
+                reply = {"registry_digest": entry.key, "registry_rows": len(entry.select_voter_records)}
+            else:
+                self._reply(404, {"error": f"Unknown path: {self.path}"})
+                return
+        except (ValueError, KeyError, OSError) as e:
+            self._reply(400, {"error": str(e)})
+            return
+        except Exception as e:
+            logger.exception(f"Match service failed a {self.path} request")
+            self._reply(500, {"error": str(e)})
+            return
+        reply["latency_ms"] = 1000 * (time.perf_counter() - started)
+        self._reply(200, reply)
+
+    def _reply(self, status: int, body: dict) -> None:
+        payload = json.dumps(body, default=_json_default).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(f"Match service {self.address_string()} {format % args}")
+
+
+def _json_default(value):
+    # numpy scores and positions of the matches
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _is_loopback(host: str) -> bool:
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == "localhost"
+
+
+def serve(
+    service: MatchService, host: str = "127.0.0.1", port: int = 0, token: str = None
+) -> ThreadingHTTPServer:
+    """
+    Binds the HTTP API of a match service, see `MatchRequestHandler`.
+    Call `serve_forever` on the returned server to serve requests.
+
+    Args:
+        service (MatchService): The service to serve.
+        host (str): The interface to listen on.
+        port (int): The port to listen on, 0 picks a free one.
+        token (str): The token every request must carry. Without one, only
+            loopback interfaces are served, since any client could swap in
+            a registry from the files of the host.
+
+    Raises:
+        ValueError: If a non-loopback interface is to be served without a token.
+    """
+    if token is None and not _is_loopback(host):
+        raise ValueError(f"Set MATCH_SERVICE_TOKEN to serve the match service on {host}")
+    handler = type("Handler", (MatchRequestHandler,), {"service": service, "token": token})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def cli(argv: List[str] = None) -> int:
+    """Command line entry point of the match service."""
+    parser = argparse.ArgumentParser(
+        prog="main.py match-server",
+        description="Serve matching against a voter registry kept in memory.",
+    )
+    parser.add_argument("registry", help="voter records CSV file")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="port to listen on, 0 picks a free one")
+    parser.add_argument("--workers", type=int, default=4, help="requests matched at once")
+    args = parser.parse_args(argv)
+
+    token = match_service_token()
+    if token is None and not _is_loopback(args.host):
+        parser.error(f"set MATCH_SERVICE_TOKEN to serve on {args.host}, clients then need the same token")
+    service = MatchService(args.registry, max_workers=args.workers)
+    server = serve(service, args.host, args.port, token=token)
+    host, port = server.server_address[:2]
+    print(f"Serving {service.rows} records on http://{host}:{port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
@@ -1,3 +1,23 @@
 from .ocr_client_factory import extract_from_encoding_async
+from .ocr_client_factory import build_ocr_messages
+from .batch import page_request_id
+from .batch import write_batch_requests
+from .batch import read_batch_requests
+from .batch import read_batch_results
+from .batch import run_local_batch
+from .metrics import OcrBudgetExceededError
+from .metrics import OcrRunMetrics
+from .metrics import PageMetrics
 
-__all__ = ["extract_from_encoding_async"]
+__all__ = [
+    "extract_from_encoding_async",
+    "build_ocr_messages",
+    "page_request_id",
+    "write_batch_requests",
+    "read_batch_requests",
+    "read_batch_results",
+    "run_local_batch",
+    "OcrBudgetExceededError",
+    "OcrRunMetrics",
+    "PageMetrics",
+]
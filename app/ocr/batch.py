@@ -0,0 +1,269 @@
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+import asyncio
+import json
+
+from settings import load_settings
+from utils import run_sync
+from utils.app_logger import logger
+from .ocr_client_factory import (
+    OCR_SCHEMAS,
+    build_ocr_messages,
+    extract_from_encoding_async,
+    parse_ocr_json,
+)
+
+
+###
+## BATCH REQUEST FILES
+###
+# Batch files follow the OpenAI batch JSONL layout: one chat completion
+# request per line, tagged with a `custom_id` that the provider copies
+# into the matching line of the result file.
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+_IMAGE_URL_PREFIX = "data:image/jpeg;base64,"
+
+
+def page_request_id(filename: str, page_number: int) -> str:
+    """Returns the batch request ID of a page."""
+    return f"{filename}::page-{page_number}"
+
+
+def batch_request(
+    custom_id: str, base64_image: str, model: str, schema: str = "rows"
+) -> dict:
+    """
+    Builds a batch request line for a single ballot image.
+
+    Uses the same prompt and output schema as `extract_from_encoding_async`.
+
+    Args:
+        custom_id (str): The ID used to join the result back to the page.
+        base64_image (str): The base64 encoded image to extract data from.
+        model (str): The model to request.
+        schema (str): The output schema requested, a key of `OCR_SCHEMAS`.
+
+    Returns:
+        dict: The batch request.
+    """
+    output_schema = OCR_SCHEMAS[schema]
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {
+            "model": model,
+            "temperature": 0.0,
+            "messages": [
+                {"role": "user", "content": build_ocr_messages(base64_image, schema)}
+            ],
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {
+                    "name": output_schema.__name__,
+                    "schema": output_schema.model_json_schema(),
+                },
+            },
+        },
+    }
+
+
+def write_batch_requests(
+    requests: Iterable[Tuple[str, str]], path: str, model: str = None, schema: str = None
+) -> int:
+    """
+    Writes a JSONL batch request file.
+
+    Args:
+        requests (Iterable[Tuple[str, str]]): Pairs of request ID and base64
+            encoded image. May be a generator, lines are written as they come.
+        path (str): The path of the batch file to write.
+        model (str): The model to request. Defaults to the model of the
+            selected OCR engine.
+        schema (str): The output schema requested. Defaults to the schema
+            selected in the settings.
+
+    Returns:
+        int: The number of requests written.
+    """
+    if model is None:
+        model = load_settings().selected_config.model
+    if schema is None:
+        schema = load_settings().ocr_schema
+
+    count = 0
+    with open(path, "w") as f:
+        for custom_id, base64_image in requests:
+            request = batch_request(custom_id, base64_image, model, schema)
+            f.write(json.dumps(request) + "\n")
+            count += 1
+
+    logger.info(f"Wrote {count} batch requests to {path}")
+    return count
+
+
+def read_batch_requests(path: str) -> Iterator[Tuple[str, str, str]]:
+    """
+    Reads back the request IDs, images and output schemas of a JSONL batch request file.
+
+    Args:
+        path (str): The path of the batch file.
+
+    Yields:
+        Tuple[str, str, str]: The request ID, the base64 encoded image and the
+            output schema requested, a key of `OCR_SCHEMAS`.
+    """
+    schema_names = {model.__name__: name for name, model in OCR_SCHEMAS.items()}
+    with open(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            content = request["body"]["messages"][0]["content"]
+            image_url = next(
+                part["image_url"]["url"] for part in content if part["type"] == "image_url"
+            )
+            schema_name = request["body"]["response_format"]["json_schema"]["name"]
+            yield (
+                request["custom_id"],
+                image_url.removeprefix(_IMAGE_URL_PREFIX),
+                schema_names[schema_name],
+            )
+
+
+def read_batch_results(
+    path: str, schemas: Dict[str, str] = None
+) -> Tuple[Dict[str, List[dict]], Dict[str, str]]:
+    """
+    Reads a JSONL batch result file.
+
+    Args:
+        path (str): The path of the result file.
+        schemas (Dict[str, str]): The output schema requested by every
+            request ID, see `read_batch_requests`. Defaults to the schema
+            selected in the settings for every request.
+
+    Returns:
+        Tuple[Dict[str, List[dict]], Dict[str, str]]: The OCR rows of every
+            successful request and the error message of every failed request,
+            both keyed by request ID.
+    """
+    default_schema = load_settings().ocr_schema
+    results = dict()
+    errors = dict()
+    with open(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            custom_id = result["custom_id"]
+            response = result.get("response") or {}
+
+            if result.get("error") or response.get("status_code") != 200:
+                error = result.get("error") or response.get("body", {}).get("error")
+                errors[custom_id] = str(error)
+                continue
+
+            try:
+                content = response["body"]["choices"][0]["message"]["content"]
+                schema = (schemas or {}).get(custom_id, default_schema)
+                results[custom_id] = parse_ocr_json(content, schema)
+            except Exception as e:
+                errors[custom_id] = f"Could not parse response: {str(e)}"
+
+    logger.info(f"Read {len(results)} batch results and {len(errors)} errors from {path}")
+    return results, errors
+
+
+###
+## LOCAL BATCH RUNNER
+###
+
+
+async def run_local_batch_async(
+    requests_path: str,
+    results_path: str,
+    extract: Callable = extract_from_encoding_async,
+    max_concurrent_requests: int = 10,
+) -> int:
+    """
+    Local stand-in for a provider batch endpoint.
+
+    Reads a batch request file, answers each request with `extract` and
+    writes a result file in the provider layout. Useful for testing the
+    batch workflow and for providers without a batch endpoint.
+
+    Args:
+        requests_path (str): The path of the batch request file.
+        results_path (str): The path of the result file to write.
+        extract (Callable): Coroutine function mapping a base64 encoded image
+            to a list of OCR rows.
+        max_concurrent_requests (int): The number of requests run at once.
+
+    Returns:
+        int: The number of requests answered.
+    """
+    semaphore = asyncio.Semaphore(max_concurrent_requests)
+
+    async def answer(
+        line_no: int, custom_id: str, base64_image: str, schema: str
+    ) -> dict:
+        async with semaphore:
+            try:
+                rows = await extract(base64_image)
+            except Exception as e:
+                return {
+                    "id": f"batch_req_{line_no}",
+                    "custom_id": custom_id,
+                    "response": None,
+                    "error": {"message": str(e)},
+                }
+        if schema == "columns":
+            content = json.dumps(
+                {key: [row[key] for row in rows] for key in ("Name", "Address", "Date", "Ward")}
+            )
+        else:
+            content = json.dumps({"Data": rows})
+        return {
+            "id": f"batch_req_{line_no}",
+            "custom_id": custom_id,
+            "response": {
+                "status_code": 200,
+                "body": {
+                    "choices": [
+                        {"index": 0, "message": {"role": "assistant", "content": content}}
+                    ]
+                },
+            },
+            "error": None,
+        }
+
+    results = await asyncio.gather(
+        *(
+            answer(line_no, custom_id, base64_image, schema)
+            for line_no, (custom_id, base64_image, schema) in enumerate(
+                read_batch_requests(requests_path)
+            )
+        )
+    )
+
+    with open(results_path, "w") as f:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+
+    logger.info(f"Wrote {len(results)} local batch results to {results_path}")
+    return len(results)
+
+
+def run_local_batch(
+    requests_path: str,
+    results_path: str,
+    extract: Callable = extract_from_encoding_async,
+    max_concurrent_requests: int = 10,
+) -> int:
+    """Synchronous wrapper of `run_local_batch_async`."""
+    return run_sync(
+        run_local_batch_async(
+            requests_path, results_path, extract, max_concurrent_requests
+        )
+    )
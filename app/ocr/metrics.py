@@ -0,0 +1,231 @@
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from settings import load_settings
+from utils.app_logger import logger
+
+# pages read before the cost projection is trusted
+_MIN_PAGES_FOR_PROJECTION = 3
+
+
+class OcrBudgetExceededError(RuntimeError):
+    """Raised when an OCR run would spend more than its budget"""
+
+
+@dataclass
+class PageMetrics:
+    """Timings, token usage and cost of the OCR request of a single page"""
+
+    page_id: str
+    provider: str = ""
+    model: str = ""
+    queue_wait_s: float = 0.0
+    request_s: float = 0.0
+    parse_s: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    payload_bytes: int = 0
+    retries: int = 0
+    cost_usd: float = 0.0
+    status: str = "ok"  # one of ok, failed, skipped
+
+
+# per-page metrics whose histograms are exported with the run summary
+HISTOGRAM_METRICS = ("queue_wait_s", "request_s", "parse_s", "input_tokens", "output_tokens")
+
+
+class OcrRunMetrics:
+    """
+    Collects the page metrics of an OCR run and enforces its budget.
+
+    The expected number of pages is registered as files are opened, so the
+    cost of the whole run can be projected from the pages read so far.
+
+    Budget actions:
+        abort: raise `OcrBudgetExceededError` as soon as the projected cost
+            exceeds the budget.
+        throttle: once the projection exceeds the budget, read one page at a
+            time and skip the remaining pages when the next one would not fit.
+    """
+
+    def __init__(
+        self,
+        input_token_cost: float = 0.0,
+        output_token_cost: float = 0.0,
+        budget_usd: Optional[float] = None,
+        budget_action: str = "abort",
+    ):
+        """
+        Args:
+            input_token_cost (float): USD per million request tokens.
+            output_token_cost (float): USD per million response tokens.
+            budget_usd (float): Spending limit of the run, None for no limit.
+            budget_action (str): "abort" or "throttle".
+        """
+        self.input_token_cost = input_token_cost
+        self.output_token_cost = output_token_cost
+        self.budget_usd = budget_usd
+        self.budget_action = budget_action
+        self.expected_pages = 0
+        self.pages: List[PageMetrics] = []
+        self.started_at = datetime.now()
+        self._throttle_lock: Optional[asyncio.Lock] = None
+
+    @classmethod
+    def from_settings(cls) -> "OcrRunMetrics":
+        """Creates run metrics with the pricing and budget of the current settings."""
+        settings = load_settings()
+        return cls(
+            input_token_cost=settings.selected_config.input_token_cost,
+            output_token_cost=settings.selected_config.output_token_cost,
+            budget_usd=settings.budget.max_cost_usd,
+            budget_action=settings.budget.action,
+        )
+
+    def add_expected_pages(self, count: int) -> None:
+        """Registers pages that will be sent to OCR in this run."""
+        self.expected_pages += count
+
+    def page_cost(self, input_tokens: int, output_tokens: int) -> float:
+        return (
+            input_tokens * self.input_token_cost + output_tokens * self.output_token_cost
+        ) / 1_000_000
+
+    def record(self, page: PageMetrics) -> None:
+        """Adds the metrics of a completed, failed or skipped page."""
+        page.cost_usd = self.page_cost(page.input_tokens, page.output_tokens)
+        self.pages.append(page)
+
+    @property
+    def spent_usd(self) -> float:
+        return sum(page.cost_usd for page in self.pages)
+
+    def mean_page_cost(self) -> float:
+        read = [page.cost_usd for page in self.pages if page.status != "skipped"]
+        return float(np.mean(read)) if read else 0.0
+
+    def projected_cost(self) -> float:
+        """Projects the cost of the whole run from the mean cost of the pages read so far."""
+        return self.mean_page_cost() * max(self.expected_pages, len(self.pages))
+
+    def _over_budget(self) -> bool:
+        return (
+            self.budget_usd is not None
+            and len(self.pages) >= _MIN_PAGES_FOR_PROJECTION
+            and self.projected_cost() > self.budget_usd
+        )
+
+    @asynccontextmanager
+    async def request_slot(self) -> AsyncIterator[None]:
+        """
+        Wraps an OCR request, enforcing the budget.
+
+        Raises:
+            OcrBudgetExceededError: If the run is over budget. In throttle mode
+                only once the next page would no longer fit in the budget.
+        """
+        if self.budget_usd is None or not self._over_budget():
+            yield
+            return
+
+        if self.budget_action == "abort":
+            raise OcrBudgetExceededError(
+                f"OCR run projected to cost ${self.projected_cost():.2f} "
+                f"for {self.expected_pages} pages, over the budget of ${self.budget_usd:.2f}"
+            )
+
+        if self._throttle_lock is None:
+            logger.warning(
+                f"OCR run projected to cost ${self.projected_cost():.2f}, "
+                f"over the budget of ${self.budget_usd:.2f}. Throttling to one page at a time."
+            )
+            self._throttle_lock = asyncio.Lock()
+
+        async with self._throttle_lock:
+            if self.spent_usd + self.mean_page_cost() > self.budget_usd:
+                raise OcrBudgetExceededError(
+                    f"OCR budget of ${self.budget_usd:.2f} spent"
+                )
+            yield
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Returns one row of metrics per page."""
+        return pd.DataFrame(
+            [asdict(page) for page in self.pages],
+            columns=[f.name for f in fields(PageMetrics)],
+        )
+
+    def histogram(self, metric: str, bins: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Histogram of a per-page metric, e.g. "request_s" or "output_tokens".
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The counts and the bin edges.
+        """
+        values = [getattr(page, metric) for page in self.pages if page.status == "ok"]
+        return np.histogram(values, bins=bins)
+
+    def summary(self) -> Dict:
+        """Aggregates the run into totals, latency percentiles and cost."""
+        ok = [page for page in self.pages if page.status == "ok"]
+
+        def percentiles(metric: str) -> Dict[str, float]:
+            values = [getattr(page, metric) for page in ok]
+            if not values:
+                return {}
+            p50, p90, p99 = np.percentile(values, [50, 90, 99])
+            return {"p50": p50, "p90": p90, "p99": p99, "max": max(values)}
+
+        return {
+            "started_at": self.started_at.isoformat(),
+            "providers": sorted({f"{page.provider}/{page.model}" for page in self.pages}),
+            "expected_pages": self.expected_pages,
+            "pages_ok": len(ok),
+            "pages_failed": sum(page.status == "failed" for page in self.pages),
+            "pages_skipped": sum(page.status == "skipped" for page in self.pages),
+            "retries": sum(page.retries for page in self.pages),
+            "input_tokens": sum(page.input_tokens for page in self.pages),
+            "output_tokens": sum(page.output_tokens for page in self.pages),
+            "payload_bytes": sum(page.payload_bytes for page in self.pages),
+            "queue_wait_s": percentiles("queue_wait_s"),
+            "request_s": percentiles("request_s"),
+            "parse_s": percentiles("parse_s"),
+            "cost_usd": self.spent_usd,
+            "projected_cost_usd": self.projected_cost(),
+            "budget_usd": self.budget_usd,
+        }
+
+    def export(self, directory: str) -> Tuple[str, str]:
+        """
+        Writes the per-page metrics as CSV, and the run summary with the
+        histograms of `HISTOGRAM_METRICS` as JSON.
+
+        Args:
+            directory (str): The directory to write to.
+
+        Returns:
+            Tuple[str, str]: The paths of the CSV and JSON files.
+        """
+        os.makedirs(directory, exist_ok=True)
+        stem = f"ocr_metrics_{self.started_at.strftime('%Y%m%d_%H%M%S')}"
+        csv_path = os.path.join(directory, stem + ".csv")
+        json_path = os.path.join(directory, stem + ".json")
+
+        self.to_dataframe().to_csv(csv_path, index=False)
+        histograms = {}
+        for metric in HISTOGRAM_METRICS:
+            counts, edges = self.histogram(metric)
+            histograms[metric] = {"counts": counts.tolist(), "edges": edges.tolist()}
+        with open(json_path, "w") as f:
+            json.dump({**self.summary(), "histograms": histograms}, f, indent=2, default=float)
+
+        logger.info(f"Exported OCR metrics to {csv_path} and {json_path}")
+        return csv_path, json_path
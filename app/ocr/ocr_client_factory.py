@@ -1,11 +1,4 @@
-from typing import List
-from langchain_openai import ChatOpenAI
-from langchain_mistralai import ChatMistralAI
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.runnables import (
-    Runnable,
-)
-from langchain_core.messages import HumanMessage
+from typing import TYPE_CHECKING, Dict, List, Type
 from pydantic import BaseModel, Field
 from settings import (
     load_settings,
@@ -14,7 +7,15 @@ from settings import (
     GeminiAiConfig,
 )
 from utils.app_logger import logger
-import json
+from utils.tracing import tracer
+from .metrics import PageMetrics
+import asyncio
+import time
+
+# the LangChain provider SDKs take seconds to import, each is only imported
+# once its engine is selected
+if TYPE_CHECKING:
+    from langchain_core.runnables import Runnable
 
 
 ###
@@ -33,7 +34,108 @@ class OCRData(BaseModel):
     Data: List[OCREntry]
 
 
-def _create_ocr_client() -> Runnable:
+class OCRColumns(BaseModel):
+    """Ballot signatory data, one list per field with one entry per signer"""
+
+    Name: List[str] = Field(description="Names of the petition signers")
+    Address: List[str] = Field(description="Addresses of the petition signatories")
+    Date: List[str] = Field(description="Dates of the signatures")
+    Ward: List[int] = Field(
+        description="The area or 'Ward' that each signer belongs to"
+    )
+
+
+# Output schemas the model can be asked for. "columns" names each field once
+# per page instead of once per signer, which cuts the output tokens.
+OCR_SCHEMAS: Dict[str, Type[BaseModel]] = {
+    "rows": OCRData,
+    "columns": OCRColumns,
+}
+
+_OCR_INSTRUCTIONS = {
+    "rows": """Using the written text in the image create a list of dictionaries where each dictionary consists of keys 'Name', 'Address', 'Date', and 'Ward'. Fill in the values of each dictionary with the correct entries for each key. Write all the values of the dictionary in full. Only output the list of dictionaries. No other intro text is necessary.""",
+    "columns": """Using the written text in the image create four lists under the keys 'Name', 'Address', 'Date', and 'Ward', with one entry per signer in the same order in every list. Write all the values in full. Only output the lists. No other intro text is necessary.""",
+}
+
+
+def build_ocr_messages(base64_image: str, schema: str = "rows") -> List[dict]:
+    """
+    Builds the prompt content for reading a single ballot image.
+
+    Shared by live requests and batch request files so that both ask the
+    model the same question.
+
+    Args:
+        base64_image: The base64 encoded image to extract data from.
+        schema: The output schema requested, a key of `OCR_SCHEMAS`.
+
+    Returns:
+        list: The content parts of the user message.
+    """
+    return [
+        {
+            "type": "text",
+            "text": _OCR_INSTRUCTIONS[schema],
+        },
+        {
+            "type": "text",
+            "text": """Remove the city name 'Washington, DC' and any zip codes from the 'Address' values.""",
+        },
+        {
+            "type": "image_url",
+            "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"},
+        },
+    ]
+
+
+def parse_ocr_output(parsed: BaseModel) -> List[dict]:
+    """
+    Converts the structured output of the model to OCR rows.
+
+    Reads the fields of the pydantic model directly, without serializing
+    it to JSON and back.
+
+    Args:
+        parsed: An `OCRData` or `OCRColumns` instance.
+
+    Returns:
+        list: A list of dictionaries with the OCR data.
+
+    Raises:
+        ValueError: If the columns are of unequal length, a field was skipped
+            or repeated and the rows cannot be aligned.
+    """
+    if isinstance(parsed, OCRColumns):
+        lengths = {len(column) for column in (parsed.Name, parsed.Address, parsed.Date, parsed.Ward)}
+        if len(lengths) > 1:
+            raise ValueError(
+                f"OCR columns have unequal lengths: {len(parsed.Name)} names, {len(parsed.Address)} "
+                f"addresses, {len(parsed.Date)} dates and {len(parsed.Ward)} wards"
+            )
+        return [
+            {"Name": name, "Address": address, "Date": date, "Ward": ward}
+            for name, address, date, ward in zip(
+                parsed.Name, parsed.Address, parsed.Date, parsed.Ward
+            )
+        ]
+    return [entry.model_dump() for entry in parsed.Data]
+
+
+def parse_ocr_json(content: str, schema: str) -> List[dict]:
+    """
+    Parses a JSON response of the model.
+
+    Args:
+        content: The JSON text of the response.
+        schema: The output schema requested, a key of `OCR_SCHEMAS`.
+
+    Returns:
+        list: A list of dictionaries with the OCR data.
+    """
+    return parse_ocr_output(OCR_SCHEMAS[schema].model_validate_json(content))
+
+
+def _create_ocr_client() -> "Runnable":
     """
     Create an OpenAI client with the appropriate settings.
 
@@ -41,77 +143,115 @@ def _create_ocr_client() -> Runnable:
         Runnable: An AI client for OCR extraction.
     """
 
-    ocr_config = load_settings().selected_config
+    settings = load_settings()
+    ocr_config = settings.selected_config
+    output_schema = OCR_SCHEMAS[settings.ocr_schema]
 
-    client: Runnable = None
+    client: "Runnable" = None
 
     match ocr_config:
         case OpenAiConfig():
+            from langchain_openai import ChatOpenAI
+
             client = ChatOpenAI(
                 api_key=ocr_config.api_key,
                 temperature=0.0,
                 openai_api_base="https://oai.helicone.ai/v1",
                 model=ocr_config.model,
-            ).with_structured_output(OCRData)
+            ).with_structured_output(output_schema, include_raw=True)
         case MistralAiConfig():
+            from langchain_mistralai import ChatMistralAI
+
             client = ChatMistralAI(
                 api_key=ocr_config.api_key,
                 temperature=0.0,
                 model_name=ocr_config.model,
-            ).with_structured_output(OCRData)
+            ).with_structured_output(output_schema, include_raw=True)
         case GeminiAiConfig():
+            from langchain_google_genai import ChatGoogleGenerativeAI
+
             client = ChatGoogleGenerativeAI(
                 api_key=ocr_config.api_key,
                 temperature=0.0,
                 model=ocr_config.model,
-            ).with_structured_output(OCRData)
+            ).with_structured_output(output_schema, include_raw=True)
 
     logger.debug(f"Creating client {ocr_config}")
 
     return client
 
 
-async def extract_from_encoding_async(base64_image: str) -> List[dict]:
+def _provider_name(ocr_config) -> str:
+    match ocr_config:
+        case OpenAiConfig():
+            return "open_ai"
+        case MistralAiConfig():
+            return "mistral_ai"
+        case GeminiAiConfig():
+            return "gemini_ai"
+    return type(ocr_config).__name__
+
+
+async def extract_from_encoding_async(
+    base64_image: str, metrics: PageMetrics = None
+) -> List[dict]:
     """
     Extracts names and addresses from single ballot image asynchronously.
     Uses base64_image
 
+    Failed requests are retried up to `max_retries` times from the settings,
+    with exponential backoff.
+
     Args:
         base64_image: The base64 encoded image to extract data from.
+        metrics: If given, filled with the request and parse timings, token
+            usage, payload size, retries and provider of the request.
 
     Returns:
         list: A list of dictionaries with the OCR data.
     """
+    from langchain_core.messages import HumanMessage
+
     logger.debug("Starting OCR extraction for image")
 
-    try:
-        # AI client definition
-        client = _create_ocr_client()
-        # prompt message
-        messages = [
-            {
-                "type": "text",
-                "text": """Using the written text in the image create a list of dictionaries where each dictionary consists of keys 'Name', 'Address', 'Date', and 'Ward'. Fill in the values of each dictionary with the correct entries for each key. Write all the values of the dictionary in full. Only output the list of dictionaries. No other intro text is necessary.""",
-            },
-            {
-                "type": "text",
-                "text": """Remove the city name 'Washington, DC' and any zip codes from the 'Address' values.""",
-            },
-            {
-                "type": "image_url",
-                "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"},
-            },
-        ]
+    settings = load_settings()
+    if metrics is None:
+        metrics = PageMetrics(page_id="")
+    metrics.provider = _provider_name(settings.selected_config)
+    metrics.model = settings.selected_config.model
+    metrics.payload_bytes = len(base64_image)
+
+    # AI client definition
+    client = _create_ocr_client()
+    # prompt message
+    messages = build_ocr_messages(base64_image, settings.ocr_schema)
+
+    for attempt in range(settings.max_retries + 1):
+        try:
+            request_start = time.perf_counter()
+            with tracer.span("ocr_request"):
+                results = await client.ainvoke([HumanMessage(content=messages)])
+            metrics.request_s += time.perf_counter() - request_start
+
+            usage = getattr(results["raw"], "usage_metadata", None) or {}
+            metrics.input_tokens += usage.get("input_tokens", 0)
+            metrics.output_tokens += usage.get("output_tokens", 0)
 
-        results = await client.ainvoke([HumanMessage(content=messages)])
+            if results["parsing_error"] is not None:
+                raise results["parsing_error"]
 
-        parsed_results = results
+            parse_start = time.perf_counter()
+            with tracer.span("parse"):
+                parsed_list = parse_ocr_output(results["parsed"])
+            metrics.parse_s = time.perf_counter() - parse_start
 
-        # dictionary results
-        parsed_list = json.loads(parsed_results.json())["Data"]
-        logger.debug(f"Successfully extracted {len(parsed_list)} entries from image")
-        return parsed_list
+            logger.debug(f"Successfully extracted {len(parsed_list)} entries from image")
+            return parsed_list
 
-    except Exception as e:
-        logger.error(f"Error in OCR extraction: {str(e)}")
-        raise
+        except Exception as e:
+            if attempt == settings.max_retries:
+                logger.error(f"Error in OCR extraction: {str(e)}")
+                raise
+            metrics.retries += 1
+            logger.warning(f"OCR extraction failed, retrying: {str(e)}")
+            await asyncio.sleep(2**attempt)
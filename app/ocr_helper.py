@@ -1,40 +1,33 @@
-from typing import List
+from typing import AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
 import base64
 import os
 import json
-from tqdm.notebook import tqdm
+from tqdm.auto import tqdm
 from dotenv import load_dotenv
 import pandas as pd
 import asyncio
 import fitz  # Add this import at the top with other imports
-
-import logging
-from datetime import datetime
-
-from ocr import extract_from_encoding_async
+import numpy as np
+
+import time
+
+from ocr import (
+    OcrBudgetExceededError,
+    OcrRunMetrics,
+    PageMetrics,
+    extract_from_encoding_async,
+    page_request_id,
+    read_batch_requests,
+    read_batch_results,
+    write_batch_requests,
+)
+from dedup import IndexedPage, PageHashIndex, perceptual_hash
+from settings import load_config
+from store import OcrCheckpoint
+from utils import get_pipeline_logger, run_sync, tracer
 
 # Set up logging
-log_directory = "logs"
-if not os.path.exists(log_directory):
-    os.makedirs(log_directory)
-
-# Create a logger
-logger = logging.getLogger("ocr_processing")
-logger.setLevel(logging.INFO)
-
-# Create handlers
-log_filename = f"ocr_processing_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-file_handler = logging.FileHandler(os.path.join(log_directory, log_filename))
-console_handler = logging.StreamHandler()
-
-# Create formatters and add it to handlers
-log_format = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-file_handler.setFormatter(log_format)
-console_handler.setFormatter(log_format)
-
-# Add handlers to the logger
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
+logger = get_pipeline_logger("ocr_processing")
 
 repo_name = "Ballot-Initiative"
 REPODIR = os.getcwd()
@@ -45,17 +38,34 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 HELICONE_PERSONAL_API_KEY = os.getenv("HELICONE_PERSONAL_API_KEY")
 
 
-# load config
-with open("config.json", "r") as f:
-    config = json.load(f)
+# fields of every OCR row, as returned by the model plus `add_metadata`
+OCR_DATA_COLUMNS = [
+    "Name", "Address", "Date", "Ward",
+    "Page Number", "Row Number", "Filename", "Duplicate Of",
+]
 
 
-def collecting_pdf_encoded_images(file_path: str) -> List[str]:
+def collecting_pdf_encoded_images(file_path: str, page_numbers: Sequence[int] = None) -> List[str]:
     """Convert PDF pages to encoded images, cropping to target area.
-    Returns list of base64 encoded image strings."""
+    Returns list of base64 encoded image strings.
+    With `page_numbers`, only those pages, counted from 0, are converted."""
+    return _encode_pdf_pages(file_path, page_numbers, return_hashes=False)[0]
 
+
+def collecting_pdf_encoded_images_and_hashes(
+    file_path: str, page_numbers: Sequence[int] = None
+) -> Tuple[List[str], List[int]]:
+    """Convert PDF pages to encoded images, as `collecting_pdf_encoded_images`,
+    along with the perceptual hashes of the cropped pages, to detect rescanned pages."""
+    return _encode_pdf_pages(file_path, page_numbers, return_hashes=True)
+
+
+def _encode_pdf_pages(
+    file_path: str, page_numbers: Optional[Sequence[int]], return_hashes: bool
+) -> Tuple[List[str], List[int]]:
     logger.info(f"Starting PDF conversion for file: {file_path}")
     encoded_image_list = []
+    page_hashes = []
 
     # Open PDF document
     pdf_document = fitz.open(file_path)
@@ -63,7 +73,8 @@ def collecting_pdf_encoded_images(file_path: str) -> List[str]:
 
     print("\nCropping Images and Converting to Bytes Objects")
     # Process each page
-    for page in tqdm(pdf_document):
+    selected = pdf_document if page_numbers is None else (pdf_document[n] for n in page_numbers)
+    for page in tqdm(selected, total=len(pdf_document) if page_numbers is None else len(page_numbers)):
         # Get page dimensions
         rect = page.rect
         width = rect.width
@@ -72,32 +83,46 @@ def collecting_pdf_encoded_images(file_path: str) -> List[str]:
         # Calculate crop rectangle
         crop_rect = fitz.Rect(
             0,  # left
-            height * config["TOP_CROP"],  # top
+            height * load_config()["TOP_CROP"],  # top
             width,  # right
-            height * config["BOTTOM_CROP"],  # bottom
+            height * load_config()["BOTTOM_CROP"],  # bottom
         )
 
         # Get pixmap with cropped area and grayscale
-        pix = page.get_pixmap(
-            matrix=fitz.Matrix(1, 1),  # zoom factors of 1 = 72 dpi
-            colorspace="gray",  # convert to grayscale
-            clip=crop_rect,  # crop to our target area
-        )
+        with tracer.span("render"):
+            pix = page.get_pixmap(
+                matrix=fitz.Matrix(1, 1),  # zoom factors of 1 = 72 dpi
+                colorspace="gray",  # convert to grayscale
+                clip=crop_rect,  # crop to our target area
+            )
 
         # Convert to bytes and encode
-        img_bytes = pix.tobytes(output="jpeg")
-        encoded = base64.b64encode(img_bytes).decode("utf-8")
+        with tracer.span("encode"):
+            img_bytes = pix.tobytes(output="jpeg")
+            encoded = base64.b64encode(img_bytes).decode("utf-8")
         encoded_image_list.append(encoded)
 
+        # Hash the cropped grayscale pixels to detect rescanned pages
+        if return_hashes:
+            pixels = np.frombuffer(pix.samples, dtype=np.uint8).reshape(
+                pix.height, pix.stride
+            )[:, : pix.width]
+            page_hashes.append(perceptual_hash(pixels))
+
     pdf_document.close()
     logger.info(
         f"Completed PDF conversion. Generated {len(encoded_image_list)} encoded images"
     )
-    return encoded_image_list
+    return encoded_image_list, page_hashes
 
 
 # function for adding data
-def add_metadata(initial_data: List[dict], page_no: int, filename: str) -> List[dict]:
+def add_metadata(
+    initial_data: List[dict],
+    page_no: int,
+    filename: str,
+    duplicate_of: Optional[str] = None,
+) -> List[dict]:
     """
     Adds page number, row number, and filename metadata to the recognized signatures
 
@@ -105,6 +130,7 @@ def add_metadata(initial_data: List[dict], page_no: int, filename: str) -> List[
         initial_data (List[dict]): The initial data to add metadata to.
         page_no (int): The page number of the current page.
         filename (str): The name of the file.
+        duplicate_of (str): Label of the page this page is a rescan of, if any.
 
     Returns:
         List[dict]: The final data with metadata.
@@ -116,11 +142,49 @@ def add_metadata(initial_data: List[dict], page_no: int, filename: str) -> List[
         temp_dict["Page Number"] = page_no + 1
         temp_dict["Row Number"] = row + 1
         temp_dict["Filename"] = filename
+        temp_dict["Duplicate Of"] = duplicate_of
         final_data.append(temp_dict)
 
     return final_data
 
 
+def register_pages(
+    page_hashes: List[int],
+    filename: str,
+    page_index: PageHashIndex,
+    page_numbers: Sequence[int] = None,
+) -> List[Tuple[IndexedPage, Optional[str]]]:
+    """
+    Registers the pages of a file in the page index.
+
+    Args:
+        page_hashes (List[int]): The perceptual hashes of the pages, in page order.
+        filename (str): The name of the file.
+        page_index (PageHashIndex): Index of already seen pages.
+        page_numbers (Sequence[int]): The page numbers, counted from 0, of
+            the hashes when only some pages of the file were converted.
+
+    Returns:
+        List[Tuple[IndexedPage, Optional[str]]]: For each page, the indexed page
+            holding its OCR rows and, for duplicates, the label of the first copy.
+    """
+    if page_numbers is None:
+        page_numbers = range(len(page_hashes))
+    pages = []
+    for page_no, page_hash in zip(page_numbers, page_hashes):
+        original = page_index.find(page_hash)
+        if original is None:
+            page = IndexedPage(filename=filename, page_number=page_no + 1)
+            page_index.add(page_hash, page)
+            pages.append((page, None))
+        else:
+            pages.append((original, original.label()))
+
+    duplicates = sum(duplicate_of is not None for _, duplicate_of in pages)
+    logger.info(f"Found {duplicates} duplicate pages out of {len(pages)} in {filename}")
+    return pages
+
+
 async def process_batch_async(encodings: List[str]) -> List[List[dict]]:
     """
     Process a batch of images concurrently
@@ -132,90 +196,329 @@ async def process_batch_async(encodings: List[str]) -> List[List[dict]]:
     return results
 
 
-def get_or_create_event_loop() -> asyncio.AbstractEventLoop:
+class PageResult(NamedTuple):
+    """OCR rows of a single page, with metadata added"""
+
+    page_no: int
+    total_pages: int
+    rows: List[dict]
+
+
+async def iter_ocr_pages_async(
+    filedir: str,
+    filename: str,
+    max_page_num: int = None,
+    max_concurrent_requests: int = 10,
+    semaphore: asyncio.Semaphore = None,
+    page_index: PageHashIndex = None,
+    page_futures: Dict[Tuple[str, int], asyncio.Future] = None,
+    metrics: OcrRunMetrics = None,
+    checkpoint: OcrCheckpoint = None,
+    page_numbers: Sequence[int] = None,
+) -> AsyncIterator[PageResult]:
+    """
+    Reads the pages of a PDF file with OCR, yielding each page as it completes.
+
+    Pages are yielded in completion order, not page order. Closing the
+    iterator or cancelling the task consuming it cancels the OCR requests
+    still in flight.
+
+    Args:
+        filedir (str): The directory of the PDF file.
+        filename (str): The name of the PDF file.
+        max_page_num (int): The maximum number of pages to process.
+        max_concurrent_requests (int): Bound on OCR requests in flight, used
+            when no `semaphore` is given.
+        semaphore (asyncio.Semaphore): Bound on OCR requests in flight, shared
+            by every file read in the same run.
+        page_index (PageHashIndex): Index of already seen pages. Pass the same
+            index for several files to detect duplicates across bundles.
+        page_futures (Dict[Tuple[str, int], asyncio.Future]): OCR results of
+            the pages in `page_index` that are still being read, keyed by
+            filename and page number. Shared along with `page_index`.
+        metrics (OcrRunMetrics): Collects the timings, token usage and cost of
+            every page and enforces the run budget. Defaults to new run
+            metrics with the pricing and budget of the settings.
+        checkpoint (OcrCheckpoint): Stores the rows and status of every page
+            as it completes. When resuming, pages already stored are not
+            sent to OCR again.
+        page_numbers (Sequence[int]): Only read these pages, counted from 0,
+            e.g. a sample. Rows keep the page numbers of the whole file.
+
+    Yields:
+        PageResult: The OCR rows of a page.
+    """
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(max_concurrent_requests)
+    if page_index is None:
+        page_index = PageHashIndex(max_distance=load_config()["DUPLICATE_PAGE_DISTANCE"])
+    if page_futures is None:
+        page_futures = dict()
+    if metrics is None:
+        metrics = OcrRunMetrics.from_settings()
+
+    logger.info(f"Starting OCR collection for {filename}")
+
+    # collecting images without blocking the event loop
+    file_path = os.path.join(filedir, filename)
+    if page_numbers is not None and max_page_num:
+        page_numbers = [n for n in page_numbers if n < max_page_num]
+    encoded_images, page_hashes = await asyncio.to_thread(
+        collecting_pdf_encoded_images_and_hashes, file_path, page_numbers=page_numbers
+    )
+
+    checkpointed_rows = dict()
+    if checkpoint is not None:
+        run_key = await asyncio.to_thread(checkpoint.run_key, file_path)
+        checkpointed_rows = checkpoint.start(run_key)
+
+    # selecting pages
+    if max_page_num and page_numbers is None:
+        encoded_images = encoded_images[:max_page_num]
+        page_hashes = page_hashes[:max_page_num]
+        logger.info(f"Limited processing to {max_page_num} pages")
+    if page_numbers is None:
+        page_numbers = range(len(page_hashes))
+
+    # registering pages, only the first copy of a page is read
+    pages = register_pages(page_hashes, filename, page_index, page_numbers)
+    total_pages = len(pages)
+    metrics.add_expected_pages(
+        sum(
+            duplicate_of is None and page.page_number not in checkpointed_rows
+            for page, duplicate_of in pages
+        )
+    )
+
+    async def read_page(page: IndexedPage, encoding: str) -> List[dict]:
+        if page.page_number in checkpointed_rows:
+            page.ocr_rows = checkpointed_rows[page.page_number]
+            return page.ocr_rows
+
+        page_metrics = PageMetrics(page_id=page_request_id(page.filename, page.page_number))
+        queued = time.perf_counter()
+        try:
+            async with semaphore:
+                page_metrics.queue_wait_s = time.perf_counter() - queued
+                async with metrics.request_slot():
+                    page.ocr_rows = await extract_from_encoding_async(encoding, page_metrics)
+        except OcrBudgetExceededError as e:
+            if metrics.budget_action != "throttle":
+                page_metrics.status = "failed"
+                metrics.record(page_metrics)
+                if checkpoint is not None:
+                    checkpoint.save_page(run_key, page.page_number, "failed", error=str(e))
+                raise
+            logger.warning(f"Skipping {page.label()}: {str(e)}")
+            page_metrics.status = "skipped"
+            page.ocr_rows = []
+        except Exception as e:
+            page_metrics.status = "failed"
+            metrics.record(page_metrics)
+            if checkpoint is not None:
+                checkpoint.save_page(run_key, page.page_number, "failed", error=str(e))
+            raise
+
+        metrics.record(page_metrics)
+        if checkpoint is not None:
+            checkpoint.save_page(run_key, page.page_number, page_metrics.status, page.ocr_rows)
+        return page.ocr_rows
+
+    async def page_result(
+        page_no: int, page: IndexedPage, duplicate_of: str, encoding: str
+    ) -> PageResult:
+        ocr_rows = page.ocr_rows
+        if ocr_rows is None:
+            original = page_futures[(page.filename, page.page_number)]
+            try:
+                # shielded, the first copy may belong to another file's iterator
+                ocr_rows = await asyncio.shield(original)
+            except asyncio.CancelledError:
+                if not original.cancelled() or page.filename == filename:
+                    raise
+                ocr_rows = None
+            except Exception:
+                if page.filename == filename:
+                    raise
+                ocr_rows = None
+            if ocr_rows is None:
+                # the first copy was closed or failed with its own file, this
+                # copy is read in its place and counts as the original
+                logger.warning(f"Reading {filename}, page {page_no + 1} again, {duplicate_of} was not read")
+                metrics.add_expected_pages(1)
+                duplicate_of = None
+                ocr_rows = await read_page(IndexedPage(filename=filename, page_number=page_no + 1), encoding)
+        return PageResult(
+            page_no, total_pages, add_metadata(ocr_rows, page_no, filename, duplicate_of)
+        )
+
+    own_futures = []
+    for encoding, (page, duplicate_of) in zip(encoded_images, pages):
+        if duplicate_of is None:
+            future = asyncio.ensure_future(read_page(page, encoding))
+            page_futures[(page.filename, page.page_number)] = future
+            own_futures.append(future)
+
+    waiters = [
+        asyncio.ensure_future(page_result(page_no, page, duplicate_of, encoding))
+        for page_no, encoding, (page, duplicate_of) in zip(page_numbers, encoded_images, pages)
+    ]
+
     try:
-        return asyncio.get_event_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        return loop
+        for next_result in asyncio.as_completed(waiters):
+            yield await next_result
+    finally:
+        for future in own_futures + waiters:
+            future.cancel()
 
 
-def collect_ocr_data(
+async def collect_ocr_data_async(
     filedir: str,
     filename: str,
     max_page_num: int = None,
     batch_size: int = 10,
     st_bar=None,
+    page_index: PageHashIndex = None,
+    semaphore: asyncio.Semaphore = None,
+    page_futures: Dict[Tuple[str, int], asyncio.Future] = None,
+    on_progress: Callable[[int, int], None] = None,
+    metrics: OcrRunMetrics = None,
+    checkpoint: OcrCheckpoint = None,
+    page_numbers: Sequence[int] = None,
 ) -> List[dict]:
     """
     Collects OCR data from a PDF file.
 
+    Pages that are near-identical to an earlier page (a rescan or a double
+    upload) are not sent to OCR again. They reuse the OCR rows of the first
+    copy and are marked through the "Duplicate Of" field.
+
     Args:
         filedir (str): The directory of the PDF file.
         filename (str): The name of the PDF file.
         max_page_num (int): The maximum number of pages to process.
-        batch_size (int): The number of pages to process in each batch.
+        batch_size (int): The number of pages read concurrently, used when no
+            `semaphore` is given.
         st_bar (st.progress): A progress bar to display the progress of the OCR process.
+        page_index (PageHashIndex): Index of already seen pages. Pass the same
+            index for several files to detect duplicates across bundles.
+        semaphore (asyncio.Semaphore): Bound on OCR requests in flight, shared
+            by every file read in the same run.
+        page_futures (Dict[Tuple[str, int], asyncio.Future]): OCR results of
+            the pages in `page_index` that are still being read.
+        on_progress (Callable[[int, int], None]): Called with the number of
+            pages done and the total number of pages after each page.
+        metrics (OcrRunMetrics): Collects per-page timings, tokens and cost
+            and enforces the run budget.
+        checkpoint (OcrCheckpoint): Stores every page as it completes, so a
+            failed run can be resumed.
+        page_numbers (Sequence[int]): Only read these pages, counted from 0.
 
     Returns:
         list: A list of dictionaries with the OCR data.
     """
-    logger.info(f"Starting OCR collection for {filename}")
     logger.info(f"Parameters - max_page_num: {max_page_num}, batch_size: {batch_size}")
 
-    # collecting images
-    encoded_images = collecting_pdf_encoded_images(os.path.join(filedir, filename))
-
-    # selecting pages
-    if max_page_num:
-        encoded_images = encoded_images[:max_page_num]
-        logger.info(f"Limited processing to {max_page_num} pages")
+    page_rows = dict()
+    async for page_no, total_pages, rows in iter_ocr_pages_async(
+        filedir,
+        filename,
+        max_page_num=max_page_num,
+        max_concurrent_requests=batch_size,
+        semaphore=semaphore,
+        page_index=page_index,
+        page_futures=page_futures,
+        metrics=metrics,
+        checkpoint=checkpoint,
+        page_numbers=page_numbers,
+    ):
+        page_rows[page_no] = rows
 
-    print()
-    print("Files Successfully Converted to Bytes")
-    print("Performing OCR to read Names and Addresses")
+        if st_bar:
+            st_bar.progress(
+                len(page_rows) / total_pages,
+                text="Processed {} of {} pages".format(len(page_rows), total_pages),
+            )
+        if on_progress:
+            on_progress(len(page_rows), total_pages)
 
     full_data = []
-    total_pages = len(encoded_images)
+    for page_no in sorted(page_rows):
+        full_data.extend(page_rows[page_no])
 
-    # getting event loop
-    loop = get_or_create_event_loop()
+    logger.info(f"OCR collection for {filename} complete. Total entries: {len(full_data)}")
+    return full_data
 
-    # Process in batches
-    logger.info(f"Processing {total_pages} pages in batches of {batch_size}")
-    for i in tqdm(range(0, total_pages, batch_size)):
-        batch = encoded_images[i : i + batch_size]
-        logger.info(
-            f"Processing batch {i//batch_size + 1} of {(total_pages + batch_size - 1)//batch_size}"
-        )
 
-        if st_bar:
-            st_bar.progress(
-                i / total_pages,
-                text="Processing pages {} to {} (of {})".format(
-                    i + 1, i + batch_size, total_pages
-                ),
-            )
+def collect_ocr_data(
+    filedir: str,
+    filename: str,
+    max_page_num: int = None,
+    batch_size: int = 10,
+    st_bar=None,
+    page_index: PageHashIndex = None,
+    checkpoint: OcrCheckpoint = None,
+) -> List[dict]:
+    """
+    Collects OCR data from a PDF file.
 
-        # Run async batch processing using the event loop
-        batch_results = loop.run_until_complete(process_batch_async(batch))
+    Synchronous wrapper of `collect_ocr_data_async`, see there for details.
 
-        # Add metadata for each result in the batch
-        for page_idx, result in enumerate(batch_results):
-            current_page = i + page_idx
-            ocr_data = add_metadata(result, current_page, filename)
-            full_data.extend(ocr_data)
+    Args:
+        filedir (str): The directory of the PDF file.
+        filename (str): The name of the PDF file.
+        max_page_num (int): The maximum number of pages to process.
+        batch_size (int): The number of pages read concurrently.
+        st_bar (st.progress): A progress bar to display the progress of the OCR process.
+        page_index (PageHashIndex): Index of already seen pages.
+        checkpoint (OcrCheckpoint): Stores every page as it completes, so a
+            failed run can be resumed.
 
-        logger.info(
-            f"Batch {i//batch_size + 1} complete. Processed {len(batch_results)} pages"
+    Returns:
+        list: A list of dictionaries with the OCR data.
+    """
+    return run_sync(
+        collect_ocr_data_async(
+            filedir,
+            filename,
+            max_page_num=max_page_num,
+            batch_size=batch_size,
+            st_bar=st_bar,
+            page_index=page_index,
+            checkpoint=checkpoint,
         )
+    )
 
-    logger.info(f"OCR collection complete. Total entries: {len(full_data)}")
-    return full_data
 
+def ocr_data_to_df(ocr_data: List[dict]) -> pd.DataFrame:
+    """
+    Converts collected OCR data to the dataframe consumed by the matcher.
+
+    Args:
+        ocr_data (List[dict]): The OCR data with metadata.
 
-def create_ocr_df(
+    Returns:
+        pd.DataFrame: A dataframe with the OCR data.
+    """
+    # convert dataframe, keeping the expected columns when nothing was read
+    ocr_df = pd.DataFrame(data=ocr_data)
+    if ocr_df.empty:
+        ocr_df = pd.DataFrame(columns=OCR_DATA_COLUMNS)
+    logger.info(f"Created DataFrame with shape: {ocr_df.shape}")
+
+    # renaming columns
+    ocr_df.rename(
+        columns={"Name": "OCR Name", "Address": "OCR Address", "Ward": "OCR Ward"},
+        inplace=True,
+    )
+
+    # converting all caps names to title format
+    ocr_df["OCR Name"] = ocr_df["OCR Name"].apply(lambda row: row.title())
+
+    return ocr_df
+
+
+async def create_ocr_df_async(
     filedir: str,
     filename: str,
     max_page_num: int = None,
@@ -229,7 +532,7 @@ def create_ocr_df(
         filedir (str): The directory of the PDF file.
         filename (str): The name of the PDF file.
         max_page_num (int): The maximum number of pages to process.
-        batch_size (int): The number of pages to process in each batch.
+        batch_size (int): The number of pages read concurrently.
         st_bar (st.progress): A progress bar to display the progress of the OCR process.
 
     Returns:
@@ -238,7 +541,7 @@ def create_ocr_df(
     logger.info("Starting OCR DataFrame creation")
 
     # gathering ocr_data
-    ocr_data = collect_ocr_data(
+    ocr_data = await collect_ocr_data_async(
         filedir,
         filename,
         max_page_num=max_page_num,
@@ -246,18 +549,159 @@ def create_ocr_df(
         st_bar=st_bar,
     )
 
-    # convert dataframe
-    ocr_df = pd.DataFrame(data=ocr_data)
-    logger.info(f"Created DataFrame with shape: {ocr_df.shape}")
+    ocr_df = ocr_data_to_df(ocr_data)
 
-    # renaming columns
-    ocr_df.rename(
-        columns={"Name": "OCR Name", "Address": "OCR Address", "Ward": "OCR Ward"},
-        inplace=True,
+    logger.info("OCR DataFrame creation complete")
+    return ocr_df
+
+
+def create_ocr_df(
+    filedir: str,
+    filename: str,
+    max_page_num: int = None,
+    batch_size: int = 10,
+    st_bar=None,
+) -> pd.DataFrame:
+    """
+    Creates a dataframe from OCR data.
+
+    Synchronous wrapper of `create_ocr_df_async`, kept for Streamlit.
+
+    Args:
+        filedir (str): The directory of the PDF file.
+        filename (str): The name of the PDF file.
+        max_page_num (int): The maximum number of pages to process.
+        batch_size (int): The number of pages read concurrently.
+        st_bar (st.progress): A progress bar to display the progress of the OCR process.
+
+    Returns:
+        pd.DataFrame: A dataframe with the OCR data.
+    """
+    return run_sync(
+        create_ocr_df_async(
+            filedir,
+            filename,
+            max_page_num=max_page_num,
+            batch_size=batch_size,
+            st_bar=st_bar,
+        )
     )
 
-    # converting all caps names to title format
-    ocr_df["OCR Name"] = ocr_df["OCR Name"].apply(lambda row: row.title())
 
-    logger.info("OCR DataFrame creation complete")
-    return ocr_df
+###
+## BATCH SUBMISSION
+###
+
+
+def batch_manifest_path(requests_path: str) -> str:
+    """Returns the path of the page manifest written next to a batch request file."""
+    return requests_path + ".manifest.json"
+
+
+def create_ocr_batch_file(
+    filedir: str,
+    filenames: List[str],
+    requests_path: str,
+    max_page_num: int = None,
+) -> int:
+    """
+    Writes the OCR requests of every page of the files to a JSONL batch file.
+
+    Duplicate pages are not written; the manifest saved next to the batch
+    file records every page and, for duplicates, the page they repeat.
+
+    Args:
+        filedir (str): The directory of the PDF files.
+        filenames (List[str]): The names of the PDF files.
+        requests_path (str): The path of the batch request file to write.
+        max_page_num (int): The maximum number of pages to process per file.
+
+    Returns:
+        int: The number of requests written.
+    """
+    page_index = PageHashIndex(max_distance=load_config()["DUPLICATE_PAGE_DISTANCE"])
+    manifest = []
+
+    def page_requests():
+        for filename in filenames:
+            encoded_images, page_hashes = collecting_pdf_encoded_images_and_hashes(
+                os.path.join(filedir, filename)
+            )
+            if max_page_num:
+                encoded_images = encoded_images[:max_page_num]
+                page_hashes = page_hashes[:max_page_num]
+
+            pages = register_pages(page_hashes, filename, page_index)
+            for page_no, (page, duplicate_of) in enumerate(pages):
+                request_id = page_request_id(page.filename, page.page_number)
+                manifest.append(
+                    {
+                        "request_id": request_id,
+                        "filename": filename,
+                        "page_number": page_no + 1,
+                        "duplicate_of": duplicate_of,
+                    }
+                )
+                if duplicate_of is None:
+                    yield request_id, encoded_images[page_no]
+
+    count = write_batch_requests(page_requests(), requests_path)
+
+    with open(batch_manifest_path(requests_path), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    logger.info(f"Batch file for {len(manifest)} pages written to {requests_path}")
+    return count
+
+
+def create_ocr_df_from_batch(
+    requests_path: str, results_path: str, allow_missing: bool = False
+) -> pd.DataFrame:
+    """
+    Creates the OCR dataframe from a batch result file.
+
+    Results are joined back to their pages by request ID, so the dataframe
+    is the same as the one `create_ocr_df` returns and can be passed on to
+    matching.
+
+    Args:
+        requests_path (str): The path of the batch request file.
+        results_path (str): The path of the batch result file.
+        allow_missing (bool): Skip pages without a successful result instead
+            of raising.
+
+    Returns:
+        pd.DataFrame: A dataframe with the OCR data.
+
+    Raises:
+        ValueError: If pages are missing from the results and `allow_missing` is not set.
+    """
+    with open(batch_manifest_path(requests_path), "r") as f:
+        manifest = json.load(f)
+
+    schemas = {
+        request_id: schema for request_id, _, schema in read_batch_requests(requests_path)
+    }
+    results, errors = read_batch_results(results_path, schemas)
+
+    missing = sorted({entry["request_id"] for entry in manifest} - results.keys())
+    if missing:
+        logger.warning(f"{len(missing)} pages have no batch result, e.g. {missing[:5]}")
+        if not allow_missing:
+            raise ValueError(
+                f"{len(missing)} pages have no batch result ({len(errors)} failed requests). "
+                "Resubmit them or set allow_missing to skip them."
+            )
+
+    ocr_data = []
+    for entry in manifest:
+        rows = results.get(entry["request_id"])
+        if rows is None:
+            continue
+        ocr_data.extend(
+            add_metadata(
+                rows, entry["page_number"] - 1, entry["filename"], entry["duplicate_of"]
+            )
+        )
+
+    return ocr_data_to_df(ocr_data)
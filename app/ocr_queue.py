@@ -0,0 +1,209 @@
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+import asyncio
+import logging
+
+import pandas as pd
+
+from dedup import PageHashIndex
+from ocr import OcrRunMetrics
+from settings import load_config
+from store import OcrCheckpoint
+from utils import run_sync
+from ocr_helper import collect_ocr_data_async, ocr_data_to_df
+
+logger = logging.getLogger("ocr_processing")
+
+
+@dataclass
+class FileJob:
+    """Progress and results of the OCR of a single PDF file"""
+
+    filename: str
+    status: str = "queued"  # one of queued, running, done, failed
+    pages_done: int = 0
+    total_pages: int = 0
+    ocr_data: List[dict] = field(default_factory=list)
+    error: Optional[str] = None
+    # the pages to read, counted from 0, None reading every page
+    page_numbers: Optional[List[int]] = None
+
+    @property
+    def progress(self) -> float:
+        if self.status == "done":
+            return 1.0
+        if not self.total_pages:
+            return 0.0
+        return self.pages_done / self.total_pages
+
+
+class OcrJobQueue:
+    """
+    Queue of PDF files to read with OCR.
+
+    Files are picked up by `max_concurrent_files` workers, while a single
+    semaphore bounds the OCR requests in flight across all files, so adding
+    files never raises the load on the OCR provider. Duplicate pages are
+    detected across every file in the queue.
+
+    Example:
+        queue = OcrJobQueue("temp")
+        queue.add("bundle_1.pdf")
+        queue.add("bundle_2.pdf")
+        jobs = queue.run()
+        ocr_df = queue.results_df()
+    """
+
+    def __init__(
+        self,
+        filedir: str,
+        max_concurrent_requests: int = None,
+        max_concurrent_files: int = None,
+        max_page_num: int = None,
+        on_progress: Callable[[FileJob], None] = None,
+        metrics: OcrRunMetrics = None,
+        checkpoint: OcrCheckpoint = None,
+        page_index: PageHashIndex = None,
+    ):
+        """
+        Args:
+            filedir (str): The directory of the PDF files.
+            max_concurrent_requests (int): Global bound on OCR requests in flight.
+                Defaults to MAX_CONCURRENT_OCR_REQUESTS of config.json.
+            max_concurrent_files (int): The number of files processed at once.
+                Defaults to MAX_CONCURRENT_FILES of config.json.
+            max_page_num (int): The maximum number of pages to process per file.
+            on_progress (Callable[[FileJob], None]): Called with the job of a file
+                whenever its status or page count changes.
+            metrics (OcrRunMetrics): Collects the timings, token usage and cost
+                of every page and enforces the run budget across all files.
+                Defaults to the pricing and budget of the settings.
+            checkpoint (OcrCheckpoint): Stores every page as it completes, so
+                an interrupted run can be resumed.
+            page_index (PageHashIndex): Index of already seen pages. Pass the
+                index of an earlier queue so the pages it read are not read
+                again. Each run starts a new one by default.
+        """
+        self.filedir = filedir
+        config = load_config()
+        self.max_concurrent_requests = max_concurrent_requests or config["MAX_CONCURRENT_OCR_REQUESTS"]
+        self.max_concurrent_files = max_concurrent_files or config["MAX_CONCURRENT_FILES"]
+        self.max_page_num = max_page_num
+        self.on_progress = on_progress
+        self.metrics = metrics
+        self.checkpoint = checkpoint
+        self.page_index = page_index
+        self.jobs: Dict[str, FileJob] = {}
+
+    def add(self, filename: str, page_numbers: List[int] = None) -> FileJob:
+        """
+        Adds a file to the queue.
+
+        Args:
+            filename (str): The name of the PDF file within `filedir`.
+            page_numbers (List[int]): Only read these pages, counted from 0.
+
+        Returns:
+            FileJob: The job tracking the file.
+        """
+        if filename in self.jobs:
+            raise ValueError(f"File {filename} is already queued")
+
+        job = FileJob(filename=filename, page_numbers=page_numbers)
+        self.jobs[filename] = job
+        return job
+
+    def _notify(self, job: FileJob) -> None:
+        if self.on_progress:
+            self.on_progress(job)
+
+    async def _process(
+        self,
+        job: FileJob,
+        semaphore: asyncio.Semaphore,
+        page_index: PageHashIndex,
+        page_futures: dict,
+    ) -> None:
+        def update_pages(pages_done: int, total_pages: int) -> None:
+            job.pages_done = pages_done
+            job.total_pages = total_pages
+            self._notify(job)
+
+        job.status = "running"
+        self._notify(job)
+        try:
+            job.ocr_data = await collect_ocr_data_async(
+                self.filedir,
+                job.filename,
+                max_page_num=self.max_page_num,
+                page_index=page_index,
+                semaphore=semaphore,
+                page_futures=page_futures,
+                on_progress=update_pages,
+                metrics=self.metrics,
+                checkpoint=self.checkpoint,
+                page_numbers=job.page_numbers,
+            )
+            job.status = "done"
+        except (Exception, asyncio.CancelledError) as e:
+            # a cancelled page fails its file, unless the run itself is cancelled
+            if isinstance(e, asyncio.CancelledError) and asyncio.current_task().cancelling():
+                raise
+            logger.error(f"OCR of {job.filename} failed: {str(e) or type(e).__name__}")
+            job.status = "failed"
+            job.error = str(e) or type(e).__name__
+        self._notify(job)
+
+    async def run_async(self) -> Dict[str, FileJob]:
+        """
+        Processes every queued file.
+
+        A failing file is marked as failed without stopping the other files.
+
+        Returns:
+            Dict[str, FileJob]: The jobs keyed by filename.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        for job in self.jobs.values():
+            if job.status == "queued":
+                queue.put_nowait(job)
+
+        logger.info(
+            f"Processing {queue.qsize()} files with {self.max_concurrent_files} workers "
+            f"and at most {self.max_concurrent_requests} OCR requests in flight"
+        )
+
+        if self.metrics is None:
+            self.metrics = OcrRunMetrics.from_settings()
+
+        semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        page_index = self.page_index or PageHashIndex(max_distance=load_config()["DUPLICATE_PAGE_DISTANCE"])
+        page_futures = dict()
+
+        async def worker() -> None:
+            while not queue.empty():
+                job = queue.get_nowait()
+                await self._process(job, semaphore, page_index, page_futures)
+
+        await asyncio.gather(*(worker() for _ in range(self.max_concurrent_files)))
+        return self.jobs
+
+    def run(self) -> Dict[str, FileJob]:
+        """Synchronous wrapper of `run_async`."""
+        return run_sync(self.run_async())
+
+    def results_df(self) -> pd.DataFrame:
+        """
+        Merges the OCR results of all completed files.
+
+        Rows are kept in the order the files were added and are told apart
+        by their "Filename" column.
+
+        Returns:
+            pd.DataFrame: A dataframe with the OCR data of every completed file.
+        """
+        ocr_data = []
+        for job in self.jobs.values():
+            if job.status == "done":
+                ocr_data.extend(job.ocr_data)
+        return ocr_data_to_df(ocr_data)
@@ -0,0 +1,411 @@
+from statistics import NormalDist
+from typing import Dict, List, NamedTuple
+import argparse
+import json
+import math
+import os
+import time
+
+import fitz
+import numpy as np
+import pandas as pd
+
+from dedup import PageHashIndex
+from fuzzy_match_helper import MATCHED_COLUMNS, create_ocr_matched_df, create_select_voter_records
+from ocr import OcrRunMetrics
+from ocr_queue import OcrJobQueue
+from settings import load_config
+from utils import get_pipeline_logger
+
+logger = get_pipeline_logger("page_sampling")
+
+SAMPLE_RESULTS_FILENAME = "sample_results.csv"
+SAMPLE_SUMMARY_FILENAME = "sampling_summary.json"
+
+
+def petition_pages(pdf_dir: str, filenames: List[str], pages_per_stratum: int = 20) -> pd.DataFrame:
+    """
+    Lists every page of the petition files, with its stratum.
+
+    Pages are numbered as `ocr_helper.add_metadata` numbers them, from 1
+    within each file. A stratum is a run of `pages_per_stratum` consecutive
+    pages of one file, so the sample covers every bundle, and every part of
+    a long bundle, in proportion to its pages.
+
+    Args:
+        pdf_dir (str): The directory of the PDF files.
+        filenames (List[str]): The PDF files.
+        pages_per_stratum (int): The number of pages of a stratum.
+
+    Returns:
+        pd.DataFrame: The "Filename", "Page Number" and "Stratum" of every page.
+    """
+    parts = []
+    for filename in filenames:
+        with fitz.open(os.path.join(pdf_dir, filename)) as pdf_document:
+            page_count = pdf_document.page_count
+        parts.append(pd.DataFrame({"Filename": filename, "Page Number": np.arange(1, page_count + 1)}))
+    pages = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=["Filename", "Page Number"])
+    blocks = pages["Filename"] + "|" + ((pages["Page Number"] - 1) // pages_per_stratum).astype(str)
+    pages["Stratum"] = pd.factorize(blocks)[0]
+    return pages
+
+
+class ValidCountEstimate(NamedTuple):
+    """The estimated number of valid signatures of all pages, from a sample"""
+
+    estimate: float
+    lower: float
+    upper: float
+    # the confidence of the interval from `lower` to `upper`
+    confidence: float
+    pages_read: int
+    total_pages: int
+    # valid signatures on the pages read, a floor of the total
+    valid_read: int
+
+    def decision(self, target: float) -> str:
+        """Whether the interval "cleared" or "missed" the target, else "undecided"."""
+        if self.lower >= target:
+            return "cleared"
+        if self.upper < target:
+            return "missed"
+        return "undecided"
+
+
+def estimate_valid_count(pages: pd.DataFrame, page_valid: pd.Series, confidence: float = 0.95) -> ValidCountEstimate:
+    """
+    Estimates the valid signatures of all pages from those of sampled pages.
+
+    The stratified estimator of a total: every stratum contributes its page
+    count times its mean valid signatures per sampled page, with a variance
+    corrected for the share of the stratum already read. Pages are large
+    clusters of rows, so the normal interval holds with tens of pages.
+
+    Args:
+        pages (pd.DataFrame): Every page with its stratum, see `petition_pages`.
+        page_valid (pd.Series): The valid signatures of each page read,
+            indexed by "Filename" and "Page Number".
+        confidence (float): The confidence of the interval.
+
+    Returns:
+        ValidCountEstimate: The estimate and its interval.
+    """
+    counts = pages.set_index(["Filename", "Page Number"])["Stratum"]
+    read = pd.DataFrame({"Stratum": counts.loc[page_valid.index].to_numpy(), "Valid": page_valid.to_numpy()})
+    strata = read.groupby("Stratum")["Valid"].agg(["mean", "var", "count"])
+    # strata not read yet leave the estimate unknown
+    if len(strata) < counts.nunique():
+        return ValidCountEstimate(np.nan, float(page_valid.sum()), np.inf, confidence, len(page_valid),
+                                  len(pages), int(page_valid.sum()))
+    sizes = counts.value_counts().reindex(strata.index).to_numpy()
+
+    estimate = float((sizes * strata["mean"]).sum())
+    variances = strata["var"].fillna(0).to_numpy() / strata["count"].to_numpy()
+    variance = float((sizes ** 2 * (1 - strata["count"].to_numpy() / sizes) * variances).sum())
+    margin = NormalDist().inv_cdf(1 - (1 - confidence) / 2) * math.sqrt(variance)
+    return ValidCountEstimate(
+        estimate=estimate,
+        lower=max(estimate - margin, float(page_valid.sum())),
+        upper=estimate + margin,
+        confidence=confidence,
+        pages_read=len(page_valid),
+        total_pages=len(pages),
+        valid_read=int(page_valid.sum()),
+    )
+
+
+class SequentialPageSample:
+    """
+    A stratified random sample of pages, grown until it settles a target.
+
+    Every stratum gets its pages in a random order once, and the sample
+    grows by exactly `step_pages` at a time, allocated to the strata in
+    proportion to their pages by largest remainder, at least two each so
+    every stratum has a variance.
+
+    The interval is looked at after every step, so stopping at the first
+    look that clears or misses the target would be wrong more often than
+    the confidence says. Each look therefore uses an error rate of
+    (1 - confidence) divided by the number of looks the sample could take
+    at most, which keeps the chance of any wrong decision within 1 - confidence.
+
+    Example:
+        sample = SequentialPageSample(pages, target=10_000)
+        while sample.decision() == "undecided":
+            to_read = sample.draw()
+            sample.record(to_read, matched_df)
+    """
+
+    def __init__(self, pages: pd.DataFrame, target: float, confidence: float = 0.95,
+                 initial_pages: int = None, step_pages: int = 25, seed: int = None):
+        """
+        Args:
+            pages (pd.DataFrame): Every page with its stratum, see `petition_pages`.
+            target (float): The number of valid signatures required.
+            confidence (float): The chance that the decision is right.
+            initial_pages (int): The pages of the first draw. Defaults to
+                `step_pages`, or two per stratum when more.
+            step_pages (int): The pages added at every later draw.
+            seed (int): Seeds the page order.
+
+        Raises:
+            ValueError: If `step_pages` or `initial_pages` is not positive.
+        """
+        if step_pages <= 0:
+            raise ValueError(f"step_pages must be positive, got {step_pages}")
+        if initial_pages is not None and initial_pages <= 0:
+            raise ValueError(f"initial_pages must be positive, got {initial_pages}")
+        self.pages = pages
+        self.target = target
+        self.confidence = confidence
+        self.step_pages = step_pages
+        self.initial_pages = initial_pages or step_pages
+
+        rng = np.random.default_rng(seed)
+        self._orders = {
+            stratum: group.index.to_numpy()[rng.permutation(len(group))]
+            for stratum, group in pages.groupby("Stratum")
+        }
+        self._sizes = np.array([len(order) for order in self._orders.values()], dtype=np.int64)
+        self._drawn = np.zeros(len(self._orders), dtype=np.int64)
+        self.page_valid = pd.Series(
+            dtype=np.int64, index=pd.MultiIndex.from_arrays([[], []], names=["Filename", "Page Number"])
+        )
+
+        # the sample holds `first` pages after the first draw, and `step_pages` more after every other
+        self._first = min(max(self.initial_pages, int(np.minimum(2, self._sizes).sum())), len(pages))
+        self.max_looks = 1 + max(math.ceil((len(pages) - self._first) / step_pages), 0)
+        self.look_confidence = 1 - (1 - confidence) / self.max_looks
+
+    def _allocate(self, size: int) -> np.ndarray:
+        """Gives the pages drawn from every stratum in a sample of `size` pages."""
+        lower = np.maximum(self._drawn, np.minimum(2, self._sizes))
+        extra = size - int(lower.sum())
+        # the pages left over the minimums, in proportion to the strata behind their share
+        shares = np.clip(size * self._sizes / len(self.pages) - lower, 0, self._sizes - lower)
+        if shares.sum() > extra:
+            shares *= extra / shares.sum()
+        allocation = lower + np.floor(shares).astype(np.int64)
+        left = size - int(allocation.sum())
+        # the pages still left go to the largest remainders, then to the strata with pages left
+        order = np.argsort(-(shares - np.floor(shares)), kind="stable")
+        while left > 0:
+            for stratum in order:
+                if left and allocation[stratum] < self._sizes[stratum]:
+                    allocation[stratum] += 1
+                    left -= 1
+        return allocation
+
+    def draw(self) -> pd.DataFrame:
+        """
+        Grows the sample by the next step.
+
+        Returns:
+            pd.DataFrame: The pages to read, with their "Filename" and
+                "Page Number", none once every page was drawn.
+        """
+        drawn = int(self._drawn.sum())
+        size = min(drawn + self.step_pages if drawn else self._first, len(self.pages))
+        allocation = self._allocate(size)
+        new = [order[start:stop] for order, start, stop in zip(self._orders.values(), self._drawn, allocation)]
+        self._drawn = allocation
+        new = np.concatenate(new) if new else np.empty(0, dtype=np.int64)
+        return self.pages.loc[np.sort(new), ["Filename", "Page Number"]]
+
+    def record(self, pages_read: pd.DataFrame, matched_df: pd.DataFrame) -> None:
+        """
+        Adds the valid signatures of pages read. Pages without rows count
+        none, and so do copies of pages read elsewhere in the petitions,
+        whose signatures count on the first copy.
+
+        Args:
+            pages_read (pd.DataFrame): The pages read, from `draw`.
+            matched_df (pd.DataFrame): Their matched rows, numbered by
+                `ocr_helper.add_metadata`.
+        """
+        index = pd.MultiIndex.from_frame(pages_read[["Filename", "Page Number"]])
+        if len(matched_df) and "Duplicate Of" in matched_df:
+            matched_df = matched_df[matched_df["Duplicate Of"].isna()]
+        valid = matched_df.groupby(["Filename", "Page Number"])["Valid"].sum() if len(matched_df) else None
+        counts = (valid.reindex(index, fill_value=0) if valid is not None else pd.Series(0, index=index)).astype(np.int64)
+        self.page_valid = pd.concat([self.page_valid, counts])
+
+    def estimate(self) -> ValidCountEstimate:
+        """The estimate at the confidence of a single look."""
+        if len(self.page_valid) == len(self.pages):
+            # every page was read, the count is exact
+            total = float(self.page_valid.sum())
+            return ValidCountEstimate(total, total, total, 1.0, len(self.pages), len(self.pages), int(total))
+        return estimate_valid_count(self.pages, self.page_valid, self.look_confidence)
+
+    def decision(self) -> str:
+        """Whether the sample "cleared" or "missed" the target, or is still "undecided"."""
+        if not len(self.page_valid):
+            return "undecided"
+        return self.estimate().decision(self.target)
+
+
+def run_sampling(
+    pdf_dir: str,
+    registry_path: str,
+    target: float,
+    output_dir: str,
+    confidence: float = 0.95,
+    initial_pages: int = None,
+    step_pages: int = 25,
+    pages_per_stratum: int = 20,
+    threshold: float = None,
+    max_concurrent_requests: int = None,
+    max_concurrent_files: int = None,
+    matching_workers: int = None,
+    seed: int = None,
+) -> ValidCountEstimate:
+    """
+    Estimates whether the petition PDFs in a directory hold `target` valid
+    signatures, reading and matching a growing sample of their pages.
+
+    Pages are drawn, read and matched a step at a time until the interval
+    of the estimate clears or misses the target, or every page was read.
+    The rows read are written to `output_dir` along with a summary of the
+    estimate after every step.
+
+    Args:
+        pdf_dir (str): The directory of the PDF files.
+        registry_path (str): The voter records CSV file.
+        target (float): The number of valid signatures required.
+        output_dir (str): The directory results are written to.
+        confidence (float): The chance that the decision is right.
+        initial_pages (int): The pages of the first draw.
+        step_pages (int): The pages added at every later draw.
+        pages_per_stratum (int): The number of consecutive pages of a file
+            forming a stratum.
+        threshold (float): The threshold for matching. Defaults to
+            BASE_THRESHOLD of config.json.
+        max_concurrent_requests (int): Global bound on OCR requests in flight.
+        max_concurrent_files (int): The number of files read at once.
+        matching_workers (int): The number of threads matching rows.
+        seed (int): Seeds the sample.
+
+    Returns:
+        ValidCountEstimate: The estimate the sampling stopped at.
+    """
+    if threshold is None:
+        threshold = load_config()["BASE_THRESHOLD"]
+    os.makedirs(output_dir, exist_ok=True)
+    filenames = sorted(f for f in os.listdir(pdf_dir) if f.lower().endswith(".pdf"))
+    pages = petition_pages(pdf_dir, filenames, pages_per_stratum)
+    sample = SequentialPageSample(pages, target, confidence=confidence, initial_pages=initial_pages,
+                                  step_pages=step_pages, seed=seed)
+    print(f"Sampling {len(pages)} pages of {len(filenames)} files in {pages['Stratum'].nunique()} strata, "
+          f"target {target:,.0f} valid signatures at {confidence:.0%} confidence")
+
+    print(f"Loading voter records from {registry_path}")
+    select_voter_records = create_select_voter_records(pd.read_csv(registry_path, dtype=str))
+
+    started = time.perf_counter()
+    metrics = OcrRunMetrics.from_settings()
+    # pages read at earlier looks are recognised as copies at later ones
+    page_index = PageHashIndex(max_distance=load_config()["DUPLICATE_PAGE_DISTANCE"])
+    matched_parts: List[pd.DataFrame] = []
+    history: List[Dict] = []
+    while True:
+        to_read = sample.draw()
+        if not len(to_read):
+            break
+        queue = OcrJobQueue(pdf_dir, max_concurrent_requests=max_concurrent_requests,
+                            max_concurrent_files=max_concurrent_files, metrics=metrics, page_index=page_index)
+        for filename, group in to_read.groupby("Filename"):
+            queue.add(filename, page_numbers=(group["Page Number"] - 1).tolist())
+        for job in queue.run().values():
+            if job.status == "failed":
+                raise RuntimeError(f"OCR of {job.filename} failed: {job.error}")
+
+        ocr_df = queue.results_df()
+        matched_df = (
+            create_ocr_matched_df(ocr_df, select_voter_records, threshold=threshold, max_workers=matching_workers)
+            if len(ocr_df) else pd.DataFrame(columns=MATCHED_COLUMNS)
+        )
+        matched_parts.append(matched_df)
+        sample.record(to_read, matched_df)
+
+        estimate = sample.estimate()
+        decision = estimate.decision(target)
+        history.append({**estimate._asdict(), "decision": decision})
+        print(f"[sample] {estimate.pages_read}/{estimate.total_pages} pages, {estimate.valid_read} valid read, "
+              f"estimate {estimate.estimate:,.0f} ({estimate.lower:,.0f} to {estimate.upper:,.0f}): {decision}",
+              flush=True)
+        if decision != "undecided":
+            break
+
+    results_df = pd.concat(matched_parts, ignore_index=True) if matched_parts else pd.DataFrame(columns=MATCHED_COLUMNS)
+    results_df.sort_values(["Filename", "Page Number", "Row Number"]).to_csv(
+        os.path.join(output_dir, SAMPLE_RESULTS_FILENAME), index=False
+    )
+    estimate = sample.estimate()
+    summary = {
+        "target": target,
+        "confidence": confidence,
+        "decision": estimate.decision(target),
+        "estimate": estimate._asdict(),
+        "max_looks": sample.max_looks,
+        "looks": history,
+        "elapsed_s": time.perf_counter() - started,
+        "ocr": metrics.summary(),
+    }
+    with open(os.path.join(output_dir, SAMPLE_SUMMARY_FILENAME), "w") as f:
+        json.dump(summary, f, indent=2, default=float)
+    logger.info(f"Sampling stopped after {len(history)} looks: {summary['decision']}")
+    return estimate
+
+
+def cli(argv: List[str] = None) -> int:
+    """Command line entry point of the sampling validation."""
+    config = load_config()
+    parser = argparse.ArgumentParser(
+        prog="main.py sample",
+        description="Estimate whether petition PDFs hold a required count of valid signatures from a sample of pages.",
+    )
+    parser.add_argument("pdf_dir", help="directory of petition PDF files")
+    parser.add_argument("registry", help="voter records CSV file")
+    parser.add_argument("target", type=float, help="number of valid signatures required")
+    parser.add_argument("-o", "--output-dir", default="results", help="directory for the results")
+    parser.add_argument("--confidence", type=float, default=0.95, help="chance that the decision is right")
+    parser.add_argument("--initial-pages", type=int, default=None, help="pages of the first draw")
+    parser.add_argument("--step-pages", type=int, default=25, help="pages added at every later draw")
+    parser.add_argument("--pages-per-stratum", type=int, default=20, help="consecutive pages of a file per stratum")
+    parser.add_argument("--threshold", type=float, default=config["BASE_THRESHOLD"])
+    parser.add_argument(
+        "--ocr-concurrency",
+        type=int,
+        default=config["MAX_CONCURRENT_OCR_REQUESTS"],
+        help="OCR requests in flight across all files",
+    )
+    parser.add_argument("--matching-workers", type=int, default=None, help="threads matching rows")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the sample")
+    args = parser.parse_args(argv)
+    if args.step_pages <= 0:
+        parser.error("--step-pages must be positive")
+    if args.initial_pages is not None and args.initial_pages <= 0:
+        parser.error("--initial-pages must be positive")
+
+    estimate = run_sampling(
+        args.pdf_dir,
+        args.registry,
+        args.target,
+        args.output_dir,
+        confidence=args.confidence,
+        initial_pages=args.initial_pages,
+        step_pages=args.step_pages,
+        pages_per_stratum=args.pages_per_stratum,
+        threshold=args.threshold,
+        max_concurrent_requests=args.ocr_concurrency,
+        matching_workers=args.matching_workers,
+        seed=args.seed,
+    )
+    print(
+        f"{estimate.decision(args.target).capitalize()}: an estimated {estimate.estimate:,.0f} valid signatures "
+        f"({estimate.lower:,.0f} to {estimate.upper:,.0f}) from {estimate.pages_read} of {estimate.total_pages} "
+        f"pages, results in {args.output_dir}"
+    )
+    return 0
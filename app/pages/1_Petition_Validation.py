@@ -1,17 +1,18 @@
 import streamlit as st
-import pandas as pd
 import os
-import glob
 from loguru import logger
 import time
+import uuid
 from dotenv import load_dotenv
 import streamlit_shadcn_ui as ui
-import json
 import fitz  # PyMuPDF
 from PIL import Image
 
-from ocr_helper import create_ocr_df
-from fuzzy_match_helper import create_select_voter_records, create_ocr_matched_df
+from job_manager import JobManager, ValidationJob, validate_petitions_async
+from match_candidates import COMBINATION_RULES, MatchCandidates
+from settings import load_config
+from sessions import RegistryCache, SessionWorkspace, load_registry, registry_digest
+from store import EXPORT_FORMATS, RESULT_COLUMNS, FrameResults, ReevaluatedResults, ResultsFilter, ResultsStore, StoreResults, write_export
 
 
 # setting up logger for benchmarking, comment in to write logs to data/logs/benchmark_logs.log
@@ -21,37 +22,113 @@ logger.remove()
 # loading environmental variables
 load_dotenv('.env', override=True)
 
-# name of uploaded pdf file
-UPLOADED_FILENAME = "ballot.pdf"
-
 # name of repo
 repo_name = 'Ballot-Initiative'
 REPODIR = os.getcwd().split(repo_name)[0] + repo_name
 
 # load config
-with open('config.json', 'r') as f:
-    config = json.load(f)
+config = load_config()
+
+
+##
+# BACKGROUND JOBS
+##
 
+@st.cache_resource
+def get_job_manager() -> JobManager:
+    """Shares one job manager, and so its jobs, across all sessions"""
+    return JobManager()
+
+@st.cache_resource
+def get_results_store() -> ResultsStore:
+    """Shares one connection to the results database across all sessions"""
+    return ResultsStore(config['RESULTS_DB'])
+
+@st.cache_resource
+def get_registry_cache() -> RegistryCache:
+    """Shares one copy of each voter registry across all sessions"""
+    return RegistryCache(max_bytes=config['REGISTRY_CACHE_MB'] * 2**20)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def cleanup_stale_workspaces(root: str) -> list:
+    """Removes the files of sessions that are gone, at most once an hour"""
+    return SessionWorkspace.cleanup_stale(
+        root, config['WORKSPACE_IDLE_HOURS'] * 3600, keep=job_manager.active_owners()
+    )
+
+job_manager = get_job_manager()
+results_store = get_results_store()
+registry_cache = get_registry_cache()
+
+def collect_job_results(job: ValidationJob):
+    """Moves the outcome of a finished job into the session state"""
+    if job.status == "done":
+        st.session_state.processed_results = job.result
+        st.session_state.processed_results_id = job.job_id
+        st.session_state.results_run_id = job.job_id
+        st.session_state.is_processing_complete = True
+        st.session_state.processing_time = job.elapsed
+        st.session_state.failed_files = job.failed_files
+        st.session_state.ocr_metrics = job.ocr_metrics
+        st.session_state.match_candidates = job.candidates
+        st.session_state.candidates_run_id = job.job_id
+    elif job.status == "failed":
+        st.session_state.processing_error = job.error
+    else:
+        st.session_state.processing_cancelled = True
+
+    st.session_state.validation_job_id = None
+    if "job" in st.query_params:
+        del st.query_params["job"]
+
+@st.fragment(run_every=1)
+def show_job_progress(job_id: str):
+    """Polls the progress of a background job without rerunning the whole page"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return
+    st.progress(job.progress, text=job.progress_text)
+    for filename, file_progress in job.file_progress.items():
+        st.caption(f"{filename}: {file_progress}")
+    if not job.is_active:
+        collect_job_results(job)
+        st.rerun()
 
 ##
 # DELETE TEMPORARY FILES
 ##
 
 def wipe_all_temp_files():
-    """Wipes all temporary files and resets session state"""
+    """Wipes the temporary files of this session and resets session state"""
     try:
-        # Clear temp directory
-        temp_files = [file.path for file in os.scandir('./temp') if file.name != '.gitkeep']
-        for file in temp_files:
-            os.remove(file)
-            
+        # Stop a running job before deleting the files it reads
+        if st.session_state.get('validation_job_id'):
+            job_manager.cancel(st.session_state.validation_job_id)
+            st.session_state.validation_job_id = None
+            if "job" in st.query_params:
+                del st.query_params["job"]
+
+        # Clear the files of this session, other sessions keep theirs
+        workspace.clear()
+        registry_cache.release_holder(st.session_state.session_id)
+
        # Reset session state for data and files
-        if 'voter_records_df' in st.session_state:
-            del st.session_state.voter_records_df
+        if 'voter_records_key' in st.session_state:
+            del st.session_state.voter_records_key
+        for key in ('registry_upload_id', 'registry_key', 'held_registry_key'):
+            st.session_state.pop(key, None)
         if 'processed_results' in st.session_state:
             del st.session_state.processed_results
+        st.session_state.pop('processed_results_id', None)
+        if 'results_run_id' in st.session_state:
+            del st.session_state.results_run_id
+        if 'match_candidates' in st.session_state:
+            del st.session_state.match_candidates
         if 'signature_file' in st.session_state:
             del st.session_state.signature_file
+        if 'signature_filenames' in st.session_state:
+            del st.session_state.signature_filenames
+        st.session_state.pop('signature_uploads', None)
         if 'voter_records_file' in st.session_state:
             del st.session_state.voter_records_file
             
@@ -103,48 +180,56 @@ st.header("Petition Validation")
 st.caption("Automated signature verification for ballot initiatives")
 st.markdown("<hr style='height:3px;border:none;color:#0066cc;background-color:#0066cc;'/>", unsafe_allow_html=True)
 
-start_time = None
-
 # Add these session state initializations near the top with other session state setup
 if 'is_processing_complete' not in st.session_state:
     st.session_state.is_processing_complete = False
-if 'current_progress' not in st.session_state:
-    st.session_state.current_progress = 0
-if 'progress_text' not in st.session_state:
-    st.session_state.progress_text = ""
+if 'processing_time' not in st.session_state:
+    st.session_state.processing_time = None
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if 'validation_job_id' not in st.session_state:
+    # a reload starts a new session, the job ID in the URL picks the job back up
+    st.session_state.validation_job_id = st.query_params.get("job")
+
+# uploads and exports of this session, apart from those of other sessions
+workspace = SessionWorkspace(config['WORKSPACE_DIR'], st.session_state.session_id)
+cleanup_stale_workspaces(config['WORKSPACE_DIR'])
 
-@st.cache_data
 def load_voter_records(voter_records_file):
-    """Cache and process voter records file"""
-    df = pd.read_csv(voter_records_file, dtype=str)
-    
-    # Create necessary columns
-    df['Full Name'] = df["First_Name"] + ' ' + df['Last_Name']
-    df['Full Address'] = df["Street_Number"] + " " + df["Street_Name"] + " " + \
-                        df["Street_Type"] + " " + df["Street_Dir_Suffix"]
-    return df
+    """Gives the voter records from the registry cache, loading them once for all sessions"""
+    # hashed once per upload, identical uploads of other sessions share the entry
+    if st.session_state.get('registry_upload_id') != voter_records_file.file_id:
+        st.session_state.registry_key = registry_digest(voter_records_file)
+        st.session_state.registry_upload_id = voter_records_file.file_id
+    key = st.session_state.registry_key
+    held_key = st.session_state.get('held_registry_key')
+    if held_key is not None and held_key != key:
+        # the session switched registries, the old one may be evicted
+        registry_cache.release(held_key, st.session_state.session_id)
+    st.session_state.held_registry_key = key
+    return registry_cache.acquire(
+        key, st.session_state.session_id, loader=lambda: load_registry(key, voter_records_file)
+    ).voter_records
 
-@st.cache_data
 def load_signatures(signatures_file):
-    """Cache and process signatures PDF file"""
-    pdf_bytes = signatures_file.read()
-    # Create temp directory if it doesn't exist
-    os.makedirs('temp', exist_ok=True)
-    
-    # Save PDF to temp directory
-    pdf_path = os.path.join('temp', UPLOADED_FILENAME)
-    with open(pdf_path, 'wb') as f:
-        f.write(pdf_bytes)
-    
-    # Convert first page for preview using PyMuPDF
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    first_page = doc[0]
-    pix = first_page.get_pixmap()
-    preview_image = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-    num_pages = len(doc)
-    doc.close()
-    
-    return pdf_bytes, preview_image, num_pages
+    """Streams a signatures PDF file to the session workspace once per upload and previews it"""
+    uploads = st.session_state.setdefault('signature_uploads', {})
+    upload = uploads.get(signatures_file.file_id)
+    if upload is None or not os.path.exists(upload.path):
+        upload = uploads[signatures_file.file_id] = workspace.store_upload(signatures_file.name, signatures_file)
+    return (upload.filename, *preview_signatures(upload.path, upload.digest))
+
+@st.cache_data(max_entries=32)
+def preview_signatures(_path, digest, width=300):
+    """
+    Renders the first page of a signatures PDF on disk at thumbnail size and
+    counts its pages. Cached by the content digest, the path is not hashed.
+    """
+    with fitz.open(_path) as doc:
+        first_page = doc[0]
+        zoom = width / first_page.rect.width
+        pix = first_page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        return Image.frombytes("RGB", [pix.width, pix.height], pix.samples), len(doc)
 
 
 # Sidebar with improved styling
@@ -168,6 +253,7 @@ with st.sidebar:
     with st.expander("2️⃣ Upload Signatures", expanded=False):
         st.markdown("""
         - PDF format only
+        - Several files can be uploaded at once
         - Clear, legible scans
         - One signature per line
         - *Example: Download a sample of fake signed petitions [here](https://github.com/Civic-Tech-Ballot-Inititiave/Ballot-Initiative/blob/main/sample_data/fake_signed_petitions_1-10.pdf).*
@@ -178,7 +264,7 @@ with st.sidebar:
         - Click 'Process Files'
         - Review matches
         - Download CSV results
-        - *Note: Moving to the 'Home' page will restart processing.*
+        - *Note: Processing continues in the background while you visit other pages, and picks up again after a reload.*
         """)
 
     with st.expander("4️⃣ Clear Files", expanded=False):
@@ -187,8 +273,9 @@ with st.sidebar:
         """)        
 
 # Initialize session state for data storage
-if 'voter_records_df' not in st.session_state:
-    st.session_state.voter_records_df = None
+# the voter records themselves stay in the shared registry cache
+if 'voter_records_key' not in st.session_state:
+    st.session_state.voter_records_key = None
 if 'processed_results' not in st.session_state:
     st.session_state.processed_results = None
 
@@ -238,13 +325,19 @@ with col1:
             if not all(col in df.columns for col in required_columns):
                 st.error("Missing required columns in CSV file")
             else:
-                st.session_state.voter_records_df = df
+                st.session_state.voter_records_key = st.session_state.registry_key
                 st.success("✅ Voter records loaded successfully!")
                 
                 # Display preview
                 with st.expander("Preview Voter Records"):
                     st.dataframe(df.head(), use_container_width=True)
                     st.caption(f"Total records: {len(df):,}")
+                    cache_stats = registry_cache.stats()
+                    st.caption(
+                        f"Shared registry cache: {cache_stats['registries']} registries, "
+                        f"{cache_stats['nbytes'] / 2**20:,.0f} of {cache_stats['max_bytes'] / 2**20:,.0f} MB, "
+                        f"used by {cache_stats['holders']} sessions and jobs"
+                    )
                 
         except Exception as e:
             st.error(f"Error loading voter records: {str(e)}")
@@ -252,37 +345,43 @@ with col1:
 # Initialize session state for file uploads
 if 'signature_file' not in st.session_state:
     st.session_state.signature_file = None
+if 'signature_filenames' not in st.session_state:
+    st.session_state.signature_filenames = []
 
 with col2:
     st.markdown("""
     #### ✍️ Petition Signatures
-    Upload your PDF file containing petition pages with signatures. Each file will be cropped to focus on the section where the signatures are located. 
+    Upload your PDF files containing petition pages with signatures. Each file will be cropped to focus on the section where the signatures are located. 
     Ensure these sections have the printed name and address of the voter. 
     """)
     
     signatures = st.file_uploader(
-        "Choose PDF file",
+        "Choose PDF files",
         type=['pdf'],
         key="signatures",
-        help="Upload a PDF containing scanned signature pages",
+        accept_multiple_files=True,
+        help="Upload one or more PDFs containing scanned signature pages",
         on_change=lambda: setattr(st.session_state, 'signature_file', st.session_state.signatures)        
     )
     
-    # Restore file from session state if available
-    if signatures is None and st.session_state.signature_file is not None:
+    # Restore files from session state if available
+    if not signatures and st.session_state.signature_file:
         signatures = st.session_state.signature_file
 
-    # Process PDF when uploaded
-    if signatures is not None:
+    # Process PDFs when uploaded
+    if signatures:
         try:
-            pdf_bytes, preview_image, num_pages = load_signatures(signatures)
-            st.success("✅ Petition signatures loaded successfully!")
+            previews = [load_signatures(signature) for signature in signatures]
+            st.session_state.signature_filenames = [filename for filename, _, _ in previews]
+            st.success(f"✅ {len(signatures)} petition signature file(s) loaded successfully!")
             
             # Display preview
             with st.expander("Preview Petition Signatures"):
                 st.markdown("**Preview of First Page:**")
-                st.image(preview_image, width=300)
-                st.caption(f"Total pages: {num_pages}")
+                st.image(previews[0][1], width=300)
+                for filename, _, num_pages in previews:
+                    st.caption(f"{filename}: {num_pages} pages")
+                st.caption(f"Total pages: {sum(num_pages for _, _, num_pages in previews)}")
                 
         except Exception as e:
             st.error(f"Error processing ballot signatures: {str(e)}")
@@ -294,169 +393,273 @@ st.markdown("---")
 st.markdown("### Process Files")
 col1, col2, col3 = st.columns([1,2,1])
 with col2:
-    if st.session_state.voter_records_df is None or signatures is None:
+    job = job_manager.get(st.session_state.validation_job_id) if st.session_state.validation_job_id else None
+    if job is None and st.session_state.validation_job_id:
+        # the job is gone, e.g. after a server restart
+        st.session_state.validation_job_id = None
+        if "job" in st.query_params:
+            del st.query_params["job"]
+
+    if st.session_state.get('processing_error'):
+        st.error(f"Error during processing: {st.session_state.pop('processing_error')}")
+    if st.session_state.get('processing_cancelled'):
+        st.warning("Processing cancelled by user")
+        st.session_state.processing_cancelled = False
+
+    if job is not None and not job.is_active:
+        # finished while this page was not polling it, e.g. before a reload
+        collect_job_results(job)
+        st.rerun()
+    elif job is not None:
+        # the job runs in the background, navigating away or reloading the page does not stop it
+        if st.button("⚠️ Cancel Processing", type="secondary", use_container_width=True):
+            job_manager.cancel(job.job_id)
+        show_job_progress(job.job_id)
+    elif st.session_state.voter_records_key is None or not signatures:
         st.warning("⚠️ Please upload both files to proceed")
     else:
-        # Initialize cancel state if not exists
-        if 'processing_cancelled' not in st.session_state:
-            st.session_state.processing_cancelled = False
-            
-        # Show either process or cancel button
-        if not st.session_state.get('is_processing', False):
-            process_button = st.button("🚀 Process Files", type="primary", use_container_width=True)
-            if process_button:
-                st.session_state.is_processing = True
+        process_button = st.button("🚀 Process Files", type="primary", use_container_width=True)
+        if process_button:
+            filenames = list(st.session_state.signature_filenames)
+            filedir = workspace.path
+            registry_key = st.session_state.voter_records_key
+            voter_records_file = st.session_state.voter_records_file
+
+            async def run_validation(job):
+                # the job holds the registry until it finishes, wherever the session goes;
+                # it is loaded again if it was evicted while the job was queued
+                registry = registry_cache.acquire(
+                    registry_key,
+                    job.job_id,
+                    loader=lambda: load_registry(registry_key, voter_records_file),
+                    expires=False,
+                )
+                try:
+                    return await validate_petitions_async(
+                        job,
+                        filedir,
+                        filenames,
+                        registry.voter_records,
+                        threshold=config['BASE_THRESHOLD'],
+                        results_store=results_store,
+                        select_voter_records=registry.select_voter_records,
+                    )
+                finally:
+                    registry_cache.release(registry_key, job.job_id)
+
+            job = job_manager.submit(owner=st.session_state.session_id, run=run_validation)
+            st.session_state.validation_job_id = job.job_id
+            st.session_state.is_processing_complete = False
+            st.query_params["job"] = job.job_id
+            st.rerun()
+
+def get_match_candidates():
+    """Gives the match candidates of the results, loading those of stored runs from disk"""
+    run_id = st.session_state.get('results_run_id')
+    if run_id is not None and st.session_state.get('candidates_run_id') != run_id:
+        path = results_store.candidates_path(run_id)
+        st.session_state.match_candidates = MatchCandidates.load(path) if os.path.exists(path) else None
+        st.session_state.candidates_run_id = run_id
+    return st.session_state.get('match_candidates')
+
+def get_results_source(threshold=config['BASE_THRESHOLD'], rule="harmonic"):
+    """Gives the results view of the session, backed by the results store when possible"""
+    run_id = st.session_state.get('results_run_id')
+    if run_id is not None:
+        key = ('store', run_id)
+    elif st.session_state.get('processed_results') is not None:
+        # keyed by the job that produced them, ids of collected frames are reused
+        key = ('frame', st.session_state.get('processed_results_id'))
+    else:
+        return None
+
+    # other thresholds and rules are re-evaluated from the kept candidates, without rescoring
+    reevaluate = (threshold, rule) != (config['BASE_THRESHOLD'], "harmonic") and get_match_candidates() is not None
+    if reevaluate:
+        key = ('reevaluated', f"{key[1]}_{rule}_{threshold}")
+
+    # kept across reruns so the summary counts are only updated with new rows
+    if st.session_state.get('results_source_key') != key:
+        if reevaluate and run_id is not None:
+            # stored runs are read page by page, like without re-evaluation
+            st.session_state.results_source = ReevaluatedResults(
+                results_store, run_id, get_match_candidates(), threshold, rule
+            )
+        elif reevaluate:
+            st.session_state.results_source = FrameResults(
+                get_match_candidates().reevaluate(st.session_state.processed_results, threshold, rule)
+            )
+        elif run_id is not None:
+            st.session_state.results_source = StoreResults(results_store, run_id)
+        else:
+            st.session_state.results_source = FrameResults(st.session_state.processed_results)
+        st.session_state.results_source_key = key
+        st.session_state.results_page = 1
+    return st.session_state.results_source
+
+def show_match_settings():
+    """Lets the threshold and score combination be changed when the match candidates were kept"""
+    candidates = get_match_candidates()
+    if candidates is None:
+        return config['BASE_THRESHOLD'], "harmonic"
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        threshold = st.slider("Match threshold", 0, 100, config['BASE_THRESHOLD'], key="match_threshold")
+    with col2:
+        rule = st.selectbox("Score combination", list(COMBINATION_RULES), key="match_rule")
+    return threshold, rule
+
+def show_candidates(candidates, rule):
+    """Shows the top candidates of one result row, for reviewing borderline matches"""
+    with st.expander("Review Match Candidates"):
+        row = st.number_input("Result row", min_value=0, max_value=max(len(candidates) - 1, 0), key="candidates_row")
+        st.dataframe(candidates.row(row, rule), use_container_width=True, hide_index=True)
+
+def reset_results_page():
+    st.session_state.results_page = 1
+
+def show_results_table(source):
+    """Shows one page of the filtered and sorted results"""
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        filenames = st.multiselect("File", source.options("Filename"), key="results_filenames", on_change=reset_results_page)
+    with col2:
+        wards = st.multiselect("Ward", source.options("OCR Ward"), key="results_wards", on_change=reset_results_page)
+    with col3:
+        validity = st.selectbox("Validity", ["All", "Valid", "Invalid"], key="results_validity", on_change=reset_results_page)
+    with col4:
+        hide_duplicates = st.checkbox("Hide duplicate pages", key="results_hide_duplicates", on_change=reset_results_page)
+
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        order_by = st.selectbox("Sort by", ["Result order"] + RESULT_COLUMNS, key="results_order_by", on_change=reset_results_page)
+    with col2:
+        descending = st.toggle("Descending", key="results_descending", on_change=reset_results_page)
+    with col3:
+        page_size = st.selectbox("Rows per page", [50, 100, 250, 500], index=1, key="results_page_size", on_change=reset_results_page)
+
+    results_page = source.page(
+        ResultsFilter(
+            filenames=filenames or None,
+            wards=wards or None,
+            valid={"All": None, "Valid": True, "Invalid": False}[validity],
+            duplicate=False if hide_duplicates else None,
+        ),
+        page=st.session_state.get('results_page', 1),
+        page_size=page_size,
+        order_by=None if order_by == "Result order" else order_by,
+        descending=descending,
+    )
+
+    st.data_editor(
+        results_page.rows,
+        use_container_width=True,
+        hide_index=True
+    )
+
+    st.session_state.results_page = results_page.page
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        st.number_input("Page", min_value=1, max_value=results_page.page_count, key="results_page")
+    with col2:
+        st.caption(f"Page {results_page.page} of {results_page.page_count} ({results_page.total_rows:,} rows)")
+
+def show_export(source):
+    """Writes the results to a file in chunks and offers it for download"""
+    col1, col2 = st.columns(2)
+    with col1:
+        export_format = st.radio("Export format", ["CSV", "Parquet"], horizontal=True, key="export_format")
+    extension = export_format.lower()
+    # results of a finished run do not change, an export is written once
+    export_path = workspace.file_path(
+        f"validated_petition_signatures_{st.session_state.results_source_key[1]}.{extension}"
+    )
+    with col2:
+        if not os.path.exists(export_path):
+            if st.button(f"Prepare {export_format} Download", use_container_width=True):
+                with st.spinner("Writing results..."):
+                    write_export(source.iter_chunks(), export_path)
                 st.rerun()
         else:
-            if st.button("⚠️ Cancel Processing", type="secondary", use_container_width=True, help="Note: Moving to the 'Home' page will restart processing."):
-                st.caption("Processing cancelled by user")
-                st.session_state.processing_cancelled = True
-                st.session_state.is_processing = False
-                st.session_state.is_processing_complete = False
-                st.session_state.processing_cancelled = False
-                st.session_state.current_progress = 0
-                st.session_state.progress_text = ""
+            with open(export_path, 'rb') as export_file:
+                st.download_button(
+                    label=f"Download data as {export_format}",
+                    data=export_file,
+                    file_name=f"validated_petition_signatures.{extension}",
+                    mime=EXPORT_FORMATS[extension],
+                    use_container_width=True,
+                )
+
+# Pick up results kept from an earlier session
+if st.session_state.get('processed_results') is None and st.session_state.get('results_run_id') is None:
+    stored_runs = results_store.runs()
+    stored_runs = stored_runs[stored_runs["rows"] > 0]
+    if len(stored_runs):
+        with st.expander("Previous Results"):
+            labels = {
+                run.run_id: f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(run.started_at))} "
+                            f"{run.campaign or ''} ({run.rows:,} rows, {run.status})"
+                for run in stored_runs.itertuples()
+            }
+            run_id = st.selectbox("Run", list(labels), format_func=labels.get)
+            if st.button("Show Results"):
+                st.session_state.results_run_id = run_id
                 st.rerun()
-                
-        # Process files if in processing state
-        if st.session_state.get('is_processing', False) and not st.session_state.is_processing_complete:
-            start_time = time.time()
-            with st.spinner("Processing signatures for validation..."):
-                try:
-                    matching_bar = st.progress(st.session_state.current_progress, 
-                                            text=st.session_state.progress_text or "Loading PDF of signed petitions...")
-                    
-                    # Check for cancellation
-                    if st.session_state.processing_cancelled:
-                        st.warning("Processing cancelled by user")
-                        st.session_state.is_processing = False
-                        st.session_state.is_processing_complete = False
-                        st.session_state.processing_cancelled = False
-                        st.session_state.current_progress = 0
-                        st.session_state.progress_text = ""
-                        st.rerun()
-
-                    # Update progress state as processing continues
-                    st.session_state.current_progress = 0.0
-                    st.session_state.progress_text = "Converting PDF to images..."
-                    matching_bar.progress(st.session_state.current_progress, text=st.session_state.progress_text)
-                    
-                    pdf_full_path = glob.glob(os.path.join('temp', UPLOADED_FILENAME))[0]
-
-                    if st.session_state.processing_cancelled:
-                        raise InterruptedError("Processing cancelled by user")
-
-                    st.session_state.current_progress = 0.3
-                    matching_bar.progress(st.session_state.current_progress, text=st.session_state.progress_text)
-                    
-                    ocr_df = create_ocr_df(filedir='temp', 
-                                         filename=UPLOADED_FILENAME, 
-                                         st_bar=matching_bar)
-                    
-                    if st.session_state.processing_cancelled:
-                        raise InterruptedError("Processing cancelled by user")
-
-                    st.session_state.current_progress = 0.9
-                    st.session_state.progress_text = "Compiling Voter Record Data"
-                    matching_bar.progress(st.session_state.current_progress, text=st.session_state.progress_text)
-
-                    select_voter_records = create_select_voter_records(st.session_state.voter_records_df)
-                    
-                    if st.session_state.processing_cancelled:
-                        raise InterruptedError("Processing cancelled by user")
-
-                    st.session_state.current_progress = 0.95
-                    st.session_state.progress_text = "Matching petition signatures to voter records..."
-                    matching_bar.progress(st.session_state.current_progress, text=st.session_state.progress_text)
-
-                    ocr_matched_df = create_ocr_matched_df(
-                        ocr_df, 
-                        select_voter_records, 
-                        threshold=config['BASE_THRESHOLD']
-                    )
-                    
-                    st.session_state.current_progress = 1.0
-                    st.session_state.progress_text = "Complete!"
-                    matching_bar.progress(st.session_state.current_progress, text=st.session_state.progress_text)
-                    
-                    st.session_state.processed_results = ocr_matched_df
-                    matching_bar.empty()
-                    st.session_state.is_processing = False
-                    st.session_state.is_processing_complete = True
-                    st.session_state.processing_time = time.time() - start_time
-                    st.session_state.current_progress = 0
-                    st.session_state.progress_text = ""
-                    st.rerun()
-                    
-                except InterruptedError as e:
-                    st.warning(str(e))
-                    matching_bar.empty()
-                    st.session_state.is_processing = False
-                    st.session_state.is_processing_complete = False
-                    st.session_state.current_progress = 0
-                    st.session_state.progress_text = ""
-                except Exception as e:
-                    st.error(f"Error during processing: {str(e)}")
-                    st.session_state.is_processing = False
-                    st.session_state.is_processing_complete = False
-                    st.session_state.current_progress = 0
-                    st.session_state.progress_text = ""
-
-@st.cache_data
-def convert_df(df):
-    # IMPORTANT: Cache the conversion to prevent computation on every rerun
-    return df.to_csv().encode("utf-8")
 
 # Display results if available
-if st.session_state.get('processed_results') is not None:
+if st.session_state.get('processed_results') is not None or st.session_state.get('results_run_id') is not None:
     st.markdown("### Results")
-    
-    # Update Valid column based on threshold
-    results_df = st.session_state.processed_results.copy()
-    results_df["Valid"] = results_df["Match Score"] >= config['BASE_THRESHOLD']
-    
+    match_threshold, match_rule = show_match_settings()
+    results_source = get_results_source(match_threshold, match_rule)
+else:
+    results_source = None
+if results_source is not None:
+    for filename, error in st.session_state.get('failed_files', {}).items():
+        st.warning(f"OCR failed for {filename}, its signatures are not included: {error}")
+
     tabs = st.tabs(["📊 Data Table", "📈 Statistics"])
     if st.session_state.processing_time:
         st.caption(f"Processing time: {st.session_state.processing_time:.2f} seconds")
+    if st.session_state.get('ocr_metrics'):
+        ocr_metrics = st.session_state.ocr_metrics
+        st.caption(
+            f"OCR: {ocr_metrics['pages_ok']} pages, "
+            f"{ocr_metrics['input_tokens']:,} input / {ocr_metrics['output_tokens']:,} output tokens, "
+            f"{ocr_metrics['retries']} retries, estimated cost ${ocr_metrics['cost_usd']:.2f}"
+        )
+        if ocr_metrics['pages_skipped']:
+            st.warning(f"{ocr_metrics['pages_skipped']} pages were skipped to stay within the OCR budget.")
 
     with tabs[0]:
-        edited_df = st.data_editor(
-            results_df,
-            use_container_width=True,
-            hide_index=True
-        )
+        show_results_table(results_source)
+        if get_match_candidates() is not None:
+            show_candidates(get_match_candidates(), match_rule)
 
-    # Update the download button to use the modified dataframe
-    csv = convert_df(results_df)
+    show_export(results_source)
 
-    st.download_button(
-        label="Download data as CSV",
-        data=csv,
-        file_name="validated_petition_signatures.csv",
-        mime="text/csv",
-    )        
-    
     with tabs[1]:
-        # results_df = st.session_state.processed_results
+        summary = results_source.summary()
         col1, col2, col3 = st.columns(3)
         with col1:
             ui.metric_card(
                 title="Total Records",
-                content=len(results_df),
+                content=summary.total,
                 description="Total signatures processed"
             )
         with col2:
             ui.metric_card(
                 title="Valid Matches",
-                content=sum(results_df["Valid"]),
+                content=summary.valid,
                 description="Signatures verified"
             )
         with col3:
             ui.metric_card(
                 title="Percentage Valid",
-                content=f"{(sum(results_df['Valid'])/len(results_df))*100:.1f}%",
+                content=f"{summary.percentage_valid:.1f}%",
                 description="Percentage of signatures verified"
             )
+        if summary.duplicates:
+            st.caption(f"{summary.duplicates} rows come from duplicate page scans and are not counted.")
 
 # Add this near the bottom of your app, before the footer
 st.markdown("---")
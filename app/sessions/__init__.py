@@ -0,0 +1,17 @@
+from .registry_cache import RegistryCache
+from .registry_cache import RegistryEntry
+from .registry_cache import frame_nbytes
+from .registry_cache import load_registry
+from .registry_cache import registry_digest
+from .workspace import SessionWorkspace
+from .workspace import StoredUpload
+
+__all__ = [
+    "RegistryCache",
+    "RegistryEntry",
+    "frame_nbytes",
+    "load_registry",
+    "registry_digest",
+    "SessionWorkspace",
+    "StoredUpload",
+]
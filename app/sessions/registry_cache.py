@@ -0,0 +1,214 @@
+from dataclasses import dataclass, field
+from typing import BinaryIO, Callable, Dict, Optional
+import hashlib
+import threading
+import time
+
+import pandas as pd
+
+from fuzzy_match_helper import create_select_voter_records
+from utils.app_logger import logger
+
+
+@dataclass
+class RegistryEntry:
+    """A loaded voter registry and the matching index built from it"""
+
+    key: str
+    voter_records: pd.DataFrame
+    select_voter_records: pd.DataFrame
+    nbytes: int
+    # holder -> last time it used the entry, None for holders that never expire
+    holders: Dict[str, Optional[float]] = field(default_factory=dict)
+    last_used: float = field(default_factory=time.time)
+
+    @property
+    def refcount(self) -> int:
+        return len(self.holders)
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    """Measures the memory of a DataFrame, including its strings."""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def registry_digest(data: BinaryIO, chunk_size: int = 1 << 20) -> str:
+    """Hashes an uploaded registry file, so identical uploads share one cache entry."""
+    digest = hashlib.sha256()
+    data.seek(0)
+    for chunk in iter(lambda: data.read(chunk_size), b""):
+        digest.update(chunk)
+    data.seek(0)
+    return digest.hexdigest()
+
+
+def load_registry(key: str, data: BinaryIO) -> RegistryEntry:
+    """
+    Reads a voter registry CSV and builds its matching index.
+
+    Args:
+        key (str): The key of the registry in the cache.
+        data (BinaryIO): The CSV file.
+
+    Returns:
+        RegistryEntry: The registry, not yet held by anyone.
+    """
+    data.seek(0)
+    voter_records = pd.read_csv(data, dtype=str)
+    # adds the "Full Name", "Full Address" and "Canonical Address" columns to the records
+    select_voter_records = create_select_voter_records(voter_records)
+    # the index shares its strings with the records, they are only counted once
+    nbytes = frame_nbytes(voter_records) + int(select_voter_records.memory_usage(index=True).sum())
+    return RegistryEntry(key, voter_records, select_voter_records, nbytes)
+
+
+class RegistryCache:
+    """
+    Process-wide cache of voter registries, shared by every session.
+
+    Each registry is loaded once, however many sessions and jobs use it.
+    Holders are counted per entry: a session or job acquires the registry
+    it uses and releases it when done. Registries nobody holds are evicted,
+    least recently used first, once the cache grows past its memory budget.
+    Sessions that go away without releasing stop counting after `max_idle_s`.
+
+    Example:
+        entry = cache.acquire(digest, holder=session_id, loader=lambda: load_registry(digest, upload))
+        ...
+        cache.release(digest, holder=session_id)
+    """
+
+    def __init__(self, max_bytes: int, max_idle_s: float = 3600):
+        """
+        Args:
+            max_bytes (int): The memory budget of the cache. Registries in use
+                are never evicted, even over budget.
+            max_idle_s (float): How long a holder counts without using its registry.
+        """
+        self.max_bytes = max_bytes
+        self.max_idle_s = max_idle_s
+        self._entries: Dict[str, RegistryEntry] = {}
+        self._loading: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def acquire(
+        self,
+        key: str,
+        holder: str,
+        loader: Callable[[], RegistryEntry] = None,
+        expires: bool = True,
+    ) -> RegistryEntry:
+        """
+        Gives the registry with `key`, loading it if it is not cached.
+
+        Acquiring again with the same holder only refreshes it, a holder
+        counts once however often it acquires.
+
+        Args:
+            key (str): The registry, e.g. the digest of its file.
+            holder (str): Who uses the registry, e.g. a session or job ID.
+            loader (Callable[[], RegistryEntry]): Loads the registry on a miss.
+                Concurrent misses of the same key load it once.
+            expires (bool): Whether the holder stops counting when idle, jobs
+                hold their registry until they release it.
+
+        Returns:
+            RegistryEntry: The registry.
+
+        Raises:
+            KeyError: If the registry is not cached and there is no loader.
+        """
+        with self._lock:
+            entry = self._hold(key, holder, expires)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            if loader is None:
+                raise KeyError(key)
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                # loaded by another holder while this one waited
+                entry = self._hold(key, holder, expires)
+                if entry is not None:
+                    self.hits += 1
+                    return entry
+
+            started = time.perf_counter()
+            entry = loader()
+
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = entry
+                self._loading.pop(key, None)
+                self._hold(key, holder, expires)
+                logger.info(
+                    f"Loaded registry {key[:12]} ({entry.nbytes / 2**20:.1f} MB) "
+                    f"in {time.perf_counter() - started:.2f}s"
+                )
+                self._evict()
+            return entry
+
+    def release(self, key: str, holder: str) -> None:
+        """Stops `holder` counting as a user of the registry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.holders.pop(holder, None)
+                self._evict()
+
+    def release_holder(self, holder: str) -> None:
+        """Releases every registry `holder` uses, e.g. when its session clears its files."""
+        with self._lock:
+            for entry in self._entries.values():
+                entry.holders.pop(holder, None)
+            self._evict()
+
+    def _hold(self, key: str, holder: str, expires: bool) -> Optional[RegistryEntry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            now = time.time()
+            entry.holders[holder] = now if expires else None
+            entry.last_used = now
+        return entry
+
+    def _expire_holders(self) -> None:
+        cutoff = time.time() - self.max_idle_s
+        for entry in self._entries.values():
+            for holder, last_seen in list(entry.holders.items()):
+                if last_seen is not None and last_seen < cutoff:
+                    del entry.holders[holder]
+
+    def _evict(self) -> None:
+        self._expire_holders()
+        total = sum(entry.nbytes for entry in self._entries.values())
+        idle = sorted(
+            (entry for entry in self._entries.values() if entry.refcount == 0),
+            key=lambda entry: entry.last_used,
+        )
+        for entry in idle:
+            if total <= self.max_bytes:
+                break
+            del self._entries[entry.key]
+            total -= entry.nbytes
+            self.evictions += 1
+            logger.info(f"Evicted registry {entry.key[:12]} ({entry.nbytes / 2**20:.1f} MB)")
+
+    def stats(self) -> dict:
+        """Reports the cached registries, their memory and the hit rate."""
+        with self._lock:
+            self._expire_holders()
+            return {
+                "registries": len(self._entries),
+                "held": sum(entry.refcount > 0 for entry in self._entries.values()),
+                "holders": sum(entry.refcount for entry in self._entries.values()),
+                "nbytes": sum(entry.nbytes for entry in self._entries.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
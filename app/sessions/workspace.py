@@ -0,0 +1,127 @@
+from typing import BinaryIO, List, NamedTuple
+import hashlib
+import os
+import re
+import shutil
+import time
+
+from utils.app_logger import logger
+
+
+def _safe_name(filename: str) -> str:
+    # uploads are named by the browser, keep them inside the workspace
+    name = re.sub(r"[^\w.\- ]", "_", os.path.basename(filename)).strip(". ")
+    return name or "upload"
+
+
+class StoredUpload(NamedTuple):
+    """An upload written to a session workspace"""
+
+    filename: str
+    path: str
+    # hex SHA-256 of the content
+    digest: str
+    size: int
+
+
+class SessionWorkspace:
+    """
+    Directory of the files uploaded and written by one session.
+
+    Every session works in its own directory under the workspace root, so
+    sessions uploading files with the same name do not overwrite each
+    other and clearing a session's files leaves the others alone.
+    """
+
+    def __init__(self, root: str, session_id: str):
+        """
+        Args:
+            root (str): The directory holding the workspaces of all sessions.
+            session_id (str): The session, names its directory.
+        """
+        self.root = root
+        self.session_id = session_id
+        self.path = os.path.join(root, _safe_name(session_id))
+        os.makedirs(self.path, exist_ok=True)
+
+    def file_path(self, filename: str) -> str:
+        """Gives the path of a file in the workspace."""
+        return os.path.join(self.path, _safe_name(filename))
+
+    def save_upload(self, filename: str, data: BinaryIO) -> str:
+        """
+        Writes an uploaded file to the workspace, see `store_upload`.
+
+        Returns:
+            str: The name of the file in the workspace.
+        """
+        return self.store_upload(filename, data).filename
+
+    def store_upload(self, filename: str, data: BinaryIO, chunk_size: int = 1 << 20) -> StoredUpload:
+        """
+        Writes an uploaded file to the workspace in chunks, hashing it on the
+        way, so large scans are never copied whole in memory. A file of the
+        same name is replaced.
+
+        Args:
+            filename (str): The name of the upload.
+            data (BinaryIO): The content of the upload.
+            chunk_size (int): The number of bytes copied at a time.
+
+        Returns:
+            StoredUpload: The file in the workspace and the digest of its content.
+        """
+        path = self.file_path(filename)
+        tmp_path = path + ".tmp"
+        digest = hashlib.sha256()
+        size = 0
+        data.seek(0)
+        with open(tmp_path, "wb") as f:
+            while chunk := data.read(chunk_size):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(tmp_path, path)
+        data.seek(0)
+        self.touch()
+        return StoredUpload(os.path.basename(path), path, digest.hexdigest(), size)
+
+    def files(self) -> List[str]:
+        """Lists the files in the workspace."""
+        return sorted(entry.name for entry in os.scandir(self.path) if entry.is_file())
+
+    def touch(self) -> None:
+        """Marks the workspace as in use, so it is not cleaned up as stale."""
+        os.utime(self.path)
+
+    def clear(self) -> None:
+        """Deletes every file of this session, and only of this session."""
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(self.path, exist_ok=True)
+
+    @staticmethod
+    def cleanup_stale(root: str, max_idle_s: float, keep: List[str] = ()) -> List[str]:
+        """
+        Deletes the workspaces of sessions that have not been used for a while.
+
+        Args:
+            root (str): The directory holding the workspaces.
+            max_idle_s (float): How long a workspace is kept without use.
+            keep (List[str]): Sessions whose workspaces are kept regardless,
+                e.g. the owners of running jobs.
+
+        Returns:
+            List[str]: The sessions whose workspaces were deleted.
+        """
+        if not os.path.isdir(root):
+            return []
+        cutoff = time.time() - max_idle_s
+        keep = {_safe_name(session_id) for session_id in keep}
+        removed = []
+        for entry in os.scandir(root):
+            if entry.is_dir() and entry.name not in keep and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed.append(entry.name)
+        if removed:
+            logger.info(f"Removed {len(removed)} stale session workspaces")
+        return removed
@@ -1,13 +1,19 @@
 from .settings_repo import OpenAiConfig
 from .settings_repo import MistralAiConfig
 from .settings_repo import GeminiAiConfig
+from .settings_repo import OcrBudgetConfig
+from .settings_repo import TracingConfig
 from .settings_repo import SettingsData
 from .settings_repo import load_settings
+from .app_config import load_config
 
 __all__ = [
     "load_settings",
+    "load_config",
     "SettingsData",
     "OpenAiConfig",
     "MistralAiConfig",
     "GeminiAiConfig",
+    "OcrBudgetConfig",
+    "TracingConfig",
 ]
@@ -0,0 +1,38 @@
+from typing import Optional
+import json
+import pathlib
+
+# config.json of the repository, used when the working directory has none
+_REPO_CONFIG = pathlib.Path(__file__).resolve().parents[2] / "config.json"
+
+_current_config: Optional[dict] = None
+
+
+def load_config(custom_path: str = None, reload_config: bool = False) -> dict:
+    """
+    Load the pipeline constants of config.json, e.g. the crop margins and
+    the matching threshold.
+
+    The file is read on first use rather than when modules are imported,
+    and kept for later calls.
+
+    Args:
+        custom_path (str): Path to a config file. Defaults to config.json
+            in the working directory, then to the one of the repository.
+        reload_config (bool): Whether to read the file again.
+
+    Returns:
+        dict: The config values.
+    """
+    global _current_config
+
+    if (_current_config is not None) and (not reload_config):
+        return _current_config
+
+    path = pathlib.Path(custom_path or "./config.json")
+    if custom_path is None and not path.exists():
+        path = _REPO_CONFIG
+
+    with open(path, "r") as f:
+        _current_config = json.load(f)
+    return _current_config
@@ -1,10 +1,11 @@
 from typing import Optional
 import tomllib
 import pathlib
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from utils import (
     enable_debug_logging,
     logger,
+    tracer,
 )
 
 
@@ -12,24 +13,57 @@ from utils import (
 class OpenAiConfig:
     api_key: str
     model: str
+    # USD per million tokens, used for cost estimates
+    input_token_cost: float = 0.0
+    output_token_cost: float = 0.0
 
 
 @dataclass
 class MistralAiConfig:
     api_key: str
     model: str
+    input_token_cost: float = 0.0
+    output_token_cost: float = 0.0
 
 
 @dataclass
 class GeminiAiConfig:
     api_key: str
     model: str
+    input_token_cost: float = 0.0
+    output_token_cost: float = 0.0
+
+
+@dataclass
+class OcrBudgetConfig:
+    # no limit when not set
+    max_cost_usd: Optional[float] = None
+    # "abort" stops the run, "throttle" reads one page at a time until the budget is spent
+    action: str = "abort"
+
+
+@dataclass
+class TracingConfig:
+    enabled: bool = False
+    # share of spans recorded, lower it to trace long runs cheaply
+    sample_rate: float = 1.0
+    # record the peak memory of every span with tracemalloc
+    track_memory: bool = False
+    # dump a cProfile profile and a tracemalloc snapshot of every run
+    profile: bool = False
+    snapshot: bool = False
+    output_dir: str = "logs"
 
 
 @dataclass
 class SettingsData:
     selected_config: OpenAiConfig | MistralAiConfig | GeminiAiConfig
     debug_mode: bool = False
+    max_retries: int = 2
+    # "rows" asks the model for one object per signer, "columns" for one list per field
+    ocr_schema: str = "rows"
+    budget: OcrBudgetConfig = field(default_factory=OcrBudgetConfig)
+    tracing: TracingConfig = field(default_factory=TracingConfig)
 
 
 _current_settings: Optional[SettingsData] = None
@@ -79,6 +113,8 @@ def load_settings(
                 selected_config=OpenAiConfig(
                     api_key=engine_config["api_key"],
                     model=engine_config["model"],
+                    input_token_cost=engine_config.get("input_token_cost", 0.0),
+                    output_token_cost=engine_config.get("output_token_cost", 0.0),
                 )
             )
         case "mistral_ai":
@@ -86,6 +122,8 @@ def load_settings(
                 selected_config=MistralAiConfig(
                     api_key=engine_config["api_key"],
                     model=engine_config["model"],
+                    input_token_cost=engine_config.get("input_token_cost", 0.0),
+                    output_token_cost=engine_config.get("output_token_cost", 0.0),
                 )
             )
         case "gemini_ai":
@@ -93,6 +131,8 @@ def load_settings(
                 selected_config=GeminiAiConfig(
                     api_key=engine_config["api_key"],
                     model=engine_config["model"],
+                    input_token_cost=engine_config.get("input_token_cost", 0.0),
+                    output_token_cost=engine_config.get("output_token_cost", 0.0),
                 )
             )
         case _:
@@ -101,6 +141,37 @@ def load_settings(
             )
 
     _current_settings.debug_mode = settings.get("debug_mode", False)
+    _current_settings.max_retries = settings.get("max_retries", 2)
+
+    ocr_schema = settings.get("ocr_schema", "rows")
+    if ocr_schema not in ("rows", "columns"):
+        raise ValueError(
+            f"Unknown OCR schema {ocr_schema}. Use 'rows' or 'columns'."
+        )
+    _current_settings.ocr_schema = ocr_schema
+
+    budget = settings.get("budget", {})
+    if budget.get("action", "abort") not in ("abort", "throttle"):
+        raise ValueError(
+            f"Unknown budget action {budget['action']}. Use 'abort' or 'throttle'."
+        )
+    _current_settings.budget = OcrBudgetConfig(
+        max_cost_usd=budget.get("max_cost_usd"),
+        action=budget.get("action", "abort"),
+    )
+
+    tracing = settings.get("tracing", {})
+    sample_rate = tracing.get("sample_rate", 1.0)
+    if not 0 < sample_rate <= 1:
+        raise ValueError(
+            f"Tracing sample rate {sample_rate} must be between 0 and 1."
+        )
+    _current_settings.tracing = TracingConfig(**tracing)
+    tracer.configure(
+        enabled=_current_settings.tracing.enabled,
+        sample_rate=sample_rate,
+        track_memory=_current_settings.tracing.track_memory,
+    )
 
     logger.debug(f"Loaded settings: {_current_settings}")
     logger.info(
@@ -0,0 +1,21 @@
+from .coordinator import ShardCoordinator
+from .coordinator import merge_shard_candidates
+from .coordinator import parse_worker_address
+from .shards import ShardInfo
+from .shards import load_shard
+from .shards import partition_registry
+from .shards import read_manifest
+from .worker import ShardWorker
+from .worker import shard_authkey
+
+__all__ = [
+    "ShardCoordinator",
+    "merge_shard_candidates",
+    "parse_worker_address",
+    "ShardInfo",
+    "load_shard",
+    "partition_registry",
+    "read_manifest",
+    "ShardWorker",
+    "shard_authkey",
+]
@@ -0,0 +1,211 @@
+from multiprocessing.connection import Client, Connection
+from typing import List, Sequence, Tuple
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+from fuzzy_match_helper import matched_df_from_candidates
+from match_candidates import MatchCandidates, RowCandidates, combine_scores
+from settings import load_config
+from utils.app_logger import logger
+
+
+def parse_worker_address(address: str) -> Tuple[str, int]:
+    """Parses a "host:port" worker address."""
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Worker addresses look like host:port, got {address}")
+    return host, int(port)
+
+
+def merge_shard_candidates(parts: Sequence[dict], k: int) -> Tuple[np.ndarray, RowCandidates]:
+    """
+    Merges the top-k candidates of one row from every shard.
+
+    Every shard reports its own top-k by name score, so the best k of their
+    union are the top-k of the whole registry.
+
+    Args:
+        parts (Sequence[dict]): The candidates of the row from each shard.
+        k (int): The number of candidates kept.
+
+    Returns:
+        Tuple[np.ndarray, RowCandidates]: The registry positions of the
+            candidates and the candidates, best name score first.
+    """
+    name_scores = np.concatenate([np.asarray(part["name_scores"], dtype=np.float32) for part in parts])
+    positions = np.concatenate([np.asarray(part["positions"], dtype=np.int64) for part in parts])
+    # ties are broken by registry position, so the result does not depend on the shard layout
+    order = np.lexsort((positions, -name_scores))[:k]
+
+    def pick(key: str, dtype) -> np.ndarray:
+        return np.concatenate([np.asarray(part[key], dtype=dtype) for part in parts])[order]
+
+    names = [name for part in parts for name in part["names"]]
+    addresses = [address for part in parts for address in part["addresses"]]
+    return positions[order], RowCandidates(
+        registry_ids=pick("registry_ids", np.int64),
+        names=[names[i] for i in order],
+        addresses=[addresses[i] for i in order],
+        name_scores=name_scores[order],
+        address_scores=pick("address_scores", np.float32),
+    )
+
+
+class ShardCoordinator:
+    """
+    Matches OCR rows against a registry split over shard workers.
+
+    Rows are sent to every worker in batches, each worker scores them
+    against its shard, and the per-shard top-k candidates are merged. The
+    results are those of matching against the whole registry on one host.
+
+    Example:
+        with ShardCoordinator(["node-1:7000", "node-2:7000"], shard_authkey()) as coordinator:
+            results_df, candidates = coordinator.create_ocr_matched_df(ocr_df)
+    """
+
+    def __init__(self, addresses: Sequence[str], authkey: bytes, timeout_s: float = 300):
+        """
+        Connects to the workers and checks they serve all of one registry.
+        A worker failing a request closes the coordinator.
+
+        Args:
+            addresses (Sequence[str]): The "host:port" addresses of the workers.
+            authkey (bytes): The key the workers were started with.
+            timeout_s (float): How long to wait for a worker to answer.
+
+        Raises:
+            ValueError: If the workers serve different registries, or their
+                shards overlap or leave records out.
+        """
+        self.timeout_s = timeout_s
+        self._lock = threading.Lock()
+        self._connections: List[Connection] = []
+        try:
+            for address in addresses:
+                self._connections.append(Client(parse_worker_address(address), authkey=authkey))
+            infos = self._request_all({"op": "info"})
+        except BaseException:
+            self.close()
+            raise
+
+        digests = {info["registry_digest"] for info in infos}
+        rows = {info["rows"] for info in infos}
+        if len(digests) != 1 or len(rows) != 1:
+            self.close()
+            raise ValueError("The shard workers serve different registries")
+        self.registry_digest = digests.pop()
+        self.rows = rows.pop()
+
+        covered = 0
+        for info in sorted(infos, key=lambda info: info["start"]):
+            if info["start"] != covered:
+                self.close()
+                raise ValueError(f"The shard workers do not cover registry rows {covered} to {info['start']}")
+            covered = info["stop"]
+        if covered != self.rows:
+            self.close()
+            raise ValueError(f"The shard workers do not cover registry rows {covered} to {self.rows}")
+        logger.info(f"Coordinating {len(infos)} shard workers over {self.rows} records")
+
+    def _request_all(self, request: dict) -> List[dict]:
+        payload = json.dumps(request).encode()
+        with self._lock:
+            if not self._connections:
+                raise RuntimeError("The coordinator is closed")
+            try:
+                # every worker starts on the request before any reply is awaited
+                for conn in self._connections:
+                    conn.send_bytes(payload)
+                replies = [self._receive(shard, conn) for shard, conn in enumerate(self._connections)]
+            except BaseException:
+                # replies still in flight would be read as answers to the next request
+                self.close()
+                raise
+        return replies
+
+    def _receive(self, shard: int, conn: Connection) -> dict:
+        if not conn.poll(self.timeout_s):
+            raise TimeoutError(f"Shard worker {shard} did not answer within {self.timeout_s}s")
+        reply = json.loads(conn.recv_bytes())
+        if "error" in reply:
+            raise RuntimeError(f"Shard worker {shard} failed: {reply['error']}")
+        return reply
+
+    def score_rows(self, rows: Sequence[Tuple[str, str]], k: int = 10) -> List[Tuple[np.ndarray, RowCandidates]]:
+        """
+        Gives the top-k candidates of a batch of OCR rows.
+
+        Args:
+            rows (Sequence[Tuple[str, str]]): The OCR name and address of every row.
+            k (int): The number of candidates kept per row.
+
+        Returns:
+            List[Tuple[np.ndarray, RowCandidates]]: The registry positions and
+                the candidates of every row, in row order.
+        """
+        if not len(rows):
+            return []
+        replies = self._request_all({"op": "score", "rows": [list(row) for row in rows], "k": k})
+        return [
+            merge_shard_candidates([reply["rows"][row] for reply in replies], k)
+            for row in range(len(rows))
+        ]
+
+    def score_candidates(self, ocr_name: str, ocr_address: str, limit_: int = 10) -> RowCandidates:
+        """Sharded `fuzzy_match_helper.score_candidates`."""
+        return self.score_rows([(ocr_name, ocr_address)], k=limit_)[0][1]
+
+    def get_matched_name_address(self, ocr_name: str, ocr_address: str) -> List[Tuple[str, str, float, int]]:
+        """
+        Sharded `fuzzy_match_helper.get_matched_name_address`.
+
+        Returns:
+            List[Tuple[str, str, float, int]]: The top matches with their
+                harmonic mean score and registry position, best first.
+        """
+        positions, candidates = self.score_rows([(ocr_name, ocr_address)])[0]
+        harmonic_means = combine_scores(candidates.name_scores, candidates.address_scores, "harmonic")
+        results = list(zip(candidates.names, candidates.addresses, harmonic_means, positions))
+        return sorted(results, key=lambda x: x[2], reverse=True)
+
+    def create_ocr_matched_df(
+        self, ocr_df: pd.DataFrame, threshold: float = None, k: int = 10, batch_size: int = 500
+    ) -> Tuple[pd.DataFrame, MatchCandidates]:
+        """
+        Sharded `fuzzy_match_helper.create_ocr_matched_df_with_candidates`.
+
+        Args:
+            ocr_df (pd.DataFrame): The DataFrame containing OCR results.
+            threshold (float): The threshold for matching. Defaults to
+                BASE_THRESHOLD of config.json.
+            k (int): The number of candidates kept per row.
+            batch_size (int): The number of rows sent to the workers at once.
+
+        Returns:
+            Tuple[pd.DataFrame, MatchCandidates]: The DataFrame with matched
+                name and address, and the candidates of its rows.
+        """
+        if threshold is None:
+            threshold = load_config()["BASE_THRESHOLD"]
+        rows = list(zip(ocr_df["OCR Name"], ocr_df["OCR Address"]))
+        candidates = [
+            row_candidates
+            for start in range(0, len(rows), batch_size)
+            for _, row_candidates in self.score_rows(rows[start:start + batch_size], k=k)
+        ]
+        return matched_df_from_candidates(ocr_df, candidates, threshold, k)
+
+    def close(self) -> None:
+        for conn in self._connections:
+            conn.close()
+        self._connections = []
+
+    def __enter__(self) -> "ShardCoordinator":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,124 @@
+from dataclasses import dataclass
+from typing import List, Tuple
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from fuzzy_match_helper import create_select_voter_records
+from store import file_digest
+from utils.app_logger import logger
+
+MANIFEST_FILENAME = "manifest.json"
+
+
+@dataclass
+class ShardInfo:
+    """A contiguous slice of the registry, rows `start` to `stop`"""
+
+    shard: int
+    filename: str
+    start: int
+    stop: int
+
+
+def partition_registry(
+    select_voter_records: pd.DataFrame, directory: str, n_shards: int, digest: str
+) -> str:
+    """
+    Splits a compiled registry into contiguous shards, one Parquet file each,
+    and writes a manifest describing them.
+
+    Shards keep the registry index, so the registry IDs and positions a
+    worker reports are those of the whole registry.
+
+    Args:
+        select_voter_records (pd.DataFrame): The compiled registry, as made
+            by `create_select_voter_records`.
+        directory (str): The directory of the shards and the manifest.
+        n_shards (int): The number of shards.
+        digest (str): The digest of the registry file, workers of different
+            registries refuse to be coordinated together.
+
+    Returns:
+        str: The path of the manifest.
+    """
+    if not 0 < n_shards <= max(len(select_voter_records), 1):
+        raise ValueError(f"Cannot split {len(select_voter_records)} records into {n_shards} shards")
+
+    os.makedirs(directory, exist_ok=True)
+    bounds = np.linspace(0, len(select_voter_records), n_shards + 1).astype(int)
+    shards = []
+    for shard, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+        filename = f"shard_{shard:03d}.parquet"
+        select_voter_records.iloc[start:stop].to_parquet(os.path.join(directory, filename))
+        shards.append(ShardInfo(shard, filename, int(start), int(stop)))
+
+    manifest_path = os.path.join(directory, MANIFEST_FILENAME)
+    with open(manifest_path, "w") as f:
+        json.dump(
+            {
+                "registry_digest": digest,
+                "rows": len(select_voter_records),
+                "shards": [shard.__dict__ for shard in shards],
+            },
+            f,
+            indent=2,
+        )
+    logger.info(f"Split {len(select_voter_records)} records into {n_shards} shards in {directory}")
+    return manifest_path
+
+
+def read_manifest(manifest_path: str) -> Tuple[str, int, List[ShardInfo]]:
+    """
+    Reads a shard manifest.
+
+    Args:
+        manifest_path (str): The path of the manifest.
+
+    Returns:
+        Tuple[str, int, List[ShardInfo]]: The registry digest, its number of
+            records and its shards.
+    """
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    return manifest["registry_digest"], manifest["rows"], [ShardInfo(**shard) for shard in manifest["shards"]]
+
+
+def load_shard(manifest_path: str, shard: int) -> Tuple[ShardInfo, pd.DataFrame]:
+    """
+    Loads one shard of a partitioned registry.
+
+    Args:
+        manifest_path (str): The path of the manifest.
+        shard (int): The number of the shard.
+
+    Returns:
+        Tuple[ShardInfo, pd.DataFrame]: The shard and its records.
+    """
+    _, _, shards = read_manifest(manifest_path)
+    if not 0 <= shard < len(shards):
+        raise ValueError(f"No shard {shard} in {manifest_path}, it has {len(shards)}")
+    info = shards[shard]
+    records = pd.read_parquet(os.path.join(os.path.dirname(manifest_path), info.filename))
+    return info, records
+
+
+def cli(argv: List[str] = None) -> int:
+    """Command line entry point splitting a registry into shards."""
+    parser = argparse.ArgumentParser(
+        prog="main.py shard-registry",
+        description="Split a voter registry into shards served by matching workers.",
+    )
+    parser.add_argument("registry", help="voter records CSV file")
+    parser.add_argument("output_dir", help="directory for the shards and their manifest")
+    parser.add_argument("--shards", type=int, required=True, help="number of shards")
+    args = parser.parse_args(argv)
+
+    digest = file_digest(args.registry)
+    select_voter_records = create_select_voter_records(pd.read_csv(args.registry, dtype=str))
+    manifest_path = partition_registry(select_voter_records, args.output_dir, args.shards, digest)
+    print(f"Wrote {args.shards} shards of {len(select_voter_records)} records, manifest {manifest_path}")
+    return 0
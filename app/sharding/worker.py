@@ -0,0 +1,157 @@
+from multiprocessing.connection import AuthenticationError, Connection, Listener
+from typing import List
+import argparse
+import json
+import os
+import threading
+
+import pandas as pd
+
+from address_canonicalizer import canonicalize_addresses
+from fuzzy_match_helper import score_candidates
+from utils.app_logger import logger
+
+from .shards import load_shard, read_manifest
+
+
+def shard_authkey() -> bytes:
+    """
+    Gives the key workers and coordinators authenticate each other with,
+    from the SHARD_AUTHKEY environment variable or .env.
+
+    Raises:
+        RuntimeError: If SHARD_AUTHKEY is not set.
+    """
+    authkey = os.getenv("SHARD_AUTHKEY")
+    if not authkey:
+        raise RuntimeError("Set SHARD_AUTHKEY to the same secret on the coordinator and every shard worker")
+    return authkey.encode()
+
+
+class ShardWorker:
+    """
+    Serves the matching of one registry shard over a socket.
+
+    Requests and replies are JSON messages on an authenticated
+    `multiprocessing.connection` channel, so nothing received is unpickled.
+    Each coordinator connection is served on its own thread.
+
+    Requests:
+        {"op": "info"}: the shard, its rows, the rows of the whole registry
+            and the registry digest.
+        {"op": "score", "rows": [[name, address], ...], "k": 10}: the top-k
+            candidates of every row within the shard, best name score first,
+            with their positions in the whole registry.
+    """
+
+    def __init__(self, manifest_path: str, shard: int, authkey: bytes, host: str = "127.0.0.1", port: int = 0):
+        """
+        Args:
+            manifest_path (str): The manifest of the partitioned registry.
+            shard (int): The number of the shard to serve.
+            authkey (bytes): The key coordinators authenticate with.
+            host (str): The interface to listen on.
+            port (int): The port to listen on, 0 picks a free one.
+        """
+        self.digest, self.registry_rows, _ = read_manifest(manifest_path)
+        self.info, self.records = load_shard(manifest_path, shard)
+        self._listener = Listener((host, port), authkey=authkey)
+        self.address = self._listener.address
+        self._closed = False
+
+    def serve_forever(self) -> None:
+        """Accepts coordinator connections until the worker is closed."""
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except AuthenticationError:
+                logger.warning(f"Shard {self.info.shard} refused a connection with a wrong key")
+                continue
+            except OSError:
+                if self._closed:
+                    return
+                raise
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: Connection) -> None:
+        with conn:
+            while True:
+                try:
+                    request = json.loads(conn.recv_bytes())
+                except EOFError:
+                    return
+                try:
+                    reply = self.handle(request)
+                except Exception as e:
+                    logger.exception(f"Shard {self.info.shard} failed a {request.get('op')} request")
+                    reply = {"error": str(e)}
+                conn.send_bytes(json.dumps(reply).encode())
+
+    def handle(self, request: dict) -> dict:
+        """Answers one request, see the class docstring."""
+        if request.get("op") == "info":
+            return {
+                "shard": self.info.shard,
+                "start": self.info.start,
+                "stop": self.info.stop,
+                "rows": self.registry_rows,
+                "registry_digest": self.digest,
+            }
+        if request.get("op") == "score":
+            k = min(int(request.get("k", 10)), len(self.records))
+            rows = request["rows"]
+            canonical_addresses = canonicalize_addresses(pd.Series([address for _, address in rows], dtype=object))
+            return {"rows": [
+                self._score(name, address, canonical_address, k)
+                for (name, address), canonical_address in zip(rows, canonical_addresses)
+            ]}
+        raise ValueError(f"Unknown request: {request.get('op')}")
+
+    def _score(self, name: str, address: str, canonical_address: str, k: int) -> dict:
+        candidates = score_candidates(name, address, self.records, limit_=k, canonical_address=canonical_address)
+        positions = self.info.start + self.records.index.get_indexer(candidates.registry_ids)
+        return {
+            "positions": positions.tolist(),
+            "registry_ids": candidates.registry_ids.tolist(),
+            "names": list(candidates.names),
+            "addresses": list(candidates.addresses),
+            "name_scores": candidates.name_scores.tolist(),
+            "address_scores": candidates.address_scores.tolist(),
+        }
+
+    def close(self) -> None:
+        self._closed = True
+        self._listener.close()
+
+
+def cli(argv: List[str] = None) -> int:
+    """Command line entry point of a shard worker."""
+    parser = argparse.ArgumentParser(
+        prog="main.py shard-worker",
+        description="Serve the matching of one registry shard to a coordinator.",
+    )
+    parser.add_argument("manifest", help="manifest written by main.py shard-registry")
+    parser.add_argument("shard", type=int, help="number of the shard to serve")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on, 0.0.0.0 for all")
+    parser.add_argument("--port", type=int, default=0, help="port to listen on, 0 picks a free one")
+    args = parser.parse_args(argv)
+
+    try:
+        authkey = shard_authkey()
+    except RuntimeError as e:
+        print(e)
+        return 2
+
+    worker = ShardWorker(args.manifest, args.shard, authkey, host=args.host, port=args.port)
+    host, port = worker.address
+    print(
+        f"Serving shard {worker.info.shard} ({worker.info.stop - worker.info.start} records) on {host}:{port}",
+        flush=True,
+    )
+    try:
+        worker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.close()
+    return 0
@@ -0,0 +1,31 @@
+from .checkpoint import OcrCheckpoint
+from .checkpoint import file_digest
+from .checkpoint import ocr_settings_key
+from .export import EXPORT_FORMATS
+from .export import frame_chunks
+from .export import write_export
+from .results_store import RESULT_COLUMNS
+from .results_store import ResultsStore
+from .results_view import FrameResults
+from .results_view import ReevaluatedResults
+from .results_view import ResultsFilter
+from .results_view import ResultsPage
+from .results_view import ResultsSummary
+from .results_view import StoreResults
+
+__all__ = [
+    "OcrCheckpoint",
+    "file_digest",
+    "ocr_settings_key",
+    "EXPORT_FORMATS",
+    "frame_chunks",
+    "write_export",
+    "RESULT_COLUMNS",
+    "ResultsStore",
+    "FrameResults",
+    "ReevaluatedResults",
+    "ResultsFilter",
+    "ResultsPage",
+    "ResultsSummary",
+    "StoreResults",
+]
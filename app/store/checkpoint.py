@@ -0,0 +1,237 @@
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from settings import load_config, load_settings
+from utils.app_logger import logger
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    run_key TEXT NOT NULL,
+    page_number INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    rows TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (run_key, page_number)
+);
+CREATE TABLE IF NOT EXISTS matches (
+    run_key TEXT NOT NULL,
+    registry_key TEXT NOT NULL,
+    page_number INTEGER NOT NULL,
+    rows TEXT NOT NULL,
+    PRIMARY KEY (run_key, registry_key, page_number)
+);
+"""
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Hashes the content of a file.
+
+    Args:
+        path (str): The file to hash.
+        chunk_size (int): The number of bytes read at a time.
+
+    Returns:
+        str: The hex SHA-256 digest of the file.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def ocr_settings_key() -> str:
+    """
+    Fingerprints the settings that change the OCR result of a page: the
+    engine, its model, the output schema and the page crop.
+
+    Returns:
+        str: A short hex digest of the settings.
+    """
+    settings = load_settings()
+    config = load_config()
+    ocr_settings = {
+        "engine": type(settings.selected_config).__name__,
+        "model": settings.selected_config.model,
+        "schema": settings.ocr_schema,
+        "top_crop": config["TOP_CROP"],
+        "bottom_crop": config["BOTTOM_CROP"],
+    }
+    return hashlib.sha256(json.dumps(ocr_settings, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class OcrCheckpoint:
+    """
+    SQLite store of the OCR rows of every page, written as pages complete.
+
+    Pages are keyed by a run key made of the content hash of the PDF and
+    the OCR settings, so renaming a file keeps its checkpoint while
+    changing the model or the crop starts over. With `resume` set, pages
+    already read are served from the store and only missing or failed
+    pages are sent to OCR again. Matched rows are kept per page as well,
+    keyed by the voter registry they were matched against.
+
+    Example:
+        checkpoint = OcrCheckpoint("results/checkpoint.sqlite", resume=True)
+        queue = OcrJobQueue("petitions", checkpoint=checkpoint)
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        """
+        Args:
+            path (str): The SQLite database file, created if missing.
+            resume (bool): Reuse the pages stored by an earlier run. Otherwise
+                the stored pages of a file are cleared when it is read again.
+        """
+        self.path = path
+        self.resume = resume
+        self._lock = threading.Lock()
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+        # run keys cleared by this run, a file uploaded twice is only cleared once
+        self._started = set()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # shared by the event loop and the matching threads, writes are serialized by the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def run_key(self, pdf_path: str) -> str:
+        """
+        Gives the key of the pages of a PDF file under the current settings.
+
+        The content hash is cached by path, size and modification time, so
+        asking again for the same file is cheap.
+
+        Args:
+            pdf_path (str): The PDF file.
+
+        Returns:
+            str: The run key of the file.
+        """
+        stat = os.stat(pdf_path)
+        cache_key = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+        if cache_key not in self._digests:
+            self._digests[cache_key] = file_digest(pdf_path)
+        return f"{self._digests[cache_key]}:{ocr_settings_key()}"
+
+    def start(self, run_key: str) -> Dict[int, List[dict]]:
+        """
+        Starts reading a file.
+
+        Args:
+            run_key (str): The run key of the file.
+
+        Returns:
+            Dict[int, List[dict]]: The OCR rows of the pages already read,
+                keyed by page number. Unless resuming, only pages read earlier
+                in this run, by a copy of the same file.
+        """
+        with self._lock:
+            if not self.resume and run_key not in self._started:
+                self._started.add(run_key)
+                self._conn.execute("DELETE FROM pages WHERE run_key = ?", (run_key,))
+                self._conn.execute("DELETE FROM matches WHERE run_key = ?", (run_key,))
+                self._conn.commit()
+            done = self._conn.execute(
+                "SELECT page_number, rows FROM pages WHERE run_key = ? AND status = 'ok'",
+                (run_key,),
+            ).fetchall()
+
+        if done:
+            logger.info(f"Reusing {len(done)} checkpointed pages of {run_key}")
+        return {page_number: json.loads(rows) for page_number, rows in done}
+
+    def save_page(
+        self,
+        run_key: str,
+        page_number: int,
+        status: str,
+        rows: Optional[List[dict]] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        """
+        Stores the outcome of a page.
+
+        Args:
+            run_key (str): The run key of the file.
+            page_number (int): The page number, starting at 1.
+            status (str): One of ok, failed or skipped. Only ok pages are
+                reused when resuming.
+            rows (List[dict]): The OCR rows of the page.
+            error (str): Why the page failed.
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    run_key,
+                    page_number,
+                    status,
+                    json.dumps(rows) if rows is not None else None,
+                    error,
+                    time.time(),
+                ),
+            )
+            self._conn.commit()
+
+    def page_status(self, run_key: str) -> Dict[int, str]:
+        """Gives the stored status of every page of a file, keyed by page number."""
+        with self._lock:
+            return dict(
+                self._conn.execute(
+                    "SELECT page_number, status FROM pages WHERE run_key = ?", (run_key,)
+                ).fetchall()
+            )
+
+    def load_matches(self, run_key: str, registry_key: str) -> pd.DataFrame:
+        """
+        Loads the matched rows stored for a file.
+
+        Args:
+            run_key (str): The run key of the file.
+            registry_key (str): The digest of the voter registry matched against.
+
+        Returns:
+            pd.DataFrame: The matched rows of every stored page, empty if none.
+        """
+        with self._lock:
+            stored = self._conn.execute(
+                "SELECT rows FROM matches WHERE run_key = ? AND registry_key = ? ORDER BY page_number",
+                (run_key, registry_key),
+            ).fetchall()
+
+        records = [record for (rows,) in stored for record in json.loads(rows)]
+        return pd.DataFrame.from_records(records)
+
+    def save_matches(self, run_key: str, registry_key: str, matched_df: pd.DataFrame) -> None:
+        """
+        Stores matched rows, one entry per page.
+
+        Args:
+            run_key (str): The run key of the file.
+            registry_key (str): The digest of the voter registry matched against.
+            matched_df (pd.DataFrame): Matched rows with a "Page Number" column.
+        """
+        entries = [
+            (run_key, registry_key, int(page_number), page_df.to_json(orient="records"))
+            for page_number, page_df in matched_df.groupby("Page Number")
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO matches VALUES (?, ?, ?, ?)", entries)
+            self._conn.commit()
@@ -0,0 +1,141 @@
+from typing import Iterable, Iterator, List
+import argparse
+import os
+
+import pandas as pd
+
+from settings import load_config
+
+from .results_store import _COLUMNS, RESULT_COLUMNS, ResultsStore
+
+EXPORT_FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+def frame_chunks(results_df: pd.DataFrame, chunk_size: int = 50_000) -> Iterator[pd.DataFrame]:
+    """Splits a results DataFrame into chunks without copying it."""
+    for start in range(0, len(results_df), chunk_size):
+        yield results_df.iloc[start:start + chunk_size]
+
+
+# nullable pandas types of the result columns, by store type
+_PANDAS_TYPES = {"TEXT": "string", "REAL": "float64", "INTEGER": "Int64"}
+
+
+def _typed(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Gives a chunk the same column types however its values were read."""
+    return chunk.reindex(columns=RESULT_COLUMNS).astype(
+        {
+            column: "boolean" if column == "Valid" else _PANDAS_TYPES[sql_type]
+            for column, _, sql_type in _COLUMNS
+        }
+    )
+
+
+def _csv_bytes(chunk: pd.DataFrame, header: bool) -> bytes:
+    return _typed(chunk).to_csv(index=False, header=header).encode("utf-8")
+
+
+def write_export(chunks: Iterable[pd.DataFrame], path: str, export_format: str = None) -> int:
+    """
+    Writes results to a CSV or Parquet file, one chunk at a time.
+
+    Only one chunk is held in memory, however large the results. The file
+    is written under a temporary name and moved into place when complete.
+
+    Args:
+        chunks (Iterable[pd.DataFrame]): The results in chunks, e.g. from
+            `ResultsStore.iter_chunks` or `frame_chunks`.
+        path (str): The file to write.
+        export_format (str): "csv" or "parquet". Defaults to the extension of `path`.
+
+    Returns:
+        int: The number of rows written.
+    """
+    export_format = export_format or os.path.splitext(path)[1].lstrip(".").lower()
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    tmp_path = path + ".tmp"
+    try:
+        rows = _write_chunks(chunks, tmp_path, export_format)
+    except BaseException:
+        # an export stopped part way leaves no partial file behind
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    return rows
+
+
+def _write_chunks(chunks: Iterable[pd.DataFrame], path: str, export_format: str) -> int:
+    rows = 0
+    if export_format == "csv":
+        with open(path, "wb") as f:
+            for chunk in chunks:
+                f.write(_csv_bytes(chunk, header=f.tell() == 0))
+                rows += len(chunk)
+            if f.tell() == 0:
+                f.write(_csv_bytes(pd.DataFrame(), header=True))
+    else:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.Schema.from_pandas(_typed(pd.DataFrame()), preserve_index=False)
+        with pq.ParquetWriter(path, schema) as writer:
+            # one row group per chunk
+            for chunk in chunks:
+                writer.write_table(pa.Table.from_pandas(_typed(chunk), schema=schema, preserve_index=False))
+                rows += len(chunk)
+    return rows
+
+
+def cli(argv: List[str] = None) -> int:
+    """Command line entry point of the results export."""
+    parser = argparse.ArgumentParser(
+        prog="main.py export",
+        description="Export a run of the results database to CSV or Parquet.",
+    )
+    parser.add_argument("run_id", help="run to export, or 'latest'")
+    parser.add_argument("output", help="file to write, .csv or .parquet")
+    parser.add_argument("--db", default=load_config()["RESULTS_DB"], help="results database")
+    parser.add_argument(
+        "--follow",
+        action="store_true",
+        help="start while the run is still producing rows and wait for it to finish",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=600,
+        help="with --follow, give up after this many seconds without new rows from a running run",
+    )
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="rows held in memory")
+    args = parser.parse_args(argv)
+
+    store = ResultsStore(args.db)
+    try:
+        run_id = args.run_id
+        if run_id == "latest":
+            runs = store.runs()
+            if runs.empty:
+                print(f"No runs in {args.db}")
+                return 1
+            run_id = runs["run_id"].iloc[0]
+        if store.run_status(run_id) is None:
+            print(f"No run {run_id} in {args.db}")
+            return 1
+
+        chunks = store.iter_chunks(
+            run_id, chunk_size=args.chunk_size, follow=args.follow, idle_timeout=args.idle_timeout
+        )
+        try:
+            rows = write_export(chunks, args.output)
+        except TimeoutError as e:
+            print(e)
+            return 1
+    finally:
+        store.close()
+    print(f"Exported {rows} rows of run {run_id} to {args.output}")
+    return 0
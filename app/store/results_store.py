@@ -0,0 +1,410 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from utils.app_logger import logger
+
+# result columns and the store columns they are kept in
+_COLUMNS: List[Tuple[str, str, str]] = [
+    ("OCR Name", "ocr_name", "TEXT"),
+    ("OCR Address", "ocr_address", "TEXT"),
+    ("Matched Name", "matched_name", "TEXT"),
+    ("Matched Address", "matched_address", "TEXT"),
+    ("Date", "date", "TEXT"),
+    ("OCR Ward", "ward", "TEXT"),
+    ("Match Score", "match_score", "REAL"),
+    ("Valid", "valid", "INTEGER"),
+    ("Page Number", "page_number", "INTEGER"),
+    ("Row Number", "row_number", "INTEGER"),
+    ("Filename", "filename", "TEXT"),
+    ("Duplicate Of", "duplicate_of", "TEXT"),
+    ("Matched Registry ID", "registry_id", "INTEGER"),
+]
+RESULT_COLUMNS = [column for column, _, _ in _COLUMNS]
+_SQL_COLUMNS = {column: sql_column for column, sql_column, _ in _COLUMNS}
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    campaign TEXT,
+    source TEXT,
+    threshold REAL,
+    status TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL REFERENCES runs (run_id),
+    {", ".join(f"{sql_column} {sql_type}" for _, sql_column, sql_type in _COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS idx_results_file_page ON results (run_id, filename, page_number);
+CREATE INDEX IF NOT EXISTS idx_results_valid ON results (run_id, valid);
+CREATE INDEX IF NOT EXISTS idx_results_ward ON results (run_id, ward);
+CREATE INDEX IF NOT EXISTS idx_results_registry_id ON results (registry_id);
+CREATE INDEX IF NOT EXISTS idx_runs_campaign ON runs (campaign);
+"""
+
+
+class ResultsStore:
+    """
+    SQLite store of matched signatures, kept across sessions, runs and campaigns.
+
+    Rows are only ever appended, in one transaction per call, so a running
+    job can write each file or chunk as it is matched while the rows
+    written so far are queried. Rows are indexed by run together with
+    filename and page number, validity and ward, and by the matched
+    registry ID across runs, so filters and summaries stay fast with
+    millions of rows.
+
+    Filters are given as keyword arguments named after the result columns
+    in snake case, e.g. `store.query(run_id, valid=True, ward="3")`.
+
+    Example:
+        store = ResultsStore("data/results.sqlite")
+        run_id = store.start_run(campaign="Initiative 83")
+        store.append(run_id, matched_df)
+        store.finish_run(run_id)
+        store.summary(run_id, by="Filename")
+    """
+
+    # filter arguments and the store columns they apply to
+    FILTERS: Dict[str, str] = {
+        "filename": "filename",
+        "page_number": "page_number",
+        "valid": "valid",
+        "ward": "ward",
+        "registry_id": "registry_id",
+        "row_id": "id",
+        "duplicate": "duplicate_of IS NOT NULL",
+        "after_id": "id >",
+        "until_id": "id <=",
+    }
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): The SQLite database file, created if missing.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # shared by jobs and sessions, calls are serialized by the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def candidates_path(self, run_id: str) -> str:
+        """Gives the file the match candidates of a run are kept in, next to the database."""
+        return os.path.join(os.path.splitext(self.path)[0] + "_candidates", f"{run_id}.npz")
+
+    ###
+    ## WRITING
+    ###
+
+    def start_run(
+        self,
+        run_id: str = None,
+        campaign: str = None,
+        source: str = None,
+        threshold: float = None,
+    ) -> str:
+        """
+        Registers a run before its rows are appended.
+
+        Args:
+            run_id (str): The ID of the run, e.g. a job ID. Defaults to a new ID.
+            campaign (str): The petition campaign the run belongs to.
+            source (str): Where the run came from, e.g. "app" or "batch".
+            threshold (float): The match score threshold rows were validated with.
+
+        Returns:
+            str: The ID of the run.
+        """
+        run_id = run_id or uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO runs VALUES (?, ?, ?, ?, 'running', ?, NULL)",
+                (run_id, campaign, source, threshold, time.time()),
+            )
+            self._conn.commit()
+        return run_id
+
+    def finish_run(self, run_id: str, status: str = "done") -> None:
+        """Marks a run as finished with one of done, failed or cancelled."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE runs SET status = ?, finished_at = ? WHERE run_id = ?",
+                (status, time.time(), run_id),
+            )
+            self._conn.commit()
+
+    def append(self, run_id: str, results_df: pd.DataFrame) -> int:
+        """
+        Appends matched rows to a run.
+
+        Args:
+            run_id (str): The ID of the run.
+            results_df (pd.DataFrame): Matched rows, missing result columns are
+                stored as NULL.
+
+        Returns:
+            int: The number of rows appended.
+        """
+        if not len(results_df):
+            return 0
+
+        values = results_df.reindex(columns=RESULT_COLUMNS)
+        values = values.astype(object).where(values.notna(), None)
+        values["Valid"] = values["Valid"].map(lambda valid: None if valid is None else bool(valid))
+        rows = [(run_id, *row) for row in values.itertuples(index=False, name=None)]
+
+        placeholders = ", ".join("?" for _ in range(len(_COLUMNS) + 1))
+        sql_columns = ", ".join(sql_column for _, sql_column, _ in _COLUMNS)
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT INTO results (run_id, {sql_columns}) VALUES ({placeholders})", rows
+            )
+            self._conn.commit()
+
+        logger.debug(f"Appended {len(rows)} rows to run {run_id}")
+        return len(rows)
+
+    ###
+    ## READING
+    ###
+
+    def _where(self, run_id: Optional[str], filters: dict) -> Tuple[str, list]:
+        clauses, params = [], []
+        if run_id is not None:
+            clauses.append("run_id = ?")
+            params.append(run_id)
+        for name, value in filters.items():
+            if name not in self.FILTERS:
+                raise ValueError(f"Unknown filter: {name}")
+            if value is None:
+                continue
+            if name == "duplicate":
+                clauses.append(self.FILTERS[name] if value else f"NOT ({self.FILTERS[name]})")
+            elif name in ("after_id", "until_id"):
+                clauses.append(f"{self.FILTERS[name]} ?")
+                params.append(value)
+            elif isinstance(value, (list, tuple, set)):
+                clauses.append(f"{self.FILTERS[name]} IN ({', '.join('?' for _ in value)})")
+                params.extend(value)
+            else:
+                clauses.append(f"{self.FILTERS[name]} = ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def _to_df(self, cursor: sqlite3.Cursor) -> pd.DataFrame:
+        columns = {sql_column: column for column, sql_column, _ in _COLUMNS}
+        results_df = pd.DataFrame.from_records(
+            cursor.fetchall(), columns=[description[0] for description in cursor.description]
+        ).rename(columns=columns)
+        if "Valid" in results_df:
+            results_df["Valid"] = results_df["Valid"].astype(bool)
+        return results_df
+
+    def count(self, run_id: str = None, **filters) -> int:
+        """Counts the rows of a run matching the filters."""
+        where, params = self._where(run_id, filters)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM results{where}", params).fetchone()[0]
+
+    def query(
+        self,
+        run_id: str = None,
+        order_by: str = None,
+        descending: bool = False,
+        limit: int = None,
+        offset: int = 0,
+        **filters,
+    ) -> pd.DataFrame:
+        """
+        Reads the rows of a run matching the filters.
+
+        Args:
+            run_id (str): The ID of the run. Defaults to all runs.
+            order_by (str): The result column to sort by. Defaults to the
+                order rows were appended in.
+            descending (bool): Sort in descending order.
+            limit (int): The maximum number of rows to read.
+            offset (int): The number of rows to skip.
+            **filters: Filters on the rows, see `FILTERS`.
+
+        Returns:
+            pd.DataFrame: The matching rows with the result columns.
+        """
+        where, params = self._where(run_id, filters)
+        sql_order = _SQL_COLUMNS[order_by] if order_by else "id"
+        direction = "DESC" if descending else "ASC"
+        sql = (
+            f"SELECT {', '.join(_SQL_COLUMNS.values())} FROM results{where} "
+            f"ORDER BY {sql_order} {direction}, id {direction}"
+        )
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        with self._lock:
+            return self._to_df(self._conn.execute(sql, params))
+
+    def row_ids(
+        self,
+        run_id: str = None,
+        order_by: str = None,
+        descending: bool = False,
+        **filters,
+    ) -> np.ndarray:
+        """
+        Lists the row IDs of a run matching the filters, in the order of `query`.
+
+        Lets views keep the positions of the rows of a large run without
+        reading them, e.g. to page through re-evaluated results.
+        """
+        where, params = self._where(run_id, filters)
+        sql_order = _SQL_COLUMNS[order_by] if order_by else "id"
+        direction = "DESC" if descending else "ASC"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id FROM results{where} ORDER BY {sql_order} {direction}, id {direction}", params
+            ).fetchall()
+        return np.fromiter((row_id for (row_id,) in rows), dtype=np.int64, count=len(rows))
+
+    def iter_chunks(
+        self,
+        run_id: str = None,
+        chunk_size: int = 50_000,
+        follow: bool = False,
+        poll_interval: float = 1.0,
+        idle_timeout: float = None,
+        **filters,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Reads the rows of a run in chunks, keeping memory flat for large runs.
+
+        Chunks are read by row ID, so rows appended while iterating are
+        included as long as the iterator has not reached the end.
+
+        Args:
+            run_id (str): The ID of the run. Defaults to all runs.
+            chunk_size (int): The number of rows per chunk.
+            follow (bool): Wait for the rows of a running run until it finishes.
+            poll_interval (float): Seconds between checks for new rows when following.
+            idle_timeout (float): Seconds to wait for new rows of a running run
+                before giving up, e.g. when the process running it has died.
+                Waits as long as it runs by default.
+            **filters: Filters on the rows, see `FILTERS`.
+
+        Yields:
+            pd.DataFrame: The next rows in the order they were appended.
+
+        Raises:
+            TimeoutError: If a followed run adds no rows for `idle_timeout` seconds.
+        """
+        where, params = self._where(run_id, filters)
+        where = (where + " AND" if where else " WHERE") + " id > ?"
+        last_id = 0
+        last_row_at = time.monotonic()
+        while True:
+            # read before the rows, every row of a finished run is committed by then
+            running = follow and self.run_status(run_id) == "running"
+            with self._lock:
+                chunk = self._to_df(
+                    self._conn.execute(
+                        f"SELECT id, {', '.join(_SQL_COLUMNS.values())} FROM results{where} "
+                        f"ORDER BY id LIMIT ?",
+                        params + [last_id, chunk_size],
+                    )
+                )
+            if chunk.empty:
+                if not running:
+                    return
+                if idle_timeout is not None and time.monotonic() - last_row_at > idle_timeout:
+                    raise TimeoutError(f"Run {run_id} added no rows for {idle_timeout:g} seconds")
+                time.sleep(poll_interval)
+                continue
+            last_row_at = time.monotonic()
+            last_id = int(chunk["id"].iloc[-1])
+            yield chunk.drop(columns="id")
+
+    def run_status(self, run_id: str) -> Optional[str]:
+        """Gives the status of a run, `None` if there is no such run."""
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return row[0] if row else None
+
+    def last_row_id(self, run_id: str = None) -> int:
+        """Gives the ID of the last row appended to a run, 0 if it has no rows."""
+        where, params = self._where(run_id, {})
+        with self._lock:
+            return self._conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM results{where}", params).fetchone()[0]
+
+    def distinct(self, column: str, run_id: str = None) -> list:
+        """Lists the distinct values of a result column in a run, e.g. its filenames."""
+        where, params = self._where(run_id, {})
+        sql_column = _SQL_COLUMNS[column]
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT DISTINCT {sql_column} FROM results{where} ORDER BY {sql_column}", params
+            ).fetchall()
+        return [value for (value,) in rows if value is not None]
+
+    def summary(self, run_id: str = None, by: str = None, **filters) -> pd.DataFrame:
+        """
+        Counts the rows, valid signatures and duplicates of a run.
+
+        Rows of duplicate pages are counted as duplicates and not as valid.
+
+        Args:
+            run_id (str): The ID of the run. Defaults to all runs.
+            by (str): A result column to group by, e.g. "Filename" or "OCR Ward".
+            **filters: Filters on the rows, see `FILTERS`.
+
+        Returns:
+            pd.DataFrame: The "Total", "Valid" and "Duplicates" counts, one row
+                per group or a single row.
+        """
+        where, params = self._where(run_id, filters)
+        group = _SQL_COLUMNS[by] if by else None
+        sql = (
+            f"SELECT {group + ', ' if group else ''}COUNT(*), "
+            "COALESCE(SUM(valid AND duplicate_of IS NULL), 0), "
+            f"COALESCE(SUM(duplicate_of IS NOT NULL), 0) FROM results{where}"
+        )
+        if group:
+            sql += f" GROUP BY {group} ORDER BY {group}"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return pd.DataFrame.from_records(
+            rows, columns=([by] if by else []) + ["Total", "Valid", "Duplicates"]
+        )
+
+    def runs(self, campaign: str = None) -> pd.DataFrame:
+        """Lists the stored runs, newest first, with their row counts."""
+        sql = (
+            "SELECT runs.*, (SELECT COUNT(*) FROM results WHERE results.run_id = runs.run_id) AS rows "
+            "FROM runs"
+        )
+        params = []
+        if campaign is not None:
+            sql += " WHERE campaign = ?"
+            params.append(campaign)
+        with self._lock:
+            cursor = self._conn.execute(sql + " ORDER BY started_at DESC", params)
+            return pd.DataFrame.from_records(
+                cursor.fetchall(), columns=[description[0] for description in cursor.description]
+            )
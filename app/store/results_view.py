@@ -0,0 +1,290 @@
+from dataclasses import dataclass
+from typing import Iterator, List, NamedTuple, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from match_candidates import MatchCandidates
+
+from .export import frame_chunks
+from .results_store import RESULT_COLUMNS, ResultsStore
+
+
+@dataclass
+class ResultsFilter:
+    """Filters of the results view, `None` shows everything"""
+
+    filenames: Optional[List[str]] = None
+    wards: Optional[List[str]] = None
+    valid: Optional[bool] = None
+    duplicate: Optional[bool] = None
+
+
+@dataclass
+class ResultsSummary:
+    """Running counts of the results, updated as rows are added"""
+
+    # signatures, without the rows of rescanned pages
+    total: int = 0
+    valid: int = 0
+    # rows of rescanned pages, counted once on their first copy
+    duplicates: int = 0
+
+    def add(self, results_df: pd.DataFrame) -> None:
+        is_duplicate = results_df["Duplicate Of"].notna()
+        self.total += int((~is_duplicate).sum())
+        self.valid += int((results_df["Valid"].astype(bool) & ~is_duplicate).sum())
+        self.duplicates += int(is_duplicate.sum())
+
+    @property
+    def percentage_valid(self) -> float:
+        return 100 * self.valid / max(self.total, 1)
+
+
+class ResultsPage(NamedTuple):
+    rows: pd.DataFrame
+    total_rows: int
+    page: int
+    page_count: int
+
+
+class FrameResults:
+    """
+    Results view of a DataFrame.
+
+    Filters are applied as column masks and only the visible page is
+    sorted into view and copied out of the frame.
+    """
+
+    def __init__(self, results_df: pd.DataFrame):
+        self.results_df = results_df
+        self._summary = ResultsSummary()
+        self._summarized_rows = 0
+
+    def _filtered(self, results_filter: ResultsFilter) -> pd.DataFrame:
+        results_df = self.results_df
+        mask = pd.Series(True, index=results_df.index)
+        if results_filter.filenames is not None:
+            mask &= results_df["Filename"].isin(results_filter.filenames)
+        if results_filter.wards is not None:
+            mask &= results_df["OCR Ward"].astype(str).isin([str(ward) for ward in results_filter.wards])
+        if results_filter.valid is not None:
+            mask &= results_df["Valid"] == results_filter.valid
+        if results_filter.duplicate is not None:
+            mask &= results_df["Duplicate Of"].notna() == results_filter.duplicate
+        return results_df[mask]
+
+    def page(
+        self,
+        results_filter: ResultsFilter,
+        page: int = 1,
+        page_size: int = 100,
+        order_by: str = None,
+        descending: bool = False,
+    ) -> ResultsPage:
+        """
+        Fetches one page of the filtered and sorted results.
+
+        Args:
+            results_filter (ResultsFilter): The rows to show.
+            page (int): The page number, starting at 1. Clamped to the last page.
+            page_size (int): The number of rows per page.
+            order_by (str): The column to sort by. Defaults to the result order.
+            descending (bool): Sort in descending order.
+
+        Returns:
+            ResultsPage: The rows of the page and the number of pages.
+        """
+        filtered_df = self._filtered(results_filter)
+        page_count = max(-(-len(filtered_df) // page_size), 1)
+        page = min(max(page, 1), page_count)
+        start = (page - 1) * page_size
+
+        if order_by:
+            # mergesort keeps the result order of equal values, like the store does
+            order = filtered_df[order_by].argsort(kind="mergesort").to_numpy()
+            if descending:
+                order = order[::-1]
+            rows = filtered_df.iloc[order[start:start + page_size]]
+        else:
+            rows = filtered_df.iloc[start:start + page_size]
+        return ResultsPage(rows.reindex(columns=RESULT_COLUMNS), len(filtered_df), page, page_count)
+
+    def options(self, column: str) -> list:
+        """Lists the distinct values of a column, for filter choices."""
+        values = self.results_df[column].dropna().astype(str).unique()
+        return sorted(values)
+
+    def iter_chunks(self, chunk_size: int = 50_000) -> Iterator[pd.DataFrame]:
+        """Gives every result in chunks, for export."""
+        return frame_chunks(self.results_df, chunk_size)
+
+    def summary(self) -> ResultsSummary:
+        """Counts the results, only adding the rows appended since the last call."""
+        if len(self.results_df) > self._summarized_rows:
+            self._summary.add(self.results_df.iloc[self._summarized_rows:])
+            self._summarized_rows = len(self.results_df)
+        return self._summary
+
+
+class StoreResults:
+    """
+    Results view of a run in the results store.
+
+    Filtering, sorting and paging run as indexed queries, so only the
+    visible page is read, however large the run.
+    """
+
+    def __init__(self, store: ResultsStore, run_id: str):
+        self.store = store
+        self.run_id = run_id
+        self._summary = ResultsSummary()
+        self._last_row_id = 0
+
+    @staticmethod
+    def _filters(results_filter: ResultsFilter) -> dict:
+        return {
+            "filename": results_filter.filenames,
+            "ward": results_filter.wards,
+            "valid": results_filter.valid,
+            "duplicate": results_filter.duplicate,
+        }
+
+    def page(
+        self,
+        results_filter: ResultsFilter,
+        page: int = 1,
+        page_size: int = 100,
+        order_by: str = None,
+        descending: bool = False,
+    ) -> ResultsPage:
+        """See `FrameResults.page`."""
+        filters = self._filters(results_filter)
+        total_rows = self.store.count(self.run_id, **filters)
+        page_count = max(-(-total_rows // page_size), 1)
+        page = min(max(page, 1), page_count)
+        rows = self.store.query(
+            self.run_id,
+            order_by=order_by,
+            descending=descending,
+            limit=page_size,
+            offset=(page - 1) * page_size,
+            **filters,
+        )
+        return ResultsPage(rows, total_rows, page, page_count)
+
+    def options(self, column: str) -> list:
+        """Lists the distinct values of a column, for filter choices."""
+        return [str(value) for value in self.store.distinct(column, self.run_id)]
+
+    def iter_chunks(self, chunk_size: int = 50_000) -> Iterator[pd.DataFrame]:
+        """Gives every result in chunks, for export."""
+        return self.store.iter_chunks(self.run_id, chunk_size=chunk_size)
+
+    def summary(self) -> ResultsSummary:
+        """Counts the results, only reading the rows appended since the last call."""
+        last_row_id = self.store.last_row_id(self.run_id)
+        if last_row_id > self._last_row_id:
+            counts = self.store.summary(
+                self.run_id, after_id=self._last_row_id, until_id=last_row_id
+            ).iloc[0]
+            self._summary.total += int(counts["Total"]) - int(counts["Duplicates"])
+            self._summary.valid += int(counts["Valid"])
+            self._summary.duplicates += int(counts["Duplicates"])
+            self._last_row_id = last_row_id
+        return self._summary
+
+
+class ReevaluatedResults:
+    """
+    Results view of a run in the results store, re-evaluated with another
+    threshold or combination rule from its match candidates.
+
+    Only the row IDs of the run and its re-evaluated matches are held, the
+    stored rows of a page or chunk are read when it is shown or exported,
+    so the run is never loaded as a whole.
+    """
+
+    def __init__(
+        self,
+        store: ResultsStore,
+        run_id: str,
+        candidates: MatchCandidates,
+        threshold: float,
+        rule: str = "harmonic",
+    ):
+        self.store = store
+        self.run_id = run_id
+        # in append order, the order the candidates were kept in
+        self.row_ids = store.row_ids(run_id)
+        if len(self.row_ids) != len(candidates):
+            raise ValueError(f"{len(self.row_ids)} results for {len(candidates)} rows of candidates")
+        self.evaluated = candidates.evaluate(threshold, rule)
+        self._summary = None
+
+    def _positions(self, results_filter: ResultsFilter, order_by: str = None, descending: bool = False) -> np.ndarray:
+        # re-evaluated columns are sorted here, the others by the store
+        store_order = order_by if order_by not in self.evaluated.columns else None
+        row_ids = self.store.row_ids(
+            self.run_id,
+            order_by=store_order,
+            descending=descending and store_order is not None,
+            **{**StoreResults._filters(results_filter), "valid": None},
+        )
+        positions = np.searchsorted(self.row_ids, row_ids)
+        if results_filter.valid is not None:
+            positions = positions[self.evaluated["Valid"].to_numpy()[positions] == results_filter.valid]
+        if order_by and store_order is None:
+            # mergesort keeps the result order of equal values, like the store does
+            order = self.evaluated[order_by].to_numpy()[positions].argsort(kind="mergesort")
+            positions = positions[order[::-1] if descending else order]
+        return positions
+
+    def _reevaluated(self, rows: pd.DataFrame, positions: Union[np.ndarray, slice]) -> pd.DataFrame:
+        evaluated = self.evaluated.iloc[positions]
+        return rows.assign(**{column: evaluated[column].to_numpy() for column in evaluated.columns})
+
+    def page(
+        self,
+        results_filter: ResultsFilter,
+        page: int = 1,
+        page_size: int = 100,
+        order_by: str = None,
+        descending: bool = False,
+    ) -> ResultsPage:
+        """See `FrameResults.page`."""
+        positions = self._positions(results_filter, order_by, descending)
+        total_rows = len(positions)
+        page_count = max(-(-total_rows // page_size), 1)
+        page = min(max(page, 1), page_count)
+        positions = positions[(page - 1) * page_size:page * page_size]
+
+        # the store gives the rows of the page by ID, put back in page order
+        row_ids = self.row_ids[positions]
+        rows = self.store.query(self.run_id, row_id=sorted(row_ids.tolist()))
+        rows = rows.iloc[np.searchsorted(np.sort(row_ids), row_ids)].reset_index(drop=True)
+        return ResultsPage(self._reevaluated(rows, positions), total_rows, page, page_count)
+
+    def options(self, column: str) -> list:
+        """Lists the distinct values of a column, for filter choices."""
+        return [str(value) for value in self.store.distinct(column, self.run_id)]
+
+    def iter_chunks(self, chunk_size: int = 50_000) -> Iterator[pd.DataFrame]:
+        """Gives every result in chunks, for export."""
+        start = 0
+        for chunk in self.store.iter_chunks(self.run_id, chunk_size=chunk_size):
+            yield self._reevaluated(chunk, slice(start, start + len(chunk)))
+            start += len(chunk)
+
+    def summary(self) -> ResultsSummary:
+        """Counts the re-evaluated results, once as the run does not change."""
+        if self._summary is None:
+            is_duplicate = np.zeros(len(self.row_ids), dtype=bool)
+            is_duplicate[np.searchsorted(self.row_ids, self.store.row_ids(self.run_id, duplicate=True))] = True
+            is_valid = self.evaluated["Valid"].to_numpy() & ~is_duplicate
+            self._summary = ResultsSummary(
+                total=int((~is_duplicate).sum()),
+                valid=int(is_valid.sum()),
+                duplicates=int(is_duplicate.sum()),
+            )
+        return self._summary
@@ -1,4 +1,21 @@
 from .app_logger import logger
 from .app_logger import enable_debug_logging
+from .app_logger import get_pipeline_logger
+from .async_runner import run_sync
+from .tracing import Tracer
+from .tracing import TraceRun
+from .tracing import profile_run
+from .tracing import trace_run
+from .tracing import tracer
 
-__all__ = ["logger", "enable_debug_logging"]
+__all__ = [
+    "logger",
+    "enable_debug_logging",
+    "get_pipeline_logger",
+    "run_sync",
+    "Tracer",
+    "TraceRun",
+    "profile_run",
+    "trace_run",
+    "tracer",
+]
@@ -1,5 +1,7 @@
+from datetime import datetime
 import structlog
 import logging
+import os
 
 # Configure the default logging level
 structlog.configure(
@@ -16,4 +18,47 @@ def enable_debug_logging(enable_debugging: bool):
 
 
     global logger
-    logger = structlog.get_logger()
\ No newline at end of file
+    logger = structlog.get_logger()
+
+_LOG_FORMAT = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+
+class _DeferredFileHandler(logging.FileHandler):
+    """File handler creating its directory and file on the first record, not when attached"""
+
+    def __init__(self, filename: str):
+        super().__init__(filename, delay=True)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+def get_pipeline_logger(name: str, log_directory: str = "logs") -> logging.Logger:
+    """
+    Gives a standard library logger writing to the console and to its own file
+    in `log_directory`.
+
+    Handlers are attached once per logger, so modules sharing a logger or
+    being re-imported do not print every message several times. The log
+    file is only created once the logger writes its first record, so
+    importing a module does not touch the disk.
+
+    Args:
+        name (str): The name of the logger, e.g. "ocr_processing".
+        log_directory (str): The directory of the log files.
+
+    Returns:
+        logging.Logger: The logger.
+    """
+    pipeline_logger = logging.getLogger(name)
+    if any(getattr(handler, "_pipeline_handler", False) for handler in pipeline_logger.handlers):
+        return pipeline_logger
+
+    log_filename = f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+    for handler in (_DeferredFileHandler(os.path.join(log_directory, log_filename)), logging.StreamHandler()):
+        handler.setFormatter(_LOG_FORMAT)
+        handler._pipeline_handler = True
+        pipeline_logger.addHandler(handler)
+    pipeline_logger.setLevel(logging.INFO)
+    return pipeline_logger
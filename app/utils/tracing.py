@@ -0,0 +1,312 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+import cProfile
+import json
+import os
+import random
+import threading
+import time
+import tracemalloc
+
+from .app_logger import logger
+
+
+@dataclass
+class SpanStats:
+    """Timings and memory of the sampled spans of one stage"""
+
+    name: str
+    count: int = 0
+    errors: int = 0
+    total_s: float = 0.0
+    max_s: float = 0.0
+    peak_bytes: int = 0
+
+    def add(self, duration_s: float, peak_bytes: int, failed: bool) -> None:
+        self.count += 1
+        self.errors += failed
+        self.total_s += duration_s
+        self.max_s = max(self.max_s, duration_s)
+        self.peak_bytes = max(self.peak_bytes, peak_bytes)
+
+    @property
+    def mean_ms(self) -> float:
+        return 1000 * self.total_s / max(self.count, 1)
+
+
+class TraceRun:
+    """The span statistics of one run, e.g. a validation job or a batch"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = datetime.now()
+        self.stats: Dict[str, SpanStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, duration_s: float, peak_bytes: int, failed: bool) -> None:
+        with self._lock:
+            if name not in self.stats:
+                self.stats[name] = SpanStats(name)
+            self.stats[name].add(duration_s, peak_bytes, failed)
+
+    def summary(self) -> List[dict]:
+        """Lists the stages with their sampled span count, timings and peak memory."""
+        with self._lock:
+            return [
+                dict(asdict(stats), mean_ms=stats.mean_ms)
+                for stats in sorted(self.stats.values(), key=lambda stats: -stats.total_s)
+            ]
+
+    def export(self, directory: str) -> str:
+        """
+        Writes the span statistics of the run as JSON.
+
+        Args:
+            directory (str): The directory to write to.
+
+        Returns:
+            str: The path of the JSON file.
+        """
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"trace_{self.name}_{self.started_at.strftime('%Y%m%d_%H%M%S')}.json")
+        with open(path, "w") as f:
+            json.dump({"run": self.name, "spans": self.summary()}, f, indent=2)
+        logger.info(f"Exported trace of {self.name} to {path}")
+        return path
+
+
+# run the spans of the current task or thread are recorded into
+_current_run: ContextVar[Optional[TraceRun]] = ContextVar("trace_run", default=None)
+
+
+class _NullSpan:
+    """Span handed out when tracing is off or the span is not sampled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """Times one stage, e.g. a page render or an OCR request"""
+
+    __slots__ = ("tracer", "name", "started", "memory_start")
+
+    def __init__(self, tracer: "Tracer", name: str):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.memory_start = self.tracer._memory_enter()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        duration_s = time.perf_counter() - self.started
+        self.tracer._record(self.name, duration_s, self.tracer._memory_exit(self.memory_start), exc_type is not None)
+        return False
+
+
+class Tracer:
+    """
+    Times the stages of the pipeline.
+
+    Code marks a stage with `with tracer.span("ocr_request"):`. While
+    tracing is off, a span is a shared no-op and costs a single attribute
+    check. When on, each span is timed with probability `sample_rate` and
+    recorded per stage name, both process-wide and in the run the current
+    task belongs to.
+
+    With `track_memory`, spans also record the peak memory allocated while
+    they were open, measured with tracemalloc. Spans that overlap share one
+    peak, so stages running concurrently report an upper bound.
+
+    Example:
+        with tracer.run("batch") as traced:
+            with tracer.span("render"):
+                ...
+        traced.export("logs")
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 1.0
+        self.track_memory = False
+        self.totals = TraceRun("process")
+        self._open_spans = 0
+        self._started_tracemalloc = False
+        self._lock = threading.Lock()
+
+    def configure(self, enabled: bool = False, sample_rate: float = 1.0, track_memory: bool = False) -> None:
+        """
+        Turns tracing on or off.
+
+        Args:
+            enabled (bool): Whether spans are recorded.
+            sample_rate (float): The share of spans recorded, between 0 and 1.
+            track_memory (bool): Whether spans record their peak memory,
+                which slows allocation-heavy stages down.
+        """
+        if not 0 < sample_rate <= 1:
+            raise ValueError(f"Sample rate must be between 0 and 1, got {sample_rate}")
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.track_memory = enabled and track_memory
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        elif not self.track_memory and self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def span(self, name: str):
+        """Gives a context manager timing the stage `name`."""
+        if not self.enabled:
+            return _NULL_SPAN
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return _NULL_SPAN
+        return Span(self, name)
+
+    @contextmanager
+    def run(self, name: str) -> Iterator[TraceRun]:
+        """
+        Collects the spans of a run apart from those of other runs.
+
+        Spans opened by the current task, by tasks it starts and by
+        `asyncio.to_thread` calls belong to the run.
+
+        Args:
+            name (str): The name of the run, e.g. a job ID.
+
+        Yields:
+            TraceRun: The span statistics of the run.
+        """
+        trace_run = TraceRun(name)
+        token = _current_run.set(trace_run)
+        try:
+            yield trace_run
+        finally:
+            _current_run.reset(token)
+
+    def _record(self, name: str, duration_s: float, peak_bytes: int, failed: bool) -> None:
+        self.totals.record(name, duration_s, peak_bytes, failed)
+        trace_run = _current_run.get()
+        if trace_run is not None:
+            trace_run.record(name, duration_s, peak_bytes, failed)
+
+    def _memory_enter(self) -> int:
+        if not self.track_memory:
+            return 0
+        with self._lock:
+            # the peak is only reset when no other span is measuring it
+            if self._open_spans == 0:
+                tracemalloc.reset_peak()
+            self._open_spans += 1
+        return tracemalloc.get_traced_memory()[0]
+
+    def _memory_exit(self, memory_start: int) -> int:
+        if not self.track_memory:
+            return 0
+        with self._lock:
+            self._open_spans -= 1
+        return max(tracemalloc.get_traced_memory()[1] - memory_start, 0)
+
+
+tracer = Tracer()
+
+
+@contextmanager
+def trace_run(
+    name: str, output_dir: str = "logs", profile: bool = False, snapshot: bool = False
+) -> Iterator[TraceRun]:
+    """
+    Traces a run: collects its spans, dumps a profile and memory snapshot
+    when asked to and, when tracing is on, exports its span statistics.
+
+    Args:
+        name (str): The name of the run, e.g. a job ID.
+        output_dir (str): The directory of the trace, profile and snapshot.
+        profile (bool): Whether to dump a cProfile profile of the run.
+        snapshot (bool): Whether to dump a tracemalloc snapshot of the run.
+
+    Yields:
+        TraceRun: The span statistics of the run.
+    """
+    with tracer.run(name) as traced:
+        try:
+            with profile_run(output_dir, name, cprofile=profile, snapshot=snapshot):
+                yield traced
+        finally:
+            if tracer.enabled:
+                traced.export(output_dir)
+
+
+# only one profiler can be active per process, runs of concurrent jobs are not profiled
+_profile_lock = threading.Lock()
+
+
+@contextmanager
+def profile_run(directory: str, name: str, cprofile: bool = False, snapshot: bool = False) -> Iterator[None]:
+    """
+    Dumps a cProfile profile and a tracemalloc snapshot of a run.
+
+    The profile covers the calling thread, for an async run its event loop.
+    Work handed to other threads shows up as waiting. One run is profiled
+    at a time, a run started while another is profiled is not.
+
+    Args:
+        directory (str): The directory to write the dumps to.
+        name (str): The name of the run, used in the file names.
+        cprofile (bool): Whether to write `profile_<name>.prof`, readable
+            with `python -m pstats` or snakeviz.
+        snapshot (bool): Whether to write `memory_<name>.tracemalloc`,
+            readable with `tracemalloc.Snapshot.load`.
+    """
+    if not (cprofile or snapshot):
+        yield
+        return
+    if not _profile_lock.acquire(blocking=False):
+        logger.warning(f"Not profiling {name}, another run is being profiled")
+        yield
+        return
+
+    try:
+        with _dump_profile(directory, name, cprofile, snapshot):
+            yield
+    finally:
+        _profile_lock.release()
+
+
+@contextmanager
+def _dump_profile(directory: str, name: str, cprofile: bool, snapshot: bool) -> Iterator[None]:
+    os.makedirs(directory, exist_ok=True)
+    started_tracing = snapshot and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    profiler = cProfile.Profile() if cprofile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profile_path = os.path.join(directory, f"profile_{name}.prof")
+            profiler.dump_stats(profile_path)
+            logger.info(f"Wrote profile of {name} to {profile_path}")
+        if snapshot:
+            snapshot_path = os.path.join(directory, f"memory_{name}.tracemalloc")
+            tracemalloc.take_snapshot().dump(snapshot_path)
+            logger.info(f"Wrote memory snapshot of {name} to {snapshot_path}")
+            if started_tracing:
+                tracemalloc.stop()
@@ -0,0 +1,95 @@
+"""
+Measures address canonicalization throughput on a large registry.
+
+Builds a registry of --rows records by repeating the fake voter records,
+and reports the rows per second of the vectorized canonicalization (run
+once per registry build) against canonicalizing one address at a time,
+and of canonicalizing OCR batches. Also reports how often a spelled-out
+OCR address ("Street", "N.W.") scores 100 against its registry record
+before and after canonicalization.
+
+Run from the repository root:
+    uv run benchmarks/address_canonicalizer_benchmark.py
+    uv run benchmarks/address_canonicalizer_benchmark.py --rows 200000 --batch-size 500
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "app"))
+
+from address_canonicalizer import (  # noqa: E402
+    ADDRESS_ABBREVIATIONS,
+    canonicalize_address,
+    canonicalize_addresses,
+)
+from fuzzy_match_helper import _join_columns  # noqa: E402
+
+# abbreviation -> the word OCR reads when the signer spelled it out
+_SPELLED_OUT = {}
+for word, abbreviation in ADDRESS_ABBREVIATIONS.items():
+    _SPELLED_OUT.setdefault(abbreviation, word)
+
+
+def registry_addresses(rows: int) -> pd.Series:
+    records = pd.read_csv("sample_data/fake_voter_records.csv", dtype=str)
+    components = ["Street_Number", "Street_Name", "Street_Type", "Street_Dir_Suffix"]
+    records = records[components].fillna("")
+    repeats = -(-rows // len(records))
+    return _join_columns(pd.concat([records] * repeats, ignore_index=True).iloc[:rows], components)
+
+
+def spell_out(address: str) -> str:
+    """An OCR reading of a registry address, with abbreviations written out."""
+    return " ".join(_SPELLED_OUT.get(word, word).title() for word in address.split())
+
+
+def rows_per_second(rows: int, seconds: float) -> str:
+    return f"{rows / seconds:>12,.0f}"
+
+
+def main(rows: int, batch_size: int, scalar_rows: int) -> None:
+    addresses = registry_addresses(rows)
+    print(f"Registry of {len(addresses):,} addresses\n")
+    print(f"{'path':<34}{'seconds':>10}{'rows/s':>12}")
+
+    start = time.perf_counter()
+    canonical = canonicalize_addresses(addresses)
+    elapsed = time.perf_counter() - start
+    print(f"{'vectorized, whole registry':<34}{elapsed:>10.2f}{rows_per_second(rows, elapsed)}")
+
+    sample = addresses.iloc[:scalar_rows]
+    start = time.perf_counter()
+    scalar = sample.map(canonicalize_address)
+    elapsed = time.perf_counter() - start
+    print(f"{'one address at a time':<34}{elapsed:>10.2f}{rows_per_second(len(sample), elapsed)}")
+    assert (scalar == canonical.iloc[:scalar_rows]).all(), "the scalar and vectorized paths disagree"
+
+    ocr_addresses = addresses.iloc[:scalar_rows].map(spell_out)
+    start = time.perf_counter()
+    ocr_canonical = pd.concat([
+        canonicalize_addresses(ocr_addresses.iloc[batch_start:batch_start + batch_size])
+        for batch_start in range(0, len(ocr_addresses), batch_size)
+    ])
+    elapsed = time.perf_counter() - start
+    print(f"{f'OCR batches of {batch_size}':<34}{elapsed:>10.2f}{rows_per_second(len(ocr_addresses), elapsed)}")
+
+    raw = np.mean([fuzz.ratio(a, b) == 100 for a, b in zip(ocr_addresses, sample)])
+    canonicalized = np.mean([fuzz.ratio(a, b) == 100 for a, b in zip(ocr_canonical, canonical.iloc[:scalar_rows])])
+    print(f"\nSpelled-out OCR addresses scoring 100: raw {raw:.1%}, canonical {canonicalized:.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=1_000_000, help="registry records to canonicalize")
+    parser.add_argument("--batch-size", type=int, default=1000, help="OCR rows canonicalized at once")
+    parser.add_argument("--scalar-rows", type=int, default=100_000,
+                        help="addresses canonicalized one at a time and as OCR batches")
+    args = parser.parse_args()
+    main(args.rows, args.batch_size, args.scalar_rows)
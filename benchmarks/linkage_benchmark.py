@@ -0,0 +1,108 @@
+"""
+Measures the accuracy and speed of Fellegi-Sunter linkage, see app/linkage.
+
+The signers of sample_data/all_petition_signers.csv get synthetic OCR noise
+as in matching_accuracy_benchmark.py and are linked to the registry of
+sample_data/fake_voter_records.csv. Registered signers count as found when
+linked to their own record at or above --probability, any link of a
+spurious signer is a false positive.
+
+--copies grows the registry to millions of records by repeating it with
+the last names of every copy changed, e.g. WELCH to WELCHB, so the blocks
+keep their size and only the number of records grows. Time is reported for
+building the linker, for finding and comparing the candidate pairs and for
+fitting the model.
+
+Run from the repository root:
+    uv run benchmarks/linkage_benchmark.py
+    uv run benchmarks/linkage_benchmark.py --noise 0.1 --copies 20
+"""
+
+import argparse
+import os
+import string
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "app"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fuzzy_match_helper import create_select_voter_records  # noqa: E402
+from linkage import RecordLinker  # noqa: E402
+from matching_accuracy_benchmark import load_signers  # noqa: E402
+
+
+def load_registry(copies: int) -> pd.DataFrame:
+    """The registry, repeated `copies` times with distinct last names."""
+    voter_records = pd.read_csv("sample_data/fake_voter_records.csv", dtype=str)
+    suffixes = ["", *(a + b for a in string.ascii_uppercase for b in ["", *string.ascii_uppercase])][:copies]
+    voter_records = pd.concat(
+        [voter_records.assign(Last_Name=voter_records["Last_Name"] + suffix) for suffix in suffixes],
+        ignore_index=True,
+    )
+    return create_select_voter_records(voter_records)
+
+
+def main(args: argparse.Namespace) -> dict:
+    signers = load_signers(args.noise, args.upper, args.seed)
+    started = time.perf_counter()
+    registry = load_registry(args.copies)
+    registry_s = time.perf_counter() - started
+    print(f"{signers['Registered'].sum()} registered and {(~signers['Registered']).sum()} spurious signers, "
+          f"{len(registry):,} registry records, noise {args.noise:.0%}\n")
+
+    started = time.perf_counter()
+    linker = RecordLinker(registry, max_block_size=args.max_block_size)
+    build_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    linker.fit(signers, random_pairs=args.random_pairs, seed=args.seed)
+    fit_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    pairs = linker.candidate_pairs(linker.ocr_fields(signers))
+    links = linker.link(signers)
+    link_s = time.perf_counter() - started
+
+    names, addresses = registry["Full Name"].to_numpy(), registry["Full Address"].to_numpy()
+    true_names, true_addresses = signers["True Name"].to_numpy(), signers["True Address"].to_numpy()
+    registered = signers["Registered"].to_numpy()
+    # the rows whose own record is among their candidates
+    true_pairs = (names[pairs[:, 1]] == true_names[pairs[:, 0]]) & (addresses[pairs[:, 1]] == true_addresses[pairs[:, 0]])
+    blocked = np.isin(np.arange(len(signers)), pairs[true_pairs, 0])
+
+    linked = links["match_probability"].to_numpy() >= args.probability
+    correct = (links["registry"].to_numpy() >= 0) & (names[links["registry"]] == true_names) & (
+        addresses[links["registry"]] == true_addresses)
+    true_positives = (linked & correct & registered).sum()
+    result = {
+        "precision": true_positives / linked.sum() if linked.any() else 1.0,
+        "recall": true_positives / registered.sum(),
+        "blocking_recall": (blocked & registered).sum() / registered.sum(),
+        "pairs": len(pairs),
+        "registry_s": registry_s,
+        "build_s": build_s,
+        "fit_s": fit_s,
+        "link_s": link_s,
+        "ms_per_row": 1000 * link_s / len(signers),
+    }
+    for key, value in result.items():
+        print(f"{key:>16}: {value:,.3f}" if isinstance(value, float) else f"{key:>16}: {value:,}")
+    print()
+    print(linker.model.summary().to_string(index=False, float_format="{:.3g}".format))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--noise", type=float, default=0.05, help="share of characters misread")
+    parser.add_argument("--upper", action="store_true", help="read names and addresses in capitals, as OCR often does")
+    parser.add_argument("--probability", type=float, default=0.9, help="match probability a link is accepted at")
+    parser.add_argument("--copies", type=int, default=1, help="times the registry is repeated, up to 702")
+    parser.add_argument("--max-block-size", type=int, default=1000, help="registry blocks larger than this are skipped")
+    parser.add_argument("--random-pairs", type=int, default=100_000, help="random pairs u is estimated on")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the OCR noise and of the random pairs")
+    main(parser.parse_args())
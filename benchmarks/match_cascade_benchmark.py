@@ -0,0 +1,88 @@
+"""
+Compares the accuracy and cost of the match cascade with the registry scan.
+
+The signers of sample_data/all_petition_signers.csv get synthetic OCR noise
+as in matching_accuracy_benchmark.py and are matched against the registry
+of sample_data/fake_voter_records.csv, once by create_ocr_matched_df and
+once through a MatchCascade. Registered signers count as found when matched
+to their own record at the threshold, any valid match of a spurious signer
+is a false positive. The cascade also reports how many rows each of its
+stages settled and its milliseconds per row.
+
+Run from the repository root:
+    uv run benchmarks/match_cascade_benchmark.py
+    uv run benchmarks/match_cascade_benchmark.py --noise 0.1 --upper --band 5
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "app"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fuzzy_match_helper import create_ocr_matched_df, create_select_voter_records  # noqa: E402
+from match_cascade import MatchCascade  # noqa: E402
+from matching_accuracy_benchmark import load_signers  # noqa: E402
+from settings import load_config  # noqa: E402
+
+
+def accuracy(results_df: pd.DataFrame, signers: pd.DataFrame) -> dict:
+    """The precision and recall of matched signers."""
+    valid = results_df["Valid"].to_numpy()
+    registered = signers["Registered"].to_numpy()
+    correct = (results_df["Matched Name"].to_numpy() == signers["True Name"].to_numpy()) & (
+        results_df["Matched Address"].to_numpy() == signers["True Address"].to_numpy())
+    true_positives = (valid & correct & registered).sum()
+    return {
+        "precision": true_positives / valid.sum() if valid.any() else 1.0,
+        "recall": true_positives / registered.sum(),
+    }
+
+
+def main(args: argparse.Namespace) -> pd.DataFrame:
+    threshold = args.threshold if args.threshold is not None else load_config()["BASE_THRESHOLD"]
+    signers = load_signers(args.noise, args.upper, args.seed)
+    registry = create_select_voter_records(pd.read_csv("sample_data/fake_voter_records.csv", dtype=str))
+    ocr_df = signers[["OCR Name", "OCR Address"]].assign(**{
+        "Date": "", "Page Number": 1, "Row Number": np.arange(1, len(signers) + 1),
+        "Filename": "signers", "Duplicate Of": None,
+    })
+    print(f"{signers['Registered'].sum()} registered and {(~signers['Registered']).sum()} spurious signers, "
+          f"{len(registry):,} registry records, noise {args.noise:.0%}\n")
+
+    rows = []
+    started = time.perf_counter()
+    results_df = create_ocr_matched_df(ocr_df, registry, threshold=threshold, max_workers=args.workers)
+    rows.append({"matcher": "scan", **accuracy(results_df, signers),
+                 "ms_per_row": 1000 * (time.perf_counter() - started) / len(signers)})
+
+    cascade = MatchCascade(registry, band=args.band)
+    started = time.perf_counter()
+    results_df, _ = cascade.create_ocr_matched_df(ocr_df, threshold=threshold, max_workers=args.workers)
+    rows.append({"matcher": "cascade", **accuracy(results_df, signers),
+                 "ms_per_row": 1000 * (time.perf_counter() - started) / len(signers)})
+
+    table = pd.DataFrame(rows)
+    print(table.to_string(index=False, float_format="{:.3f}".format))
+    print()
+    for key, value in cascade.stats.summary().items():
+        if isinstance(value, dict):
+            value = ", ".join(f"{stage} {ms:.2f}" for stage, ms in value.items())
+        print(f"{key:>16}: {value}")
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--noise", type=float, default=0.05, help="share of characters misread")
+    parser.add_argument("--upper", action="store_true", help="read names and addresses in capitals, as OCR often does")
+    parser.add_argument("--threshold", type=float, help="match threshold, defaults to BASE_THRESHOLD of config.json")
+    parser.add_argument("--band", type=float, help="uncertain band around the threshold, defaults to CASCADE_BAND")
+    parser.add_argument("--workers", type=int, default=None, help="threads scanning the registry")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the OCR noise")
+    main(parser.parse_args())
@@ -0,0 +1,255 @@
+"""
+Measures matching accuracy against latency for scorers, score combination
+rules and candidate strategies.
+
+The signers of sample_data/all_petition_signers.csv that are registered in
+sample_data/fake_voter_records.csv are the true positives, those listed in
+sample_data/spurious_signers.csv the negatives. Their names and addresses
+get synthetic OCR noise (confused characters, drops, repeats and swaps)
+before they are matched. A positive counts as found when its own registry
+record is matched at or above the threshold; matching any record counts
+a negative as a false positive.
+
+Each configuration reports precision, recall and F1 at --threshold, the
+best F1 over all thresholds, and the latency per row. The table is sorted
+by latency and configurations on the Pareto front of F1 against latency
+are starred.
+
+Strategies:
+    topK: the K records with the best name scores are kept and their
+        addresses scored, as the app does with K=10.
+    joint: every record is scored on name and address.
+
+Run from the repository root:
+    uv run benchmarks/matching_accuracy_benchmark.py
+    uv run benchmarks/matching_accuracy_benchmark.py --noise 0.1 --upper --scorers ratio,WRatio --csv pareto.csv
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, utils
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "app"))
+
+from address_canonicalizer import canonicalize_address  # noqa: E402
+from fuzzy_match_helper import create_select_voter_records, score_fuzzy_match_slim  # noqa: E402
+from match_candidates import COMBINATION_RULES, combine_scores  # noqa: E402
+from settings import load_config  # noqa: E402
+
+SCORERS = {
+    "ratio": fuzz.ratio,
+    "WRatio": fuzz.WRatio,
+    "token_sort_ratio": fuzz.token_sort_ratio,
+    "token_set_ratio": fuzz.token_set_ratio,
+    "partial_ratio": fuzz.partial_ratio,
+}
+
+# characters OCR engines commonly read for one another
+CONFUSIONS = {
+    "O": "0", "0": "O", "o": "0", "I": "1", "1": "l", "l": "1", "i": "l",
+    "S": "5", "5": "S", "B": "8", "8": "B", "Z": "2", "2": "Z", "G": "6", "6": "G",
+    "e": "c", "c": "e", "a": "o", "n": "h", "h": "n", "u": "v", "v": "u", "m": "rn",
+}
+
+KEY = ["First_Name", "Last_Name", "Street_Number", "Street_Name"]
+
+
+def add_ocr_noise(text: str, rate: float, rng: np.random.Generator) -> str:
+    """Corrupts about `rate` of the characters of `text` like an OCR misread."""
+    chars = list(text)
+    noisy = []
+    i = 0
+    while i < len(chars):
+        char = chars[i]
+        if rng.random() >= rate:
+            noisy.append(char)
+        else:
+            error = rng.integers(4)
+            if error == 0:
+                noisy.append(CONFUSIONS.get(char, chr(rng.integers(ord("a"), ord("z") + 1))))
+            elif error == 1:
+                pass  # dropped
+            elif error == 2:
+                noisy.append(char * 2)
+            elif i + 1 < len(chars):
+                noisy.extend([chars[i + 1], char])
+                i += 1
+            else:
+                noisy.append(char)
+        i += 1
+    return "".join(noisy)
+
+
+def load_signers(noise: float, upper: bool, seed: int) -> pd.DataFrame:
+    """The signers with their OCR readings and whether they are registered."""
+    signers = pd.read_csv("sample_data/all_petition_signers.csv", dtype=str).fillna("")
+    spurious = pd.read_csv("sample_data/spurious_signers.csv", dtype=str).fillna("")
+    signers = signers.merge(spurious[KEY].assign(Registered=False), on=KEY, how="left")
+    signers["Registered"] = signers["Registered"].isna()
+
+    truth = create_select_voter_records(signers.drop(columns="Registered").copy())
+    rng = np.random.default_rng(seed)
+    signers["True Name"] = truth["Full Name"]
+    signers["True Address"] = truth["Full Address"]
+    ocr_names = [add_ocr_noise(" ".join(name.split()), noise, rng) for name in truth["Full Name"]]
+    ocr_addresses = [add_ocr_noise(" ".join(address.split()), noise, rng) for address in truth["Full Address"]]
+    signers["OCR Name"] = [name.upper() for name in ocr_names] if upper else ocr_names
+    signers["OCR Address"] = [address.upper() for address in ocr_addresses] if upper else ocr_addresses
+    return signers
+
+
+def score_signers(signers: pd.DataFrame, registry: pd.DataFrame, scorer_name: str,
+                  strategies: List[str], process: bool) -> Dict[str, dict]:
+    """
+    Scores every signer with one scorer and keeps, per strategy, the name and
+    address scores of its candidates, whether each is the signer's record,
+    and the time taken per row.
+    """
+    scorer = SCORERS[scorer_name]
+    if process:
+        def scorer(a, b, _scorer=SCORERS[scorer_name]):
+            return _scorer(a, b, processor=utils.default_process)
+
+    names = registry["Full Name"].values
+    addresses = registry["Full Address"].values
+    canonical_addresses = registry["Canonical Address"].values
+    ks = sorted(int(strategy[3:]) for strategy in strategies if strategy.startswith("top"))
+    results = {strategy: {"name_scores": [], "address_scores": [], "is_true": [], "seconds": 0.0}
+               for strategy in strategies}
+
+    rows = zip(signers["OCR Name"], signers["OCR Address"], signers["True Name"], signers["True Address"])
+    for ocr_name, ocr_address, true_name, true_address in rows:
+        start = time.perf_counter()
+        canonical_address = canonicalize_address(ocr_address)
+        matches = score_fuzzy_match_slim(ocr_name, names, scorer_=scorer, limit_=max(ks)) if ks else []
+        name_seconds = time.perf_counter() - start
+        positions = np.array([match[2] for match in matches], dtype=np.int64)
+
+        for k in ks:
+            start = time.perf_counter()
+            address_scores = [scorer(canonical_address, address) for address in canonical_addresses[positions[:k]]]
+            _keep(results[f"top{k}"], name_seconds + time.perf_counter() - start,
+                  np.array([match[1] for match in matches[:k]]), np.array(address_scores),
+                  (names[positions[:k]] == true_name) & (addresses[positions[:k]] == true_address))
+
+        if "joint" in strategies:
+            start = time.perf_counter()
+            name_scores = np.vectorize(lambda x: scorer(ocr_name, x))(names)
+            address_scores = np.vectorize(lambda x: scorer(canonical_address, x))(canonical_addresses)
+            seconds = time.perf_counter() - start
+            # only the best record under each rule can be matched, the rest is not kept
+            best = np.unique([np.argmax(combine_scores(name_scores, address_scores, rule)) for rule in COMBINATION_RULES])
+            _keep(results["joint"], seconds, name_scores[best], address_scores[best],
+                  (names[best] == true_name) & (addresses[best] == true_address))
+
+    return results
+
+
+def _keep(result: dict, seconds: float, name_scores: np.ndarray, address_scores: np.ndarray,
+          is_true: np.ndarray) -> None:
+    result["seconds"] += seconds
+    result["name_scores"].append(name_scores.astype(np.float32))
+    result["address_scores"].append(address_scores.astype(np.float32))
+    result["is_true"].append(is_true)
+
+
+def evaluate(result: dict, registered: np.ndarray, rule: str, threshold: float) -> dict:
+    """Precision, recall and F1 of one configuration at `threshold` and at its best threshold."""
+    best_scores, best_is_true = [], []
+    for name_scores, address_scores, is_true in zip(result["name_scores"], result["address_scores"], result["is_true"]):
+        scores = combine_scores(name_scores, address_scores, rule)
+        best = int(np.argmax(scores))
+        best_scores.append(scores[best])
+        best_is_true.append(bool(is_true[best]))
+    best_scores, best_is_true = np.array(best_scores), np.array(best_is_true)
+
+    def at(t: float) -> tuple:
+        accepted = best_scores >= t
+        true_positives = (accepted & registered & best_is_true).sum()
+        precision = true_positives / accepted.sum() if accepted.any() else 1.0
+        recall = true_positives / registered.sum()
+        f1 = 2 * precision * recall / (precision + recall) if true_positives else 0.0
+        return precision, recall, f1
+
+    precision, recall, f1 = at(threshold)
+    best_f1, best_threshold = max((at(t)[2], t) for t in np.unique(best_scores))
+    return {
+        "precision": precision, "recall": recall, "f1": f1,
+        "best_f1": best_f1, "best_threshold": best_threshold,
+        "ms_per_row": 1000 * result["seconds"] / len(registered),
+    }
+
+
+def pareto_front(table: pd.DataFrame) -> pd.Series:
+    """Whether no other configuration is at least as fast and accurate, and better on one."""
+    return table.apply(
+        lambda row: not (
+            (table["f1"] >= row["f1"]) & (table["ms_per_row"] <= row["ms_per_row"])
+            & ((table["f1"] > row["f1"]) | (table["ms_per_row"] < row["ms_per_row"]))
+        ).any(),
+        axis=1,
+    )
+
+
+def main(args: argparse.Namespace) -> pd.DataFrame:
+    threshold = args.threshold if args.threshold is not None else load_config()["BASE_THRESHOLD"]
+    signers = load_signers(args.noise, args.upper, args.seed)
+    voter_records = pd.read_csv("sample_data/fake_voter_records.csv", dtype=str)
+    if args.registry_rows < len(voter_records):
+        # keeps the records of the registered signers in the sample
+        registered = voter_records.merge(signers.loc[signers["Registered"], KEY], on=KEY, how="left", indicator=True)
+        keep = (registered["_merge"] == "both").values
+        others = np.flatnonzero(~keep)[:max(args.registry_rows - keep.sum(), 0)]
+        voter_records = voter_records.iloc[np.sort(np.concatenate([np.flatnonzero(keep), others]))]
+    registry = create_select_voter_records(voter_records.reset_index(drop=True))
+
+    print(f"{signers['Registered'].sum()} registered and {(~signers['Registered']).sum()} spurious signers, "
+          f"{len(registry):,} registry records, noise {args.noise:.0%}, threshold {threshold}\n")
+
+    rows = []
+    for scorer_name in args.scorers.split(","):
+        started = time.perf_counter()
+        results = score_signers(signers, registry, scorer_name, args.strategies.split(","), args.process)
+        print(f"scored with {scorer_name} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        for strategy, result in results.items():
+            for rule in COMBINATION_RULES:
+                rows.append({"scorer": scorer_name, "strategy": strategy, "rule": rule,
+                             **evaluate(result, signers["Registered"].values, rule, threshold)})
+
+    table = pd.DataFrame(rows).sort_values(["ms_per_row", "f1"], ascending=[True, False], ignore_index=True)
+    table["pareto"] = pareto_front(table)
+    print(table.to_string(
+        index=False,
+        formatters={
+            "precision": "{:.3f}".format, "recall": "{:.3f}".format, "f1": "{:.3f}".format,
+            "best_f1": "{:.3f}".format, "best_threshold": "{:.1f}".format, "ms_per_row": "{:.2f}".format,
+            "pareto": lambda on_front: "*" if on_front else "",
+        },
+    ))
+    if args.csv:
+        table.to_csv(args.csv, index=False)
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scorers", default="ratio,WRatio,token_sort_ratio,partial_ratio",
+                        help=f"comma-separated rapidfuzz scorers, of {', '.join(SCORERS)}")
+    parser.add_argument("--strategies", default="top1,top10,top50,joint",
+                        help="comma-separated candidate strategies, topK or joint")
+    parser.add_argument("--noise", type=float, default=0.05, help="share of characters misread")
+    parser.add_argument("--upper", action="store_true", help="read names and addresses in capitals, as OCR often does")
+    parser.add_argument("--process", action="store_true",
+                        help="lower-case and strip punctuation before scoring (rapidfuzz default_process)")
+    parser.add_argument("--threshold", type=float, help="match threshold, defaults to BASE_THRESHOLD of config.json")
+    parser.add_argument("--registry-rows", type=int, default=100_000,
+                        help="registry records to match against, the signers' records are always kept")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the OCR noise")
+    parser.add_argument("--csv", help="also write the table to this CSV file")
+    main(parser.parse_args())
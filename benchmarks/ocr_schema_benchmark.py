@@ -0,0 +1,128 @@
+"""
+Compares the "rows" and "columns" OCR output schemas.
+
+Offline (default): builds the structured output the model would return for
+pages of sample signers and counts its tokens, estimating the decode time
+at a given output rate.
+
+Live (--pdf): runs real OCR requests with both schemas on the first pages
+of a PDF and reports the measured output tokens and request latency. Needs
+a configured settings.toml.
+
+Run from the repository root:
+    uv run benchmarks/ocr_schema_benchmark.py
+    uv run benchmarks/ocr_schema_benchmark.py --pdf sample_data/fake_signed_petitions_1-10.pdf --pages 3
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "app"))
+
+from ocr.ocr_client_factory import OCR_SCHEMAS  # noqa: E402
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("o200k_base")
+
+    def count_tokens(text: str) -> int:
+        return len(_encoding.encode(text))
+
+except Exception:
+    # tiktoken missing or its encoding could not be downloaded
+    print("tiktoken unavailable, approximating 4 characters per token\n")
+
+    def count_tokens(text: str) -> int:
+        return len(text) // 4
+
+
+def sample_pages(rows_per_page: int) -> list:
+    signers = pd.read_csv("sample_data/all_petition_signers.csv", dtype=str).fillna("")
+    rows = [
+        {
+            "Name": f"{signer.First_Name} {signer.Last_Name}".upper(),
+            "Address": " ".join(
+                part
+                for part in [
+                    signer.Street_Number,
+                    signer.Street_Name,
+                    signer.Street_Type,
+                    signer.Street_Dir_Suffix,
+                ]
+                if part.strip()
+            ),
+            "Date": "7/14/2024",
+            "Ward": 1 + i % 8,
+        }
+        for i, signer in enumerate(signers.itertuples())
+    ]
+    return [rows[i : i + rows_per_page] for i in range(0, len(rows), rows_per_page)]
+
+
+def schema_output(schema: str, page: list) -> str:
+    if schema == "columns":
+        data = {key: [row[key] for row in page] for key in ("Name", "Address", "Date", "Ward")}
+    else:
+        data = {"Data": page}
+    return OCR_SCHEMAS[schema].model_validate(data).model_dump_json()
+
+
+def offline(rows_per_page: int, tokens_per_second: float) -> None:
+    pages = sample_pages(rows_per_page)
+    print(f"{len(pages)} pages of {rows_per_page} signers, decode rate {tokens_per_second} tokens/s\n")
+    print(f"{'schema':<10}{'tokens/page':>14}{'est. decode s/page':>22}{'vs rows':>10}")
+
+    baseline = None
+    for schema in OCR_SCHEMAS:
+        tokens = np.mean([count_tokens(schema_output(schema, page)) for page in pages])
+        baseline = baseline or tokens
+        print(
+            f"{schema:<10}{tokens:>14.1f}{tokens / tokens_per_second:>22.2f}"
+            f"{tokens / baseline:>10.0%}"
+        )
+
+
+def live(pdf_path: str, n_pages: int) -> None:
+    from settings import load_settings
+    from ocr import PageMetrics, extract_from_encoding_async
+    from ocr_helper import collecting_pdf_encoded_images
+
+    settings = load_settings()
+    encodings = collecting_pdf_encoded_images(pdf_path)[:n_pages]
+
+    print(f"\n{'schema':<10}{'output tokens/page':>20}{'request s/page':>16}{'rows/page':>11}")
+    for schema in OCR_SCHEMAS:
+        settings.ocr_schema = schema
+        metrics = [PageMetrics(page_id=str(n)) for n in range(len(encodings))]
+
+        async def run():
+            return [
+                await extract_from_encoding_async(encoding, page_metrics)
+                for encoding, page_metrics in zip(encodings, metrics)
+            ]
+
+        rows = asyncio.run(run())
+        print(
+            f"{schema:<10}{np.mean([m.output_tokens for m in metrics]):>20.1f}"
+            f"{np.mean([m.request_s for m in metrics]):>16.2f}"
+            f"{np.mean([len(r) for r in rows]):>11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows-per-page", type=int, default=20)
+    parser.add_argument("--tokens-per-second", type=float, default=60.0)
+    parser.add_argument("--pdf", help="run live OCR requests on this PDF")
+    parser.add_argument("--pages", type=int, default=3)
+    args = parser.parse_args()
+
+    offline(args.rows_per_page, args.tokens_per_second)
+    if args.pdf:
+        live(args.pdf, args.pages)
@@ -0,0 +1,103 @@
+"""
+Measures the cold start of the pipeline: the time to import the app
+modules and the latency of the first OCR client and the first match.
+
+Every repeat runs in a fresh interpreter, so nothing is cached between
+repeats apart from the operating system's file cache. No OCR request is
+sent, the first OCR client is only built.
+
+Run from the repository root:
+    uv run benchmarks/startup_benchmark.py
+    uv run benchmarks/startup_benchmark.py --repeat 5 --max-import-s 1.5
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+
+PROVIDER_SDKS = ["langchain_openai", "langchain_mistralai", "langchain_google_genai"]
+
+# runs in a fresh interpreter and prints its timings as JSON
+_COLD_START = """
+import json, sys, time
+
+started = time.perf_counter()
+import ocr_helper, fuzzy_match_helper, job_manager
+import_s = time.perf_counter() - started
+loaded_sdks = [name for name in {sdks!r} if name in sys.modules]
+
+from settings import load_settings
+from ocr.ocr_client_factory import _create_ocr_client
+
+load_settings({settings_path!r}, reload_settings=True)
+started = time.perf_counter()
+_create_ocr_client()
+client_s = time.perf_counter() - started
+
+import pandas as pd
+
+voter_records = pd.read_csv({registry_path!r}, dtype=str)
+started = time.perf_counter()
+select_voter_records = fuzzy_match_helper.create_select_voter_records(voter_records)
+registry_s = time.perf_counter() - started
+started = time.perf_counter()
+fuzzy_match_helper.get_matched_name_address("Adam Welch", "5211 Shaw Wall", select_voter_records)
+match_s = time.perf_counter() - started
+
+print(json.dumps(dict(
+    import_s=import_s, client_s=client_s, registry_s=registry_s, match_s=match_s, loaded_sdks=loaded_sdks
+)))
+"""
+
+
+def cold_start(settings_path: str, registry_path: str) -> dict:
+    code = _COLD_START.format(sdks=PROVIDER_SDKS, settings_path=settings_path, registry_path=registry_path)
+    env = dict(os.environ, PYTHONPATH=APP_DIR)
+    completed = subprocess.run(
+        [sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters to time")
+    parser.add_argument("--settings", default="tests/data/test_settings_default.toml")
+    parser.add_argument("--registry", default="sample_data/fake_voter_records.csv")
+    parser.add_argument(
+        "--max-import-s", type=float, default=None, help="fail if the median import time is above this"
+    )
+    args = parser.parse_args(argv)
+
+    runs = [cold_start(args.settings, args.registry) for _ in range(args.repeat)]
+
+    print(f"{args.repeat} cold starts, median and worst\n")
+    print(f"{'stage':<28}{'median s':>10}{'max s':>10}")
+    stages = [
+        ("import app modules", "import_s"),
+        ("first OCR client", "client_s"),
+        ("first registry index", "registry_s"),
+        ("first match", "match_s"),
+    ]
+    for label, key in stages:
+        times = [run[key] for run in runs]
+        print(f"{label:<28}{np.median(times):>10.3f}{max(times):>10.3f}")
+
+    loaded_sdks = sorted({name for run in runs for name in run["loaded_sdks"]})
+    print(f"\nprovider SDKs loaded by the imports: {', '.join(loaded_sdks) or 'none'}")
+
+    import_s = np.median([run["import_s"] for run in runs])
+    if args.max_import_s is not None and import_s > args.max_import_s:
+        print(f"median import time {import_s:.3f}s is above the budget of {args.max_import_s:.3f}s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,33 @@
+import importlib
 import sys
 import os
-from streamlit.web import cli as stcli
+
+# command line tools run as main.py <command> [args], each module has a `cli(argv)` entry point
+COMMANDS = {
+    # headless batch processing: main.py batch <pdf_dir> <registry.csv> [options]
+    "batch": "batch_runner",
+    # sampling validation: main.py sample <pdf_dir> <registry.csv> <target> [options]
+    "sample": "page_sampling",
+    # results export: main.py export <run_id|latest> <output.csv|output.parquet> [options]
+    "export": "store.export",
+    # sharded matching: main.py shard-registry <registry.csv> <shard_dir> --shards N
+    "shard-registry": "sharding.shards",
+    # sharded matching: main.py shard-worker <shard_dir/manifest.json> <shard> [--host H --port P]
+    "shard-worker": "sharding.worker",
+    # warm matching service: main.py match-server <registry.csv> [--host H --port P --workers N]
+    "match-server": "match_service.service",
+}
 
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "app"))
+        cli = importlib.import_module(COMMANDS[sys.argv[1]]).cli
+
+        sys.exit(cli(sys.argv[2:]))
+
+    from streamlit.web import cli as stcli
+
     sys.argv = ["streamlit", "run", "app{x}Home.py".format(x=os.sep)]
     sys.exit(stcli.main())
 
@@ -0,0 +1,65 @@
+import asyncio
+import fitz
+import pytest
+import ocr_helper
+from settings import load_settings
+
+
+@pytest.fixture(autouse=True)
+def settings():
+    # reloading the default settings afterwards undoes changes a test made, e.g. turning tracing on
+    yield load_settings("tests/data/test_settings_default.toml", reload_settings=True)
+    load_settings("tests/data/test_settings_default.toml", reload_settings=True)
+
+
+def _write_pdf(path, pages):
+    # pages are either a number of pages, with text naming the file and page
+    # so no two pages look alike to the page hash, or the text lines of each page
+    if isinstance(pages, int):
+        pages = [[f"{path.name} {n} {k} " * (n + 1) for k in range(15)] for n in range(pages)]
+    doc = fitz.open()
+    for lines in pages:
+        page = doc.new_page()
+        for k, line in enumerate(lines):
+            page.insert_text((50, 340 + k * 14), line, fontsize=10)
+    doc.save(path)
+
+
+@pytest.fixture
+def write_pdf():
+    """Writes a PDF of text pages, see `_write_pdf`."""
+    return _write_pdf
+
+
+@pytest.fixture
+def fake_ocr(monkeypatch):
+    """
+    Replaces the OCR requests, reading every page as the rows in `rows`.
+
+    The returned state lists the pages `read`, in request order. The
+    `fail_on`-th request and pages in `failing` raise, pages in `slow`
+    take `slow_delay` seconds and requests cancelled meanwhile are counted.
+    """
+    state = {
+        "rows": [{"Name": "ADAM WELCH", "Address": "5211 Shaw Wall", "Date": "1/1", "Ward": 1}],
+        "read": [],
+        "fail_on": None,
+        "failing": set(),
+        "slow": set(),
+        "slow_delay": 0.3,
+        "cancelled": 0,
+    }
+
+    async def extract(base64_image, metrics=None):
+        state["read"].append(base64_image)
+        if len(state["read"]) == state["fail_on"] or base64_image in state["failing"]:
+            raise RuntimeError("unreadable page")
+        try:
+            await asyncio.sleep(state["slow_delay"] if base64_image in state["slow"] else 0.01)
+        except asyncio.CancelledError:
+            state["cancelled"] += 1
+            raise
+        return [dict(row) for row in state["rows"]]
+
+    monkeypatch.setattr(ocr_helper, "extract_from_encoding_async", extract)
+    return state
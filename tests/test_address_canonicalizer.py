@@ -0,0 +1,48 @@
+import pandas as pd
+from address_canonicalizer import canonicalize_address, canonicalize_addresses, parse_address, parse_addresses
+from fuzzy_match_helper import create_select_voter_records, get_matched_name_address
+
+
+def test_spellings_of_one_address_are_equal():
+    spellings = pd.Series(
+        ["1600 Pennsylvania Avenue N.W.", "1600 PENNSYLVANIA AVE NW", "  1600 pennsylvania av.  northwest "],
+        index=[7, 3, 5],
+    )
+    canonical = canonicalize_addresses(spellings)
+    assert canonical.index.tolist() == [7, 3, 5]
+    assert set(canonical) == {"1600 PENNSYLVANIA AVE NW"}
+    assert canonicalize_addresses(pd.Series(["12 Main Street, Apartment #5", None])).tolist() == [
+        "12 MAIN ST APT 5",
+        "",
+    ]
+
+
+def test_vectorized_and_scalar_paths_agree():
+    records = pd.read_csv("sample_data/fake_voter_records.csv", dtype=str, nrows=5000)
+    addresses = create_select_voter_records(records)["Full Address"]
+    assert canonicalize_addresses(addresses).tolist() == [canonicalize_address(a) for a in addresses]
+
+
+def test_addresses_are_scored_in_canonical_form():
+    records = create_select_voter_records(pd.DataFrame({
+        "First_Name": ["Adam", "Jody"],
+        "Last_Name": ["Welch", "Compton"],
+        "Street_Number": ["5211", "37705"],
+        "Street_Name": ["Shaw", "Raymond"],
+        "Street_Type": ["ST", "AVE"],
+        "Street_Dir_Suffix": ["NW", "SE"],
+    }))
+    best = get_matched_name_address("Adam Welch", "5211 Shaw Street, N.W.", records)[0]
+    # the raw registry address is reported, the canonical one is scored
+    assert best[:3] == ("Adam Welch", "5211 Shaw ST NW", 100)
+
+
+def test_addresses_are_split_into_parts():
+    canonical = canonicalize_addresses(pd.Series(["12B Old Elm Road North, Apt 5", "Shaw Wall", "77 Main"]))
+    parts = parse_addresses(canonical)
+    assert parts.to_dict("records") == [
+        {"number": "12B", "street": "OLD ELM", "type": "RD", "direction": "N", "unit": "APT 5"},
+        {"number": "", "street": "SHAW", "type": "WALL", "direction": "", "unit": ""},
+        {"number": "77", "street": "MAIN", "type": "", "direction": "", "unit": ""},
+    ]
+    assert [parse_address(address) for address in canonical] == parts.to_dict("records")
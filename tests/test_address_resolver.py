@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+from address_resolver import AddressResolver
+from fuzzy_match_helper import create_select_voter_records, get_matched_name_address
+
+
+@pytest.fixture(scope="module")
+def registry():
+    return create_select_voter_records(pd.read_csv("sample_data/fake_voter_records.csv", dtype=str, nrows=20000))
+
+
+def test_streets_are_a_small_dictionary():
+    resolver = AddressResolver(create_select_voter_records(pd.DataFrame({
+        "First_Name": ["Adam", "Eve", "Jody", "Jo", "Al"],
+        "Last_Name": ["Welch", "Welch", "Compton", "Compton", "Nonum"],
+        "Street_Number": ["5211", "5211", "37705", "12", None],
+        "Street_Name": ["Shaw", "Shaw", "Raymond", "Raymond", "Shaw"],
+        "Street_Type": ["Wall", "Wall", "Gardens", "Street", "Wall"],
+        "Street_Dir_Suffix": ["", "", "", "", ""],
+    })))
+    assert len(resolver) == 3
+    assert list(resolver.street_names) == ["RAYMOND", "SHAW"]
+
+    resolved = resolver.resolve("5211 Shaw Wall")
+    assert sorted(resolved.positions) == [0, 1] and resolved.streets == ["SHAW WALL"] and resolved.exact_number
+    # misread digits, a transposed house number and a misread street type
+    assert sorted(resolver.resolve("52l1 SHAV WALL").positions) == [0, 1]
+    near = resolver.resolve("37075 Raymond Gardens")
+    assert near.positions.tolist() == [2] and not near.exact_number
+    assert resolver.resolve("12 Raymnd Stret").positions.tolist() == [3]
+    assert resolver.resolve("37705 Raymond").streets == ["RAYMOND GDNS", "RAYMOND ST"]
+    # unknown streets and missing numbers do not resolve
+    assert not len(resolver.resolve("5211 Elm Street").positions)
+    assert not len(resolver.resolve("Shaw Wall").positions)
+
+    assert resolver.get_matched_name_address("Eve Welch", "5211 Shaw Wall")[0][:3] == ("Eve Welch", "5211 Shaw Wall ", 100)
+    assert resolver.get_matched_name_address("Eve Welch", "1 Elm Street") == []
+
+
+def test_address_first_matches_agree_with_the_registry_scan(registry):
+    resolver = AddressResolver(registry)
+    rows = registry.iloc[::400]
+    for name, address in zip(rows["Full Name"], rows["Full Address"]):
+        best = resolver.get_matched_name_address(name, address)[0]
+        scanned = get_matched_name_address(name, address, registry)[0]
+        assert best[0] == scanned[0] and best[1] == scanned[1]
+        assert best[2] == pytest.approx(scanned[2])
@@ -0,0 +1,101 @@
+import asyncio
+import time
+import pandas as pd
+import fuzzy_match_helper
+import ocr_helper
+
+
+def _slow_after_first_page(fake_ocr, path, slow_delay):
+    # the first request is quick, the others stay in flight for a while
+    fake_ocr["slow"].update(ocr_helper.collecting_pdf_encoded_images(str(path))[1:])
+    fake_ocr["slow_delay"] = slow_delay
+
+
+def test_create_ocr_df_async_inside_running_loop(tmp_path, fake_ocr, write_pdf):
+    write_pdf(tmp_path / "a.pdf", 3)
+    _slow_after_first_page(fake_ocr, tmp_path / "a.pdf", 0.02)
+
+    async def main():
+        sync_df = ocr_helper.create_ocr_df(str(tmp_path), "a.pdf")
+        async_df = await ocr_helper.create_ocr_df_async(str(tmp_path), "a.pdf")
+        return sync_df, async_df
+
+    sync_df, async_df = asyncio.run(main())
+    assert list(async_df["Page Number"]) == [1, 2, 3]
+    assert sync_df.equals(async_df)
+
+
+def test_closing_page_iterator_cancels_requests(tmp_path, fake_ocr, write_pdf):
+    write_pdf(tmp_path / "a.pdf", 4)
+    _slow_after_first_page(fake_ocr, tmp_path / "a.pdf", 10)
+
+    async def main():
+        pages = ocr_helper.iter_ocr_pages_async(
+            str(tmp_path), "a.pdf", max_concurrent_requests=4
+        )
+        first = await anext(pages)
+        await pages.aclose()
+        await asyncio.sleep(0)
+        return first
+
+    first = asyncio.run(main())
+    assert first.total_pages == 4
+    assert len(fake_ocr["read"]) == 4
+    assert fake_ocr["cancelled"] == 3
+
+
+def test_async_matching_matches_sync():
+    voters = pd.DataFrame(
+        {
+            "Full Name": ["Jane Doe", "John Roe", "Ann Lee"] * 4,
+            "Full Address": ["1 Main St", "2 Oak Ave", "3 Elm Rd"] * 4,
+        }
+    )
+    ocr_df = pd.DataFrame(
+        {
+            "OCR Name": ["Jane Do", "Ann Lee"],
+            "OCR Address": ["1 Main St", "3 Elm Road"],
+            "Date": ["1/1", "1/2"],
+            "Page Number": [1, 1],
+            "Row Number": [1, 2],
+            "Filename": ["a.pdf", "a.pdf"],
+            "Duplicate Of": [None, None],
+        }
+    )
+
+    sync_df = fuzzy_match_helper.create_ocr_matched_df(ocr_df, voters)
+    async_df = asyncio.run(fuzzy_match_helper.create_ocr_matched_df_async(ocr_df, voters))
+    assert sync_df.equals(async_df)
+    assert list(async_df["Matched Name"]) == ["Jane Doe", "Ann Lee"]
+
+
+def test_async_matching_leaves_the_loop_free(monkeypatch):
+    score_candidates = fuzzy_match_helper.score_candidates
+
+    def slow_scan(*args, **kwargs):
+        # a registry scan holding on to its thread
+        time.sleep(0.01)
+        return score_candidates(*args, **kwargs)
+
+    monkeypatch.setattr(fuzzy_match_helper, "score_candidates", slow_scan)
+    voters = pd.DataFrame({"Full Name": ["Jane Doe", "John Roe"], "Full Address": ["1 Main St", "2 Oak Ave"]})
+    ocr_df = pd.DataFrame({"OCR Name": ["Jane Do"] * 30, "OCR Address": ["1 Main St"] * 30})
+
+    async def main():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        rows = [row async for row in fuzzy_match_helper.iter_matches_async(ocr_df, voters)]
+        ticker.cancel()
+        return rows, ticks
+
+    rows, ticks = asyncio.run(main())
+    assert [position for position, _ in rows] == list(range(30))
+    # the loop kept serving other tasks during the 0.3s of scans
+    assert ticks >= 10
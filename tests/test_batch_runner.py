@@ -0,0 +1,86 @@
+import json
+import pandas as pd
+import pytest
+import batch_runner
+from store import ResultsStore
+
+
+@pytest.fixture
+def fake_ocr(fake_ocr):
+    # a registered voter and a stranger on every page
+    fake_ocr["rows"].append({"Name": "NOT A VOTER", "Address": "1 Nowhere Rd", "Date": "1/1", "Ward": 1})
+    return fake_ocr
+
+
+def test_run_batch_writes_results_and_reports_partial_failure(tmp_path, fake_ocr, write_pdf):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    write_pdf(pdf_dir / "a.pdf", 2)
+    write_pdf(pdf_dir / "b.pdf", 1)
+    (pdf_dir / "broken.pdf").write_text("not a pdf")
+    output_dir = tmp_path / "out"
+
+    exit_code = batch_runner.cli(
+        [str(pdf_dir), "sample_data/all_petition_signers.csv", "-o", str(output_dir)]
+    )
+
+    assert exit_code == 1
+    a_results = pd.read_csv(output_dir / "a_results.csv")
+    assert list(a_results["Valid"]) == [True, False, True, False]
+    assert len(pd.read_csv(output_dir / "all_results.csv")) == 6
+    assert not (output_dir / "broken_results.csv").exists()
+
+
+def test_run_batch_skips_existing_results(tmp_path, fake_ocr, write_pdf):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    write_pdf(pdf_dir / "a.pdf", 1)
+    output_dir = tmp_path / "out"
+    registry = "sample_data/all_petition_signers.csv"
+
+    assert batch_runner.run_batch(str(pdf_dir), registry, str(output_dir)) == 0
+    assert batch_runner.run_batch(
+        str(pdf_dir), registry, str(output_dir), skip_existing=True
+    ) == 0
+    assert len(pd.read_csv(output_dir / "all_results.csv")) == 2
+    # a rerun that reads every file again starts the combined results over
+    assert batch_runner.run_batch(str(pdf_dir), registry, str(output_dir)) == 0
+    assert len(pd.read_csv(output_dir / "all_results.csv")) == 2
+
+
+def test_run_batch_closes_the_run_when_the_queue_raises(tmp_path, fake_ocr, write_pdf, monkeypatch):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    write_pdf(pdf_dir / "a.pdf", 1)
+    results_db = tmp_path / "results.sqlite"
+
+    def fail(self):
+        raise RuntimeError("event loop stopped")
+
+    monkeypatch.setattr(batch_runner.OcrJobQueue, "run", fail)
+    with pytest.raises(RuntimeError):
+        batch_runner.run_batch(str(pdf_dir), "sample_data/all_petition_signers.csv", str(tmp_path / "out"),
+                               results_db=str(results_db), resume=True)
+
+    store = ResultsStore(str(results_db))
+    assert list(store.runs()["status"]) == ["failed"]
+    store.close()
+
+
+def test_run_batch_matches_through_the_cascade(tmp_path, fake_ocr, write_pdf):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    write_pdf(pdf_dir / "a.pdf", 1)
+    output_dir = tmp_path / "out"
+
+    exit_code = batch_runner.cli(
+        [str(pdf_dir), "sample_data/all_petition_signers.csv", "-o", str(output_dir), "--cascade"]
+    )
+
+    assert exit_code == 0
+    assert list(pd.read_csv(output_dir / "a_results.csv")["Valid"]) == [True, False]
+    cascade = json.loads((output_dir / "run_summary.json").read_text())["cascade"]
+    assert cascade["rows"] == 2 and cascade["resolved"] + cascade["accepted"] + cascade["uncertain_valid"] == 1
+    with pytest.raises(ValueError):
+        batch_runner.run_batch(str(pdf_dir), "sample_data/all_petition_signers.csv", str(output_dir),
+                               cascade=True, match_server="http://127.0.0.1:1")
@@ -0,0 +1,48 @@
+import asyncio
+import time
+import pandas as pd
+from job_manager import JobManager, validate_petitions_async
+
+
+def _wait(job, timeout=10):
+    deadline = time.time() + timeout
+    while job.is_active and time.time() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+def test_job_runs_validation_in_background(tmp_path, fake_ocr, write_pdf):
+    write_pdf(tmp_path / "a.pdf", [["petition page"]])
+    voter_records_df = pd.read_csv("sample_data/all_petition_signers.csv", dtype=str)
+
+    manager = JobManager(max_workers=1)
+    job = manager.submit(
+        "session", lambda job: validate_petitions_async(job, str(tmp_path), ["a.pdf"], voter_records_df)
+    )
+
+    assert _wait(job).status == "done"
+    assert job.progress == 1.0
+    assert list(job.result["Valid"]) == [True]
+    assert job.ocr_metrics["pages_ok"] == 1
+    assert manager.jobs_for("session") == [job]
+
+
+def test_cancel_stops_running_and_queued_jobs():
+    started = []
+
+    async def run(job):
+        started.append(job.job_id)
+        await asyncio.sleep(30)
+
+    manager = JobManager(max_workers=1)
+    running = manager.submit("session", run)
+    queued = manager.submit("session", run)
+    while not started:
+        time.sleep(0.01)
+
+    manager.cancel(queued.job_id)
+    manager.cancel(running.job_id)
+
+    assert _wait(running).status == "cancelled"
+    assert _wait(queued).status == "cancelled"
+    assert started == [running.job_id]
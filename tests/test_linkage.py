@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fuzzy_match_helper import create_select_voter_records
+from linkage import Comparison, DEFAULT_COMPARISONS, FellegiSunterModel, RecordLinker, record_fields
+from rapidfuzz.distance import JaroWinkler
+
+
+def test_records_are_split_into_fields():
+    fields = record_fields(
+        pd.Series(["Jane A. Doe Jr.", "PRINCE", None]),
+        pd.Series(["0012 MAIN ST N APT 5", "77 OLD MILL RD", ""]),
+    )
+    assert fields.to_dict("records") == [
+        {"first_name": "JANE", "last_name": "DOE", "street_number": "12", "street_name": "MAIN",
+         "street_type": "ST", "street_direction": "N"},
+        {"first_name": "", "last_name": "PRINCE", "street_number": "77", "street_name": "OLD MILL",
+         "street_type": "RD", "street_direction": ""},
+        {"first_name": "", "last_name": "", "street_number": "", "street_name": "",
+         "street_type": "", "street_direction": ""},
+    ]
+
+
+def test_comparison_levels():
+    comparison = Comparison("first_name", JaroWinkler.normalized_similarity, (0.7, 0.88))
+    left = np.array(["JOHN", "JOHN", "JOHN", "JOHN", ""], dtype=object)
+    right = np.array(["JOHN", "JOHM", "JOAN", "XAVIER", "JOHN"], dtype=object)
+    assert comparison.levels(left, right).tolist() == [3, 2, 1, 0, -1]
+    assert comparison.level_names == ["different", ">= 0.7", ">= 0.88", "exact"]
+
+
+def test_em_recovers_the_weights_of_simulated_pairs():
+    rng = np.random.default_rng(0)
+    comparisons = [Comparison(f"field{i}", None, (0.5,)) for i in range(4)]
+    m = np.array([0.05, 0.15, 0.8])
+    u = np.array([0.9, 0.08, 0.02])
+    is_match = rng.random(200_000) < 0.1
+    levels = np.where(
+        is_match[:, None],
+        rng.choice(3, size=(len(is_match), 4), p=m),
+        rng.choice(3, size=(len(is_match), 4), p=u),
+    ).astype(np.int8)
+    levels[rng.random(levels.shape) < 0.05] = -1
+
+    model = FellegiSunterModel(comparisons).fit(levels)
+    assert model.prior == pytest.approx(0.1, abs=0.01)
+    for fitted_m, fitted_u in zip(model.m, model.u):
+        assert np.allclose(fitted_m, m, atol=0.02) and np.allclose(fitted_u, u, atol=0.02)
+    assert len(model.summary()) == 12
+
+
+def _misread(text: str, every: int) -> str:
+    # drops every n-th character, as a deterministic OCR error
+    return "".join(c for i, c in enumerate(text) if i % every != every - 1)
+
+
+def test_signers_are_linked_to_their_records():
+    registry = create_select_voter_records(pd.read_csv("sample_data/fake_voter_records.csv", dtype=str))
+    signers = create_select_voter_records(pd.read_csv("sample_data/all_petition_signers.csv", dtype=str))
+    spurious = create_select_voter_records(pd.read_csv("sample_data/spurious_signers.csv", dtype=str))
+    registered = ~signers["Full Name"].isin(spurious["Full Name"]).to_numpy()
+    ocr_df = pd.DataFrame({
+        "OCR Name": signers["Full Name"].str.upper().to_numpy(),
+        "OCR Address": [_misread(address, 9) for address in signers["Full Address"]],
+    }, index=signers.index + 100)
+
+    linker = RecordLinker(registry, DEFAULT_COMPARISONS)
+    pairs = linker.candidate_pairs(linker.ocr_fields(ocr_df))
+    # blocking compares a tiny share of the cross product
+    assert len(pairs) < 0.001 * len(ocr_df) * len(registry)
+
+    links = linker.fit(ocr_df).link(ocr_df)
+    assert links.index.equals(ocr_df.index)
+    linked = links["match_probability"].to_numpy() >= 0.9
+    correct = registry["Full Name"].to_numpy()[links["registry"]] == signers["Full Name"].to_numpy()
+    assert (linked & correct & registered).sum() >= 0.95 * registered.sum()
+    assert (linked & ~registered).sum() <= 5
+
+    # a slice of the registry keeps its index labels, pairs are by position
+    part = registry.iloc[1000:6000]
+    links = RecordLinker(part, DEFAULT_COMPARISONS).fit(ocr_df).link(ocr_df)
+    linked = links["registry"].to_numpy() >= 0
+    assert linked.any()
+    assert (part.index[links["registry"].to_numpy()[linked]] == links["registry_id"][linked].to_numpy()).all()
+    assert (part.loc[links["registry_id"][linked].tolist(), "Full Name"].to_numpy()
+            == part["Full Name"].to_numpy()[links["registry"].to_numpy()[linked]]).all()
+
+    # a house number tells records apart better than a street type
+    weights = linker.model.summary().set_index(["field", "agreement"])["weight"]
+    assert weights["street_number", "exact"] > weights["street_type", "exact"]
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+import fuzzy_match_helper
+from match_candidates import MatchCandidates
+
+
+@pytest.fixture
+def matched():
+    voters = pd.DataFrame(
+        {
+            "Full Name": ["Jane Doe", "John Roe", "Ann Lee", "Jan Dow"] * 3,
+            "Full Address": ["1 Main St", "2 Oak Ave", "3 Elm Rd", "9 Pine Ct"] * 3,
+        },
+        index=range(100, 112),
+    )
+    ocr_df = pd.DataFrame(
+        {
+            "OCR Name": ["Jane Do", "Ann Lee", "Jan Dow"],
+            "OCR Address": ["1 Main St", "3 Elm Road", "1 Main St"],
+            "Date": ["1/1", "1/2", "1/3"],
+            "Page Number": [1, 1, 1],
+            "Row Number": [1, 2, 3],
+            "Filename": ["a.pdf"] * 3,
+            "Duplicate Of": [None] * 3,
+        }
+    )
+    return fuzzy_match_helper.create_ocr_matched_df_with_candidates(ocr_df, voters, threshold=85, k=5)
+
+
+def test_candidates_reproduce_the_matched_results(matched):
+    results_df, candidates = matched
+    assert candidates.registry_ids.shape == (3, 5)
+
+    evaluated = candidates.evaluate(threshold=85)
+    for column in evaluated.columns:
+        assert list(evaluated[column]) == list(results_df[column])
+    # name and address scores belong to the same registry record, the exact
+    # name "Jan Dow" is not paired with the address of another record
+    assert list(results_df["Matched Name"]) == ["Jane Doe", "Ann Lee", "Jane Doe"]
+    assert list(results_df["Matched Address"]) == ["1 Main St", "3 Elm Rd", "1 Main St"]
+    assert results_df["Matched Registry ID"].isin(range(100, 112)).all()
+
+
+def test_reevaluate_threshold_and_rule_without_rescoring(matched):
+    results_df, candidates = matched
+
+    # "3 Elm Road" is the canonical "3 Elm Rd", only that row is a perfect match
+    strict = candidates.reevaluate(results_df, threshold=100)
+    assert list(strict["Valid"]) == [False, True, False]
+    assert list(strict["OCR Name"]) == list(results_df["OCR Name"])
+
+    # the lower of the name and address score rejects the misread name
+    by_min = candidates.reevaluate(results_df, threshold=85, rule="min")
+    assert list(by_min["Valid"]) == [True, True, False]
+    assert (by_min["Match Score"] <= results_df["Match Score"]).all()
+
+    review = candidates.row(2, "min")
+    assert review["Match Score"].is_monotonic_decreasing
+    assert list(review.iloc[0][["Name", "Address"]]) == ["Jane Doe", "1 Main St"]
+
+
+def test_concat_save_and_load(matched, tmp_path):
+    _, candidates = matched
+    first = MatchCandidates.from_rows([], k=5)
+    joined = MatchCandidates.concat([first, candidates, candidates])
+    assert len(joined) == 6
+    assert list(joined.evaluate(85)["Matched Name"]) == list(candidates.evaluate(85)["Matched Name"]) * 2
+
+    path = str(tmp_path / "candidates.npz")
+    joined.save(path)
+    loaded = MatchCandidates.load(path)
+    assert np.array_equal(loaded.name_scores, joined.name_scores)
+    assert loaded.evaluate(85, "mean").equals(joined.evaluate(85, "mean"))
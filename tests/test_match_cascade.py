@@ -0,0 +1,67 @@
+import json
+import pandas as pd
+import pytest
+from fuzzy_match_helper import create_ocr_matched_df, create_select_voter_records
+from match_cascade import MatchCascade
+
+
+@pytest.fixture(scope="module")
+def registry():
+    return create_select_voter_records(pd.read_csv("sample_data/fake_voter_records.csv", dtype=str, nrows=5000))
+
+
+def _ocr_df(names, addresses):
+    return pd.DataFrame({
+        "OCR Name": names,
+        "OCR Address": addresses,
+        "Date": "1/1",
+        "Page Number": 1,
+        "Row Number": range(1, len(names) + 1),
+        "Filename": "a.pdf",
+        "Duplicate Of": None,
+    })
+
+
+def test_stages_split_the_rows_and_rescue_the_margin(registry):
+    records = registry.iloc[::500]
+    names = list(records["Full Name"])
+    addresses = list(records["Full Address"])
+    # read exactly, in capitals with the last name first, and not registered
+    ocr_df = _ocr_df(
+        names[:4] + [" ".join(name.upper().split()[::-1]) for name in names[4:8]] + ["Zzyzx Qwerty"],
+        addresses[:4] + addresses[4:8] + ["1 Nowhere Road"],
+    )
+    cascade = MatchCascade(registry)
+
+    results_df, candidates = cascade.create_ocr_matched_df(ocr_df, threshold=85)
+
+    stats = cascade.stats
+    assert stats.rows == 9 and stats.resolved == 4 and stats.uncertain == 4
+    assert stats.scanned == stats.rejected == 1 and stats.scan_uncertain == 0
+    assert results_df["Valid"].tolist() == [True] * 8 + [False]
+    assert results_df["Matched Name"].tolist()[:8] == names[:8]
+    assert candidates.k == cascade.k
+    # rows settled by the first stages match as the registry scan does
+    scanned_df = create_ocr_matched_df(ocr_df.iloc[:4], registry, threshold=85)
+    assert results_df["Matched Name"].tolist()[:4] == scanned_df["Matched Name"].tolist()
+
+    cascade.create_ocr_matched_df(ocr_df, threshold=85)
+    assert cascade.stats.rows == 18
+    assert json.dumps(cascade.stats.summary())
+
+    # within a band this wide the scanned row goes on to the rescore, and still counts as scanned
+    wide = MatchCascade(registry, band=85)
+    wide.create_ocr_matched_df(ocr_df.iloc[8:], threshold=85)
+    assert wide.stats.scanned == wide.stats.scan_uncertain == wide.stats.uncertain == 1
+
+
+def test_a_different_house_number_is_not_rescued(registry):
+    record = registry.iloc[0]
+    number, street = record["Full Address"].split(" ", 1)
+    cascade = MatchCascade(registry)
+
+    rescored = cascade.rescore(record["Full Name"].upper(), f"{int(number) + 500} {street}", threshold=85)
+
+    assert record["Full Name"] in rescored.names
+    position = rescored.names.index(record["Full Name"])
+    assert 2 * 100 * rescored.address_scores[position] / (100 + rescored.address_scores[position]) < 85
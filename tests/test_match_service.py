@@ -0,0 +1,136 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import fitz
+import numpy as np
+import pandas as pd
+import pytest
+import batch_runner
+import ocr_helper
+from fuzzy_match_helper import create_ocr_matched_df, create_select_voter_records, get_matched_name_address
+from match_service import MatchService, MatchServiceClient, serve
+from store import file_digest
+
+
+@pytest.fixture
+def registries(tmp_path):
+    records = pd.read_csv("sample_data/fake_voter_records.csv", dtype=str, nrows=4000)
+    paths = tmp_path / "first.csv", tmp_path / "second.csv"
+    records.iloc[:3000].to_csv(paths[0], index=False)
+    records.iloc[1000:].to_csv(paths[1], index=False)
+    return paths
+
+
+@pytest.fixture
+def service(registries):
+    service = MatchService(str(registries[0]), max_workers=2)
+    yield service
+    service.close()
+
+
+def _serve(service, token=None):
+    server = serve(service, token=token)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+@pytest.fixture
+def client(service):
+    server, url = _serve(service)
+    yield MatchServiceClient(url)
+    server.shutdown()
+    server.server_close()
+
+
+def _signers(path, n):
+    records = pd.read_csv(path, dtype=str).fillna("").iloc[::50][:n]
+    return [(f"{r.First_Name} {r.Last_Name}"[1:], f"{r.Street_Number} {r.Street_Name}") for r in records.itertuples()]
+
+
+def test_service_matches_like_get_matched_name_address(registries, client):
+    select_voter_records = create_select_voter_records(pd.read_csv(registries[0], dtype=str))
+    rows = _signers(registries[0], 20)
+
+    served = client.match_rows(rows)
+    for (name, address), matches in zip(rows, served):
+        local = get_matched_name_address(name, address, select_voter_records)
+        assert [(m[0], m[1], m[3]) for m in matches] == [(m[0], m[1], m[3]) for m in local]
+        assert np.allclose([m[2] for m in matches], [m[2] for m in local])
+
+    ocr_df = pd.DataFrame(rows, columns=["OCR Name", "OCR Address"]).assign(
+        **{"Date": "1/1", "Page Number": 1, "Row Number": range(20), "Filename": "a.pdf", "Duplicate Of": None}
+    )
+    served_df, candidates = client.create_ocr_matched_df(ocr_df, threshold=85, batch_size=8)
+    pd.testing.assert_frame_equal(served_df, create_ocr_matched_df(ocr_df, select_voter_records, threshold=85))
+    assert len(candidates) == 20
+
+    stats = client.stats()
+    assert stats["registry_digest"] == file_digest(str(registries[0]))
+    assert stats["requests"] == 4 and stats["rows"] == 40 and stats["errors"] == 0
+    assert stats["queue_depth"] == 0 and stats["rows_per_s"] > 0
+    assert stats["latency_ms"]["p50"] > 0
+
+
+def test_registry_is_swapped_while_serving(registries, client):
+    rows = _signers(registries[1], 5)
+    with ThreadPoolExecutor(4) as pool:
+        # requests keep being answered while the next registry loads
+        during = [pool.submit(client.match_rows, rows) for _ in range(8)]
+        digest = client.swap_registry(str(registries[1]))
+        assert all(len(future.result()) == 5 for future in during)
+
+    assert digest == file_digest(str(registries[1])) == client.registry_digest
+    assert client.stats()["swaps"] == 1
+    select_voter_records = create_select_voter_records(pd.read_csv(registries[1], dtype=str))
+    assert [m[0] for m in client.get_matched_name_address(*rows[0])] == [
+        m[0] for m in get_matched_name_address(*rows[0], select_voter_records)
+    ]
+
+    with pytest.raises(RuntimeError, match="No such file"):
+        client.swap_registry(str(registries[0].parent / "missing.csv"))
+    assert client.registry_digest == digest
+
+
+def test_service_requires_its_token(service, monkeypatch):
+    with pytest.raises(ValueError, match="MATCH_SERVICE_TOKEN"):
+        serve(service, host="0.0.0.0")
+    server, url = _serve(service, token="secret")
+    try:
+        monkeypatch.delenv("MATCH_SERVICE_TOKEN", raising=False)
+        with pytest.raises(RuntimeError, match="token"):
+            MatchServiceClient(url).swap_registry("/etc/passwd")
+        with pytest.raises(RuntimeError, match="token"):
+            MatchServiceClient(url, token="wrong").stats()
+
+        client = MatchServiceClient(url, token="secret")
+        assert client.stats()["requests"] == 0
+        with pytest.raises(RuntimeError, match='"k"'):
+            client.score_rows([("Adam Welch", "5211 Shaw Wall")], k=10**9)
+        assert len(client.score_rows([("Adam Welch", "5211 Shaw Wall")], k=3)[1][0].names) == 3
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_batch_fails_files_matched_after_a_registry_swap(tmp_path, registries, client, monkeypatch):
+    swapped = []
+
+    async def extract(base64_image, metrics=None):
+        # another registry is swapped in after the batch checked the service
+        if not swapped:
+            swapped.append(client.swap_registry(str(registries[1])))
+        return [{"Name": "ADAM WELCH", "Address": "5211 Shaw Wall", "Date": "1/1", "Ward": 1}]
+
+    monkeypatch.setattr(ocr_helper, "extract_from_encoding_async", extract)
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((50, 340), "a petition page", fontsize=10)
+    doc.save(pdf_dir / "a.pdf")
+    output_dir = tmp_path / "out"
+
+    exit_code = batch_runner.run_batch(str(pdf_dir), str(registries[0]), str(output_dir), match_server=client.url)
+
+    assert exit_code == 1 and swapped
+    assert not (output_dir / "a_results.csv").exists()
@@ -0,0 +1,76 @@
+import json
+import pytest
+import ocr_helper
+from app.ocr.batch import (
+    page_request_id,
+    read_batch_requests,
+    read_batch_results,
+    run_local_batch,
+    write_batch_requests,
+)
+
+
+async def fake_extract(base64_image: str):
+    if base64_image == "broken":
+        raise RuntimeError("rate limited")
+    return [{"Name": f"VOTER {base64_image}", "Address": "1 Main St", "Date": "1/1", "Ward": 2}]
+
+
+@pytest.mark.parametrize("schema", ["rows", "columns"])
+def test_local_batch_round_trip(tmp_path, schema):
+    requests_path = str(tmp_path / "requests.jsonl")
+    results_path = str(tmp_path / "results.jsonl")
+    write_batch_requests(
+        [(page_request_id("a.pdf", 1), "abc"), (page_request_id("a.pdf", 2), "broken")],
+        requests_path,
+        model="test-model",
+        schema=schema,
+    )
+
+    request = json.loads(open(requests_path).readline())
+    assert request["body"]["model"] == "test-model"
+    assert list(read_batch_requests(requests_path))[0] == ("a.pdf::page-1", "abc", schema)
+
+    run_local_batch(requests_path, results_path, extract=fake_extract)
+    schemas = {request_id: schema for request_id, _, schema in read_batch_requests(requests_path)}
+    results, errors = read_batch_results(results_path, schemas)
+
+    assert results["a.pdf::page-1"][0]["Name"] == "VOTER abc"
+    assert "rate limited" in errors["a.pdf::page-2"]
+
+
+def test_batch_results_join_back_to_pages(tmp_path, write_pdf, monkeypatch):
+    monkeypatch.setattr(ocr_helper, "write_batch_requests", _write_with_test_model)
+    write_pdf(
+        tmp_path / "bundle.pdf",
+        [["Ann Lee 12 Oak St"] * 15, [f"Row {k} Bo Diaz 77 Elm Ave {k * 37}" for k in range(15)]],
+    )
+    requests_path = str(tmp_path / "requests.jsonl")
+    results_path = str(tmp_path / "results.jsonl")
+
+    assert ocr_helper.create_ocr_batch_file(str(tmp_path), ["bundle.pdf"], requests_path) == 2
+    run_local_batch(requests_path, results_path, extract=fake_extract)
+    ocr_df = ocr_helper.create_ocr_df_from_batch(requests_path, results_path)
+
+    assert list(ocr_df["Page Number"]) == [1, 2]
+    assert list(ocr_df["Filename"]) == ["bundle.pdf", "bundle.pdf"]
+    assert ocr_df["OCR Name"].str.startswith("Voter").all()
+
+
+def test_missing_batch_results_raise(tmp_path, write_pdf, monkeypatch):
+    monkeypatch.setattr(ocr_helper, "write_batch_requests", _write_with_test_model)
+    write_pdf(tmp_path / "bundle.pdf", [["Ann Lee 12 Oak St"] * 15])
+    requests_path = str(tmp_path / "requests.jsonl")
+    results_path = tmp_path / "results.jsonl"
+    ocr_helper.create_ocr_batch_file(str(tmp_path), ["bundle.pdf"], requests_path)
+    results_path.write_text("")
+
+    with pytest.raises(ValueError):
+        ocr_helper.create_ocr_df_from_batch(requests_path, str(results_path))
+    assert ocr_helper.create_ocr_df_from_batch(
+        requests_path, str(results_path), allow_missing=True
+    ).empty
+
+
+def _write_with_test_model(requests, path):
+    return write_batch_requests(requests, path, model="test-model", schema="rows")
@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+import batch_runner
+import ocr_helper
+from store import OcrCheckpoint
+
+
+def test_resume_reads_only_missing_and_failed_pages(tmp_path, fake_ocr, write_pdf):
+    write_pdf(tmp_path / "a.pdf", 4)
+    checkpoint = OcrCheckpoint(str(tmp_path / "checkpoint.sqlite"))
+
+    # one request at a time, the third page fails
+    fake_ocr["fail_on"] = 3
+    with pytest.raises(RuntimeError):
+        ocr_helper.collect_ocr_data(str(tmp_path), "a.pdf", batch_size=1, checkpoint=checkpoint)
+    run_key = checkpoint.run_key(str(tmp_path / "a.pdf"))
+    status = checkpoint.page_status(run_key)
+    assert status[1] == status[2] == "ok" and status[3] == "failed"
+    pages_to_read = 4 - sum(page_status == "ok" for page_status in status.values())
+
+    fake_ocr.update(read=[], fail_on=None)
+    checkpoint.resume = True
+    ocr_data = ocr_helper.collect_ocr_data(str(tmp_path), "a.pdf", batch_size=1, checkpoint=checkpoint)
+
+    assert len(fake_ocr["read"]) == pages_to_read
+    assert [row["Page Number"] for row in ocr_data] == [1, 2, 3, 4]
+    assert set(checkpoint.page_status(run_key).values()) == {"ok"}
+
+
+def test_resumed_batch_keeps_matched_rows(tmp_path, fake_ocr, write_pdf, monkeypatch):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    write_pdf(pdf_dir / "a.pdf", 2)
+    output_dir = tmp_path / "out"
+    registry = "sample_data/all_petition_signers.csv"
+
+    assert batch_runner.run_batch(str(pdf_dir), registry, str(output_dir / "first"), resume=True) == 0
+    first = pd.read_csv(output_dir / "first" / "a_results.csv")
+
+    def no_matching(*args, **kwargs):
+        raise AssertionError("rows were matched again")
+
+    monkeypatch.setattr(batch_runner, "create_ocr_matched_df", no_matching)
+    fake_ocr["read"].clear()
+    assert batch_runner.run_batch(
+        str(pdf_dir),
+        registry,
+        str(output_dir / "second"),
+        checkpoint_path=str(output_dir / "first" / "checkpoint.sqlite"),
+        resume=True,
+    ) == 0
+
+    assert not fake_ocr["read"]
+    pd.testing.assert_frame_equal(pd.read_csv(output_dir / "second" / "a_results.csv"), first)
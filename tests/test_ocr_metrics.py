@@ -0,0 +1,71 @@
+import asyncio
+import json
+import pytest
+from app.ocr.metrics import OcrBudgetExceededError, OcrRunMetrics, PageMetrics
+
+
+def _read_pages(metrics, n_pages, tokens=(1_000_000, 0)):
+    async def main():
+        read = 0
+        for n in range(n_pages):
+            try:
+                async with metrics.request_slot():
+                    read += 1
+            except OcrBudgetExceededError:
+                if metrics.budget_action == "abort":
+                    raise
+                metrics.record(PageMetrics(page_id=f"p{n}", status="skipped"))
+                continue
+            metrics.record(
+                PageMetrics(page_id=f"p{n}", input_tokens=tokens[0], output_tokens=tokens[1])
+            )
+        return read
+
+    return asyncio.run(main())
+
+
+def test_cost_and_summary():
+    metrics = OcrRunMetrics(input_token_cost=0.5, output_token_cost=2.0)
+    metrics.add_expected_pages(4)
+    metrics.record(PageMetrics(page_id="a", request_s=1.0, input_tokens=1000, output_tokens=500))
+    metrics.record(PageMetrics(page_id="b", request_s=3.0, input_tokens=1000, output_tokens=500, retries=1))
+
+    summary = metrics.summary()
+    assert summary["cost_usd"] == pytest.approx(2 * (0.0005 + 0.001))
+    assert summary["projected_cost_usd"] == pytest.approx(4 * 0.0015)
+    assert summary["retries"] == 1
+    assert summary["request_s"]["p50"] == pytest.approx(2.0)
+
+    counts, _ = metrics.histogram("request_s", bins=2)
+    assert list(counts) == [1, 1]
+
+
+def test_budget_abort_raises_once_projection_exceeds():
+    metrics = OcrRunMetrics(input_token_cost=1.0, budget_usd=5.0, budget_action="abort")
+    metrics.add_expected_pages(10)
+    with pytest.raises(OcrBudgetExceededError):
+        _read_pages(metrics, 10)
+    assert len(metrics.pages) == 3
+
+
+def test_budget_throttle_stops_when_spent():
+    metrics = OcrRunMetrics(input_token_cost=1.0, budget_usd=5.0, budget_action="throttle")
+    metrics.add_expected_pages(10)
+    assert _read_pages(metrics, 10) == 5
+    assert metrics.spent_usd == pytest.approx(5.0)
+    assert metrics.summary()["pages_skipped"] == 5
+
+
+def test_export(tmp_path):
+    metrics = OcrRunMetrics()
+    metrics.record(PageMetrics(page_id="a", provider="open_ai", model="gpt", request_s=1.0, output_tokens=300))
+    metrics.record(PageMetrics(page_id="b", provider="open_ai", model="gpt", request_s=3.0, output_tokens=500))
+    csv_path, json_path = metrics.export(str(tmp_path))
+
+    assert open(csv_path).readline().startswith("page_id,provider,model")
+    exported = json.load(open(json_path))
+    assert exported["providers"] == ["open_ai/gpt"]
+    histograms = exported["histograms"]
+    assert set(histograms) == {"queue_wait_s", "request_s", "parse_s", "input_tokens", "output_tokens"}
+    assert sum(histograms["request_s"]["counts"]) == 2 and len(histograms["request_s"]["edges"]) == 11
+    assert histograms["output_tokens"]["edges"][0] == 300 and histograms["output_tokens"]["edges"][-1] == 500
@@ -0,0 +1,67 @@
+import time
+import fitz
+import ocr_helper
+from ocr_queue import OcrJobQueue
+
+
+def _write_layouts_pdf(path, layouts):
+    # a dark block in another band of the crop for every layout, so pages
+    # of different layouts never look alike to the page hash
+    doc = fitz.open()
+    for layout in layouts:
+        page = doc.new_page()
+        top = page.rect.height * 0.4 + 20 * layout
+        page.draw_rect(fitz.Rect(50, top, 300, top + 40 + 10 * layout), color=(0, 0, 0), fill=(0, 0, 0))
+    doc.save(path)
+
+
+def _encodings(path):
+    return ocr_helper.collecting_pdf_encoded_images(str(path))
+
+
+def test_concurrent_files_read_shared_pages_once(tmp_path, fake_ocr):
+    _write_layouts_pdf(tmp_path / "a.pdf", [0, 1])
+    _write_layouts_pdf(tmp_path / "b.pdf", [2, 3, 4])
+    _write_layouts_pdf(tmp_path / "c.pdf", [0, 1])
+    queue = OcrJobQueue(str(tmp_path), max_concurrent_requests=2, max_concurrent_files=3)
+    for filename in ["a.pdf", "b.pdf", "c.pdf"]:
+        queue.add(filename)
+
+    jobs = queue.run()
+
+    assert [job.status for job in jobs.values()] == ["done"] * 3
+    assert len(fake_ocr["read"]) == 5
+    results_df = queue.results_df()
+    assert len(results_df) == 7
+    assert results_df["Duplicate Of"].notna().sum() == 2
+
+
+def test_a_failing_file_does_not_fail_files_sharing_its_pages(tmp_path, fake_ocr, monkeypatch):
+    _write_layouts_pdf(tmp_path / "a.pdf", [0, 1])
+    _write_layouts_pdf(tmp_path / "b.pdf", [0, 2])
+    shared, broken = _encodings(tmp_path / "a.pdf")
+    fake_ocr["slow"].add(shared)
+    fake_ocr["failing"].add(broken)
+
+    # b.pdf registers its pages after a.pdf, so its copy waits for a.pdf's read
+    collect = ocr_helper.collecting_pdf_encoded_images_and_hashes
+
+    def collect_b_later(file_path, *args, **kwargs):
+        if file_path.endswith("b.pdf"):
+            time.sleep(0.1)
+        return collect(file_path, *args, **kwargs)
+
+    monkeypatch.setattr(ocr_helper, "collecting_pdf_encoded_images_and_hashes", collect_b_later)
+    queue = OcrJobQueue(str(tmp_path), max_concurrent_requests=4, max_concurrent_files=2)
+    queue.add("a.pdf")
+    queue.add("b.pdf")
+
+    jobs = queue.run()
+
+    assert jobs["a.pdf"].status == "failed" and "unreadable page" in jobs["a.pdf"].error
+    assert jobs["b.pdf"].status == "done"
+    results_df = queue.results_df()
+    assert list(results_df["Page Number"]) == [1, 2]
+    # the copy was read in place of the failed original and counts as one
+    assert results_df["Duplicate Of"].isna().all()
+    assert fake_ocr["read"].count(shared) == 2
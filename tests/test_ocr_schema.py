@@ -0,0 +1,45 @@
+import pytest
+from ocr.ocr_client_factory import (
+    OCRColumns,
+    OCRData,
+    OCREntry,
+    build_ocr_messages,
+    parse_ocr_json,
+    parse_ocr_output,
+)
+
+
+def test_rows_and_columns_parse_to_same_rows():
+    rows = OCRData(
+        Data=[
+            OCREntry(Name="ANN LEE", Address="12 Oak St", Date="1/2", Ward=3),
+            OCREntry(Name="BO DIAZ", Address="7 Elm Ave", Date="1/3", Ward=4),
+        ]
+    )
+    columns = OCRColumns(
+        Name=["ANN LEE", "BO DIAZ"],
+        Address=["12 Oak St", "7 Elm Ave"],
+        Date=["1/2", "1/3"],
+        Ward=[3, 4],
+    )
+
+    assert parse_ocr_output(rows) == parse_ocr_output(columns)
+    assert parse_ocr_json(columns.model_dump_json(), "columns") == parse_ocr_output(rows)
+    # a name mentioning the other schema's key does not change the schema
+    quoted = OCRColumns(Name=['ANN "Data" LEE'], Address=["12 Oak St"], Date=["1/2"], Ward=[3])
+    assert parse_ocr_json(quoted.model_dump_json(), "columns")[0]["Name"] == 'ANN "Data" LEE'
+
+
+def test_uneven_columns_are_rejected():
+    columns = OCRColumns(
+        Name=["ANN LEE", "BO DIAZ"], Address=["12 Oak St"], Date=["1/2", "1/3"], Ward=[3, 4]
+    )
+    with pytest.raises(ValueError, match="unequal lengths"):
+        parse_ocr_output(columns)
+
+
+def test_prompt_depends_on_schema():
+    rows_prompt = build_ocr_messages("abc", "rows")[0]["text"]
+    columns_prompt = build_ocr_messages("abc", "columns")[0]["text"]
+    assert "list of dictionaries" in rows_prompt
+    assert "four lists" in columns_prompt
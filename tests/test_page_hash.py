@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from app.dedup import IndexedPage, PageHashIndex, perceptual_hash
+
+
+def _page(seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    # blocky random content, similar in scale to text lines on a page
+    blocks = rng.integers(0, 256, size=(12, 16), dtype=np.uint8)
+    return np.kron(blocks, np.ones((20, 25), dtype=np.uint8))
+
+
+def test_rescanned_page_hash_is_close():
+    page = _page(0)
+    noisy = np.clip(
+        page.astype(int) + np.random.default_rng(1).integers(-8, 9, page.shape), 0, 255
+    ).astype(np.uint8)
+    assert (perceptual_hash(page) ^ perceptual_hash(noisy)).bit_count() <= 16
+
+
+def test_different_pages_hash_far_apart():
+    assert (perceptual_hash(_page(0)) ^ perceptual_hash(_page(2))).bit_count() > 32
+
+
+def test_index_finds_first_near_duplicate():
+    index = PageHashIndex(max_distance=3)
+    first = IndexedPage(filename="a.pdf", page_number=1)
+    second = IndexedPage(filename="b.pdf", page_number=7)
+    index.add(0b1011, first)
+    index.add(0b1011 ^ (1 << 40), second)
+
+    assert index.find(0b1011 ^ (1 << 63) ^ (1 << 20)) is first
+    assert index.find(0b1011 ^ 0b1111 << 30) is None
+    assert len(index) == 2
+
+
+def test_index_matches_linear_scan():
+    rng = np.random.default_rng(3)
+    hashes = [int(h) for h in rng.integers(0, 2**63, size=500, dtype=np.int64)]
+    index = PageHashIndex(max_distance=4)
+    for page_number, page_hash in enumerate(hashes):
+        index.add(page_hash, IndexedPage(filename="a.pdf", page_number=page_number))
+
+    for page_hash in hashes[:50]:
+        query = page_hash ^ (1 << 5) ^ (1 << 33) ^ (1 << 61)
+        expected = next(
+            n for n, h in enumerate(hashes) if (h ^ query).bit_count() <= 4
+        )
+        assert index.find(query).page_number == expected
+
+
+def test_index_rejects_invalid_distance():
+    with pytest.raises(ValueError):
+        PageHashIndex(max_distance=256)
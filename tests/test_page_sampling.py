@@ -0,0 +1,122 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from page_sampling import SequentialPageSample, estimate_valid_count, petition_pages, run_sampling
+
+
+def _pages(page_counts, pages_per_stratum=10):
+    parts = [pd.DataFrame({"Filename": f"{n}.pdf", "Page Number": np.arange(1, count + 1)})
+             for n, count in enumerate(page_counts)]
+    pages = pd.concat(parts, ignore_index=True)
+    blocks = pages["Filename"] + "|" + ((pages["Page Number"] - 1) // pages_per_stratum).astype(str)
+    pages["Stratum"] = pd.factorize(blocks)[0]
+    return pages
+
+
+def _matched(pages, valid):
+    # one valid row per valid signature of a page
+    return pd.DataFrame({
+        "Filename": np.repeat(pages["Filename"].to_numpy(), valid),
+        "Page Number": np.repeat(pages["Page Number"].to_numpy(), valid),
+        "Valid": True,
+    })
+
+
+def test_stratified_estimate_covers_the_total():
+    pages = _pages([40, 25, 35])
+    rng = np.random.default_rng(0)
+    valid = rng.integers(5, 15, size=len(pages))
+    page_valid = pd.Series(valid, index=pd.MultiIndex.from_frame(pages[["Filename", "Page Number"]]))
+
+    # every page read: exact
+    exact = estimate_valid_count(pages, page_valid)
+    assert exact.estimate == pytest.approx(valid.sum()) and exact.lower == exact.upper == pytest.approx(valid.sum())
+
+    covered = 0
+    for seed in range(100):
+        read = pages.groupby("Stratum").sample(4, random_state=seed).index
+        estimate = estimate_valid_count(pages, page_valid.iloc[read])
+        covered += estimate.lower <= valid.sum() <= estimate.upper
+        assert estimate.pages_read == len(read) and estimate.total_pages == 100
+    assert covered >= 85
+
+    # a stratum not read yet leaves the total open
+    estimate = estimate_valid_count(pages, page_valid.iloc[:10])
+    assert estimate.decision(1) == "cleared" and estimate.decision(10_000) == "undecided"
+
+
+def test_sequential_sample_stops_once_the_target_is_settled():
+    pages = _pages([200, 100])
+    valid = np.random.default_rng(1).integers(8, 13, size=len(pages))
+
+    def run(target):
+        sample = SequentialPageSample(pages, target, step_pages=10, seed=2)
+        looks = 0
+        while sample.decision() == "undecided":
+            to_read = sample.draw()
+            looks += 1
+            # every draw after the first two per stratum adds exactly a step
+            assert len(to_read) == (60 if looks == 1 else 10) and not to_read.index.duplicated().any()
+            sample.record(to_read, _matched(pages.loc[to_read.index], valid[to_read.index]))
+        assert looks <= sample.max_looks
+        return sample
+
+    cleared = run(2000)
+    assert cleared.decision() == "cleared" and len(cleared.page_valid) < len(pages)
+    # every stratum was sampled before deciding
+    assert set(pages.loc[pages.set_index(["Filename", "Page Number"]).index.isin(cleared.page_valid.index),
+                         "Stratum"]) == set(pages["Stratum"])
+    missed = run(5000)
+    assert missed.decision() == "missed" and len(missed.page_valid) < len(pages)
+    # a target at the total needs every page
+    exact = run(int(valid.sum()))
+    assert exact.decision() == "cleared" and len(exact.page_valid) == len(pages)
+    assert exact.max_looks == 1 + (300 - 60) // 10
+
+    with pytest.raises(ValueError):
+        SequentialPageSample(pages, 2000, step_pages=0)
+
+
+def test_draws_follow_the_strata_sizes_and_copies_count_none():
+    pages = _pages([7, 3, 25], pages_per_stratum=25)
+    sample = SequentialPageSample(pages, 100, initial_pages=7, step_pages=5, seed=0)
+    sizes = []
+    while len(to_read := sample.draw()):
+        sizes.append(len(to_read))
+    assert sizes == [7, 5, 5, 5, 5, 5, 3] and len(sizes) == sample.max_looks
+    sample = SequentialPageSample(pages, 100, initial_pages=10, step_pages=5, seed=0)
+    # in proportion to the 7, 3 and 25 pages of the strata
+    assert sample.pages.loc[sample.draw().index, "Filename"].value_counts().to_dict() == {
+        "2.pdf": 6, "0.pdf": 2, "1.pdf": 2
+    }
+
+    to_read = sample.draw()
+    matched = _matched(pages.loc[to_read.index], 3).assign(**{"Duplicate Of": None})
+    matched.loc[matched.index[:3], "Duplicate Of"] = "0.pdf page 1"
+    sample.record(to_read, matched)
+    assert sample.page_valid.tolist() == [0] + [3] * (len(to_read) - 1)
+
+
+def test_run_sampling_reads_only_sampled_pages(tmp_path, fake_ocr, write_pdf):
+    fake_ocr["rows"].append({"Name": "NOT A VOTER", "Address": "1 Nowhere Rd", "Date": "1/1", "Ward": 1})
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    write_pdf(
+        pdf_dir / "bundle.pdf",
+        [[f"page {n} row {k} " * (1 + n % 7) + "x" * n for k in range(15)] for n in range(60)],
+    )
+    output_dir = tmp_path / "out"
+
+    estimate = run_sampling(str(pdf_dir), "sample_data/all_petition_signers.csv", 30, str(output_dir),
+                            step_pages=6, pages_per_stratum=20, seed=0)
+
+    assert estimate.decision(30) == "cleared"
+    assert estimate.pages_read < 60 and len(fake_ocr["read"]) <= estimate.pages_read
+    assert estimate.estimate == pytest.approx(60)
+    results = pd.read_csv(output_dir / "sample_results.csv")
+    assert results["Page Number"].nunique() == estimate.pages_read
+    assert results["Page Number"].max() > estimate.pages_read
+    summary = json.loads((output_dir / "sampling_summary.json").read_text())
+    assert summary["decision"] == "cleared" and summary["looks"][-1]["pages_read"] == estimate.pages_read
+    assert petition_pages(str(pdf_dir), ["bundle.pdf"])["Stratum"].nunique() == 3
@@ -0,0 +1,234 @@
+import threading
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from match_candidates import MatchCandidates, RowCandidates
+from store import (
+    RESULT_COLUMNS,
+    FrameResults,
+    ReevaluatedResults,
+    ResultsFilter,
+    ResultsStore,
+    StoreResults,
+    write_export,
+)
+
+
+def _results(filename, n_rows, ward="1"):
+    return pd.DataFrame(
+        {
+            "OCR Name": [f"Name {n}" for n in range(n_rows)],
+            "OCR Address": [f"{n} Main St" for n in range(n_rows)],
+            "Matched Name": [f"Name {n}" for n in range(n_rows)],
+            "Matched Address": [f"{n} Main St" for n in range(n_rows)],
+            "Date": "1/1",
+            "OCR Ward": ward,
+            "Match Score": [100.0 - 10 * n for n in range(n_rows)],
+            "Valid": [n < 2 for n in range(n_rows)],
+            "Page Number": [1 + n // 2 for n in range(n_rows)],
+            "Row Number": [1 + n % 2 for n in range(n_rows)],
+            "Filename": filename,
+            "Duplicate Of": None,
+            "Matched Registry ID": list(range(n_rows)),
+        }
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultsStore(str(tmp_path / "results.sqlite"))
+    yield store
+    store.close()
+
+
+def test_append_and_query_with_filters(store):
+    run_id = store.start_run(campaign="test", threshold=85)
+    store.append(run_id, _results("a.pdf", 4))
+    store.append(run_id, _results("b.pdf", 3, ward="2"))
+    store.finish_run(run_id)
+
+    assert store.count(run_id) == 7
+    assert store.count(run_id, valid=True, ward="2") == 2
+    assert store.count(run_id, filename="a.pdf", page_number=2) == 2
+    assert store.count(registry_id=[0, 1]) == 4
+
+    first = store.query(run_id, filename="a.pdf")
+    assert list(first.columns) == RESULT_COLUMNS
+    pd.testing.assert_frame_equal(first, _results("a.pdf", 4), check_dtype=False)
+
+    page = store.query(run_id, order_by="Match Score", descending=True, limit=2, offset=1)
+    assert list(page["Match Score"]) == [100.0, 90.0]
+
+    runs = store.runs(campaign="test")
+    assert list(runs["status"]) == ["done"] and list(runs["rows"]) == [7]
+
+
+def test_summary_excludes_duplicates_from_valid(store):
+    run_id = store.start_run()
+    duplicated = _results("b.pdf", 2)
+    duplicated["Duplicate Of"] = "a.pdf, page 1"
+    store.append(run_id, _results("a.pdf", 2))
+    store.append(run_id, duplicated)
+
+    summary = store.summary(run_id, by="Filename")
+    assert summary.to_dict("records") == [
+        {"Filename": "a.pdf", "Total": 2, "Valid": 2, "Duplicates": 0},
+        {"Filename": "b.pdf", "Total": 2, "Valid": 0, "Duplicates": 2},
+    ]
+    assert store.count(run_id, duplicate=False) == 2
+
+
+def test_iter_chunks_includes_rows_appended_while_reading(store):
+    run_id = store.start_run()
+    store.append(run_id, _results("a.pdf", 5))
+
+    chunks = store.iter_chunks(run_id, chunk_size=3)
+    sizes = [len(next(chunks))]
+    store.append(run_id, _results("b.pdf", 2))
+    sizes += [len(chunk) for chunk in chunks]
+
+    assert sizes == [3, 3, 1]
+
+
+@pytest.fixture
+def results_df():
+    duplicated = _results("c.pdf", 2)
+    duplicated["Duplicate Of"] = "a.pdf, page 1"
+    return pd.concat(
+        [_results("a.pdf", 5), _results("b.pdf", 4, ward="2"), duplicated], ignore_index=True
+    )
+
+
+@pytest.fixture(params=["frame", "store"])
+def make_source(request, tmp_path):
+    store = ResultsStore(str(tmp_path / "results.sqlite"))
+
+    def make(results_df):
+        if request.param == "frame":
+            return FrameResults(results_df)
+        run_id = store.start_run()
+        store.append(run_id, results_df)
+        return StoreResults(store, run_id)
+
+    yield make
+    store.close()
+
+
+def test_page_filters_sorts_and_clamps(make_source, results_df):
+    source = make_source(results_df)
+
+    everything = source.page(ResultsFilter(), page=2, page_size=4)
+    assert (everything.total_rows, everything.page, everything.page_count) == (11, 2, 3)
+    assert list(everything.rows["Filename"]) == ["a.pdf", "b.pdf", "b.pdf", "b.pdf"]
+
+    best_first = source.page(ResultsFilter(duplicate=False), page_size=3, order_by="Match Score", descending=True)
+    assert list(best_first.rows["Match Score"]) == [100.0, 100.0, 90.0]
+    assert best_first.total_rows == 9
+
+    valid_ward = source.page(ResultsFilter(wards=["2"], valid=True), page=5)
+    assert (valid_ward.total_rows, valid_ward.page) == (2, 1)
+    assert source.options("Filename") == ["a.pdf", "b.pdf", "c.pdf"]
+
+
+def test_reevaluated_store_results_match_the_reevaluated_frame(tmp_path, results_df):
+    candidates = MatchCandidates.from_rows(
+        [
+            RowCandidates(
+                np.array([n, 100 + n]),
+                [f"Name {n}", f"Other {n}"],
+                [f"{n} Main St", f"{n} Oak Ave"],
+                np.array([100 - 7 * n, 85 - 2 * n], dtype=np.float32),
+                np.array([60 + 3 * n, 85 - 2 * n], dtype=np.float32),
+            )
+            for n in range(len(results_df))
+        ],
+        k=2,
+    )
+    store = ResultsStore(str(tmp_path / "results.sqlite"))
+    run_id = store.start_run()
+    store.append(run_id, results_df)
+    source = ReevaluatedResults(store, run_id, candidates, threshold=75, rule="min")
+    expected = FrameResults(candidates.reevaluate(results_df, threshold=75, rule="min"))
+
+    for results_filter, order_by, descending in [
+        (ResultsFilter(), None, False),
+        (ResultsFilter(valid=True), "Match Score", False),
+        (ResultsFilter(duplicate=False), "Match Score", True),
+        (ResultsFilter(filenames=["a.pdf", "c.pdf"], valid=False), "OCR Name", True),
+    ]:
+        page = source.page(results_filter, page=2, page_size=3, order_by=order_by, descending=descending)
+        expected_page = expected.page(results_filter, page=2, page_size=3, order_by=order_by, descending=descending)
+        assert page[1:] == expected_page[1:]
+        pd.testing.assert_frame_equal(page.rows, expected_page.rows.reset_index(drop=True), check_dtype=False)
+
+    chunks = list(source.iter_chunks(chunk_size=4))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 3]
+    assert list(pd.concat(chunks)["Matched Registry ID"]) == list(candidates.evaluate(75, "min")["Matched Registry ID"])
+    assert source.summary() == expected.summary()
+    store.close()
+
+
+def test_summary_counts_rows_added_since_last_call(tmp_path, results_df):
+    store = ResultsStore(str(tmp_path / "results.sqlite"))
+    run_id = store.start_run()
+    source = StoreResults(store, run_id)
+
+    store.append(run_id, results_df.iloc[:5])
+    assert source.summary().total == 5
+    store.append(run_id, results_df.iloc[5:])
+    summary = source.summary()
+
+    assert (summary.total, summary.valid, summary.duplicates) == (9, 4, 2)
+    assert summary.percentage_valid == pytest.approx(100 * 4 / 9)
+    # rows of rescanned pages are left out of every count
+    frame_summary = FrameResults(results_df).summary()
+    assert (frame_summary.total, frame_summary.valid, frame_summary.duplicates) == (9, 4, 2)
+    store.close()
+
+
+@pytest.mark.parametrize("extension", ["csv", "parquet"])
+def test_export_in_chunks_matches_results(tmp_path, store, extension):
+    run_id = store.start_run()
+    store.append(run_id, _results("a.pdf", 5))
+    store.append(run_id, _results("b.pdf", 4, ward="2"))
+    path = str(tmp_path / f"results.{extension}")
+
+    assert write_export(store.iter_chunks(run_id, chunk_size=2), path) == 9
+
+    exported = pd.read_csv(path, dtype={"OCR Ward": str}) if extension == "csv" else pd.read_parquet(path)
+    assert list(exported.columns) == RESULT_COLUMNS
+    expected = store.query(run_id)
+    pd.testing.assert_frame_equal(
+        exported.astype(object).fillna(""), expected.astype(object).fillna(""), check_dtype=False
+    )
+
+
+def test_export_follows_a_running_run(tmp_path, store):
+    run_id = store.start_run()
+    store.append(run_id, _results("a.pdf", 3))
+
+    def finish_job():
+        time.sleep(0.1)
+        store.append(run_id, _results("b.pdf", 2))
+        store.finish_run(run_id)
+
+    writer = threading.Thread(target=finish_job)
+    writer.start()
+    rows = write_export(
+        store.iter_chunks(run_id, follow=True, poll_interval=0.01), str(tmp_path / "results.csv")
+    )
+    writer.join()
+
+    assert rows == 5
+
+
+def test_export_of_a_stuck_run_times_out(tmp_path, store):
+    run_id = store.start_run()
+    store.append(run_id, _results("a.pdf", 3))
+    path = tmp_path / "results.csv"
+
+    with pytest.raises(TimeoutError):
+        write_export(store.iter_chunks(run_id, follow=True, poll_interval=0.01, idle_timeout=0.05), str(path))
+
+    assert not path.exists() and not (tmp_path / "results.csv.tmp").exists()
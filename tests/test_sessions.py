@@ -0,0 +1,95 @@
+import hashlib
+import io
+import os
+import threading
+import time
+import pandas as pd
+import pytest
+from sessions import RegistryCache, RegistryEntry, SessionWorkspace, load_registry, registry_digest
+
+
+def _entry(key, nbytes):
+    return RegistryEntry(key, pd.DataFrame(), pd.DataFrame(), nbytes)
+
+
+def test_registry_is_loaded_once_for_all_holders():
+    with open("sample_data/all_petition_signers.csv", "rb") as f:
+        upload = io.BytesIO(f.read())
+    key = registry_digest(upload)
+    cache = RegistryCache(max_bytes=2**30)
+    loads = []
+
+    def loader():
+        loads.append(key)
+        time.sleep(0.05)
+        return load_registry(key, upload)
+
+    entries = []
+    threads = [
+        threading.Thread(target=lambda n=n: entries.append(cache.acquire(key, f"session-{n}", loader=loader)))
+        for n in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
+    assert all(entry is entries[0] for entry in entries)
+    assert entries[0].select_voter_records.columns.tolist() == ["Full Name", "Full Address", "Canonical Address"]
+    assert entries[0].voter_records["Full Name"].iloc[0] == "Adam Welch"
+    # acquiring again only refreshes the holder
+    cache.acquire(key, "session-0")
+    stats = cache.stats()
+    assert (stats["registries"], stats["holders"], stats["misses"], stats["hits"]) == (1, 4, 1, 4)
+
+
+def test_only_unheld_registries_are_evicted_least_recently_used_first():
+    cache = RegistryCache(max_bytes=250)
+    cache.acquire("a", "session-a", loader=lambda: _entry("a", 100))
+    cache.acquire("b", "session-b", loader=lambda: _entry("b", 100))
+    cache.acquire("c", "job-c", loader=lambda: _entry("c", 100), expires=False)
+    # over budget, but every registry is in use
+    assert cache.stats()["registries"] == 3
+
+    cache.release("b", "session-b")
+    cache.release("a", "session-a")
+    assert cache.stats()["registries"] == 2
+    assert cache.acquire("a", "session-a") is not None
+    with pytest.raises(KeyError):
+        cache.acquire("b", "session-b")
+
+    # idle sessions stop holding their registry, jobs do not
+    cache.max_idle_s = 0
+    cache.max_bytes = 0
+    cache.release_holder("nobody")
+    assert cache.stats()["registries"] == 1
+    assert cache.stats()["evictions"] == 2
+    cache.release("c", "job-c")
+    assert cache.stats()["registries"] == 0
+
+
+def test_session_workspaces_are_isolated(tmp_path):
+    root = str(tmp_path / "temp")
+    first = SessionWorkspace(root, "first")
+    second = SessionWorkspace(root, "second")
+
+    assert first.save_upload("../ballot.pdf", io.BytesIO(b"first")) == "ballot.pdf"
+    second.save_upload("ballot.pdf", io.BytesIO(b"second upload"))
+    with open(first.file_path("ballot.pdf"), "rb") as f:
+        assert f.read() == b"first"
+
+    upload = first.store_upload("ballot.pdf", io.BytesIO(b"replaced upload"), chunk_size=4)
+    assert upload == ("ballot.pdf", first.file_path("ballot.pdf"), hashlib.sha256(b"replaced upload").hexdigest(), 15)
+    with open(upload.path, "rb") as f:
+        assert f.read() == b"replaced upload"
+
+    first.clear()
+    assert first.files() == []
+    assert second.files() == ["ballot.pdf"]
+
+    old = time.time() - 7200
+    os.utime(first.path, (old, old))
+    os.utime(second.path, (old, old))
+    assert SessionWorkspace.cleanup_stale(root, max_idle_s=3600, keep=["second"]) == ["first"]
+    assert sorted(os.listdir(root)) == ["second"]
@@ -1,5 +1,12 @@
 import pytest
-from app.settings import load_settings, OpenAiConfig, MistralAiConfig, GeminiAiConfig
+from app.settings import (
+    load_settings,
+    OpenAiConfig,
+    MistralAiConfig,
+    GeminiAiConfig,
+    OcrBudgetConfig,
+    TracingConfig,
+)
 
 
 def test_open_ai_selected_config():
@@ -59,3 +66,30 @@ def test_return_same_settings_if_no_reload():
     )
     second_settings = load_settings("tests/data/test_settings_invalid.toml")
     assert settings == second_settings
+
+
+def test_load_settings_with_pricing_and_budget():
+    settings = load_settings(
+        "tests/data/test_settings_budget.toml", reload_settings=True
+    )
+    assert settings.selected_config.input_token_cost == 0.15
+    assert settings.selected_config.output_token_cost == 0.6
+    assert settings.max_retries == 1
+    assert settings.budget == OcrBudgetConfig(max_cost_usd=2.5, action="throttle")
+
+
+def test_load_settings_without_budget():
+    settings = load_settings(
+        "tests/data/test_settings_default.toml", reload_settings=True
+    )
+    assert settings.budget == OcrBudgetConfig()
+
+
+def test_load_settings_with_tracing():
+    settings = load_settings(
+        "tests/data/test_settings_tracing.toml", reload_settings=True
+    )
+    assert settings.tracing == TracingConfig(enabled=True, sample_rate=0.5, profile=True)
+    assert load_settings(
+        "tests/data/test_settings_default.toml", reload_settings=True
+    ).tracing == TracingConfig()
@@ -0,0 +1,99 @@
+from multiprocessing.connection import AuthenticationError
+import os
+import subprocess
+import sys
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+from fuzzy_match_helper import create_ocr_matched_df, create_select_voter_records, get_matched_name_address
+from sharding import ShardCoordinator, ShardWorker, partition_registry
+
+AUTHKEY = "test-shard-key"
+
+
+@pytest.fixture
+def registry_csv(tmp_path):
+    path = tmp_path / "registry.csv"
+    pd.read_csv("sample_data/fake_voter_records.csv", dtype=str, nrows=3000).to_csv(path, index=False)
+    return path
+
+
+def _signers(registry_csv, n):
+    # registry records read with a typo, spread over every shard
+    records = pd.read_csv(registry_csv, dtype=str).fillna("").iloc[::3000 // n][:n]
+    return [
+        (f"{r.First_Name} {r.Last_Name}"[1:], f"{r.Street_Number} {r.Street_Name}")
+        for r in records.itertuples()
+    ]
+
+
+def _start_worker(manifest, shard):
+    worker = subprocess.Popen(
+        [sys.executable, "main.py", "shard-worker", str(manifest), str(shard)],
+        env=dict(os.environ, SHARD_AUTHKEY=AUTHKEY),
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    line = worker.stdout.readline()
+    assert line.startswith(f"Serving shard {shard}"), line
+    return worker, line.split()[-1]
+
+
+def test_worker_processes_match_like_a_single_host(tmp_path, registry_csv):
+    assert subprocess.run(
+        [sys.executable, "main.py", "shard-registry", str(registry_csv), str(tmp_path / "shards"), "--shards", "3"],
+        check=True,
+    ).returncode == 0
+    workers = [_start_worker(tmp_path / "shards" / "manifest.json", shard) for shard in range(3)]
+    select_voter_records = create_select_voter_records(pd.read_csv(registry_csv, dtype=str))
+    try:
+        with ShardCoordinator([address for _, address in workers], AUTHKEY.encode()) as coordinator:
+            assert coordinator.rows == 3000
+            for name, address in _signers(registry_csv, 6):
+                sharded = coordinator.get_matched_name_address(name, address)
+                single = get_matched_name_address(name, address, select_voter_records)
+                assert [(m[0], m[1], m[3]) for m in sharded] == [(m[0], m[1], m[3]) for m in single]
+                assert np.allclose([m[2] for m in sharded], [m[2] for m in single])
+
+            ocr_df = pd.DataFrame(_signers(registry_csv, 40), columns=["OCR Name", "OCR Address"]).assign(
+                **{"Date": "1/1", "Page Number": 1, "Row Number": range(40), "Filename": "a.pdf", "Duplicate Of": None}
+            )
+            sharded_df, candidates = coordinator.create_ocr_matched_df(ocr_df, threshold=85, batch_size=16)
+            single_df = create_ocr_matched_df(ocr_df, select_voter_records, threshold=85)
+            pd.testing.assert_frame_equal(sharded_df, single_df)
+            assert len(candidates) == 40
+    finally:
+        for worker, _ in workers:
+            worker.kill()
+            worker.wait()
+
+
+def _serve(manifest, shard, authkey=AUTHKEY.encode()):
+    worker = ShardWorker(str(manifest), shard, authkey)
+    threading.Thread(target=worker.serve_forever, daemon=True).start()
+    host, port = worker.address
+    return worker, f"{host}:{port}"
+
+
+def test_coordinator_refuses_mismatched_workers(tmp_path):
+    registry = create_select_voter_records(pd.read_csv("sample_data/all_petition_signers.csv", dtype=str))
+    first = partition_registry(registry, str(tmp_path / "first"), 2, digest="first")
+    second = partition_registry(registry, str(tmp_path / "second"), 2, digest="second")
+    workers = [_serve(first, 0), _serve(first, 1), _serve(second, 1)]
+    addresses = [address for _, address in workers]
+
+    with pytest.raises(ValueError, match="different registries"):
+        ShardCoordinator([addresses[0], addresses[2]], AUTHKEY.encode())
+    with pytest.raises(ValueError, match="do not cover"):
+        ShardCoordinator([addresses[1]], AUTHKEY.encode())
+    # the shards of the head of the registry are not all of it
+    with pytest.raises(ValueError, match="do not cover"):
+        ShardCoordinator([addresses[0]], AUTHKEY.encode())
+    with pytest.raises(AuthenticationError):
+        ShardCoordinator(addresses[:2], b"wrong key")
+
+    with ShardCoordinator(addresses[:2], AUTHKEY.encode()) as coordinator:
+        assert coordinator.get_matched_name_address("Adam Welsh", "5211 Shaw Wall")[0][0] == "Adam Welch"
+    for worker, _ in workers:
+        worker.close()
@@ -0,0 +1,32 @@
+import json
+import os
+import subprocess
+import sys
+
+APP_DIR = os.path.abspath("app")
+
+
+def test_importing_the_pipeline_loads_no_provider_sdk_and_writes_nothing(tmp_path):
+    code = (
+        "import json, sys\n"
+        "import ocr_helper, fuzzy_match_helper, job_manager, batch_runner\n"
+        "from settings import load_config\n"
+        "sdks = ['langchain_openai', 'langchain_mistralai', 'langchain_google_genai', 'ipywidgets']\n"
+        "print(json.dumps({'loaded': [name for name in sdks if name in sys.modules],"
+        " 'threshold': load_config()['BASE_THRESHOLD']}))\n"
+    )
+    # run from a directory without config.json, logs or settings
+    completed = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=tmp_path,
+        env=dict(os.environ, PYTHONPATH=APP_DIR),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    assert result["loaded"] == []
+    with open("config.json") as f:
+        assert result["threshold"] == json.load(f)["BASE_THRESHOLD"]
+    assert os.listdir(tmp_path) == []
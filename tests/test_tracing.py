@@ -0,0 +1,114 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import pstats
+import threading
+import tracemalloc
+import pytest
+from utils import get_pipeline_logger, profile_run, trace_run, tracer
+
+
+def test_spans_are_free_when_tracing_is_off():
+    with tracer.run("off") as traced:
+        with tracer.span("match") as span:
+            pass
+    assert span is tracer.span("render")
+    assert traced.summary() == []
+
+
+def test_spans_are_recorded_per_run_across_tasks_and_threads(tmp_path):
+    tracer.configure(enabled=True, track_memory=True)
+
+    def render():
+        with tracer.span("render"):
+            return bytearray(1 << 20)
+
+    async def run():
+        with tracer.span("ocr_request"):
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*(asyncio.to_thread(render) for _ in range(3)))
+        with pytest.raises(ValueError):
+            with tracer.span("parse"):
+                raise ValueError("bad response")
+
+    with trace_run("job", str(tmp_path)) as traced:
+        asyncio.run(run())
+    # spans outside a run only count towards the process totals
+    with tracer.span("match"):
+        pass
+
+    stats = {row["name"]: row for row in traced.summary()}
+    assert set(stats) == {"ocr_request", "render", "parse"}
+    assert stats["render"]["count"] == 3
+    assert stats["render"]["peak_bytes"] >= 1 << 20
+    assert stats["ocr_request"]["max_s"] >= 0.01
+    assert stats["parse"]["errors"] == 1
+    assert tracer.totals.stats["match"].count >= 1
+
+    (trace_path,) = [path for path in os.listdir(tmp_path) if path.startswith("trace_job")]
+    with open(tmp_path / trace_path) as f:
+        assert json.load(f)["run"] == "job"
+
+
+def test_sampling_records_a_share_of_spans():
+    random.seed(1)
+    tracer.configure(enabled=True, sample_rate=0.25)
+    with tracer.run("sampled") as traced:
+        for _ in range(2000):
+            with tracer.span("match"):
+                pass
+    assert 400 < traced.stats["match"].count < 600
+
+
+def test_run_profile_and_memory_snapshot(tmp_path):
+    with trace_run("batch", str(tmp_path), profile=True, snapshot=True):
+        sorted(range(10_000), key=lambda n: -n)
+
+    stats = pstats.Stats(str(tmp_path / "profile_batch.prof"))
+    assert stats.total_calls > 0
+    assert tracemalloc.Snapshot.load(str(tmp_path / "memory_batch.tracemalloc")).traces is not None
+    # tracing is off, no trace is exported
+    assert not [path for path in os.listdir(tmp_path) if path.startswith("trace_")]
+
+
+def test_concurrent_runs_are_profiled_one_at_a_time(tmp_path):
+    profiling = threading.Event()
+    second_done = threading.Event()
+    errors = []
+
+    def first():
+        with profile_run(str(tmp_path), "first", cprofile=True, snapshot=True):
+            profiling.set()
+            second_done.wait(5)
+
+    def second():
+        profiling.wait(5)
+        try:
+            with profile_run(str(tmp_path), "second", cprofile=True, snapshot=True):
+                pass
+        except Exception as e:
+            errors.append(e)
+        second_done.set()
+
+    threads = [threading.Thread(target=first), threading.Thread(target=second)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sorted(os.listdir(tmp_path)) == ["memory_first.tracemalloc", "profile_first.prof"]
+    # the next run is profiled again
+    with profile_run(str(tmp_path), "third", cprofile=True):
+        pass
+    assert (tmp_path / "profile_third.prof").exists()
+
+
+def test_pipeline_logger_handlers_are_attached_once(tmp_path):
+    first = get_pipeline_logger("tracing_test", str(tmp_path))
+    second = get_pipeline_logger("tracing_test", str(tmp_path))
+    assert first is second
+    assert len(first.handlers) == 2
+    assert first.level == logging.INFO